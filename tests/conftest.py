@@ -0,0 +1,5 @@
+import os
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen") # xPubUi imports PySide6; nothing here opens a window
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,130 @@
+import os
+import time
+
+import pytest
+
+import xPubUi
+
+MARKER = "_COMPLETE"
+
+
+class FakeClock:
+    def __init__(self): self.now = time.time() # Folder mtimes are real, so the fake clock starts at the real time
+    def __call__(self): return self.now
+
+class Farm:
+    """A one-shot show whose renders the tests write, and a FolderWatcher over it driven by a fake clock."""
+    def __init__(self, tmp_path, **overrides):
+        self.config_data = dict({"project_root": str(tmp_path), "active_department": "lighting", "departments": {"lighting": {"source_path": "lighting/houdini"}},
+                                 "watch_poll_min_s": 10, "watch_poll_max_s": 80, "watch_stable_s": 100, "watch_marker": MARKER}, **overrides)
+        self.user_root = os.path.join(xPubUi.get_shots_root(str(tmp_path), "DEMO"), "SQ010", "SQ010_0010", "lighting", "houdini", "ana", "renders", "preview")
+        self.clock = FakeClock(); self.completed = []; self.watcher = None
+
+    def start(self):
+        self.watcher = xPubUi.FolderWatcher(self.config_data, ["DEMO"], self.completed.append, log_callback=lambda text: None, clock=self.clock)
+        return self
+
+    def version(self, version="v001", frames=3):
+        path = os.path.join(self.user_root, "beauty", version); os.makedirs(path, exist_ok=True)
+        for i in range(frames): self.write(version, f"beauty.{i:04d}.exr", b"x" * 100)
+        return path
+
+    def write(self, version, name, data):
+        path = os.path.join(self.user_root, "beauty", version)
+        with open(os.path.join(path, name), 'wb') as f: f.write(data)
+        self.bump(path)
+
+    def bump(self, path):
+        """Moves a folder's mtime on, as creating a file in it does on a share with coarse timestamps."""
+        st = os.stat(path); os.utime(path, ns=(st.st_atime_ns, max(st.st_mtime_ns, time.time_ns()) + 1_000_000_000))
+
+    def run_for(self, seconds):
+        """Polls every folder as it falls due until seconds of fake time have passed."""
+        end = self.clock.now + seconds
+        while True:
+            self.watcher.poll(); due = self.watcher.next_due()
+            if due is None or due > end: self.clock.now = end; self.watcher.poll(); return
+            self.clock.now = max(self.clock.now, due)
+
+    def triggers(self): return [(info["version"], info["trigger"], info["republish"]) for info in self.completed]
+
+
+def test_marker_completes_a_version_once(tmp_path):
+    farm = Farm(tmp_path).start(); farm.run_for(30)
+    farm.version(); farm.run_for(1000)
+    assert farm.completed == [] # Quiet for long, but no marker
+    farm.write("v001", MARKER, b"")
+    farm.run_for(100)
+    assert farm.triggers() == [("v001", "marker", False)]
+    info = farm.completed[0]
+    assert (info["show"], info["seq"], info["shot"], info["user"], info["render"]) == ("DEMO", "SQ010", "SQ010_0010", "ana", "beauty")
+    farm.run_for(2000)
+    assert len(farm.completed) == 1
+
+def test_stable_completion_waits_for_quiet_files(tmp_path):
+    farm = Farm(tmp_path, watch_completion="stable").start(); farm.run_for(30)
+    farm.version(); farm.run_for(60)
+    farm.write("v001", "beauty.0003.exr", b"x" * 100); farm.run_for(60)
+    assert farm.completed == []
+    path = os.path.join(farm.user_root, "beauty", "v001", "beauty.0000.exr"); st = os.stat(os.path.dirname(path))
+    with open(path, 'ab') as f: f.write(b"still rendering") # Rewritten in place: only its size moves
+    os.utime(os.path.dirname(path), ns=(st.st_atime_ns, st.st_mtime_ns))
+    farm.run_for(60)
+    assert farm.completed == []
+    farm.run_for(200)
+    assert farm.triggers() == [("v001", "stable", False)]
+
+def test_marker_mode_ignores_stable_files(tmp_path):
+    farm = Farm(tmp_path).start(); farm.run_for(30)
+    farm.version(); farm.run_for(5000)
+    assert farm.completed == []
+
+def test_versions_finished_before_the_catch_up_window_are_retired(tmp_path):
+    farm = Farm(tmp_path, watch_catch_up_hours=24)
+    path = farm.version("v001"); farm.write("v001", MARKER, b"")
+    old = time.time() - 48 * 3600; os.utime(path, (old, old))
+    recent = farm.version("v002"); farm.write("v002", MARKER, b"")
+    farm.start(); farm.run_for(300)
+    assert farm.triggers() == [("v002", "marker", False)]
+    assert farm.watcher.nodes[path].retired
+    farm.write("v001", MARKER, b"again") # Re-rendered after all
+    farm.run_for(300)
+    assert farm.triggers()[1:] == [("v001", "marker", True)]
+
+def test_failed_publish_is_rearmed(tmp_path):
+    farm = Farm(tmp_path).start(); farm.run_for(30)
+    path = farm.version(); farm.write("v001", MARKER, b""); farm.run_for(100)
+    assert len(farm.completed) == 1
+    farm.watcher.rearm(path); farm.run_for(10)
+    assert len(farm.completed) == 1 # Retried after watch_poll_max_s, not in a tight loop
+    farm.run_for(100)
+    assert farm.triggers() == [("v001", "marker", False), ("v001", "marker", False)]
+    farm.run_for(1000)
+    assert len(farm.completed) == 2
+
+def test_rerender_after_finishing_needs_a_new_marker(tmp_path):
+    farm = Farm(tmp_path).start(); farm.run_for(30)
+    farm.version(); farm.write("v001", MARKER, b""); farm.run_for(100)
+    farm.write("v001", "beauty.0000.exr", b"y" * 200) # Re-render starts; the old marker is still there
+    farm.run_for(500)
+    assert len(farm.completed) == 1
+    farm.write("v001", MARKER, b"done again")
+    farm.run_for(100)
+    assert farm.triggers() == [("v001", "marker", False), ("v001", "marker", True)]
+
+def test_stable_version_changed_in_place_is_republished(tmp_path):
+    farm = Farm(tmp_path, watch_completion="stable").start(); farm.run_for(30)
+    path = farm.version(); farm.run_for(300)
+    assert farm.triggers() == [("v001", "stable", False)]
+    st = os.stat(path)
+    with open(os.path.join(path, "beauty.0001.exr"), 'wb') as f: f.write(b"z" * 300)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns)) # The folder mtime does not move
+    farm.run_for(500)
+    assert farm.triggers() == [("v001", "stable", False), ("v001", "stable", True)]
+
+@pytest.mark.parametrize("completion", ["marker", "stable", "either"])
+def test_new_versions_are_found_below_existing_folders(tmp_path, completion):
+    farm = Farm(tmp_path, watch_completion=completion).start(); farm.run_for(30)
+    farm.version("v001"); farm.write("v001", MARKER, b""); farm.run_for(300)
+    farm.version("v002"); farm.write("v002", MARKER, b""); farm.run_for(300)
+    assert sorted(version for version, trigger, republish in farm.triggers()) == ["v001", "v002"]
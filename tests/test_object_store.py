@@ -0,0 +1,146 @@
+import os
+import tarfile
+
+import pytest
+
+import xPubUi
+
+
+@pytest.fixture
+def client():
+    return xPubUi.InMemoryObjectStore(page_size=3)
+
+@pytest.fixture
+def backend(client):
+    return xPubUi.ObjectStoreBackend(client, part_size=1024, max_workers=2)
+
+@pytest.fixture
+def store(monkeypatch):
+    """The shared in-memory store behind storage_for('s3://...'), fresh for each test."""
+    monkeypatch.setattr(xPubUi.InMemoryObjectStore, "_shared", None)
+    xPubUi.configure_storage({"object_store": {"endpoint_url": "memory://", "part_size_mb": 1 / 64, "upload_workers": 2}})
+    yield xPubUi.InMemoryObjectStore.shared()
+    xPubUi.configure_storage({})
+
+def record_ranges(client):
+    """Wraps get_object to log each request's Range (None for a whole-object GET) and the bytes it returned."""
+    requests, get_object = [], client.get_object
+    def logged(Bucket, Key, Range=None):
+        response = get_object(Bucket, Key, Range); requests.append((Key, Range, len(response["Body"].getvalue()))); return response
+    client.get_object = logged
+    return requests
+
+
+# Writes
+
+def test_small_write_is_a_single_put(backend, client):
+    with backend.open_write("s3://bk/shot/v001/a.exr") as f: f.write(b"x" * 100)
+    assert client.calls["put_object"] == 1 and client.calls["create_multipart_upload"] == 0
+    assert client.objects[("bk", "shot/v001/a.exr")][0] == b"x" * 100
+
+def test_large_write_goes_up_in_parts(backend, client):
+    data = os.urandom(3 * 1024 + 500)
+    with backend.open_write("s3://bk/shot/v001/a.exr") as f:
+        for start in range(0, len(data), 700): f.write(data[start:start + 700])
+    assert (client.calls["create_multipart_upload"], client.calls["upload_part"], client.calls["complete_multipart_upload"]) == (1, 4, 1)
+    assert client.objects[("bk", "shot/v001/a.exr")][0] == data
+
+def test_failed_write_aborts_the_upload(backend, client):
+    with pytest.raises(RuntimeError):
+        with backend.open_write("s3://bk/shot/v001/a.exr") as f:
+            f.write(os.urandom(2048)); raise RuntimeError("source vanished")
+    assert client.calls["abort_multipart_upload"] == 1
+    assert not client.objects and not client.uploads
+
+def test_upload_file_sends_parts_in_parallel(backend, client, tmp_path):
+    local = tmp_path / "a.exr"; data = os.urandom(5 * 1024 + 1); local.write_bytes(data); sent = []
+    backend.upload_file(str(local), "s3://bk/shot/v001/a.exr", sent.append)
+    assert client.calls["upload_part"] == 6 and sum(sent) == len(data)
+    with backend.open_read("s3://bk/shot/v001/a.exr") as f: assert f.read() == data
+
+
+# Listing, deleting, renaming
+
+def test_listing_pages_through_folders_and_files(backend, client):
+    for key in ["shot/v001/a.exr", "shot/v001/b.exr", "shot/v001/aov/z.exr", "shot/v002/a.exr", "shot/notes.txt"]:
+        client.put_object(Bucket="bk", Key=key, Body=b"1234")
+    assert sorted((e.name, e.is_dir) for e in backend.list("s3://bk/shot")) == [("notes.txt", False), ("v001", True), ("v002", True)]
+    assert sorted(e.path for e in backend.walk_files("s3://bk/shot/v001")) == ["s3://bk/shot/v001/a.exr", "s3://bk/shot/v001/aov/z.exr", "s3://bk/shot/v001/b.exr"]
+    assert backend.list("s3://bk/shot/v003") is None
+    assert backend.stat("s3://bk/shot/v001").is_dir and backend.stat("s3://bk/shot/v001/a.exr").size == 4
+    assert backend.stat("s3://bk/shot/v003") is None
+
+def test_delete_is_batched(backend, client):
+    paths = [f"s3://bk/v001/f.{i:04d}.exr" for i in range(2500)]
+    for path in paths: client.objects[backend.split(path)] = (b"", 0.0)
+    assert backend.delete(paths) == []
+    assert client.calls["delete_objects"] == 3 and not client.objects
+
+def test_rename_moves_every_object_below_a_folder(backend, client):
+    for key in ["stage/v001/a.exr", "stage/v001/aov/z.exr"]: client.put_object(Bucket="bk", Key=key, Body=key.encode())
+    backend.rename("s3://bk/stage/v001", "s3://bk/pub/v001")
+    assert sorted(k for b, k in client.objects) == ["pub/v001/a.exr", "pub/v001/aov/z.exr"]
+    assert client.objects[("bk", "pub/v001/aov/z.exr")][0] == b"stage/v001/aov/z.exr"
+    with pytest.raises(FileNotFoundError): backend.rename("s3://bk/stage/v001", "s3://bk/pub/v002")
+
+
+# Publishing
+
+def test_version_is_committed_only_with_its_manifest(backend, client):
+    client.put_object(Bucket="bk", Key="pub/v001/a.exr", Body=b"a")
+    assert not backend.version_committed("s3://bk/pub/v001")
+    client.put_object(Bucket="bk", Key="pub/v001/" + xPubUi.PUBLISH_MANIFEST_NAME, Body=b"{}")
+    assert backend.version_committed("s3://bk/pub/v001")
+
+def test_publish_to_the_store_commits_and_drops_stale_objects(store, tmp_path):
+    source = tmp_path / "v001"; (source / "aov").mkdir(parents=True)
+    (source / "a.exr").write_bytes(os.urandom(40000)); (source / "aov" / "z.exr").write_bytes(b"z")
+    store.put_object(Bucket="bk", Key="pub/v001/old.exr", Body=b"left over")
+    engine = xPubUi.TransferEngine([(str(source), "s3://bk/pub/v001")], config_data={"cache_dir": str(tmp_path / "cache"), "throughput_history": False}, log_callback=lambda text: None)
+    assert engine.run()
+    backend = xPubUi.storage_for("s3://bk/pub/v001")
+    assert backend.version_committed("s3://bk/pub/v001")
+    assert sorted(k for b, k in store.objects) == ["pub/v001/" + xPubUi.PUBLISH_MANIFEST_NAME, "pub/v001/a.exr", "pub/v001/aov/z.exr"]
+    assert store.objects[("bk", "pub/v001/a.exr")][0] == (source / "a.exr").read_bytes()
+
+
+# Packs
+
+@pytest.fixture
+def pack(store, tmp_path):
+    """A zlib pack of a small version, uploaded without its index sidecar. Returns (local pack path, s3 pack path, source dir)."""
+    source = tmp_path / "v001"; (source / "aov").mkdir(parents=True)
+    for i in range(8): (source / f"beauty.{i:04d}.exr").write_bytes(os.urandom(300000))
+    (source / "aov" / "z.exr").write_bytes(b"z" * 1000)
+    local = str(tmp_path / "v001.tar")
+    assert not xPubUi.pack_version_folder(str(source), local, "zlib")["error"]
+    xPubUi.storage_for("s3://bk/packs/v001.tar").upload_file(local, "s3://bk/packs/v001.tar")
+    return local, "s3://bk/packs/v001.tar", source
+
+def test_pack_index_is_rebuilt_from_ranged_reads_of_the_headers(store, pack):
+    local, remote, source = pack; requests = record_ranges(store)
+    index = xPubUi.read_pack_index(remote)
+    assert [(m["name"], m["offset"]) for m in index["members"]] == [(m["name"], m["offset"]) for m in xPubUi.read_pack_index(local)["members"]]
+    ranged = [r for r in requests if r[0] == "packs/v001.tar"]
+    assert ranged and all(rng for key, rng, size in ranged)
+    assert sum(size for key, rng, size in ranged) < os.path.getsize(local) / 2
+
+def test_pack_index_sidecar_is_one_request(store, pack):
+    local, remote, source = pack
+    xPubUi.storage_for(remote).upload_file(local + ".index.json", remote + ".index.json"); requests = record_ranges(store)
+    assert len(xPubUi.read_pack_index(remote)["members"]) == 9
+    assert requests == [("packs/v001.tar.index.json", None, os.path.getsize(local + ".index.json"))]
+
+def test_restoring_one_member_reads_only_its_bytes(store, pack, tmp_path):
+    local, remote, source = pack
+    xPubUi.storage_for(remote).upload_file(local + ".index.json", remote + ".index.json"); requests = record_ranges(store)
+    out = tmp_path / "restored"
+    assert xPubUi.restore_pack(remote, str(out), [os.path.join("aov", "z.exr")], None) == 1
+    assert (out / "aov" / "z.exr").read_bytes() == b"z" * 1000 and not (out / "beauty.0000.exr").exists()
+    assert sum(size for key, rng, size in requests if key == "packs/v001.tar") < 300000
+
+def test_restoring_a_whole_pack_from_the_store(store, pack, tmp_path):
+    local, remote, source = pack; out = tmp_path / "restored"
+    assert xPubUi.restore_pack(remote, str(out), None, None) == 9
+    for rel in xPubUi.snapshot_manifest(str(source)): assert (out / rel).read_bytes() == (source / rel).read_bytes()
+    with tarfile.open(local) as tar: assert len(tar.getmembers()) == 9
@@ -0,0 +1,139 @@
+import os
+import shutil
+import time
+
+import pytest
+
+import xPubUi
+
+
+@pytest.fixture
+def show(tmp_path):
+    """Two shots with published lighting versions beauty/v001 and beauty/v002. Returns (config, {"0010/v001": version path, ...})."""
+    config_data = {"project_root": str(tmp_path / "proj"), "cache_dir": str(tmp_path / "cache"), "scrub_db": str(tmp_path / "scrub.db"),
+                   "departments": {"lighting": {"publish_path": "publish/lighting/renders"}, "fx": {"publish_path": "publish/fx/renders"}},
+                   "scrub_workers": 2, "scrub_mb_per_s": 0, "scrub_drop_cache": False, "scrub_priority": "Normal"}
+    versions = {}
+    for shot in ("SQ010_0010", "SQ010_0020"):
+        for version in ("v001", "v002"):
+            path = os.path.join(xPubUi.get_shots_root(config_data["project_root"], "DEMO"), "SQ010", shot, "publish", "lighting", "renders", "beauty", version)
+            os.makedirs(path)
+            for frame in range(3):
+                with open(os.path.join(path, f"beauty.{frame:04d}.exr"), 'wb') as f: f.write(os.urandom(2000))
+            versions[f"{shot[-4:]}/{version}"] = path
+    return config_data, versions
+
+def scrub(config_data, **kwargs):
+    index = xPubUi.ScrubIndex.from_config(config_data)
+    try:
+        scrubber = xPubUi.PublishScrubber(config_data, index, log_callback=lambda text: None)
+        return scrubber.run(["DEMO"], **kwargs), scrubber.stats
+    finally: index.close()
+
+def problem_rows(config_data):
+    index = xPubUi.ScrubIndex.from_config(config_data)
+    try: return index.problem_files()
+    finally: index.close()
+
+def recorded(config_data, version_path):
+    index = xPubUi.ScrubIndex.from_config(config_data)
+    try: return index.version_rows(version_path)
+    finally: index.close()
+
+def rewrite(path, data, keep_mtime=False):
+    st = os.stat(path)
+    with open(path, 'r+b') as f: f.truncate(0); f.write(data)
+    if keep_mtime: os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    else: os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+
+
+def test_findings(show):
+    config_data, versions = show
+    assert scrub(config_data)[0] and problem_rows(config_data) == []
+    completed, stats = scrub(config_data)
+    assert completed and stats["hashed"] == 0 and stats["skipped"] == 12 # Unchanged files are not read again until they are due
+    v001, v002 = versions["0010/v001"], versions["0010/v002"]
+    rewrite(os.path.join(v001, "beauty.0000.exr"), os.urandom(2000), keep_mtime=True) # Bit rot: same size and mtime
+    rewrite(os.path.join(v001, "beauty.0001.exr"), b"x" * 500) # Cut short
+    rewrite(os.path.join(v002, "beauty.0000.exr"), os.urandom(2000)) # Rewritten in place
+    os.remove(os.path.join(v002, "beauty.0002.exr"))
+    completed, stats = scrub(dict(config_data, scrub_reverify_days=0)) # Everything due, so the bit rot is read too
+    assert completed
+    found = {(os.path.basename(os.path.dirname(path)), os.path.basename(path)): status for path, status, detail, ts in problem_rows(config_data)}
+    assert found == {("v001", "beauty.0000.exr"): "corrupt", ("v001", "beauty.0001.exr"): "truncated",
+                     ("v002", "beauty.0000.exr"): "modified", ("v002", "beauty.0002.exr"): "missing"}
+    assert (stats["corrupt"], stats["truncated"], stats["modified"], stats["missing"]) == (1, 1, 1, 1)
+    index = xPubUi.ScrubIndex.from_config(config_data)
+    try: assert index.problems(os.path.dirname(v001)) == {v001: {"corrupt": 1, "truncated": 1}, v002: {"modified": 1, "missing": 1}}
+    finally: index.close()
+    assert recorded(config_data, v001)[os.path.join(v001, "beauty.0001.exr")][0] == 2000 # The recorded baseline stays
+
+def test_republished_version_is_recorded_afresh(show):
+    config_data, versions = show; v001 = versions["0010/v001"]
+    assert scrub(config_data)[0]
+    replacement = v001 + "_new"; shutil.copytree(v001, replacement)
+    with open(os.path.join(replacement, "beauty.0000.exr"), 'wb') as f: f.write(b"new render")
+    shutil.rmtree(v001); os.rename(replacement, v001) # A new folder, as a republish commits one
+    completed, stats = scrub(config_data)
+    assert completed and problem_rows(config_data) == [] and stats["republished"] == 1
+
+def test_interrupted_pass_resumes_from_its_cursor(show, monkeypatch):
+    config_data, versions = show; seen = []; clock = [0.0]
+    scrub_version = xPubUi.PublishScrubber._scrub_version
+    def timed_scrub_version(scrubber, pool, show_name, version_path, pass_id):
+        seen.append(version_path); clock[0] += 10; return scrub_version(scrubber, pool, show_name, version_path, pass_id) # Each version takes 10s
+    monkeypatch.setattr(xPubUi.PublishScrubber, "_scrub_version", timed_scrub_version)
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    assert scrub(config_data, max_seconds=25)[0] is False
+    assert len(seen) == 3 # Checked before each version: 0, 10 and 20s in, but not 30
+    completed, stats = scrub(config_data, max_seconds=25)
+    assert completed and sorted(seen) == sorted(versions.values()) # The fourth only; none twice
+    index = xPubUi.ScrubIndex.from_config(config_data)
+    try:
+        assert len({r[0] for r in index.conn.execute("SELECT pass_id FROM versions")}) == 1
+        assert index.get_meta("last_completed")["id"] == 1
+    finally: index.close()
+
+def test_deleted_versions_are_forgotten(show):
+    config_data, versions = show
+    assert scrub(config_data)[0]
+    shutil.rmtree(versions["0010/v002"]); shutil.rmtree(os.path.dirname(versions["0020/v001"])) # A version, and a whole render folder
+    completed, stats = scrub(config_data)
+    assert completed and stats["forgotten"] == 3
+    assert recorded(config_data, versions["0010/v002"]) == {} and recorded(config_data, versions["0020/v002"]) == {}
+    assert len(recorded(config_data, versions["0010/v001"])) == 3
+    assert problem_rows(config_data) == [] # Not reported as missing files either
+
+def test_unlistable_render_folder_keeps_its_records(show, monkeypatch):
+    config_data, versions = show; render = os.path.dirname(versions["0010/v001"])
+    assert scrub(config_data)[0]
+    scandir, listdir = os.scandir, os.listdir
+    def refuse(real):
+        def listing(path="."):
+            if os.path.normpath(os.fspath(path)) == render: raise PermissionError(13, "Permission denied", path)
+            return real(path)
+        return listing
+    monkeypatch.setattr(os, "scandir", refuse(scandir)); monkeypatch.setattr(os, "listdir", refuse(listdir))
+    completed, stats = scrub(config_data)
+    assert completed and stats["forgotten"] == 0
+    assert len(recorded(config_data, versions["0010/v001"])) == 3 and len(recorded(config_data, versions["0010/v002"])) == 3
+
+def test_versions_outside_the_walked_roots_are_kept(show):
+    config_data, versions = show
+    assert scrub(config_data)[0]
+    index = xPubUi.ScrubIndex.from_config(config_data)
+    try: scrubber = xPubUi.PublishScrubber(config_data, index, log_callback=lambda text: None); assert scrubber.run(["DEMO"], departments=["fx"])
+    finally: index.close()
+    assert all(len(recorded(config_data, path)) == 3 for path in versions.values())
+
+def test_version_gone_needs_a_listing_that_succeeded(show, monkeypatch):
+    config_data, versions = show; v001, v002 = versions["0010/v001"], versions["0020/v001"]
+    assert not xPubUi._scrub_version_gone(v001)
+    shutil.rmtree(v001)
+    assert xPubUi._scrub_version_gone(v001)
+    shutil.rmtree(os.path.dirname(v002))
+    assert xPubUi._scrub_version_gone(v002)
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path=".": (_ for _ in ()).throw(OSError(112, "Share unavailable")) if "SQ010_00" in os.fspath(path) else listdir(path))
+    assert not xPubUi._scrub_version_gone(v001)
+    assert not xPubUi._scrub_version_gone(v002)
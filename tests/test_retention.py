@@ -0,0 +1,77 @@
+import pytest
+
+import xPubUi
+
+NOW = 1_700_000_000.0
+DAY = 86400
+
+# (source, user, render, version, age in days) of one shot's lighting versions; v001 is the oldest
+VERSIONS = [
+    ("WIP", "ana", "beauty", "v001", 40), ("WIP", "ana", "beauty", "v002", 20), ("WIP", "ana", "beauty", "v003", 10), ("WIP", "ana", "beauty", "v004", 1),
+    ("WIP", "ben", "beauty", "v001", 30), ("WIP", "ana", "fog", "v001", 50),
+    ("FINAL", "-", "beauty", "v002", 19), ("FINAL", "-", "beauty", "v003", 9),
+]
+
+def make_index(versions=VERSIONS, department="lighting"):
+    index = xPubUi.VersionIndex()
+    for source, user, render, version, age in versions:
+        index.append("SQ010", "SQ010_0010", department, source, user, render, version, f"/{source}/{user}/{render}/{version}", NOW - age * DAY)
+    return index
+
+def plan_of(policies, pins=(), logged=(), versions=VERSIONS):
+    plan = xPubUi.evaluate_retention(make_index(versions), policies, pins, {("SQ010", "SQ010_0010", r, v) for r, v in logged}, now=NOW)
+    return {(row["source"], row["user"], row["render"], row["version"]): (row["action"], row["reason"]) for row in plan.rows()}
+
+WIP = ("lighting", "WIP"); FINAL = ("lighting", "FINAL")
+
+CASES = [
+    ("no policy keeps everything", {}, (), (), {
+        ("WIP", "ana", "beauty", "v001"): ("keep", "no policy"), ("FINAL", "-", "beauty", "v002"): ("keep", "no policy")}),
+    ("keep_latest ranks per user and render", {WIP: {"keep_latest": 2}}, (), (), {
+        ("WIP", "ana", "beauty", "v004"): ("keep", "within latest 2"), ("WIP", "ana", "beauty", "v003"): ("keep", "within latest 2"),
+        ("WIP", "ana", "beauty", "v002"): ("delete", "beyond latest 2"), ("WIP", "ana", "beauty", "v001"): ("delete", "beyond latest 2"),
+        ("WIP", "ben", "beauty", "v001"): ("keep", "within latest 2"), ("WIP", "ana", "fog", "v001"): ("keep", "within latest 2"),
+        ("FINAL", "-", "beauty", "v002"): ("keep", "no policy")}),
+    ("max_age_days wins over keep_latest", {WIP: {"keep_latest": 3, "max_age_days": 15}}, (), (), {
+        ("WIP", "ana", "beauty", "v004"): ("keep", "within latest 3"), ("WIP", "ana", "beauty", "v003"): ("keep", "within latest 3"),
+        ("WIP", "ana", "beauty", "v002"): ("delete", "older than 15 days"), ("WIP", "ana", "beauty", "v001"): ("delete", "older than 15 days"),
+        ("WIP", "ben", "beauty", "v001"): ("delete", "older than 15 days")}),
+    ("max_age_days alone", {WIP: {"max_age_days": 25}, FINAL: {"max_age_days": 5}}, (), (), {
+        ("WIP", "ana", "beauty", "v002"): ("keep", "no limit"), ("WIP", "ana", "beauty", "v001"): ("delete", "older than 25 days"),
+        ("FINAL", "-", "beauty", "v003"): ("delete", "older than 5 days")}),
+    ("keep_published keeps WIP versions with a FINAL copy", {WIP: {"keep_latest": 1, "keep_published": True}}, (), (), {
+        ("WIP", "ana", "beauty", "v003"): ("keep", "published"), ("WIP", "ana", "beauty", "v002"): ("keep", "published"),
+        ("WIP", "ana", "beauty", "v001"): ("delete", "beyond latest 1")}),
+    ("keep_logged keeps versions named in a publish log", {WIP: {"keep_latest": 1, "keep_logged": True}, FINAL: {"keep_latest": 1, "keep_logged": True}},
+     (), [("beauty", "v002"), ("fog", "v001")], {
+        ("WIP", "ana", "beauty", "v002"): ("keep", "named in a publish log"), ("FINAL", "-", "beauty", "v002"): ("keep", "named in a publish log"),
+        ("WIP", "ana", "beauty", "v003"): ("delete", "beyond latest 1")}),
+    ("protect_only_copy keeps a logged WIP version whose FINAL is gone", {WIP: {"keep_latest": 1}}, (), [("beauty", "v001"), ("beauty", "v002")], {
+        ("WIP", "ana", "beauty", "v001"): ("keep", "only copy of a logged publish"), ("WIP", "ben", "beauty", "v001"): ("keep", "only copy of a logged publish"),
+        ("WIP", "ana", "beauty", "v002"): ("delete", "beyond latest 1")}),
+    ("protect_only_copy can be turned off", {WIP: {"keep_latest": 1, "protect_only_copy": False}}, (), [("beauty", "v001")], {
+        ("WIP", "ana", "beauty", "v001"): ("delete", "beyond latest 1")}),
+    ("pins win over every delete rule", {WIP: {"keep_latest": 1, "max_age_days": 1}}, ["SQ010/*/beauty/v001", "*/fog/*"], (), {
+        ("WIP", "ana", "beauty", "v001"): ("keep", "pinned"), ("WIP", "ben", "beauty", "v001"): ("keep", "pinned"),
+        ("WIP", "ana", "fog", "v001"): ("keep", "pinned"), ("WIP", "ana", "beauty", "v002"): ("delete", "older than 1 days")}),
+]
+
+@pytest.mark.parametrize("policies, pins, logged, expected", [case[1:] for case in CASES], ids=[case[0] for case in CASES])
+def test_evaluate_retention(policies, pins, logged, expected):
+    plan = plan_of(policies, pins, logged)
+    assert {key: plan[key] for key in expected} == expected
+
+def test_other_departments_fall_back_to_no_policy():
+    index = make_index()
+    for source, user, render, version, age in VERSIONS[:2]: index.append("SQ010", "SQ010_0010", "fx", source, user, render, version, f"/fx/{version}", NOW - age * DAY)
+    plan = xPubUi.evaluate_retention(index, {WIP: {"keep_latest": 1}}, now=NOW)
+    assert {(row["action"], row["reason"]) for row in plan.rows() if row["department"] == "fx"} == {("keep", "no policy")}
+    assert plan.summary()[("delete", "beyond latest 1")] == 3
+
+def test_resolve_lays_department_rules_over_the_default():
+    config_data = {"departments": {"lighting": {}, "fx": {}, "comp": {}},
+                   "retention_policies": {"*": {"WIP": {"keep_latest": 5}}, "lighting": {"WIP": {"keep_latest": 3, "keep_logged": True}, "FINAL": {"max_age_days": 90}}}}
+    policies = xPubUi.resolve_retention_policies(config_data, {("fx", "WIP"): {"keep_published": True}})
+    assert policies == {("lighting", "WIP"): {"keep_latest": 3, "keep_logged": True}, ("lighting", "FINAL"): {"max_age_days": 90},
+                        ("fx", "WIP"): {"keep_latest": 5, "keep_published": True}, ("comp", "WIP"): {"keep_latest": 5}}
+    assert xPubUi.resolve_retention_policies({"departments": {"lighting": {}}}) == {}
@@ -0,0 +1,136 @@
+import collections
+import os
+import random
+import shutil
+
+import pytest
+
+import xPubUi
+
+
+class FlakyCopier:
+    """shutil.copy2 that fails the first failures[name] calls for each named file, then copies."""
+    def __init__(self, failures):
+        self.failures = dict(failures); self.calls = collections.Counter(); self._copy2 = shutil.copy2
+    def __call__(self, src, dst, *args, **kwargs):
+        name = os.path.basename(src); self.calls[name] += 1
+        if self.calls[name] <= self.failures.get(name, 0): raise OSError(f"network name no longer available ({name})")
+        return self._copy2(src, dst, *args, **kwargs)
+
+class FakeWait:
+    def __init__(self, give_up=False): self.delays = []; self.give_up = give_up
+    def __call__(self, seconds): self.delays.append(seconds); return self.give_up
+
+def failing(failures, result="copied"):
+    calls = []
+    def func():
+        calls.append(1)
+        if len(calls) <= failures: raise OSError("busy")
+        return result
+    return func, calls
+
+
+# RetryPolicy
+
+def test_backoff_is_random_below_the_exponential_cap():
+    policy = xPubUi.RetryPolicy(retries=10, base=0.5, cap=8.0, rng=random.Random(7))
+    for attempt in range(10):
+        delays = [policy.backoff(attempt) for _ in range(200)]
+        assert 0 <= min(delays) and max(delays) <= min(8.0, 0.5 * 2 ** attempt)
+        assert max(delays) > min(8.0, 0.5 * 2 ** attempt) * 0.8 # Spread over the whole window, not stuck low
+    same = [xPubUi.RetryPolicy(rng=random.Random(3)).backoff(2) for _ in range(2)]
+    assert same[0] == same[1]
+
+def test_run_retries_until_the_call_succeeds():
+    policy = xPubUi.RetryPolicy(retries=4, base=1.0, cap=30.0, rng=random.Random(1)); wait = FakeWait(); retried = []
+    func, calls = failing(3)
+    assert policy.run(func, wait, lambda attempt, delay, error: retried.append((attempt, delay))) == "copied"
+    assert len(calls) == 4 and [attempt for attempt, delay in retried] == [1, 2, 3]
+    assert wait.delays == [delay for attempt, delay in retried]
+    assert all(delay <= 2 ** i for i, delay in enumerate(wait.delays))
+
+def test_run_gives_up_after_the_last_retry():
+    policy = xPubUi.RetryPolicy(retries=2, rng=random.Random(1)); wait = FakeWait()
+    func, calls = failing(5)
+    with pytest.raises(OSError): policy.run(func, wait)
+    assert len(calls) == 3 and len(wait.delays) == 2
+
+def test_run_stops_waiting_on_abort():
+    wait = FakeWait(give_up=True); func, calls = failing(5)
+    with pytest.raises(OSError): xPubUi.RetryPolicy(retries=4, rng=random.Random(1)).run(func, wait)
+    assert len(calls) == 1 and len(wait.delays) == 1
+
+@pytest.mark.parametrize("error, transient", [
+    (OSError("reset"), True), (TimeoutError(), True),
+    (xPubUi.InMemoryObjectStore.Error("SlowDown"), True), (xPubUi.InMemoryObjectStore.Error("503"), True),
+    (xPubUi.InMemoryObjectStore.Error("AccessDenied"), False), (xPubUi.InMemoryObjectStore.Error("NoSuchKey"), False),
+    (ValueError("bad pack"), False),
+])
+def test_only_transient_errors_are_retried(error, transient):
+    calls = []
+    def func():
+        calls.append(1)
+        if len(calls) == 1: raise error
+        return "ok"
+    if transient: assert xPubUi.RetryPolicy(retries=1, rng=random.Random(1)).run(func, FakeWait()) == "ok"
+    else:
+        with pytest.raises(type(error)): xPubUi.RetryPolicy(retries=1, rng=random.Random(1)).run(func, FakeWait())
+    assert xPubUi.is_transient_error(error) is transient
+
+def test_error_budget_is_a_count_or_a_share_of_the_files():
+    assert xPubUi.error_budget({}, 10) == 3
+    assert xPubUi.error_budget({}, 1000) == 10
+    assert xPubUi.error_budget({"transfer_error_budget_files": 0, "transfer_error_budget_pct": 0}, 1000) == 0
+
+
+# Quarantine and the last pass
+
+def write_files(root, names):
+    os.makedirs(root, exist_ok=True)
+    for name in names:
+        with open(os.path.join(root, name), 'wb') as f: f.write(name.encode() * 100)
+
+def make_engine(tmp_path, source, dest, log, **overrides):
+    config_data = dict({"cache_dir": str(tmp_path / "cache"), "throughput_history": False, "transfer_retries": 1}, **overrides)
+    engine = xPubUi.TransferEngine([(source, dest)], config_data=config_data, log_callback=log.append)
+    engine.retry = xPubUi.RetryPolicy(1, 0.001, 0.001, random.Random(5)) # Backoff waits end almost at once
+    return engine
+
+@pytest.fixture
+def job(tmp_path):
+    source, dest = str(tmp_path / "wip" / "v001"), str(tmp_path / "pub" / "beauty" / "v001")
+    names = [f"beauty.{i:04d}.exr" for i in range(6)]; write_files(source, names)
+    return source, dest, names
+
+def test_quarantine_reports_the_budget_once(tmp_path, job):
+    source, dest, names = job; log = []
+    engine = make_engine(tmp_path, source, dest, log); engine._job_budget = 2
+    assert [engine._quarantine_file(0, source, dest, name, OSError("busy")) for name in names[:4]] == [True, True, False, False]
+    engine._stream.flush()
+    assert "\n".join(log).count("more than the error budget of 2") == 1
+    assert sorted(engine._quarantine[0]["rels"]) == names[:4]
+
+def test_last_pass_recovers_quarantined_files(tmp_path, job, monkeypatch):
+    source, dest, names = job; log = []
+    copier = FlakyCopier({"beauty.0002.exr": 3, "beauty.0004.exr": 2}); monkeypatch.setattr(shutil, "copy2", copier)
+    assert make_engine(tmp_path, source, dest, log).run()
+    assert sorted(os.listdir(dest)) == names
+    assert copier.calls["beauty.0002.exr"] == 4 and copier.calls["beauty.0004.exr"] == 3 # Two tries each pass, then the last pass
+    assert "\n".join(log).count("Recovered") == 2
+    assert os.listdir(xPubUi.get_staging_root(dest)) == []
+
+def test_file_failing_in_the_last_pass_fails_the_publish(tmp_path, job, monkeypatch):
+    source, dest, names = job; log = []
+    monkeypatch.setattr(shutil, "copy2", FlakyCopier({"beauty.0003.exr": 100}))
+    assert not make_engine(tmp_path, source, dest, log).run()
+    assert not os.path.exists(dest) and os.listdir(xPubUi.get_staging_root(dest)) == []
+    assert "'beauty.0003.exr' still fails" in "\n".join(log)
+
+def test_job_stops_once_the_budget_is_spent(tmp_path, job, monkeypatch):
+    source, dest, names = job; log = []
+    copier = FlakyCopier({name: 100 for name in names[:4]}); monkeypatch.setattr(shutil, "copy2", copier)
+    assert not make_engine(tmp_path, source, dest, log, transfer_threads=1, auto_tune_transfers=False).run()
+    text = "\n".join(log)
+    assert text.count("more than the error budget of 3") == 1
+    assert "Recovered" not in text and "still fails" not in text # No last pass
+    assert not os.path.exists(dest)
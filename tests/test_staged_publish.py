@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+
+import pytest
+
+import xPubUi
+
+
+def write_files(root, files):
+    for rel, data in files.items():
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f: f.write(data)
+
+def read_files(root):
+    return {rel: open(os.path.join(root, rel), 'rb').read() for rel in xPubUi.snapshot_manifest(root)}
+
+def engine_config(tmp_path, **overrides):
+    return dict({"cache_dir": str(tmp_path / "cache"), "throughput_history": False, "publish_lock_timeout_s": 5}, **overrides)
+
+def publish(tmp_path, source, dest, **overrides):
+    return xPubUi.TransferEngine([(source, dest)], config_data=engine_config(tmp_path, **overrides), log_callback=lambda text: None).run()
+
+
+# PublishLock
+
+def test_second_writer_waits_for_the_lock(tmp_path):
+    dest = str(tmp_path / "render" / "v001")
+    first, second = xPubUi.PublishLock(dest, poll=0.01), xPubUi.PublishLock(dest, poll=0.01)
+    waited_on = []
+    assert first.acquire(timeout=1)
+    try: assert not second.acquire(timeout=0.1, on_wait=waited_on.append)
+    finally: first.release()
+    assert waited_on[0]["token"] == first.owner["token"]
+    assert second.acquire(timeout=1)
+    second.release()
+    assert not os.path.exists(second.path)
+
+def test_contending_writers_hold_the_lock_one_at_a_time(tmp_path):
+    dest = str(tmp_path / "render" / "v001"); inside, overlaps, acquired = [], [], []
+    def writer():
+        lock = xPubUi.PublishLock(dest, poll=0.005)
+        for _ in range(5):
+            assert lock.acquire(timeout=10)
+            inside.append(1); overlaps.append(len(inside)); time.sleep(0.002); inside.pop()
+            acquired.append(1); lock.release()
+    threads = [threading.Thread(target=writer) for _ in range(4)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert len(acquired) == 20 and max(overlaps) == 1
+
+def test_stale_lock_is_taken_over_and_not_released_by_its_old_owner(tmp_path):
+    dest = str(tmp_path / "render" / "v001")
+    crashed = xPubUi.PublishLock(dest, heartbeat=3600)
+    assert crashed.acquire(timeout=1)
+    crashed._stop.set(); crashed._thread.join() # Its heartbeat stops, as when the workstation dies
+    old = time.time() - 120; os.utime(crashed.path, (old, old))
+    taker = xPubUi.PublishLock(dest, stale_after=60, poll=0.01)
+    assert taker.acquire(timeout=1)
+    crashed.release() # Late cleanup of the old owner leaves the new lock alone
+    assert taker.holder()["token"] == taker.owner["token"]
+    taker.release()
+
+def test_fresh_lock_is_not_taken_over(tmp_path):
+    dest = str(tmp_path / "render" / "v001")
+    holder = xPubUi.PublishLock(dest)
+    assert holder.acquire(timeout=1)
+    try: assert not xPubUi.PublishLock(dest, stale_after=60, poll=0.01).acquire(timeout=0.1)
+    finally: holder.release()
+
+
+# Publishing through the engine
+
+def test_publish_waits_out_a_lock_left_by_another_host_until_it_is_stale(tmp_path):
+    source, dest = str(tmp_path / "wip" / "v001"), str(tmp_path / "pub" / "beauty" / "v001")
+    write_files(source, {"beauty.0001.exr": b"a" * 100})
+    lock_path = xPubUi.PublishLock(dest).path
+    write_files(os.path.dirname(lock_path), {os.path.basename(lock_path): b'{"host": "render-07", "pid": 1, "token": "x"}'})
+    assert not publish(tmp_path, source, dest, publish_lock_timeout_s=0.5) # Fresh: still held
+    old = time.time() - 10; os.utime(lock_path, (old, old))
+    assert publish(tmp_path, source, dest, publish_lock_stale_s=5)
+    assert read_files(dest) == {"beauty.0001.exr": b"a" * 100}
+    assert not os.path.exists(lock_path)
+
+def test_failed_verification_leaves_the_existing_version(tmp_path):
+    source, dest = str(tmp_path / "wip" / "v001"), str(tmp_path / "pub" / "beauty" / "v001")
+    write_files(dest, {"beauty.0001.exr": b"old"})
+    write_files(source, {"beauty.0001.exr": b"new!", "beauty.0002.exr": b"new!"})
+    engine = xPubUi.TransferEngine([(source, dest)], config_data=engine_config(tmp_path), log_callback=lambda text: None)
+    staging = xPubUi.new_staging_dir(dest); write_files(staging, {"beauty.0001.exr": b"new!"}) # 0002 never arrived
+    assert not engine._commit_staged(source, dest, staging, xPubUi.snapshot_manifest(source), None, True)
+    assert read_files(dest) == {"beauty.0001.exr": b"old"}
+    assert not os.path.exists(staging)
+
+def test_failed_verification_of_a_move_keeps_the_staged_files(tmp_path):
+    source, dest = str(tmp_path / "wip" / "v001"), str(tmp_path / "pub" / "beauty" / "v001")
+    write_files(source, {"beauty.0002.exr": b"new!"})
+    engine = xPubUi.TransferEngine([(source, dest)], is_move=True, config_data=engine_config(tmp_path), log_callback=lambda text: None)
+    staging = xPubUi.new_staging_dir(dest); write_files(staging, {"beauty.0001.exr": b"new!"})
+    assert not engine._commit_staged(source, dest, staging, {"beauty.0001.exr": 4, "beauty.0002.exr": 4}, None, True)
+    assert not os.path.exists(dest)
+    kept = [name for name in os.listdir(xPubUi.get_staging_root(dest)) if "@failed-" in name]
+    assert len(kept) == 1 and read_files(os.path.join(xPubUi.get_staging_root(dest), kept[0])) == {"beauty.0001.exr": b"new!"}
+
+def test_failed_rename_restores_the_existing_version(tmp_path, monkeypatch):
+    dest = str(tmp_path / "pub" / "beauty" / "v001"); staging = xPubUi.new_staging_dir(dest)
+    write_files(dest, {"beauty.0001.exr": b"old"}); write_files(staging, {"beauty.0001.exr": b"new"})
+    rename = os.rename
+    def failing_rename(src, dst):
+        if src == staging: raise PermissionError("share busy")
+        rename(src, dst)
+    monkeypatch.setattr(os, "rename", failing_rename)
+    with pytest.raises(PermissionError): xPubUi.commit_staged_version(staging, dest)
+    assert read_files(dest) == {"beauty.0001.exr": b"old"}
+    assert read_files(staging) == {"beauty.0001.exr": b"new"}
+
+def test_republish_merges_into_the_existing_version(tmp_path):
+    source, dest = str(tmp_path / "wip" / "v001"), str(tmp_path / "pub" / "beauty" / "v001")
+    write_files(source, {"beauty.0001.exr": b"1", "beauty.0002.exr": b"2", "aov/z.0001.exr": b"z"})
+    assert publish(tmp_path, source, dest)
+    for rel in ("beauty.0001.exr", "aov/z.0001.exr"): os.remove(os.path.join(source, rel))
+    write_files(source, {"beauty.0002.exr": b"2 fixed", "beauty.0003.exr": b"3"})
+    assert publish(tmp_path, source, dest)
+    assert read_files(dest) == {"beauty.0001.exr": b"1", "beauty.0002.exr": b"2 fixed", "beauty.0003.exr": b"3", os.path.join("aov", "z.0001.exr"): b"z"}
+    assert os.listdir(xPubUi.get_staging_root(dest)) == [] # Staging and the replaced folder are gone
+
+def test_republish_replaces_the_version_when_configured(tmp_path):
+    source, dest = str(tmp_path / "wip" / "v001"), str(tmp_path / "pub" / "beauty" / "v001")
+    write_files(source, {"beauty.0001.exr": b"1"})
+    assert publish(tmp_path, source, dest)
+    os.remove(os.path.join(source, "beauty.0001.exr")); write_files(source, {"beauty.0002.exr": b"2"})
+    assert publish(tmp_path, source, dest, publish_replace_versions=True)
+    assert read_files(dest) == {"beauty.0002.exr": b"2"}
+
+def test_carry_over_links_only_what_the_source_lacks(tmp_path):
+    dest, staging = str(tmp_path / "v001"), str(tmp_path / "staging")
+    write_files(dest, {"a.exr": b"old a", "b.exr": b"old b"}); write_files(staging, {"b.exr": b"new b"})
+    assert xPubUi.carry_over_published_files(dest, staging, {"b.exr": 5}) == ["a.exr"]
+    assert read_files(staging) == {"a.exr": b"old a", "b.exr": b"new b"}
+    assert xPubUi.carry_over_published_files(str(tmp_path / "missing"), staging, {}) == []
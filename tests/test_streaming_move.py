@@ -0,0 +1,146 @@
+import json
+import os
+
+import pytest
+
+import xPubUi
+
+FILES = {f"beauty.{i:04d}.exr": bytes([i]) * (1000 + i) for i in range(5)}
+FILES[os.path.join("aov", "z.0001.exr")] = b"z" * 300
+
+
+class Crash(Exception):
+    """Stands in for the process dying."""
+
+class OtherVolume:
+    """os.stat result of a source file, reported on another device."""
+    def __init__(self, st): self._st = st
+    def __getattr__(self, name): return getattr(self._st, name)
+    @property
+    def st_dev(self): return self._st.st_dev + 1
+
+
+def write_files(root, files):
+    for rel, data in files.items():
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f: f.write(data)
+
+def read_files(root):
+    return {rel: open(os.path.join(root, rel), 'rb').read() for rel in xPubUi.snapshot_manifest(root)}
+
+@pytest.fixture
+def paths(tmp_path):
+    source, dest = str(tmp_path / "wip" / "beauty" / "v001"), str(tmp_path / "pub" / "beauty" / "v001")
+    write_files(source, FILES)
+    return source, dest
+
+@pytest.fixture(params=[False, True], ids=["same volume", "across volumes"])
+def across_volumes(request, paths, monkeypatch):
+    if request.param:
+        source = paths[0]; real_stat = os.stat
+        def stat(path, *args, **kwargs):
+            st = real_stat(path, *args, **kwargs)
+            return OtherVolume(st) if os.fspath(path).startswith(source) else st
+        monkeypatch.setattr(os, "stat", stat)
+    return request.param
+
+@pytest.fixture
+def guarded(paths, monkeypatch):
+    """Fails the test if a source file goes before its staged copy is journaled (and, across volumes, verified in staging)."""
+    source, dest = paths; journal_path = xPubUi.move_journal_path(dest); real_remove, real_replace = os.remove, os.replace; deleted = []
+    def check(path):
+        rel = os.path.relpath(path, source)
+        header, released = xPubUi.MoveJournal(journal_path).load()
+        assert released.get(rel) == len(FILES[rel]), f"'{rel}' deleted before it was journaled"
+        return rel, header["staging"]
+    def remove(path, *args, **kwargs):
+        if os.fspath(path).startswith(source + os.sep):
+            rel, staging = check(path)
+            with open(os.path.join(staging, rel), 'rb') as f: assert f.read() == FILES[rel], f"'{rel}' deleted without a verified staged copy"
+            deleted.append(rel)
+        real_remove(path, *args, **kwargs)
+    def replace(src, dst, *args, **kwargs):
+        if os.fspath(src).startswith(source + os.sep): check(src); deleted.append(os.path.relpath(src, source))
+        real_replace(src, dst, *args, **kwargs)
+    monkeypatch.setattr(os, "remove", remove); monkeypatch.setattr(os, "replace", replace)
+    return deleted
+
+def move(tmp_path, source, dest, **overrides):
+    config_data = dict({"cache_dir": str(tmp_path / "cache"), "throughput_history": False, "move_batch_files": 2}, **overrides)
+    return xPubUi.TransferEngine([(source, dest)], is_move=True, config_data=config_data, log_callback=lambda text: None).run()
+
+def crash_after_batches(monkeypatch, batches):
+    """Makes the move die right after its journal records the given number of batches, before their sources go."""
+    release, written = xPubUi.MoveJournal.release, []
+    def dying_release(journal, entries, header=None):
+        release(journal, entries, header)
+        if entries: written.append(entries)
+        if len(written) == batches: raise Crash()
+    monkeypatch.setattr(xPubUi.MoveJournal, "release", dying_release)
+    return lambda: monkeypatch.setattr(xPubUi.MoveJournal, "release", release), written
+
+def staging_leftovers(dest):
+    root = xPubUi.get_staging_root(dest)
+    return sorted(os.listdir(root)) if os.path.isdir(root) else []
+
+
+def test_plain_move(tmp_path, paths, across_volumes, guarded):
+    source, dest = paths
+    assert move(tmp_path, source, dest)
+    assert read_files(dest) == FILES
+    assert xPubUi.snapshot_manifest(source) == {} and sorted(guarded) == sorted(FILES)
+    assert staging_leftovers(dest) == [] # Journal, lock and staging folder are gone
+
+def test_move_resumes_after_a_crash(tmp_path, paths, across_volumes, guarded, monkeypatch):
+    source, dest = paths
+    recover, written = crash_after_batches(monkeypatch, 1)
+    with pytest.raises(Crash): move(tmp_path, source, dest)
+    assert read_files(source) == FILES # The journaled batch had not been released yet
+    header, released = xPubUi.MoveJournal(xPubUi.move_journal_path(dest)).load()
+    assert len(released) == 2 and header["source"] == source
+    recover()
+    assert move(tmp_path, source, dest)
+    assert read_files(dest) == FILES
+    assert xPubUi.snapshot_manifest(source) == {} and sorted(guarded) == sorted(FILES)
+    assert staging_leftovers(dest) == []
+
+def test_torn_journal_line_is_ignored_and_cut_off(tmp_path, paths, across_volumes, guarded, monkeypatch):
+    source, dest = paths; journal_path = xPubUi.move_journal_path(dest)
+    crash_after_batches(monkeypatch, 1)
+    with pytest.raises(Crash): move(tmp_path, source, dest)
+    with open(journal_path, 'a', encoding="utf-8") as f: f.write('{"rel": "beauty.00') # Died half way through a line
+    assert len(xPubUi.MoveJournal(journal_path).load()[1]) == 2
+    recover, written = crash_after_batches(monkeypatch, 1) # The resumed run journals one batch, then dies too
+    with pytest.raises(Crash): move(tmp_path, source, dest)
+    released = xPubUi.MoveJournal(journal_path).load()[1]
+    assert all(rel in released for rel, size in written[0]) # Its lines were not lost behind the torn one
+    monkeypatch.undo()
+    assert move(tmp_path, source, dest)
+    assert read_files(dest) == FILES and xPubUi.snapshot_manifest(source) == {}
+
+def test_journal_load_stops_at_a_torn_line(tmp_path):
+    path = str(tmp_path / "v001.journal")
+    with open(path, 'w', encoding="utf-8") as f:
+        f.write(json.dumps({"source": "/wip", "staging": "/stage"}) + "\n" + json.dumps({"rel": "a.exr", "size": 3}) + "\n" + json.dumps({"rel": "b.exr", "size": 4}))
+    assert xPubUi.MoveJournal(path).load() == ({"source": "/wip", "staging": "/stage"}, {"a.exr": 3})
+    assert xPubUi.MoveJournal(str(tmp_path / "missing.journal")).load() == (None, {})
+
+def test_unfinished_move_from_another_source_is_kept(tmp_path, paths):
+    source, dest = paths; other = str(tmp_path / "wip_other" / "v001")
+    write_files(other, {"beauty.0001.exr": b"only copy"})
+    journal = xPubUi.MoveJournal(xPubUi.move_journal_path(dest)); staging = xPubUi.new_staging_dir(dest)
+    journal.start(other, staging); write_files(staging, {"beauty.0001.exr": b"only copy"}); journal.release([("beauty.0001.exr", 9)]); journal.close()
+    os.remove(os.path.join(other, "beauty.0001.exr"))
+    assert move(tmp_path, source, dest)
+    assert read_files(dest) == FILES
+    kept = [name for name in staging_leftovers(dest) if "@failed-" in name]
+    assert len(kept) == 1 and read_files(os.path.join(xPubUi.get_staging_root(dest), kept[0])) == {"beauty.0001.exr": b"only copy"}
+
+def test_failed_move_without_a_journal_keeps_the_staged_files(tmp_path, paths, monkeypatch):
+    source, dest = paths
+    monkeypatch.setattr(xPubUi, "verify_staged_version", lambda manifest, staging: ["'beauty.0000.exr' is 0 bytes, expected 1000"])
+    assert not move(tmp_path, source, dest, streaming_move=False)
+    assert not os.path.exists(dest)
+    kept = [name for name in staging_leftovers(dest) if "@failed-" in name]
+    assert len(kept) == 1 and read_files(os.path.join(xPubUi.get_staging_root(dest), kept[0])) == FILES
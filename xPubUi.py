@@ -7,121 +7,3922 @@ import datetime
 import subprocess
 import re
 import json
+import io
+import contextlib
 import stat 
-import psutil
 import time
+STARTUP_CLOCK = time.perf_counter() # Origin for the startup timing report; taken before the heavy imports below
+import argparse
+import threading
+import csv
+import math
+import random
+import collections
+import zlib
+import tempfile
+import hashlib
+import shutil
+import uuid
+import itertools
+import fnmatch
+import struct
+import mmap
+import array
+import bisect
+import socket
+import heapq
+import importlib.util
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+# asyncio, sqlite3, lzma, http.server, urllib, hmac, ipaddress and the process pools (multiprocessing) are imported where
+# they are used, like psutil and tarfile: together they cost more at startup than PySide6.QtWidgets
 from PySide6 import QtWidgets, QtCore, QtGui
 
+LOG_DATETIME_FORMAT = '%d %b %Y %H:%M:%S' # Format written by _update_datetime into every log entry
+
+# /////////////////////////////////////////////
+# NEW - Shared Path / Config Helpers
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+def get_resource_path(relative_path):
+    """Returns the external file next to the exe/script if present, else the bundled PyInstaller copy."""
+    base_path = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
+    external_path = os.path.join(base_path, relative_path)
+    if os.path.exists(external_path): return external_path
+    internal_base_path = getattr(sys, '_MEIPASS', None)
+    if internal_base_path and os.path.exists(os.path.join(internal_base_path, relative_path)):
+        return os.path.join(internal_base_path, relative_path)
+    return external_path
+
+def load_config_file(config_path=None):
+    """Loads xPubConfig.JSON without any UI. Used by the command line tools."""
+    with open(config_path or get_resource_path("xPubConfig.JSON"), 'r', encoding="utf-8") as f:
+        return json.load(f)
+
+def get_cache_dir(config_data):
+    """Local (non-share) folder for indexes and caches. Configurable via 'cache_dir'."""
+    cache_dir = config_data.get("cache_dir") or os.path.join(os.path.expanduser("~"), ".xPub")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def get_shots_root(project_root, show_name):
+    return os.path.join(project_root, show_name, "Production", "Shots")
+
+def get_shot_log_path(project_root, show_name, seq_name, shot_name):
+    return os.path.join(get_shots_root(project_root, show_name), seq_name, shot_name, "data", "lighting", "xPubLog.JSON")
+
+def get_shot_log_path_for(shot_path):
+    """get_shot_log_path of a <project_root>/<show>/Production/Shots/<seq>/<shot> folder."""
+    seq_path, shot_name = os.path.split(os.path.normpath(shot_path)); shots_root, seq_name = os.path.split(seq_path)
+    show_path = os.path.dirname(os.path.dirname(shots_root))
+    return get_shot_log_path(os.path.dirname(show_path), os.path.basename(show_path), seq_name, shot_name)
+
+def get_archive_log_path(project_root, show_name, seq_name):
+    # Archive logs live in a sibling "<seq>_Seq" folder, not inside the sequence itself
+    return os.path.join(get_shots_root(project_root, show_name), f"{seq_name}_Seq", "data", "lighting", "xPubArchiveLog.JSON")
+
+def list_subdirs(path):
+    """Names of the immediate sub-directories of path, using a single scandir round trip. Hidden (dot) folders are skipped."""
+    try:
+        with os.scandir(path) as it:
+            return [e.name for e in it if e.is_dir() and not e.name.startswith(".")]
+    except OSError:
+        return []
+
+class StartupTimer:
+    """Records named startup phases relative to process start and formats a one-line report."""
+    def __init__(self, origin):
+        self.origin = self._last = origin; self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter(); self.phases.append((phase, now - self._last)); self._last = now
+
+    def report(self):
+        parts = [f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in self.phases]
+        return f"Startup: {' | '.join(parts)} | total {(self._last - self.origin) * 1000:.0f} ms"
+
+STARTUP_TIMER = StartupTimer(STARTUP_CLOCK)
+
+SORT_ROLE = QtCore.Qt.UserRole + 1 # Raw value used for sorting when the display text is formatted
+
+class SortableTreeWidgetItem(QtWidgets.QTreeWidgetItem):
+    """Tree item that sorts on SORT_ROLE data (sizes, timestamps) when present, else on text."""
+    def __lt__(self, other):
+        column = self.treeWidget().sortColumn() if self.treeWidget() else 0
+        mine, theirs = self.data(column, SORT_ROLE), other.data(column, SORT_ROLE)
+        if mine is not None and theirs is not None: return mine < theirs
+        return super().__lt__(other)
+
+# /////////////////////////////////////////////
+# NEW - Publish History Index
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+class PublishHistoryIndex:
+    """
+    Incrementally maintained SQLite index over every shot xPubLog.JSON and sequence
+    xPubArchiveLog.JSON of a show. Only log files whose mtime/size changed since the
+    last refresh are re-parsed, so a refresh costs one stat per shot.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, show TEXT, kind TEXT, mtime_ns INTEGER, size INTEGER);
+    CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, source TEXT, show TEXT, seq TEXT, shot TEXT, kind TEXT,
+        user TEXT, host TEXT, datetime TEXT, ts REAL, mode TEXT, comment TEXT, payload TEXT);
+    CREATE TABLE IF NOT EXISTS entry_renders (entry_id INTEGER, render TEXT, version TEXT);
+    CREATE INDEX IF NOT EXISTS idx_entries_source ON entries(source);
+    CREATE INDEX IF NOT EXISTS idx_entries_user ON entries(show, user);
+    CREATE INDEX IF NOT EXISTS idx_entries_host ON entries(show, host);
+    CREATE INDEX IF NOT EXISTS idx_entries_ts ON entries(show, ts);
+    CREATE INDEX IF NOT EXISTS idx_renders_render ON entry_renders(render);
+    CREATE INDEX IF NOT EXISTS idx_renders_entry ON entry_renders(entry_id);
+    """
+
+    def __init__(self, db_path):
+        import sqlite3
+        self.db_path = db_path
+        self.has_fts = True
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+            try: conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(comment)")
+            except sqlite3.OperationalError: self.has_fts = False # SQLite built without FTS5, fall back to LIKE
+
+    @classmethod
+    def from_config(cls, config_data):
+        return cls(os.path.join(get_cache_dir(config_data), "xPubHistoryIndex.db"))
+
+    def _connect(self):
+        import sqlite3
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL"); conn.row_factory = sqlite3.Row
+        return conn
+
+    def _discover_logs(self, project_root, show_name):
+        """Yields (log_path, kind, seq, shot) for every log location of the show."""
+        shots_root = get_shots_root(project_root, show_name)
+        for seq_dir in list_subdirs(shots_root):
+            if seq_dir.endswith("_Seq"):
+                seq_name = seq_dir[:-len("_Seq")]
+                yield get_archive_log_path(project_root, show_name, seq_name), "archive", seq_name, ""
+                continue
+            for shot_name in list_subdirs(os.path.join(shots_root, seq_dir)):
+                yield get_shot_log_path(project_root, show_name, seq_dir, shot_name), "publish", seq_dir, shot_name
+
+    def refresh(self, project_root, show_name, progress_callback=None, max_workers=16):
+        """Re-indexes changed log files of a show. Returns (logs_seen, logs_reindexed, logs_removed)."""
+        candidates = list(self._discover_logs(project_root, show_name))
+
+        def stat_log(candidate):
+            try: st = os.stat(candidate[0]); return candidate, st.st_mtime_ns, st.st_size
+            except OSError: return candidate, None, None
+
+        # Stats are latency bound on a share, so issue them concurrently
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            stats = list(pool.map(stat_log, candidates))
+
+        with self._connect() as conn:
+            known = {row["path"]: (row["mtime_ns"], row["size"]) for row in conn.execute("SELECT path, mtime_ns, size FROM sources WHERE show=?", (show_name,))}
+            present, reindexed = set(), 0
+            for i, ((path, kind, seq, shot), mtime_ns, size) in enumerate(stats):
+                if progress_callback and i % 200 == 0: progress_callback(i, len(stats))
+                if mtime_ns is None: continue
+                present.add(path)
+                if known.get(path) == (mtime_ns, size): continue
+                self._index_log(conn, path, show_name, kind, seq, shot)
+                conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)", (path, show_name, kind, mtime_ns, size))
+                reindexed += 1
+            removed = [p for p in known if p not in present]
+            for path in removed:
+                self._drop_source(conn, path); conn.execute("DELETE FROM sources WHERE path=?", (path,))
+        return len(present), reindexed, len(removed)
+
+    def _drop_source(self, conn, path):
+        ids = [r[0] for r in conn.execute("SELECT id FROM entries WHERE source=?", (path,))]
+        for entry_id in ids:
+            conn.execute("DELETE FROM entry_renders WHERE entry_id=?", (entry_id,))
+            if self.has_fts: conn.execute("DELETE FROM entries_fts WHERE rowid=?", (entry_id,))
+        conn.execute("DELETE FROM entries WHERE source=?", (path,))
+
+    def _index_log(self, conn, path, show_name, kind, seq, shot):
+        self._drop_source(conn, path)
+        try:
+            with open(path, 'r', encoding="utf-8") as f: logs = json.load(f)
+            if not isinstance(logs, list): logs = [logs]
+        except (OSError, ValueError) as e:
+            print(f"History index: could not parse {path}: {e}"); return
+        for entry in logs:
+            if not isinstance(entry, dict): continue
+            date_text = entry.get("DateTime", "")
+            try: ts = datetime.datetime.strptime(date_text, LOG_DATETIME_FORMAT).timestamp()
+            except ValueError: ts = None
+            entry_shot = entry.get("Shot", shot) if kind == "archive" else shot
+            mode = entry.get("Mode") or ("Purge" if kind == "archive" else "") # Archive logs predating pack mode were purges
+            cur = conn.execute("INSERT INTO entries (source, show, seq, shot, kind, user, host, datetime, ts, mode, comment, payload) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                               (path, show_name, seq, entry_shot, kind, entry.get("User", ""), entry.get("Host", ""), date_text, ts, mode, entry.get("Comment", ""), json.dumps(entry)))
+            conn.executemany("INSERT INTO entry_renders VALUES (?, ?, ?)", [(cur.lastrowid, r, v) for r, v in self._entry_renders(entry, kind)])
+            if self.has_fts: conn.execute("INSERT INTO entries_fts (rowid, comment) VALUES (?, ?)", (cur.lastrowid, entry.get("Comment", "")))
+
+    @staticmethod
+    def _entry_renders(entry, kind):
+        """Extracts (render, version) pairs from a publish or archive log entry."""
+        if kind == "publish":
+            for pub in entry.get("Publishes", []):
+                source = (pub.get("source") or "").replace("\\", "/").rstrip("/")
+                parts = source.split("/")
+                if len(parts) >= 2: yield parts[-2], parts[-1]
+        else:
+            for cleaned in entry.get("CleanedVersions", []): # "shot/render/version (user)"
+                parts = cleaned.split(" (")[0].split("/")
+                if len(parts) >= 3: yield parts[1], parts[2]
+
+    def logged_versions(self, show):
+        """{(seq, shot, render, version)} named in any publish log entry of the show."""
+        with self._connect() as conn:
+            return {tuple(r) for r in conn.execute("SELECT e.seq, e.shot, r.render, r.version FROM entries e JOIN entry_renders r ON r.entry_id = e.id WHERE e.show = ? AND e.kind = 'publish'", (show,))}
+
+    def search(self, show=None, user=None, host=None, since=None, until=None, mode=None, render=None, text=None, kind=None, limit=500):
+        """Returns matching entries, newest first. since/until are datetime.date/datetime objects."""
+        clauses, params = [], []
+        for column, value in (("e.show", show), ("e.kind", kind), ("e.mode", mode)):
+            if value: clauses.append(f"{column} = ?"); params.append(value)
+        for column, value in (("e.user", user), ("e.host", host)):
+            if value: clauses.append(f"{column} LIKE ?"); params.append(f"%{value}%")
+        if since:
+            clauses.append("e.ts >= ?"); params.append(datetime.datetime.combine(since, datetime.time.min).timestamp() if isinstance(since, datetime.date) and not isinstance(since, datetime.datetime) else since.timestamp())
+        if until:
+            clauses.append("e.ts <= ?"); params.append(datetime.datetime.combine(until, datetime.time.max).timestamp() if isinstance(until, datetime.date) and not isinstance(until, datetime.datetime) else until.timestamp())
+        if render:
+            clauses.append("e.id IN (SELECT entry_id FROM entry_renders WHERE render LIKE ?)"); params.append(f"%{render}%")
+        if text:
+            if self.has_fts:
+                # Quote every term so user text can never be parsed as FTS syntax
+                terms = " ".join('"' + t.replace('"', '""') + '"*' for t in text.split())
+                clauses.append("e.id IN (SELECT rowid FROM entries_fts WHERE entries_fts MATCH ?)"); params.append(terms)
+            else:
+                clauses.append("e.comment LIKE ?"); params.append(f"%{text}%")
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        query = f"SELECT e.* FROM entries e {where} ORDER BY e.ts DESC LIMIT ?"
+        with self._connect() as conn:
+            rows = conn.execute(query, params + [limit]).fetchall()
+            results = []
+            for row in rows:
+                result = dict(row); result.pop("payload", None)
+                result["renders"] = [f"{r}/{v}" for r, v in conn.execute("SELECT render, version FROM entry_renders WHERE entry_id=?", (row["id"],))]
+                results.append(result)
+        return results
+
+class HistoryIndexWorker(QtCore.QObject):
+    """Refreshes the publish history index for a show in a background thread."""
+    progress_updated = QtCore.Signal(int, int)
+    finished = QtCore.Signal(str)
+
+    def __init__(self, history_index, project_root, show_name):
+        super().__init__()
+        self.history_index = history_index; self.project_root = project_root; self.show_name = show_name
+
+    def run(self):
+        try:
+            seen, reindexed, removed = self.history_index.refresh(self.project_root, self.show_name, progress_callback=self.progress_updated.emit)
+            self.finished.emit(f"Indexed {seen} logs ({reindexed} updated, {removed} removed).")
+        except Exception as e:
+            self.finished.emit(f"Index refresh failed: {e}")
+
+class HistorySearchDialog(QtWidgets.QDialog):
+    """Searchable, show-wide view of all publish and archive log entries."""
+    def __init__(self, config_data, show_names, current_show="", parent=None):
+        super(HistorySearchDialog, self).__init__(parent)
+        self.setWindowTitle("Publish History Search"); self.setMinimumSize(900, 500)
+        self.config_data = config_data
+        self.history_index = PublishHistoryIndex.from_config(config_data)
+
+        self.showComBox = QtWidgets.QComboBox(); self.showComBox.addItems(show_names)
+        if current_show in show_names: self.showComBox.setCurrentText(current_show)
+        self.userLineEdit = QtWidgets.QLineEdit(); self.userLineEdit.setPlaceholderText("User")
+        self.hostLineEdit = QtWidgets.QLineEdit(); self.hostLineEdit.setPlaceholderText("Host")
+        self.renderLineEdit = QtWidgets.QLineEdit(); self.renderLineEdit.setPlaceholderText("Render")
+        self.textLineEdit = QtWidgets.QLineEdit(); self.textLineEdit.setPlaceholderText("Search comments...")
+        self.kindComBox = QtWidgets.QComboBox(); self.kindComBox.addItems(["All", "Publish", "Archive"])
+        self.modeComBox = QtWidgets.QComboBox(); self.modeComBox.addItems(["Any", "Copy", "Move", "Purge", "Pack"])
+        self.sinceCheckBox = QtWidgets.QCheckBox("From"); self.sinceDateEdit = QtWidgets.QDateEdit(QtCore.QDate.currentDate().addDays(-7)); self.sinceDateEdit.setCalendarPopup(True)
+        self.untilCheckBox = QtWidgets.QCheckBox("To"); self.untilDateEdit = QtWidgets.QDateEdit(QtCore.QDate.currentDate()); self.untilDateEdit.setCalendarPopup(True)
+        self.refreshBtn = QtWidgets.QPushButton("Refresh Index")
+        self.statusLbl = QtWidgets.QLabel("")
+        self.resultsTree = QtWidgets.QTreeWidget(); self.resultsTree.setHeaderLabels(["Date Time", "Kind", "User", "Host", "Mode", "Seq / Shot", "Renders", "Comment"])
+        self.resultsTree.setAlternatingRowColors(True); self.resultsTree.setRootIsDecorated(False); self.resultsTree.setSortingEnabled(True); self.resultsTree.sortByColumn(0, QtCore.Qt.DescendingOrder)
+
+        filter_layout = QtWidgets.QGridLayout()
+        filter_layout.addWidget(QtWidgets.QLabel("Show"), 0, 0); filter_layout.addWidget(self.showComBox, 0, 1); filter_layout.addWidget(self.userLineEdit, 0, 2); filter_layout.addWidget(self.hostLineEdit, 0, 3); filter_layout.addWidget(self.renderLineEdit, 0, 4)
+        filter_layout.addWidget(self.kindComBox, 1, 0); filter_layout.addWidget(self.modeComBox, 1, 1); filter_layout.addWidget(self.sinceCheckBox, 1, 2); filter_layout.addWidget(self.sinceDateEdit, 1, 3); filter_layout.addWidget(self.untilCheckBox, 1, 4); filter_layout.addWidget(self.untilDateEdit, 1, 5)
+        filter_layout.addWidget(self.textLineEdit, 2, 0, 1, 5); filter_layout.addWidget(self.refreshBtn, 2, 5)
+        layout = QtWidgets.QVBoxLayout(self); layout.addLayout(filter_layout); layout.addWidget(self.resultsTree); layout.addWidget(self.statusLbl)
+
+        # Debounce typing so every keystroke does not hit the database
+        self.search_timer = QtCore.QTimer(self); self.search_timer.setSingleShot(True); self.search_timer.setInterval(150); self.search_timer.timeout.connect(self._run_search)
+        for line_edit in (self.userLineEdit, self.hostLineEdit, self.renderLineEdit, self.textLineEdit): line_edit.textChanged.connect(self.search_timer.start)
+        for combo in (self.kindComBox, self.modeComBox): combo.currentTextChanged.connect(self.search_timer.start)
+        for check_box in (self.sinceCheckBox, self.untilCheckBox): check_box.toggled.connect(self.search_timer.start)
+        for date_edit in (self.sinceDateEdit, self.untilDateEdit): date_edit.dateChanged.connect(self.search_timer.start)
+        self.showComBox.currentTextChanged.connect(self._refresh_index)
+        self.refreshBtn.clicked.connect(self._refresh_index)
+
+        self._refresh_index()
+
+    def _refresh_index(self):
+        show_name = self.showComBox.currentText()
+        if not show_name or (hasattr(self, 'index_thread') and self.index_thread.isRunning()): self._run_search(); return
+        self.refreshBtn.setEnabled(False); self.statusLbl.setText(f"Refreshing index for {show_name}...")
+        self._run_search() # Show what is already indexed while the refresh runs
+        self.index_thread = QtCore.QThread(self)
+        self.index_worker = HistoryIndexWorker(self.history_index, self.config_data.get("project_root", ""), show_name)
+        self.index_worker.moveToThread(self.index_thread)
+        self.index_thread.started.connect(self.index_worker.run)
+        self.index_worker.progress_updated.connect(lambda done, total: self.statusLbl.setText(f"Refreshing index... {done}/{total} shots"))
+        self.index_worker.finished.connect(self._on_index_refreshed)
+        self.index_worker.finished.connect(self.index_thread.quit); self.index_worker.finished.connect(self.index_worker.deleteLater)
+        self.index_thread.start()
+
+    def _on_index_refreshed(self, message):
+        self.refreshBtn.setEnabled(True); self._run_search(); self.statusLbl.setText(f"{message}  {self.statusLbl.text()}")
+
+    def _run_search(self):
+        import sqlite3
+        kind = self.kindComBox.currentText(); mode = self.modeComBox.currentText()
+        start = time.perf_counter()
+        try:
+            results = self.history_index.search(
+                show=self.showComBox.currentText() or None, user=self.userLineEdit.text().strip(), host=self.hostLineEdit.text().strip(),
+                since=self.sinceDateEdit.date().toPython() if self.sinceCheckBox.isChecked() else None,
+                until=self.untilDateEdit.date().toPython() if self.untilCheckBox.isChecked() else None,
+                mode=None if mode == "Any" else mode, render=self.renderLineEdit.text().strip(), text=self.textLineEdit.text().strip(),
+                kind=None if kind == "All" else kind.lower())
+        except sqlite3.Error as e:
+            self.statusLbl.setText(f"Search error: {e}"); return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        self.resultsTree.setSortingEnabled(False); self.resultsTree.clear()
+        for r in results:
+            comment = (r.get("comment") or "").replace("\n", " ")
+            item = SortableTreeWidgetItem([r["datetime"], r["kind"].title(), r["user"], r["host"], r["mode"], f"{r['seq']}/{r['shot']}".rstrip("/"), ", ".join(r["renders"]), comment])
+            item.setData(0, SORT_ROLE, r["ts"] or 0); item.setToolTip(7, r.get("comment") or "")
+            self.resultsTree.addTopLevelItem(item)
+        self.resultsTree.setSortingEnabled(True); self.resultsTree.sortByColumn(self.resultsTree.sortColumn(), self.resultsTree.header().sortIndicatorOrder())
+        self.statusLbl.setText(f"{len(results)} entries ({elapsed_ms:.1f} ms)")
+
+# /////////////////////////////////////////////
+# NEW - Storage Crawler & Usage Report
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+def format_size(size_bytes):
+    """Formats a size in bytes to a human-readable string (KB, MB, GB...)."""
+    if size_bytes < 1024: return "0.0 KB"
+    for unit, unit_bytes in (("TB", 1024**4), ("GB", 1024**3), ("MB", 1024**2)):
+        if size_bytes >= unit_bytes: return f"{size_bytes / unit_bytes:.1f} {unit}"
+    return f"{size_bytes / 1024:.1f} KB"
+
+class StorageCrawler:
+    """
+    Parallel directory crawler with a persistent per-directory cache. A directory whose
+    mtime has not changed since the last crawl is not listed again: its direct file bytes,
+    file count and sub-directory names come from the cache, so a repeat crawl costs one
+    stat per directory instead of one per file.
+    Note: rewriting a file in place does not touch its folder's mtime, so such edits are
+    only picked up once something is added/removed in that folder.
+    """
+    def __init__(self, cache_path=None, max_workers=16):
+        self.cache_path = cache_path; self.max_workers = max_workers
+        self._entries = {}; self._dirty = {}; self._lock = threading.Lock()
+        self.stats = {"listed": 0, "cached": 0}
+        if cache_path: self._load()
+
+    @classmethod
+    def from_config(cls, config_data):
+        return cls(os.path.join(get_cache_dir(config_data), "xPubStorageCache.db"), config_data.get("scan_workers", 16))
+
+    def _load(self):
+        import sqlite3
+        with sqlite3.connect(self.cache_path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER, bytes INTEGER, files INTEGER, subdirs TEXT)")
+            for path, mtime_ns, size, files, subdirs in conn.execute("SELECT path, mtime_ns, bytes, files, subdirs FROM dirs"):
+                self._entries[path] = (mtime_ns, size, files, tuple(json.loads(subdirs)))
+
+    def save(self):
+        """Persists directories listed since the last save."""
+        import sqlite3
+        if not self.cache_path or not self._dirty: return
+        with self._lock: dirty, self._dirty = self._dirty, {}
+        with sqlite3.connect(self.cache_path) as conn:
+            conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?)", [(p, e[0], e[1], e[2], json.dumps(e[3])) for p, e in dirty.items()])
+
+    def scan_dir(self, path):
+        """Returns (mtime_ns, direct_bytes, direct_files, subdir_names) for one directory, or None."""
+        try: mtime_ns = os.stat(path).st_mtime_ns
+        except OSError: return None
+        cached = self._entries.get(path)
+        if cached and cached[0] == mtime_ns:
+            with self._lock: self.stats["cached"] += 1
+            return cached
+        size = files = 0; subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False): subdirs.append(entry.name)
+                        elif entry.is_file(follow_symlinks=False): size += entry.stat(follow_symlinks=False).st_size; files += 1
+                    except OSError: pass
+        except OSError: return None
+        result = (mtime_ns, size, files, tuple(subdirs))
+        with self._lock: self._entries[path] = result; self._dirty[path] = result; self.stats["listed"] += 1
+        return result
+
+    def list_subdirs(self, path):
+        entry = self.scan_dir(path)
+        return list(entry[3]) if entry else []
+
+    def crawl(self, roots, progress_callback=None):
+        """Crawls every root breadth-first, one pool round per tree level. Returns {dir_path: (bytes, files)} subtree totals."""
+        direct, children = {}, {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            frontier = list(dict.fromkeys(roots))
+            while frontier:
+                next_frontier = []
+                for path, entry in zip(frontier, pool.map(self.scan_dir, frontier)):
+                    if entry is None: continue
+                    direct[path] = (entry[1], entry[2])
+                    children[path] = [os.path.join(path, name) for name in entry[3]]
+                    next_frontier.extend(children[path])
+                if progress_callback: progress_callback(len(direct))
+                frontier = next_frontier
+        # Breadth-first insertion order reversed visits children before their parents
+        totals = {}
+        for path in reversed(list(direct)):
+            size, files = direct[path]
+            for child in children[path]:
+                child_size, child_files = totals.get(child, (0, 0)); size += child_size; files += child_files
+            totals[path] = (size, files)
+        return totals
+
+STORAGE_REPORT_FIELDS = ["sequence", "shot", "department", "user", "kind", "bytes", "files"]
+
+def build_storage_report(config_data, show_name, crawler, departments=None, progress_callback=None):
+    """
+    Computes per sequence/shot/department/user/WIP-vs-FINAL usage of a show in one crawl.
+    Returns a list of record dicts with STORAGE_REPORT_FIELDS keys.
+    """
+    project_root = config_data.get("project_root", "")
+    dept_config = config_data.get("departments", {})
+    departments = departments or list(dept_config.keys())
+    shots_root = get_shots_root(project_root, show_name)
+
+    roots = [] # (path, seq, shot, dept, kind)
+    for seq_name in sorted(crawler.list_subdirs(shots_root)):
+        if seq_name.endswith("_Seq"): continue # Archive log holders, not sequences
+        seq_path = os.path.join(shots_root, seq_name)
+        for shot_name in sorted(crawler.list_subdirs(seq_path)):
+            shot_path = os.path.join(seq_path, shot_name)
+            for dept in departments:
+                for kind, key in (("WIP", "source_path"), ("FINAL", "publish_path")):
+                    template = dept_config.get(dept, {}).get(key)
+                    if template: roots.append((os.path.join(shot_path, template.replace('/', os.sep)), seq_name, shot_name, dept, kind))
+
+    totals = crawler.crawl([r[0] for r in roots], progress_callback)
+    crawler.save()
+
+    records = []
+    for path, seq_name, shot_name, dept, kind in roots:
+        if path not in totals: continue
+        if kind == "WIP":
+            # Every sub-folder of the WIP source root is a user; loose files are attributed to "-"
+            loose_bytes, loose_files = totals[path]
+            for user in crawler.list_subdirs(path):
+                size, files = totals.get(os.path.join(path, user), (0, 0))
+                loose_bytes -= size; loose_files -= files
+                records.append({"sequence": seq_name, "shot": shot_name, "department": dept, "user": user, "kind": kind, "bytes": size, "files": files})
+            if loose_files: records.append({"sequence": seq_name, "shot": shot_name, "department": dept, "user": "-", "kind": kind, "bytes": loose_bytes, "files": loose_files})
+        else:
+            size, files = totals[path]
+            records.append({"sequence": seq_name, "shot": shot_name, "department": dept, "user": "-", "kind": kind, "bytes": size, "files": files})
+    return records
+
+def aggregate_storage_records(records, group_by):
+    """Pivots report records into {group_key: {"<dept> <kind>": bytes, "Total": bytes}}."""
+    key_funcs = {"Shot": lambda r: f"{r['sequence']}/{r['shot']}", "Sequence": lambda r: r["sequence"],
+                 "User": lambda r: r["user"], "Department": lambda r: r["department"]}
+    key_func = key_funcs[group_by]; pivot = {}
+    for r in records:
+        row = pivot.setdefault(key_func(r), {"Total": 0})
+        column = f"{r['department']} {r['kind']}"
+        row[column] = row.get(column, 0) + r["bytes"]; row["Total"] += r["bytes"]
+    return pivot
+
+def export_storage_report(records, path):
+    """Writes records as CSV or JSON depending on the file extension."""
+    with open(path, 'w', encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".json"):
+            json.dump(records, f, indent=4)
+        else:
+            writer = csv.DictWriter(f, fieldnames=STORAGE_REPORT_FIELDS); writer.writeheader(); writer.writerows(records)
+
+class StorageReportWorker(QtCore.QObject):
+    """Runs build_storage_report in a background thread."""
+    progress_updated = QtCore.Signal(int)
+    finished = QtCore.Signal(list, str)
+
+    def __init__(self, config_data, show_name):
+        super().__init__()
+        self.config_data = config_data; self.show_name = show_name
+
+    def run(self):
+        try:
+            start = time.perf_counter(); crawler = StorageCrawler.from_config(self.config_data)
+            records = build_storage_report(self.config_data, self.show_name, crawler, progress_callback=self.progress_updated.emit)
+            self.finished.emit(records, f"Scanned in {time.perf_counter() - start:.1f}s ({crawler.stats['listed']} folders listed, {crawler.stats['cached']} unchanged).")
+        except Exception as e:
+            self.finished.emit([], f"Storage report failed: {e}")
+
+class SortableTableWidgetItem(QtWidgets.QTableWidgetItem):
+    """Table item that sorts on SORT_ROLE data when present, else on text."""
+    def __lt__(self, other):
+        mine, theirs = self.data(SORT_ROLE), other.data(SORT_ROLE)
+        if mine is not None and theirs is not None: return mine < theirs
+        return super().__lt__(other)
+
+class StorageReportDialog(QtWidgets.QDialog):
+    """Sortable heatmap of show storage usage, grouped by shot, sequence, user or department."""
+    HEAT_COLORS = ("#32CD32", "#FFD700", "#DC143C") # Same scale as the Archiver weight icons
+
+    def __init__(self, config_data, show_names, current_show="", parent=None):
+        super(StorageReportDialog, self).__init__(parent)
+        self.setWindowTitle("Storage Usage Report"); self.setMinimumSize(900, 550)
+        self.config_data = config_data; self.records = []
+
+        self.showComBox = QtWidgets.QComboBox(); self.showComBox.addItems(show_names)
+        if current_show in show_names: self.showComBox.setCurrentText(current_show)
+        self.groupByComBox = QtWidgets.QComboBox(); self.groupByComBox.addItems(["Shot", "Sequence", "User", "Department"])
+        self.scanBtn = QtWidgets.QPushButton("Scan"); self.exportCsvBtn = QtWidgets.QPushButton("Export CSV"); self.exportJsonBtn = QtWidgets.QPushButton("Export JSON")
+        self.exportCsvBtn.setEnabled(False); self.exportJsonBtn.setEnabled(False)
+        self.progressLbl = QtWidgets.QLabel("")
+        self.heatmapTable = QtWidgets.QTableWidget(); self.heatmapTable.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers); self.heatmapTable.setSortingEnabled(True)
+
+        top_layout = QtWidgets.QHBoxLayout()
+        for widget in (QtWidgets.QLabel("Show"), self.showComBox, QtWidgets.QLabel("Group By"), self.groupByComBox, self.scanBtn): top_layout.addWidget(widget)
+        top_layout.addStretch(); top_layout.addWidget(self.exportCsvBtn); top_layout.addWidget(self.exportJsonBtn)
+        layout = QtWidgets.QVBoxLayout(self); layout.addLayout(top_layout); layout.addWidget(self.heatmapTable); layout.addWidget(self.progressLbl)
+
+        self.scanBtn.clicked.connect(self._start_scan); self.groupByComBox.currentTextChanged.connect(self._populate_heatmap)
+        self.exportCsvBtn.clicked.connect(lambda: self._export("CSV Files (*.csv)", ".csv")); self.exportJsonBtn.clicked.connect(lambda: self._export("JSON Files (*.json)", ".json"))
+
+    def _start_scan(self):
+        show_name = self.showComBox.currentText()
+        if not show_name: return
+        self.scanBtn.setEnabled(False); self.progressLbl.setText(f"Scanning {show_name}...")
+        self.scan_thread = QtCore.QThread(self)
+        self.scan_worker = StorageReportWorker(self.config_data, show_name); self.scan_worker.moveToThread(self.scan_thread)
+        self.scan_thread.started.connect(self.scan_worker.run)
+        self.scan_worker.progress_updated.connect(lambda count: self.progressLbl.setText(f"Scanning... {count} folders"))
+        self.scan_worker.finished.connect(self._on_scan_finished)
+        self.scan_worker.finished.connect(self.scan_thread.quit); self.scan_worker.finished.connect(self.scan_worker.deleteLater)
+        self.scan_thread.start()
+
+    def _on_scan_finished(self, records, message):
+        self.records = records; self.scanBtn.setEnabled(True); self.progressLbl.setText(message)
+        self.exportCsvBtn.setEnabled(bool(records)); self.exportJsonBtn.setEnabled(bool(records))
+        self._populate_heatmap()
+
+    def _heat_color(self, fraction):
+        """Interpolates green -> yellow -> red for a 0..1 fraction."""
+        low, high = (self.HEAT_COLORS[0], self.HEAT_COLORS[1]) if fraction < 0.5 else (self.HEAT_COLORS[1], self.HEAT_COLORS[2])
+        t = fraction * 2 if fraction < 0.5 else (fraction - 0.5) * 2
+        low, high = QtGui.QColor(low), QtGui.QColor(high)
+        color = QtGui.QColor(int(low.red() + (high.red() - low.red()) * t), int(low.green() + (high.green() - low.green()) * t), int(low.blue() + (high.blue() - low.blue()) * t))
+        color.setAlphaF(0.25 + 0.6 * fraction)
+        return color
+
+    def _populate_heatmap(self):
+        pivot = aggregate_storage_records(self.records, self.groupByComBox.currentText())
+        columns = sorted({c for row in pivot.values() for c in row if c != "Total"}) + ["Total"]
+        self.heatmapTable.setSortingEnabled(False); self.heatmapTable.clear()
+        self.heatmapTable.setColumnCount(len(columns) + 1); self.heatmapTable.setRowCount(len(pivot))
+        self.heatmapTable.setHorizontalHeaderLabels([self.groupByComBox.currentText()] + columns)
+        # Log scale so a few huge shots do not wash out the rest of the map
+        max_value = {c: max((row.get(c, 0) for row in pivot.values()), default=0) for c in columns}
+        for row_index, (key, row) in enumerate(sorted(pivot.items())):
+            self.heatmapTable.setItem(row_index, 0, SortableTableWidgetItem(key))
+            for col_index, column in enumerate(columns, start=1):
+                value = row.get(column, 0)
+                item = SortableTableWidgetItem(format_size(value) if value else "-"); item.setData(SORT_ROLE, value)
+                item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                if value and max_value[column] > 1:
+                    fraction = math.log1p(value) / math.log1p(max_value[column])
+                    item.setBackground(self._heat_color(fraction))
+                self.heatmapTable.setItem(row_index, col_index, item)
+        self.heatmapTable.setSortingEnabled(True); self.heatmapTable.sortItems(len(columns), QtCore.Qt.DescendingOrder)
+        self.heatmapTable.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+
+    def _export(self, file_filter, extension):
+        file_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export Storage Report", f"{self.showComBox.currentText()}_storage{extension}", file_filter)
+        if not file_path: return
+        try: export_storage_report(self.records, file_path); self.progressLbl.setText(f"Exported {len(self.records)} rows to {file_path}")
+        except OSError as e: QtWidgets.QMessageBox.warning(self, "Export Error", f"Could not write report:\n{e}")
+
+# /////////////////////////////////////////////
+# NEW - Async Scanning Core
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+ScanEntry = collections.namedtuple("ScanEntry", "name path is_dir size mtime")
+HierarchyRecord = collections.namedtuple("HierarchyRecord", "path depth mtime direct_bytes direct_files subdirs")
+SizeEstimate = collections.namedtuple("SizeEstimate", "size low high exact") # low/high: 95% bound; all equal when exact
+
+class ScanCancelled(Exception):
+    """Raised inside a scan whose should_stop callback asked it to stop."""
+
+class AsyncScanner:
+    """
+    Asyncio front end for directory enumeration (through storage_for, so local and object-store
+    paths alike). Every blocking listdir/stat runs on a bounded
+    thread pool, so up to max_in_flight share round trips are outstanding at once instead of one.
+    latency_ms injects an artificial delay per call to reproduce a high-latency share locally.
+    should_stop, when given, is checked before every call; once it returns True the scan raises ScanCancelled.
+    """
+    def __init__(self, max_in_flight=32, latency_ms=0, should_stop=None):
+        self.max_in_flight = max_in_flight; self.latency = latency_ms / 1000.0; self.should_stop = should_stop
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="xPubScan")
+        self._semaphore = None # Bound to the running loop on first use
+
+    @classmethod
+    def from_config(cls, config_data, **kwargs):
+        return cls(max_in_flight=config_data.get("scan_workers", 16), **kwargs)
+
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): self.close()
+    def close(self): self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _call(self, func, *args):
+        import asyncio
+        if self._semaphore is None: self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        async with self._semaphore:
+            if self.should_stop and self.should_stop(): raise ScanCancelled()
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _scandir_blocking(self, path):
+        if self.latency: time.sleep(self.latency)
+        return storage_for(path).list(path)
+
+    def _listdir_blocking(self, path):
+        """(sub-folder paths, file paths) of path from the listing alone, without a stat per file."""
+        if self.latency: time.sleep(self.latency)
+        if is_object_store_path(path): # Object listings carry sizes anyway
+            entries = storage_for(path).list(path) or []
+            return [e.path for e in entries if e.is_dir], [e.path for e in entries if not e.is_dir]
+        dirs, files = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False): dirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False): files.append(entry.path)
+                    except OSError: pass
+        except OSError:
+            return [], []
+        return dirs, files
+
+    def _stat_blocking(self, path):
+        if self.latency: time.sleep(self.latency)
+        return storage_for(path).stat(path)
+
+    def _committed_blocking(self, path):
+        if self.latency: time.sleep(self.latency)
+        return storage_for(path).version_committed(path)
+
+    async def scandir(self, path):
+        """List of ScanEntry for path, or None if it cannot be listed."""
+        return await self._call(self._scandir_blocking, path)
+
+    async def stat(self, path):
+        """ScanEntry for path, or None if it does not exist."""
+        return await self._call(self._stat_blocking, path)
+
+    async def committed(self, path):
+        """True if the publish version at path is complete (StorageBackend.version_committed)."""
+        return await self._call(self._committed_blocking, path)
+
+    async def subdirs(self, path):
+        """Sub-directories of path, without hidden (dot) folders such as publish staging."""
+        entries = await self.scandir(path)
+        return [e for e in entries or [] if e.is_dir and not e.name.startswith(".")]
+
+    async def directory_size(self, path):
+        """Recursive byte count; sibling folders are listed concurrently."""
+        import asyncio
+        entries = await self.scandir(path)
+        if not entries: return 0.0
+        total = float(sum(e.size for e in entries if not e.is_dir))
+        sub_paths = [e.path for e in entries if e.is_dir]
+        if sub_paths: total += sum(await asyncio.gather(*(self.directory_size(p) for p in sub_paths)))
+        return total
+
+    async def list_files(self, path):
+        """Every file path under path, from directory listings only; sibling folders are listed concurrently."""
+        import asyncio
+        dirs, files = await self._call(self._listdir_blocking, path)
+        for sub_files in await asyncio.gather(*(self.list_files(d) for d in dirs)): files.extend(sub_files)
+        return files
+
+    async def estimate_size(self, path, sample_size=48, rng=random):
+        """
+        SizeEstimate of path: the file count from the listings times the mean size of a random
+        sample of sample_size files, with a 95% bound (finite population corrected). Frames of a
+        render are near-uniform in size, so the bound is tight. Folders holding no more files than
+        the sample are stat'ed completely and come back exact.
+        """
+        import asyncio
+        files = await self.list_files(path)
+        sample = files if len(files) <= sample_size else rng.sample(files, sample_size)
+        sizes = [st.size for st in await asyncio.gather(*(self.stat(f) for f in sample)) if st is not None]
+        if len(sample) == len(files):
+            total = float(sum(sizes)); return SizeEstimate(total, total, total, True)
+        n, population = len(sizes), len(files)
+        if not n: return SizeEstimate(0.0, 0.0, 0.0, False)
+        mean = sum(sizes) / n; variance = sum((s - mean) ** 2 for s in sizes) / (n - 1) if n > 1 else 0.0
+        estimate = population * mean; margin = 1.96 * population * math.sqrt(variance / n * (1 - n / population))
+        return SizeEstimate(estimate, max(0.0, estimate - margin), estimate + margin, False)
+
+    async def walk(self, root, max_depth=None):
+        """Async generator of HierarchyRecord for every folder under root, in completion order."""
+        import asyncio
+        async def visit(path, depth, mtime):
+            return path, depth, mtime, await self.scandir(path)
+        root_stat = await self.stat(root)
+        if root_stat is None: return
+        pending = {asyncio.ensure_future(visit(root, 0, root_stat.mtime))}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    path, depth, mtime, entries = task.result()
+                    if entries is None: continue
+                    sub_dirs = [e for e in entries if e.is_dir]; files = [e for e in entries if not e.is_dir]
+                    yield HierarchyRecord(path, depth, mtime, sum(e.size for e in files), len(files), [e.name for e in sub_dirs])
+                    if max_depth is None or depth < max_depth:
+                        pending.update(asyncio.ensure_future(visit(e.path, depth + 1, e.mtime)) for e in sub_dirs)
+        finally:
+            for task in pending: task.cancel()
+
+    async def iter_shot_sizes(self, seq_path, department_roots, skip=(), sample_size=None):
+        """
+        Async generator of (shot_name, {department: SizeEstimate}) for every shot of a sequence, as
+        each finishes. department_roots(shot_path) gives the {department: root} folders to size;
+        the sequence is listed once and each shot's departments are sized concurrently. (shot,
+        department) pairs in skip are left out. With sample_size the sizes are estimate_size
+        estimates, otherwise exact.
+        """
+        import asyncio
+        async def size(path):
+            if not path: return SizeEstimate(0.0, 0.0, 0.0, True) # The department has no such folder configured
+            if sample_size: return await self.estimate_size(path, sample_size)
+            total = await self.directory_size(path); return SizeEstimate(total, total, total, True)
+        async def shot_sizes(shot):
+            roots = {dept: root for dept, root in department_roots(shot.path).items() if (shot.name, dept) not in skip}
+            return shot.name, dict(zip(roots, await asyncio.gather(*(size(root) for root in roots.values()))))
+        for next_done in asyncio.as_completed([shot_sizes(s) for s in await self.subdirs(seq_path)]):
+            shot_name, sizes = await next_done
+            if sizes: yield shot_name, sizes
+
+    async def iter_wip_versions(self, user_base_path):
+        """Async generator of version dicts (user, render, version, path, mtime) under a WIP source root."""
+        import asyncio
+        async def user_renders(user):
+            preview_path = os.path.join(user.path, "renders", "preview")
+            return user.name, await self.subdirs(preview_path)
+        async def render_versions(user_name, render):
+            return user_name, render.name, await self.subdirs(render.path)
+        users = await self.subdirs(user_base_path)
+        render_jobs = [render_versions(user_name, render) for user_name, renders in await asyncio.gather(*(user_renders(u) for u in users)) for render in renders]
+        for next_done in asyncio.as_completed(render_jobs):
+            user_name, render_name, versions = await next_done
+            for v in versions:
+                yield {'user': user_name, 'render': render_name, 'version': v.name, 'path': v.path, 'mtime': v.mtime}
+
+    async def iter_publish_versions(self, publish_base_path):
+        """Async generator of version dicts (render, version, path, mtime) under a publish root."""
+        import asyncio
+        async def render_versions(render):
+            return render.name, await self.subdirs(render.path)
+        for next_done in asyncio.as_completed([render_versions(r) for r in await self.subdirs(publish_base_path)]):
+            render_name, versions = await next_done
+            for v in versions:
+                yield {'render': render_name, 'version': v.name, 'path': v.path, 'mtime': v.mtime}
+
+async def collect_async(async_gen):
+    """Drains an async generator into a list."""
+    return [item async for item in async_gen]
+
+class AsyncScanBridge(QtCore.QObject):
+    """
+    Qt bridge for the async scanner: drives an async generator on a private event loop inside
+    a QThread and delivers its items to the GUI thread in batches, at most one signal per
+    batch_interval_ms, instead of one cross-thread signal per record.
+    """
+    batch_ready = QtCore.Signal(list)
+    finished = QtCore.Signal()
+
+    def __init__(self, config_data, batch_interval_ms=100, batch_size=500):
+        super().__init__()
+        self.config_data = config_data
+        self.batch_interval = batch_interval_ms / 1000.0; self.batch_size = batch_size
+        self._is_cancelled = False
+
+    def iter_results(self, scanner):
+        """Override: returns the async generator to drain."""
+        raise NotImplementedError
+
+    def run(self):
+        import asyncio
+        try:
+            with AsyncScanner.from_config(self.config_data) as scanner:
+                asyncio.run(self._consume(scanner))
+        except Exception as e:
+            print(f"{type(self).__name__} Error: {e}")
+        finally:
+            self.finished.emit()
+
+    async def _consume(self, scanner):
+        batch, last_flush = [], time.monotonic()
+        async for item in self.iter_results(scanner):
+            if self._is_cancelled: break
+            batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() - last_flush >= self.batch_interval:
+                self.batch_ready.emit(batch); batch, last_flush = [], time.monotonic()
+        if batch and not self._is_cancelled: self.batch_ready.emit(batch)
+
+    def cancel(self): self._is_cancelled = True
+
+def benchmark_scan(path, latency_ms=5, max_in_flight=32):
+    """Times a serial recursive size against the async scanner with the same injected latency. Returns (serial_s, async_s, size)."""
+    import asyncio
+    def serial_size(p):
+        time.sleep(latency_ms / 1000.0); total = 0
+        try:
+            with os.scandir(p) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False): total += serial_size(entry.path)
+                    elif entry.is_file(follow_symlinks=False): total += entry.stat(follow_symlinks=False).st_size
+        except OSError: pass
+        return total
+    start = time.perf_counter(); serial_total = serial_size(path); serial_s = time.perf_counter() - start
+    with AsyncScanner(max_in_flight=max_in_flight, latency_ms=latency_ms) as scanner:
+        start = time.perf_counter(); async_total = asyncio.run(scanner.directory_size(path)); async_s = time.perf_counter() - start
+    if serial_total != async_total: print(f"WARNING: size mismatch serial={serial_total} async={async_total}")
+    return serial_s, async_s, serial_total
+
+# /////////////////////////////////////////////
+# NEW - Storage Backends
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# A path is either a local/UNC path (LocalBackend) or an "s3://bucket/key/prefix" URL
+# (ObjectStoreBackend, any S3-compatible store). storage_for(path) picks the backend, so the
+# scanners, the transfer engine and the archiver do not care where the bytes live. On an
+# object store a folder is a key prefix; listing it returns its "sub-folders" and objects.
+OBJECT_STORE_SCHEME = "s3://"
+PUBLISH_MANIFEST_NAME = ".xpub_manifest.json" # Written last into an object-store publish; its presence commits the version
+
+def is_object_store_path(path): return isinstance(path, str) and path.startswith(OBJECT_STORE_SCHEME)
+
+def storage_join(base, *parts):
+    """os.path.join for local paths, '/'-joined keys for object-store URLs."""
+    if not is_object_store_path(base): return os.path.join(base, *parts)
+    return "/".join([base.rstrip("/")] + [p.replace("\\", "/").strip("/") for p in parts if p])
+
+class StorageBackend:
+    """Interface every backend implements: list, stat, open_read, open_write, delete and rename. The rest is built on those."""
+    def list(self, path):
+        """ScanEntry list of the immediate children of path, or None if it cannot be listed."""
+        raise NotImplementedError
+    def stat(self, path):
+        """ScanEntry of path, or None if it does not exist."""
+        raise NotImplementedError
+    def open_read(self, path):
+        """Binary file-like object, usable as a context manager."""
+        raise NotImplementedError
+    def open_ranged(self, path, buffer_size=None):
+        """Seekable binary reader that fetches only the parts that are read. Local files already are."""
+        return self.open_read(path)
+    def open_write(self, path):
+        """Binary file-like writer; the data is only in place once it is closed without error."""
+        raise NotImplementedError
+    def delete(self, paths):
+        """Deletes files. Returns a list of (path, error) for those that failed."""
+        raise NotImplementedError
+    def rename(self, source, dest):
+        raise NotImplementedError
+
+    def exists(self, path): return self.stat(path) is not None
+
+    def walk_files(self, path):
+        """Yields a ScanEntry for every file below path."""
+        for entry in self.list(path) or []:
+            if entry.is_dir: yield from self.walk_files(entry.path)
+            else: yield entry
+
+    def upload_file(self, local_path, path, progress_callback=None):
+        with open(local_path, 'rb') as src, self.open_write(path) as dst:
+            for chunk in iter(lambda: src.read(DEDUP_CHUNK_SIZE), b""):
+                dst.write(chunk)
+                if progress_callback: progress_callback(len(chunk))
+
+    def download_file(self, path, local_path):
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        with self.open_read(path) as src, open(local_path, 'wb') as dst: shutil.copyfileobj(src, dst, DEDUP_CHUNK_SIZE)
+
+    def delete_tree(self, path):
+        """Deletes every file below path. Returns the (path, error) failures."""
+        return self.delete([e.path for e in self.walk_files(path)])
+
+    def version_committed(self, path):
+        """True once a publish of this version is complete (see 'NEW - Staged Publish')."""
+        return self.exists(path)
+
+class LocalBackend(StorageBackend):
+    """Local disks and mounted shares through os / shutil."""
+    def list(self, path):
+        entries = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False): entries.append(ScanEntry(entry.name, entry.path, True, 0, entry.stat(follow_symlinks=False).st_mtime))
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False); entries.append(ScanEntry(entry.name, entry.path, False, st.st_size, st.st_mtime))
+                    except OSError: pass
+        except OSError:
+            return None
+        return entries
+
+    def stat(self, path):
+        try: st = os.stat(path)
+        except OSError: return None
+        is_dir = stat.S_ISDIR(st.st_mode)
+        return ScanEntry(os.path.basename(os.path.normpath(path)), path, is_dir, 0 if is_dir else st.st_size, st.st_mtime)
+
+    def open_read(self, path): return open(path, 'rb')
+
+    def open_write(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True); return open(path, 'wb')
+
+    def delete(self, paths):
+        failed = []
+        for path in paths:
+            try: os.remove(path)
+            except OSError as e: failed.append((path, str(e)))
+        return failed
+
+    def rename(self, source, dest):
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True); os.rename(source, dest)
+
+    def upload_file(self, local_path, path, progress_callback=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True); shutil.copy2(local_path, path)
+        if progress_callback: progress_callback(os.path.getsize(path))
+
+    def version_committed(self, path): return os.path.isdir(path)
+
+OBJECT_STORE_TRANSIENT_CODES = {"RequestTimeout", "RequestTimeTooSkewed", "SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded", "InternalError", "ServiceUnavailable"}
+
+def is_transient_error(error):
+    """True for errors worth retrying: OS and network errors, object-store throttling, timeouts and 5xx responses, and
+    botocore's own connection errors (BotoCoreError, which is not an OSError). Client mistakes such as AccessDenied are not."""
+    if isinstance(error, OSError): return True
+    response = getattr(error, "response", None)
+    if isinstance(response, dict): # botocore ClientError or InMemoryObjectStore.Error
+        code = str(response.get("Error", {}).get("Code", ""))
+        return code in OBJECT_STORE_TRANSIENT_CODES or code.startswith("5") or response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500
+    return type(error).__module__.split(".")[0] in ("botocore", "urllib3")
+
+def _is_not_found(error):
+    """True for an S3 'no such key' error (botocore ClientError or InMemoryObjectStore's)."""
+    return str(getattr(error, "response", {}).get("Error", {}).get("Code")) in ("404", "NoSuchKey", "NotFound")
+
+class _MultipartWriter:
+    """open_write() of ObjectStoreBackend: full parts are uploaded in parallel while the caller keeps writing."""
+    def __init__(self, backend, bucket, key):
+        self.backend = backend; self.bucket = bucket; self.key = key
+        self._buffer = bytearray(); self._upload_id = None; self._parts = []; self._closed = False
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self.backend.part_size:
+            self._submit(bytes(self._buffer[:self.backend.part_size])); del self._buffer[:self.backend.part_size]
+        return len(data)
+
+    def _submit(self, body):
+        client = self.backend.client
+        if self._upload_id is None: self._upload_id = client.create_multipart_upload(Bucket=self.bucket, Key=self.key)["UploadId"]
+        while sum(1 for f in self._parts if not f.done()) >= self.backend.max_workers: # Bounds the parts held in memory
+            next(f for f in self._parts if not f.done()).result()
+        number = len(self._parts) + 1
+        self._parts.append(self.backend._executor.submit(self.backend._upload_part, self.bucket, self.key, self._upload_id, number, body))
+
+    def close(self):
+        if self._closed: return
+        self._closed = True; client = self.backend.client
+        if self._upload_id is None: client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer)); return
+        try:
+            if self._buffer: self._submit(bytes(self._buffer))
+            parts = [f.result() for f in self._parts]
+            client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, MultipartUpload={"Parts": parts})
+        except Exception:
+            self.abort(); raise
+
+    def abort(self):
+        self._closed = True
+        if self._upload_id is not None:
+            for f in self._parts: f.cancel()
+            try: self.backend.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception as e: print(f"Could not abort multipart upload of {self.key}: {e}")
+
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type: self.abort()
+        else: self.close()
+
+class ObjectStoreBackend(StorageBackend):
+    """
+    S3-compatible object store through a boto3-style client (see make_object_store_client).
+    Files above part_size go up as multipart uploads with max_workers parts in flight; deletes
+    are sent in batches of up to 1000 keys. rename() is copy + delete, so it is not atomic;
+    publishes are committed by writing PUBLISH_MANIFEST_NAME last instead.
+    """
+    DELETE_BATCH = 1000 # S3 DeleteObjects limit
+
+    def __init__(self, client, part_size=64 * 1024 * 1024, max_workers=8):
+        self.client = client; self.part_size = part_size; self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="xPubUpload")
+
+    @staticmethod
+    def split(path):
+        """('bucket', 'key') of an s3:// URL."""
+        bucket, _, key = path[len(OBJECT_STORE_SCHEME):].partition("/")
+        return bucket, key.strip("/")
+
+    def _list_pages(self, bucket, prefix, delimiter=None):
+        kwargs = {"Bucket": bucket, "Prefix": prefix}
+        if delimiter: kwargs["Delimiter"] = delimiter
+        while True:
+            page = self.client.list_objects_v2(**kwargs)
+            yield page
+            if not page.get("IsTruncated"): return
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+    @staticmethod
+    def _mtime(obj):
+        modified = obj.get("LastModified")
+        return modified.timestamp() if hasattr(modified, "timestamp") else float(modified or 0)
+
+    def list(self, path):
+        bucket, key = self.split(path); prefix = key + "/" if key else ""
+        entries = []
+        for page in self._list_pages(bucket, prefix, "/"):
+            for common in page.get("CommonPrefixes", []):
+                name = common["Prefix"][len(prefix):].rstrip("/"); entries.append(ScanEntry(name, storage_join(path, name), True, 0, 0.0))
+            for obj in page.get("Contents", []):
+                name = obj["Key"][len(prefix):]
+                if name: entries.append(ScanEntry(name, storage_join(path, name), False, obj["Size"], self._mtime(obj)))
+        return entries if entries or not key else None # An object store has no empty folders
+
+    def walk_files(self, path):
+        bucket, key = self.split(path); prefix = key + "/" if key else ""
+        for page in self._list_pages(bucket, prefix):
+            for obj in page.get("Contents", []):
+                if not obj["Key"].endswith("/"): yield ScanEntry(obj["Key"].rsplit("/", 1)[-1], f"{OBJECT_STORE_SCHEME}{bucket}/{obj['Key']}", False, obj["Size"], self._mtime(obj))
+
+    def stat(self, path):
+        bucket, key = self.split(path)
+        if not key: return ScanEntry(bucket, path, True, 0, 0.0)
+        try:
+            head = self.client.head_object(Bucket=bucket, Key=key)
+            return ScanEntry(key.rsplit("/", 1)[-1], path, False, head["ContentLength"], self._mtime(head))
+        except Exception as e:
+            if not _is_not_found(e): raise
+        page = self.client.list_objects_v2(Bucket=bucket, Prefix=key + "/", MaxKeys=1)
+        return ScanEntry(key.rsplit("/", 1)[-1], path, True, 0, 0.0) if page.get("KeyCount", len(page.get("Contents", []))) else None
+
+    def open_read(self, path):
+        bucket, key = self.split(path)
+        return contextlib.closing(self.client.get_object(Bucket=bucket, Key=key)["Body"])
+
+    def open_ranged(self, path, buffer_size=None):
+        entry = self.stat(path)
+        if entry is None or entry.is_dir: raise FileNotFoundError(path)
+        bucket, key = self.split(path); return io.BufferedReader(_RangedObjectReader(self.client, bucket, key, entry.size), buffer_size or PACK_CHUNK_SIZE)
+
+    def open_write(self, path):
+        bucket, key = self.split(path); return _MultipartWriter(self, bucket, key)
+
+    def _upload_part(self, bucket, key, upload_id, number, body):
+        response = self.client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body)
+        return {"ETag": response["ETag"], "PartNumber": number}
+
+    def upload_file(self, local_path, path, progress_callback=None):
+        """Uploads a local file; large files are split into parts that are read and sent in parallel."""
+        bucket, key = self.split(path); size = os.path.getsize(local_path)
+        if size <= self.part_size:
+            with open(local_path, 'rb') as f: self.client.put_object(Bucket=bucket, Key=key, Body=f.read())
+            if progress_callback: progress_callback(size)
+            return
+        upload_id = self.client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+        def send(number):
+            with open(local_path, 'rb') as f:
+                f.seek((number - 1) * self.part_size); body = f.read(self.part_size)
+            part = self._upload_part(bucket, key, upload_id, number, body)
+            if progress_callback: progress_callback(len(body))
+            return part
+        try:
+            parts = list(self._executor.map(send, range(1, math.ceil(size / self.part_size) + 1)))
+            self.client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id); raise
+
+    def delete(self, paths):
+        failed, by_bucket = [], collections.defaultdict(list)
+        for path in paths:
+            bucket, key = self.split(path); by_bucket[bucket].append(key)
+        for bucket, keys in by_bucket.items():
+            for i in range(0, len(keys), self.DELETE_BATCH):
+                response = self.client.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in keys[i:i + self.DELETE_BATCH]], "Quiet": True})
+                failed.extend((f"{OBJECT_STORE_SCHEME}{bucket}/{e['Key']}", e.get("Message", e.get("Code", ""))) for e in response.get("Errors", []))
+        return failed
+
+    def rename(self, source, dest):
+        """Copies every object below source (or source itself) to dest, then deletes the originals."""
+        entry = self.stat(source)
+        if entry is None: raise FileNotFoundError(source)
+        pairs = [(source, dest)] if not entry.is_dir else [(e.path, storage_join(dest, e.path[len(source.rstrip('/')) + 1:])) for e in self.walk_files(source)]
+        for src, dst in pairs:
+            (src_bucket, src_key), (dst_bucket, dst_key) = self.split(src), self.split(dst)
+            self.client.copy_object(Bucket=dst_bucket, Key=dst_key, CopySource={"Bucket": src_bucket, "Key": src_key})
+        failed = self.delete([src for src, dst in pairs])
+        if failed: raise OSError(f"Renamed, but {len(failed)} originals could not be deleted: {failed[0][1]}")
+
+    def version_committed(self, path): return self.exists(storage_join(path, PUBLISH_MANIFEST_NAME))
+
+class _RangedObjectReader(io.RawIOBase):
+    """Seekable view of one object; every read is a ranged GET of just the bytes asked for (see open_ranged)."""
+    def __init__(self, client, bucket, key, size):
+        self.client = client; self.bucket = bucket; self.key = key; self.size = size; self._pos = 0
+
+    def readable(self): return True
+    def seekable(self): return True
+    def tell(self): return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._pos = max(0, (0, self._pos, self.size)[whence] + offset); return self._pos
+
+    def readinto(self, buffer):
+        length = min(len(buffer), self.size - self._pos)
+        if length <= 0: return 0
+        data = self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={self._pos}-{self._pos + length - 1}")["Body"].read()
+        buffer[:len(data)] = data; self._pos += len(data)
+        return len(data)
+
+class InMemoryObjectStore:
+    """
+    In-process stand-in for an S3 client: the boto3 method subset ObjectStoreBackend uses, kept
+    in a dict. Selected with "endpoint_url": "memory://" for tests and dry runs. 'calls' counts
+    requests per method, so batching and multipart behaviour can be checked.
+    """
+    _shared = None
+
+    class Error(Exception):
+        def __init__(self, code, message=""):
+            super().__init__(f"{code}: {message}"); self.response = {"Error": {"Code": code, "Message": message}}
+
+    def __init__(self, page_size=1000):
+        self.objects = {}; self.uploads = {}; self.page_size = page_size
+        self.calls = collections.Counter(); self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        if cls._shared is None: cls._shared = cls()
+        return cls._shared
+
+    def _count(self, method):
+        with self._lock: self.calls[method] += 1
+
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, ContinuationToken=None, MaxKeys=None):
+        self._count("list_objects_v2")
+        with self._lock: keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        contents, prefixes = [], []
+        for k in keys:
+            rest = k[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                common = Prefix + rest.split(Delimiter, 1)[0] + Delimiter
+                if not prefixes or prefixes[-1] != common: prefixes.append(common)
+            else: contents.append(k)
+        items = [("c", p) for p in prefixes] + [("o", k) for k in contents]; items.sort(key=lambda item: item[1])
+        start = int(ContinuationToken or 0); limit = min(MaxKeys or self.page_size, self.page_size); page = items[start:start + limit]
+        response = {"CommonPrefixes": [{"Prefix": p} for kind, p in page if kind == "c"], "KeyCount": len(page),
+                    "Contents": [{"Key": k, "Size": len(self.objects[(Bucket, k)][0]), "LastModified": self.objects[(Bucket, k)][1]} for kind, k in page if kind == "o"],
+                    "IsTruncated": start + limit < len(items)}
+        if response["IsTruncated"]: response["NextContinuationToken"] = str(start + limit)
+        return response
+
+    def head_object(self, Bucket, Key):
+        self._count("head_object")
+        if (Bucket, Key) not in self.objects: raise self.Error("404", "Not Found")
+        data, mtime = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(data), "LastModified": mtime}
+
+    def get_object(self, Bucket, Key, Range=None):
+        self._count("get_object")
+        if (Bucket, Key) not in self.objects: raise self.Error("NoSuchKey", Key)
+        data = self.objects[(Bucket, Key)][0]
+        if Range: # "bytes=first-last", inclusive
+            first, last = Range[len("bytes="):].split("-"); data = data[int(first):int(last) + 1]
+        return {"Body": io.BytesIO(data)}
+
+    def put_object(self, Bucket, Key, Body=b""):
+        self._count("put_object")
+        with self._lock: self.objects[(Bucket, Key)] = (bytes(Body), time.time())
+        return {"ETag": hashlib.md5(Body).hexdigest()}
+
+    def create_multipart_upload(self, Bucket, Key):
+        self._count("create_multipart_upload"); upload_id = uuid.uuid4().hex
+        with self._lock: self.uploads[upload_id] = (Bucket, Key, {})
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._count("upload_part")
+        with self._lock: self.uploads[UploadId][2][PartNumber] = bytes(Body)
+        return {"ETag": hashlib.md5(Body).hexdigest()}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._count("complete_multipart_upload")
+        with self._lock:
+            bucket, key, parts = self.uploads.pop(UploadId)
+            self.objects[(Bucket, Key)] = (b"".join(parts[p["PartNumber"]] for p in sorted(MultipartUpload["Parts"], key=lambda p: p["PartNumber"])), time.time())
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._count("abort_multipart_upload")
+        with self._lock: self.uploads.pop(UploadId, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        self._count("delete_objects")
+        if len(Delete["Objects"]) > 1000: raise self.Error("MalformedXML", "More than 1000 keys")
+        with self._lock:
+            for obj in Delete["Objects"]: self.objects.pop((Bucket, obj["Key"]), None)
+        return {"Errors": []}
+
+    def copy_object(self, Bucket, Key, CopySource):
+        self._count("copy_object")
+        with self._lock:
+            if (CopySource["Bucket"], CopySource["Key"]) not in self.objects: raise self.Error("NoSuchKey", CopySource["Key"])
+            self.objects[(Bucket, Key)] = (self.objects[(CopySource["Bucket"], CopySource["Key"])][0], time.time())
+        return {}
+
+def make_object_store_client(settings):
+    """boto3 S3 client for the 'object_store' config block; "endpoint_url": "memory://" gives the shared InMemoryObjectStore."""
+    if settings.get("endpoint_url") == "memory://": return InMemoryObjectStore.shared()
+    try: import boto3 # Optional: only needed once an s3:// target is configured
+    except ImportError: raise RuntimeError("Object store targets need the boto3 package (pip install boto3).")
+    return boto3.client("s3", endpoint_url=settings.get("endpoint_url") or None, region_name=settings.get("region") or None,
+                        aws_access_key_id=settings.get("access_key") or None, aws_secret_access_key=settings.get("secret_key") or None)
+
+LOCAL_STORAGE = LocalBackend()
+_STORAGE_SETTINGS = {}; _STORAGE_BACKENDS = {}; _STORAGE_LOCK = threading.Lock()
+
+def configure_storage(config_data):
+    """Takes the 'object_store' settings of a newly loaded config; backends are (re)built on first use."""
+    global _STORAGE_SETTINGS
+    with _STORAGE_LOCK: _STORAGE_SETTINGS = dict(config_data.get("object_store", {})); _STORAGE_BACKENDS.clear()
+
+def storage_for(path):
+    """The backend that serves path."""
+    if not is_object_store_path(path): return LOCAL_STORAGE
+    with _STORAGE_LOCK:
+        if "s3" not in _STORAGE_BACKENDS:
+            _STORAGE_BACKENDS["s3"] = ObjectStoreBackend(make_object_store_client(_STORAGE_SETTINGS), int(_STORAGE_SETTINGS.get("part_size_mb", 64) * 1024 * 1024), _STORAGE_SETTINGS.get("upload_workers", 8))
+        return _STORAGE_BACKENDS["s3"]
+
+def get_department_target(config_data, key, department=None):
+    """A per-department storage target ('publish_target' / 'archive_root'); falls back to the top-level key.
+    department defaults to the active one."""
+    department = department or config_data.get("active_department")
+    return config_data.get("departments", {}).get(department, {}).get(key) or config_data.get(key, "")
+
+def get_publish_base(config_data, shot_path, department=None):
+    """
+    Publish root of a shot: <shot>/<publish_path>, or, with a department 'publish_target', the
+    same layout below that target (e.g. s3://renders/projects/<show>/Production/Shots/...).
+    department defaults to the active one.
+    """
+    department = department or config_data.get("active_department")
+    publish_template = config_data.get("departments", {}).get(department, {}).get("publish_path")
+    if not publish_template: return None
+    target = get_department_target(config_data, "publish_target", department)
+    if not target: return os.path.join(shot_path, publish_template.replace('/', os.sep))
+    relative = os.path.relpath(shot_path, config_data.get("project_root", "")).replace(os.sep, "/")
+    return storage_join(target, relative, publish_template)
+
+def get_department_root(config_data, department, shot_path, source_mode):
+    """WIP source root ("WIP") or publish root ("FINAL") of one department of a shot; None when the department has no such path."""
+    if source_mode == "FINAL": return get_publish_base(config_data, shot_path, department)
+    template = config_data.get("departments", {}).get(department, {}).get("source_path")
+    return os.path.join(shot_path, template.replace('/', os.sep)) if template else None
+
+def get_scan_departments(config_data):
+    """Departments the Archiver scans together: 'archive_departments', or every configured one when that is empty."""
+    configured = list(config_data.get("departments", {}))
+    return [d for d in config_data.get("archive_departments") or configured if d in configured]
+
+# /////////////////////////////////////////////
+# NEW - Cold Storage Packs
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# A pack is a plain PAX tar whose members are individually zlib/lzma compressed, plus a JSON
+# member index ("<pack>.index.json") holding each member's data offset. Restoring one file is a
+# seek and a single decompress, not a decompress of everything before it.
+def _lzma():
+    import lzma # Deferred: only lzma packs need it
+    return lzma
+
+PACK_CODECS = { # codec: (compressor factory, decompressor factory)
+    "zlib": (lambda: zlib.compressobj(6), zlib.decompressobj),
+    "lzma": (lambda: _lzma().LZMACompressor(preset=6), lambda: _lzma().LZMADecompressor()),
+}
+PACK_CHUNK_SIZE = 4 * 1024 * 1024
+
+def _iter_member_data(fileobj, csize, codec):
+    """Yields the decompressed data of one member, reading csize compressed bytes in chunks."""
+    decompressor = PACK_CODECS[codec][1](); remaining = csize
+    while remaining > 0:
+        chunk = fileobj.read(min(PACK_CHUNK_SIZE, remaining))
+        if not chunk: raise EOFError("Pack is truncated")
+        remaining -= len(chunk)
+        data = decompressor.decompress(chunk)
+        if data: yield data
+    tail = decompressor.flush() if hasattr(decompressor, "flush") else b""
+    if tail: yield tail
+
+def get_pack_path(config_data, version_path, department=None):
+    """Pack location mirroring the version's path below project_root inside the department's archive_root (local or s3://).
+    department defaults to the active one."""
+    archive_root = get_department_target(config_data, "archive_root", department); backend = storage_for(archive_root)
+    relative = os.path.relpath(version_path, config_data.get("project_root", ""))
+    if relative.startswith(".."): relative = os.path.splitdrive(version_path)[1].lstrip("\\/")
+    relative = relative if not is_object_store_path(archive_root) else relative.replace(os.sep, "/")
+    pack_path = storage_join(archive_root, relative + ".tar"); counter = 2
+    while backend.exists(pack_path): # Never overwrite an earlier pack of the same version
+        pack_path = storage_join(archive_root, f"{relative}_{counter}.tar"); counter += 1
+    return pack_path
+
+def pack_version_folder(source_dir, pack_path, codec="lzma"):
+    """
+    Streams every file of source_dir into a pack, then re-reads the pack and verifies each
+    member's CRC before writing the index. Runs in a worker process. Returns a summary dict whose
+    'members' lists the (name, size, mtime) of what was packed; 'error' is set if anything failed,
+    in which case no pack is left behind.
+    """
+    import tarfile
+    summary = {"source": source_dir, "pack": pack_path, "files": 0, "bytes": 0, "packed_bytes": 0, "members": [], "error": None}
+    partial_path = pack_path + ".partial"
+    try:
+        make_compressor = PACK_CODECS[codec][0]
+        os.makedirs(os.path.dirname(pack_path), exist_ok=True)
+        expected = {}
+        with tarfile.open(partial_path, "w", format=tarfile.PAX_FORMAT) as tar:
+            for dirpath, dirnames, filenames in os.walk(source_dir):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    file_path = os.path.join(dirpath, name)
+                    if os.path.islink(file_path): continue
+                    st = os.stat(file_path); crc = 0; compressor = make_compressor()
+                    # Compressed size must be known before the tar header is written, so spool it first
+                    with open(file_path, 'rb') as src, tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as spool:
+                        for chunk in iter(lambda: src.read(PACK_CHUNK_SIZE), b""):
+                            crc = zlib.crc32(chunk, crc); spool.write(compressor.compress(chunk))
+                        spool.write(compressor.flush())
+                        member = tarfile.TarInfo(os.path.relpath(file_path, source_dir).replace(os.sep, "/"))
+                        member.size = spool.tell(); member.mtime = st.st_mtime; member.mode = stat.S_IMODE(st.st_mode)
+                        member.pax_headers = {"XPUB.codec": codec, "XPUB.size": str(st.st_size), "XPUB.crc32": str(crc)}
+                        spool.seek(0); tar.addfile(member, spool)
+                    expected[member.name] = (st.st_size, crc)
+                    summary["files"] += 1; summary["bytes"] += st.st_size
+
+        members = verify_pack(partial_path, expected)
+        index = {"source": source_dir, "codec": codec, "created": datetime.datetime.now().strftime(LOG_DATETIME_FORMAT), "members": members}
+        with open(pack_path + ".index.json", 'w', encoding="utf-8") as f: json.dump(index, f, indent=1)
+        os.replace(partial_path, pack_path)
+        summary["packed_bytes"] = os.path.getsize(pack_path); summary["members"] = [(m["name"], m["size"], m["mtime"]) for m in members]
+    except Exception as e:
+        summary["error"] = str(e)
+        for leftover in (partial_path, pack_path + ".index.json"):
+            try: os.remove(leftover)
+            except OSError: pass
+    return summary
+
+def verify_pack(pack_path, expected):
+    """Decompresses every member and checks size/CRC against expected {name: (size, crc)}. Returns the member index."""
+    import tarfile
+    members = []
+    with tarfile.open(pack_path, "r") as tar:
+        for member in tar:
+            if not member.isfile(): continue
+            codec = member.pax_headers.get("XPUB.codec", "zlib"); size = crc = 0
+            for data in _iter_member_data(tar.extractfile(member), member.size, codec):
+                size += len(data); crc = zlib.crc32(data, crc)
+            if expected.get(member.name) != (size, crc): raise ValueError(f"Verification failed for member '{member.name}'")
+            members.append({"name": member.name, "offset": member.offset_data, "csize": member.size, "size": size, "crc32": crc, "mtime": member.mtime, "mode": member.mode, "codec": codec})
+    if len(members) != len(expected): raise ValueError(f"Pack holds {len(members)} members, expected {len(expected)}")
+    return members
+
+def read_pack_index(pack_path):
+    """Loads the member index, rebuilding it from the tar's PAX headers if the sidecar is missing. On an object store only the sidecar or the headers are fetched."""
+    backend = storage_for(pack_path)
+    try:
+        with backend.open_read(pack_path + ".index.json") as f: return json.load(f)
+    except Exception as e:
+        if not isinstance(e, (OSError, ValueError)) and not _is_not_found(e): raise
+        import tarfile
+        members = []
+        with backend.open_ranged(pack_path, 64 * 1024) as raw, tarfile.open(fileobj=raw, mode="r:") as tar:
+            for m in tar:
+                if m.isfile(): members.append({"name": m.name, "offset": m.offset_data, "csize": m.size, "size": int(m.pax_headers.get("XPUB.size", -1)), "crc32": int(m.pax_headers.get("XPUB.crc32", -1)), "mtime": m.mtime, "mode": m.mode, "codec": m.pax_headers.get("XPUB.codec", "zlib")})
+        return {"source": None, "members": members}
+
+def restore_pack(pack_path, dest_dir=None, member_names=None, log_callback=print):
+    """Restores all (or the named) members of a pack into dest_dir (defaults to the original source). Returns files restored.
+    A pack on an object store is read with ranged requests, so restoring a few members does not download the rest."""
+    index = read_pack_index(pack_path)
+    dest_dir = dest_dir or index.get("source")
+    if not dest_dir: raise ValueError("Pack index has no source path; pass a destination folder.")
+    wanted = set(member_names) if member_names else None
+    restored = 0
+    with storage_for(pack_path).open_ranged(pack_path) as pack:
+        for member in index["members"]:
+            if wanted is not None and member["name"] not in wanted: continue
+            pack.seek(member["offset"]); crc = 0
+            target = os.path.join(dest_dir, *member["name"].split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                for data in _iter_member_data(pack, member["csize"], member.get("codec", index.get("codec", "zlib"))):
+                    crc = zlib.crc32(data, crc); f.write(data)
+            if member["crc32"] >= 0 and crc != member["crc32"]: raise ValueError(f"CRC mismatch restoring '{member['name']}'")
+            os.utime(target, (member["mtime"], member["mtime"])); os.chmod(target, member["mode"] or stat.S_IWRITE | stat.S_IREAD)
+            restored += 1
+            if log_callback: log_callback(f"  Restored {member['name']}")
+    if wanted is not None and restored != len(wanted): raise ValueError(f"Restored {restored} of {len(wanted)} requested members")
+    return restored
+
+class RestoreWorker(QtCore.QObject):
+    """Restores one or more packs in a background thread."""
+    progress_updated = QtCore.Signal(int); log_message = QtCore.Signal(str); finished = QtCore.Signal(bool)
+
+    def __init__(self, pack_paths):
+        super().__init__()
+        self.pack_paths = pack_paths; self._is_aborted = False
+
+    def run(self):
+        success = True
+        for i, pack_path in enumerate(self.pack_paths):
+            if self._is_aborted: success = False; break
+            self.log_message.emit(f"Restoring '{os.path.basename(pack_path)}'...")
+            try: self.log_message.emit(f"  {restore_pack(pack_path, log_callback=None)} files restored.")
+            except Exception as e: self.log_message.emit(f"ERROR: {e}"); success = False
+            self.progress_updated.emit(int((i + 1) / len(self.pack_paths) * 100))
+        self.finished.emit(success)
+
+    def abort(self):
+        self.log_message.emit("--- ABORTING ---"); self._is_aborted = True
+
+# /////////////////////////////////////////////
+# NEW - Retention Policies
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# Retention is configured per department and data source ("WIP" or "FINAL") in
+# 'retention_policies'; the "*" entry is the default each department's entry is laid over:
+#   {"*": {"WIP": {"keep_latest": 5}}, "lighting": {"WIP": {"keep_latest": 3, "keep_logged": true}}}
+# Rules: keep_latest (N newest per render per user), max_age_days (older versions go even when
+# within keep_latest), keep_published (WIP versions that have a FINAL copy), keep_logged (versions
+# named in a publish log) and protect_only_copy (on by default: a logged WIP version whose FINAL
+# copy is gone is never deleted). 'retention_pins' lists "seq/shot/render/version" patterns that
+# are always kept. A department/source without any policy is kept as is.
+VERSION_INDEX_COLUMNS = ("seq", "shot", "department", "source", "user", "render", "version", "path", "mtime")
+
+class VersionIndex:
+    """Every version folder of a set of shots, stored column-wise (one list per VERSION_INDEX_COLUMNS entry)."""
+    def __init__(self):
+        self.columns = {name: [] for name in VERSION_INDEX_COLUMNS}
+
+    def __len__(self): return len(self.columns["path"])
+
+    def append(self, seq, shot, department, source, user, render, version, path, mtime):
+        for name, value in zip(VERSION_INDEX_COLUMNS, (seq, shot, department, source, user, render, version, path, mtime)): self.columns[name].append(value)
+
+    def row(self, i): return {name: values[i] for name, values in self.columns.items()}
+
+def list_show_shots(config_data, show_name):
+    """(seq, shot, shot_path) of every shot of a show."""
+    shots_root = get_shots_root(config_data.get("project_root", ""), show_name); shots = []
+    for seq_name in sorted(list_subdirs(shots_root)):
+        if seq_name.endswith("_Seq"): continue # Archive log holders, not sequences
+        for shot_name in sorted(list_subdirs(os.path.join(shots_root, seq_name))): shots.append((seq_name, shot_name, os.path.join(shots_root, seq_name, shot_name)))
+    return shots
+
+def build_version_index(config_data, shot_paths, departments=None, progress_callback=None):
+    """Lists the WIP and FINAL versions of every department of the given shot folders in one concurrent scan."""
+    import asyncio
+    dept_config = config_data.get("departments", {}); departments = departments or list(dept_config.keys())
+    roots = [] # (root, seq, shot, dept, source)
+    for shot_path in shot_paths:
+        seq, shot = os.path.basename(os.path.dirname(os.path.normpath(shot_path))), os.path.basename(os.path.normpath(shot_path))
+        for dept in departments:
+            template = dept_config.get(dept, {}).get("source_path")
+            if template: roots.append((os.path.join(shot_path, template.replace('/', os.sep)), seq, shot, dept, "WIP"))
+            publish_base = get_publish_base(config_data, shot_path, dept)
+            if publish_base: roots.append((publish_base, seq, shot, dept, "FINAL"))
+    index = VersionIndex()
+
+    async def scan():
+        with AsyncScanner.from_config(config_data) as scanner:
+            async def versions(root, source):
+                return await collect_async(scanner.iter_wip_versions(root) if source == "WIP" else scanner.iter_publish_versions(root))
+            jobs = [versions(root, source) for root, seq, shot, dept, source in roots]
+            for done, (root_info, found) in enumerate(zip(roots, await asyncio.gather(*jobs)), start=1):
+                root, seq, shot, dept, source = root_info
+                for v in found: index.append(seq, shot, dept, source, v.get('user', "-"), v['render'], v['version'], v['path'], v['mtime'])
+                if progress_callback and done % 200 == 0: progress_callback(done, len(roots))
+
+    asyncio.run(scan())
+    return index
+
+def logged_versions_from_logs(shot_paths):
+    """{(seq, shot, render, version)} named in the publish logs of the given shot folders."""
+    logged = set()
+    for shot_path in shot_paths:
+        seq, shot = os.path.basename(os.path.dirname(os.path.normpath(shot_path))), os.path.basename(os.path.normpath(shot_path))
+        try:
+            with open(get_shot_log_path_for(shot_path), 'r', encoding="utf-8") as f: logs = json.load(f)
+        except (OSError, ValueError): continue
+        for entry in logs if isinstance(logs, list) else [logs]:
+            if isinstance(entry, dict): logged.update((seq, shot, render, version) for render, version in PublishHistoryIndex._entry_renders(entry, "publish"))
+    return logged
+
+def resolve_retention_policies(config_data, overrides=None):
+    """{(department, source): rules}; overrides ({(department, source): rules}) are laid over the config, as the Archiver does with its controls."""
+    policies = config_data.get("retention_policies", {}); default = policies.get("*", {}); resolved = {}
+    for dept in config_data.get("departments", {}):
+        for source in ("WIP", "FINAL"):
+            rules = {**default.get(source, {}), **policies.get(dept, {}).get(source, {}), **(overrides or {}).get((dept, source), {})}
+            if rules: resolved[(dept, source)] = rules
+    return resolved
+
+class RetentionPlan:
+    """Outcome of evaluate_retention: per index row an action ("keep"/"delete") and the reason for it."""
+    FIELDS = list(VERSION_INDEX_COLUMNS) + ["action", "reason"]
+
+    def __init__(self, index, actions, reasons):
+        self.index = index; self.actions = actions; self.reasons = reasons
+
+    def __len__(self): return len(self.actions)
+
+    def rows(self, action=None):
+        for i, row_action in enumerate(self.actions):
+            if action is None or row_action == action: yield dict(self.index.row(i), action=row_action, reason=self.reasons[i])
+
+    def summary(self):
+        """Counter of (action, reason)."""
+        return collections.Counter(zip(self.actions, self.reasons))
+
+    def export(self, path):
+        """Writes the plan as CSV or JSON depending on the file extension."""
+        with open(path, 'w', encoding="utf-8", newline="") as f:
+            if path.lower().endswith(".json"): json.dump(list(self.rows()), f, indent=4)
+            else: writer = csv.DictWriter(f, fieldnames=self.FIELDS); writer.writeheader(); writer.writerows(self.rows())
+
+def evaluate_retention(index, policies, pins=(), logged=frozenset(), now=None):
+    """
+    Evaluates the resolved policies over the whole index at once: one sort ranks every version
+    within its (shot, department, source, user, render) group, then each rule is a single pass over
+    the columns. The first rule that applies decides, in order: pins, only-copy protection,
+    keep_logged, keep_published, max_age_days, keep_latest. Returns a RetentionPlan.
+    """
+    c = index.columns; n = len(index); now = now or time.time()
+    groups = list(zip(c["seq"], c["shot"], c["department"], c["source"], c["user"], c["render"]))
+    rank = [0] * n; previous = None; run = 0 # 0 = newest of its group
+    for i in sorted(range(n), key=lambda i: (groups[i], -c["mtime"][i])):
+        run = run + 1 if groups[i] == previous else 0
+        rank[i] = run; previous = groups[i]
+    keys = list(zip(c["seq"], c["shot"], c["render"], c["version"]))
+    final = {(k, dept) for k, dept, source in zip(keys, c["department"], c["source"]) if source == "FINAL"}
+    labels = [f"{seq}/{shot}/{render}/{version}" for seq, shot, render, version in keys]
+    pinned = [any(fnmatch.fnmatchcase(label, p) for p in pins) for label in labels] if pins else [False] * n
+
+    actions, reasons = [None] * n, [None] * n
+    def decide(mask, action, reason):
+        for i in range(n):
+            if actions[i] is None and mask(i): actions[i] = action; reasons[i] = reason(i) if callable(reason) else reason
+    rules = [policies.get((dept, source)) for dept, source in zip(c["department"], c["source"])]
+    decide(lambda i: rules[i] is None, "keep", "no policy")
+    decide(lambda i: pinned[i], "keep", "pinned")
+    decide(lambda i: c["source"][i] == "WIP" and rules[i].get("protect_only_copy", True) and keys[i] in logged and (keys[i], c["department"][i]) not in final, "keep", "only copy of a logged publish")
+    decide(lambda i: rules[i].get("keep_logged") and keys[i] in logged, "keep", "named in a publish log")
+    decide(lambda i: c["source"][i] == "WIP" and rules[i].get("keep_published") and (keys[i], c["department"][i]) in final, "keep", "published")
+    decide(lambda i: rules[i].get("max_age_days") is not None and (now - c["mtime"][i]) / 86400 > rules[i]["max_age_days"], "delete", lambda i: f"older than {rules[i]['max_age_days']:g} days")
+    decide(lambda i: rules[i].get("keep_latest") is not None and rank[i] >= rules[i]["keep_latest"], "delete", lambda i: f"beyond latest {rules[i]['keep_latest']}")
+    decide(lambda i: True, "keep", lambda i: f"within latest {rules[i]['keep_latest']}" if rules[i].get("keep_latest") is not None else "no limit")
+    return RetentionPlan(index, actions, reasons)
+
+# /////////////////////////////////////////////
+# NEW - Scan Snapshots
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# A snapshot is one binary file: a header, a JSON meta block and fixed-width columns, each
+# 8-byte aligned so they can be cast straight out of an mmap. Rows are shots ("seq/shot") and
+# versions ("seq/shot/dept/source/user/render/version"), sorted by (kind, key hash), so every
+# lookup is a bisect on the hash column and nothing is parsed until a key is actually read.
+#   hashes Q[n] | key offsets Q[n+1] | keys (utf-8) | sizes Q[n] | mtimes d[n] | files I[n]
+SNAPSHOT_MAGIC = b"XPUBSNP1"
+SNAPSHOT_HEADER = struct.Struct("<8sIIdQQ") # magic, rows, shot rows, created, meta bytes, key bytes
+SNAPSHOT_SHOT, SNAPSHOT_VERSION = 0, 1
+
+def snapshot_key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _pad8(n): return (n + 7) & ~7
+
+def write_scan_snapshot(path, rows, meta=None):
+    """Writes rows of (kind, key, size, mtime, files) as a snapshot; the temp-file rename keeps readers from seeing a partial one."""
+    rows = sorted(((kind, snapshot_key_hash(key), key.encode("utf-8"), size, mtime, files) for kind, key, size, mtime, files in rows), key=lambda r: (r[0], r[1]))
+    meta_bytes = json.dumps(meta or {}).encode("utf-8"); keys = b"".join(r[2] for r in rows)
+    offsets = list(itertools.accumulate((len(r[2]) for r in rows), initial=0))
+    columns = [array.array("Q", [r[1] for r in rows]), array.array("Q", offsets), keys,
+               array.array("Q", [r[3] for r in rows]), array.array("d", [r[4] for r in rows]), array.array("I", [r[5] for r in rows])]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True); temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(rows), sum(1 for r in rows if r[0] == SNAPSHOT_SHOT), time.time(), len(meta_bytes), len(keys)))
+        for block in [meta_bytes] + columns:
+            data = block.tobytes() if isinstance(block, array.array) else block
+            f.write(data); f.write(b"\0" * (_pad8(len(data)) - len(data)))
+    os.replace(temp_path, path)
+    return path
+
+class ScanSnapshot:
+    """
+    Read-only view of a snapshot file. Columns are memoryviews over an mmap, so opening one costs
+    a header read regardless of size, and memory stays at the pages actually touched.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f: self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, self.count, self.shot_count, self.created, meta_len, keys_len = SNAPSHOT_HEADER.unpack_from(buffer)
+        if magic != SNAPSHOT_MAGIC: buffer.release(); self._mmap.close(); raise ValueError(f"{path} is not an xPub scan snapshot")
+        position = _pad8(SNAPSHOT_HEADER.size)
+        self.meta = json.loads(bytes(buffer[position:position + meta_len]) or b"{}"); position += _pad8(meta_len)
+        def column(fmt, length):
+            nonlocal position
+            view = buffer[position:position + length * array.array(fmt).itemsize].cast(fmt); position += _pad8(length * array.array(fmt).itemsize)
+            return view
+        self.hashes = column("Q", self.count); self._offsets = column("Q", self.count + 1)
+        self._keys = buffer[position:position + keys_len]; position += _pad8(keys_len)
+        self.sizes = column("Q", self.count); self.mtimes = column("d", self.count); self.files = column("I", self.count)
+        self._views = [buffer, self.hashes, self._offsets, self._keys, self.sizes, self.mtimes, self.files]
+
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): self.close()
+    def __len__(self): return self.count
+
+    def close(self):
+        for view in reversed(self._views): view.release()
+        self._mmap.close()
+
+    def kind_range(self, kind):
+        return (0, self.shot_count) if kind == SNAPSHOT_SHOT else (self.shot_count, self.count)
+
+    def key(self, i): return bytes(self._keys[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+    def find(self, key, kind=SNAPSHOT_VERSION):
+        """Row index of key, or -1."""
+        low, high = self.kind_range(kind); key_hash = snapshot_key_hash(key)
+        i = bisect.bisect_left(self.hashes, key_hash, low, high)
+        return i if i < high and self.hashes[i] == key_hash else -1
+
+    def find_hash(self, key_hash, kind):
+        low, high = self.kind_range(kind)
+        i = bisect.bisect_left(self.hashes, key_hash, low, high)
+        return i if i < high and self.hashes[i] == key_hash else -1
+
+def get_snapshot_dir(config_data, show_name):
+    return os.path.join(get_cache_dir(config_data), "snapshots", show_name)
+
+def list_scan_snapshots(config_data, show_name):
+    """Snapshot files of a show, oldest first (names are timestamps)."""
+    snapshot_dir = get_snapshot_dir(config_data, show_name)
+    try: return [os.path.join(snapshot_dir, name) for name in sorted(os.listdir(snapshot_dir)) if name.endswith(".xsnap")]
+    except OSError: return []
+
+def take_scan_snapshot(config_data, show_name, progress_callback=None):
+    """Scans every version of a show (sizes through the StorageCrawler cache) and writes a snapshot. Returns its path."""
+    shots = list_show_shots(config_data, show_name)
+    index = build_version_index(config_data, [path for seq, shot, path in shots])
+    c = index.columns; local_paths = [p for p in c["path"] if not is_object_store_path(p)]
+    crawler = StorageCrawler.from_config(config_data); totals = crawler.crawl(local_paths, progress_callback); crawler.save()
+    rows, shot_totals = [], {f"{seq}/{shot}": [0, 0.0, 0] for seq, shot, path in shots}
+    for i in range(len(index)):
+        path = c["path"][i]
+        if is_object_store_path(path):
+            objects = list(storage_for(path).walk_files(path)); size, files = sum(o.size for o in objects), len(objects)
+        else: size, files = totals.get(path, (0, 0))
+        shot_key = f"{c['seq'][i]}/{c['shot'][i]}"
+        rows.append((SNAPSHOT_VERSION, f"{shot_key}/{c['department'][i]}/{c['source'][i]}/{c['user'][i]}/{c['render'][i]}/{c['version'][i]}", size, c["mtime"][i], files))
+        total = shot_totals.setdefault(shot_key, [0, 0.0, 0]); total[0] += size; total[1] = max(total[1], c["mtime"][i]); total[2] += files
+    rows.extend((SNAPSHOT_SHOT, key, size, mtime, files) for key, (size, mtime, files) in shot_totals.items())
+    path = os.path.join(get_snapshot_dir(config_data, show_name), datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".xsnap")
+    write_scan_snapshot(path, rows, {"show": show_name, "project_root": config_data.get("project_root", "")})
+    for old in list_scan_snapshots(config_data, show_name)[:-max(1, config_data.get("snapshot_keep", 30))]:
+        try: os.remove(old)
+        except OSError as e: print(f"Could not remove old snapshot {old}: {e}")
+    return path
+
+def _merge_snapshot_rows(old, new, kind, compare_sizes=False):
+    """
+    Walks the sorted hash columns of both snapshots together and yields (old row, new row) for
+    rows that differ, -1 standing for "not there". Equal stretches are skipped a slice at a time
+    (a C-level memoryview compare) and a differing slice is halved until the first difference is
+    found, so two mostly identical snapshots cost a few compares per change.
+    """
+    j, j_end = old.kind_range(kind); i, i_end = new.kind_range(kind); stride = 1024
+    while i < i_end and j < j_end:
+        step = min(stride, i_end - i, j_end - j)
+        if new.hashes[i:i + step] == old.hashes[j:j + step] and (not compare_sizes or new.sizes[i:i + step] == old.sizes[j:j + step]): i += step; j += step; continue
+        if step > 1: stride = step // 2; continue
+        stride = 1024; new_hash, old_hash = new.hashes[i], old.hashes[j]
+        if new_hash == old_hash:
+            if compare_sizes and new.sizes[i] != old.sizes[j]: yield j, i
+            i += 1; j += 1
+        elif new_hash < old_hash: yield -1, i; i += 1
+        else: yield j, -1; j += 1
+    for j in range(j, j_end): yield j, -1
+    for i in range(i, i_end): yield -1, i
+
+def diff_scan_snapshots(old, new):
+    """
+    Per-shot changes from old to new: {shot key: {"old": bytes, "new": bytes, "delta": bytes,
+    "added": [(version key, bytes)], "removed": [(version key, bytes)]}}, only for shots that changed.
+    Only the keys of rows that differ are ever decoded.
+    """
+    changes = {}
+    def shot(key):
+        if key not in changes:
+            sizes = [s.sizes[i] if i >= 0 else 0 for s, i in ((old, old.find(key, SNAPSHOT_SHOT)), (new, new.find(key, SNAPSHOT_SHOT)))]
+            changes[key] = {"old": sizes[0], "new": sizes[1], "delta": sizes[1] - sizes[0], "added": [], "removed": []}
+        return changes[key]
+    for j, i in _merge_snapshot_rows(old, new, SNAPSHOT_SHOT, compare_sizes=True): shot(new.key(i) if i >= 0 else old.key(j))
+    for j, i in _merge_snapshot_rows(old, new, SNAPSHOT_VERSION):
+        snapshot, row, bucket = (new, i, "added") if i >= 0 else (old, j, "removed")
+        key = snapshot.key(row); shot("/".join(key.split("/")[:2]))[bucket].append((key, snapshot.sizes[row]))
+    return changes
+
+# /////////////////////////////////////////////
+# NEW - Publish Frame Deduplication
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+DEDUP_CHUNK_SIZE = 4 * 1024 * 1024
+
+def hash_file(path, algorithm="blake2b"):
+    """Hex digest of a file's contents, read in chunks."""
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DEDUP_CHUNK_SIZE), b""): digest.update(chunk)
+    return digest.hexdigest()
+
+def version_sort_key(name):
+    """Orders version folder names by their number, so v9 comes before v10; names without a number sort by name, before numbered ones."""
+    match = re.search(r"(\d+)\D*$", name)
+    return (1, int(match.group(1)), name) if match else (0, 0, name)
+
+def find_previous_published_version(dest_version_path):
+    """Newest sibling version folder whose number is below dest's version, or None."""
+    render_dir, current = os.path.split(os.path.normpath(dest_version_path))
+    earlier = [v for v in list_subdirs(render_dir) if version_sort_key(v) < version_sort_key(current) and not v.startswith(".")]
+    return os.path.join(render_dir, max(earlier, key=version_sort_key)) if earlier else None
+
+def dedup_version(source_dir, dest_dir, previous_dir, algorithm="blake2b", max_workers=8):
+    """
+    Hardlinks into dest_dir every file of source_dir that is byte-identical to the same relative
+    path in previous_dir. Files are only hashed when their sizes already match. Returns a dict
+    with 'linked' (relative paths), 'bytes_saved' and 'candidates'. Links that the filesystem
+    refuses are skipped; those files are simply copied as usual.
+    """
+    result = {"linked": [], "bytes_saved": 0, "candidates": 0}
+    pairs = []
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        for name in filenames:
+            src = os.path.join(dirpath, name); rel = os.path.relpath(src, source_dir); prev = os.path.join(previous_dir, rel)
+            try:
+                size = os.stat(src).st_size
+                if size and os.stat(prev).st_size == size: pairs.append((rel, src, prev, size))
+            except OSError: continue
+    result["candidates"] = len(pairs)
+    if not pairs: return result
+
+    def same_content(pair):
+        try: return hash_file(pair[1], algorithm) == hash_file(pair[2], algorithm)
+        except OSError: return False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for (rel, src, prev, size), identical in zip(pairs, pool.map(same_content, pairs)):
+            if not identical: continue
+            target = os.path.join(dest_dir, rel)
+            try:
+                os.makedirs(os.path.dirname(target), exist_ok=True); os.link(prev, target)
+            except OSError: continue
+            result["linked"].append(rel); result["bytes_saved"] += size
+    return result
+
+# /////////////////////////////////////////////
+# NEW - Navigation Prefetcher
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+class LRUCache:
+    """Thread-safe bounded mapping; the least recently used entry is evicted first."""
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries; self._data = collections.OrderedDict(); self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data: return default
+            self._data.move_to_end(key); return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value; self._data.move_to_end(key)
+            while len(self._data) > self.max_entries: self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock: self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock: self._data.clear()
+
+    def __len__(self): return len(self._data)
+
+class NavigationPrefetcher:
+    """
+    Warms the listings behind the Show -> Sequence -> Shot combos on a small thread pool so a
+    selection renders from memory. Jobs run in the order they are scheduled. Every schedule()
+    or cancel() starts a new generation: queued jobs from an older generation are dropped, and
+    running ones stop at their next share round trip if their loader checks is_stale() (the
+    version scans pass it to AsyncScanner as should_stop). Entries expire after ttl seconds.
+    """
+    _SKIPPED = object()
+
+    def __init__(self, max_entries=256, ttl=120, max_workers=2):
+        self.cache = LRUCache(max_entries); self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="xPubPrefetch")
+        self._inflight = {}; self._lock = threading.Lock(); self._generation = 0 # key -> (job token, future); a token is [generation]
+        self._job = threading.local() # Token of the job running on the current pool thread
+        self._history = collections.deque(maxlen=32) # Most recently visited keys, newest last
+
+    @classmethod
+    def from_config(cls, config_data):
+        return cls(config_data.get("prefetch_entries", 256), config_data.get("prefetch_ttl_s", 120), config_data.get("prefetch_workers", 2))
+
+    def _fresh(self, key):
+        entry = self.cache.get(key)
+        return entry if entry and time.monotonic() - entry[0] < self.ttl else None
+
+    def get(self, key, loader):
+        """Cached value for key. Waits for an in-flight prefetch of the same key, or calls loader() on a miss."""
+        entry = self._fresh(key)
+        if entry: return entry[1]
+        with self._lock: future = self._inflight.get(key, (None, None))[1]
+        if future:
+            try:
+                value = future.result()
+                if value is not self._SKIPPED: return value
+            except Exception: pass
+        value = loader(); self.cache.put(key, (time.monotonic(), value))
+        return value
+
+    def peek(self, key):
+        """Cached value for key, or None; never loads or waits."""
+        entry = self._fresh(key)
+        return entry[1] if entry else None
+
+    def pending(self, key):
+        """Future of a warm-up of key that is queued or running, or None."""
+        with self._lock: return self._inflight.get(key, (None, None))[1]
+
+    def put(self, key, value): self.cache.put(key, (time.monotonic(), value))
+
+    def schedule(self, jobs):
+        """Replaces any queued warm-up with jobs, an ordered list of (key, loader)."""
+        with self._lock:
+            self._generation += 1; generation = self._generation; self._drop_queued()
+            for key, loader in jobs:
+                if self._fresh(key): continue
+                if key in self._inflight: self._inflight[key][0][0] = generation; continue # Running and still wanted: adopted instead of stopped
+                token = [generation]; self._inflight[key] = (token, self._executor.submit(self._run, token, key, loader))
+
+    def _run(self, token, key, loader):
+        try:
+            if token[0] != self._generation: return self._SKIPPED
+            self._job.token = token
+            value = loader(); self.cache.put(key, (time.monotonic(), value))
+            return value
+        except ScanCancelled: return self._SKIPPED
+        except Exception as e:
+            print(f"Prefetch of {key} failed: {e}"); return self._SKIPPED
+        finally:
+            self._job.token = None
+            with self._lock:
+                if self._inflight.get(key, (None,))[0] is token: del self._inflight[key]
+
+    def _drop_queued(self):
+        """Cancels the jobs that have not started and forgets them, so a later schedule() queues them afresh. Caller holds the lock."""
+        for key, (token, future) in list(self._inflight.items()):
+            if future.cancel(): del self._inflight[key]
+
+    def is_stale(self):
+        """True inside a job whose generation was superseded by schedule() or cancel(); loaders pass it on as should_stop."""
+        token = getattr(self._job, "token", None)
+        return token is not None and token[0] != self._generation
+
+    def cancel(self):
+        with self._lock: self._generation += 1; self._drop_queued()
+
+    def note_visit(self, key):
+        if key in self._history: self._history.remove(key)
+        self._history.append(key)
+
+    def prioritize(self, keys):
+        """keys in their given (combo) order, with recently visited ones moved to the front, newest first."""
+        recent = {key: rank for rank, key in enumerate(reversed(self._history))}
+        return sorted(keys, key=lambda k: recent.get(k, len(recent)))
+
+    def invalidate(self, key=None):
+        """Drops one entry, or everything when key is None."""
+        if key is None: self.cache.clear()
+        else: self.cache.discard(key)
+
+    def close(self):
+        self.cancel(); self._executor.shutdown(wait=False, cancel_futures=True)
+
+class SnapshotRevalidator(QtCore.QObject):
+    """Re-runs the listing loaders behind a restored session snapshot in a background thread."""
+    finished = QtCore.Signal(object) # {prefetch key: fresh value}; tuple keys do not survive a dict signal
+
+    def __init__(self, loaders):
+        super().__init__()
+        self.loaders = loaders # {prefetch key: loader}
+
+    def run(self):
+        results = {}
+        for key, loader in self.loaders.items():
+            try: results[key] = loader()
+            except Exception as e: print(f"Snapshot revalidation of {key} failed: {e}")
+        self.finished.emit(results)
+
+# /////////////////////////////////////////////
+# NEW - Dailies (Proxy Frames & Contact Sheet)
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+DAILY_FRAME_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff")
+DAILY_CHUNK_FRAMES = 16 # Frames per pool task; keeps per-task overhead low on long sequences
+
+def get_daily_path(config_data, shot_path, render_name, version_name):
+    """Daily output folder of a version: <shot>/<daily_path>/<render>/<version>. None if the department has no 'daily_path'."""
+    daily_template = config_data.get("departments", {}).get(config_data.get("active_department"), {}).get("daily_path")
+    return os.path.join(shot_path, daily_template.replace('/', os.sep), render_name, version_name) if daily_template else None
+
+def _open_frame_rgb(path, max_size):
+    """Opens one frame reduced to fit max_size, as 8-bit RGB. Only this frame is held in memory."""
+    from PIL import Image
+    with Image.open(path) as image: # Closes the file; what is returned is a converted copy
+        image.draft("RGB", (max_size, max_size)) # JPEG decodes straight to a reduced size
+        if image.mode in ("I;16", "I;16B", "I;16L", "I"): image = image.convert("I").point(lambda v: v * (1 / 256)).convert("L")
+        image.thumbnail((max_size, max_size))
+        return image.convert("RGB")
+
+def proxy_path_for(frame_path, source_root, proxy_dir):
+    """Proxy of a frame: its path relative to source_root below proxy_dir, so frames of the same name in different
+    sub-folders (or with different extensions) never share one. Non-JPEG frames get '.jpg' appended."""
+    rel = os.path.relpath(frame_path, source_root)
+    return os.path.join(proxy_dir, rel if rel.lower().endswith((".jpg", ".jpeg")) else rel + ".jpg")
+
+def make_proxy_frames(frame_paths, proxy_dir, max_size=1024, quality=85, source_root=None):
+    """
+    Writes a JPEG proxy per frame (see proxy_path_for). A proxy whose mtime equals its source's
+    mtime is current and is skipped. Runs in a worker process. Returns a list of (proxy_path or None, status).
+    """
+    results = []
+    for frame_path in frame_paths:
+        proxy_path = proxy_path_for(frame_path, source_root or os.path.dirname(frame_path), proxy_dir)
+        try:
+            os.makedirs(os.path.dirname(proxy_path), exist_ok=True)
+            source_mtime = os.stat(frame_path).st_mtime
+            if os.path.exists(proxy_path) and os.stat(proxy_path).st_mtime == source_mtime: results.append((proxy_path, "cached")); continue
+            with _open_frame_rgb(frame_path, max_size) as image: image.save(proxy_path, "JPEG", quality=quality)
+            os.utime(proxy_path, (source_mtime, source_mtime))
+            results.append((proxy_path, "made"))
+        except Exception as e:
+            results.append((None, f"{os.path.basename(frame_path)}: {e}"))
+    return results
+
+def build_contact_sheet(proxy_paths, sheet_path, max_tiles=48, columns=8, tile_width=240):
+    """Tiles an even sample of up to max_tiles proxies into one JPEG, pasting one proxy at a time."""
+    from PIL import Image
+    if not proxy_paths: return None
+    step = max(1, math.ceil(len(proxy_paths) / max_tiles)); sample = proxy_paths[::step][:max_tiles]
+    with Image.open(sample[0]) as first: tile_height = max(1, round(tile_width * first.height / first.width))
+    rows = math.ceil(len(sample) / columns)
+    sheet = Image.new("RGB", (min(columns, len(sample)) * tile_width, rows * tile_height), (20, 20, 20))
+    for i, proxy_path in enumerate(sample):
+        with Image.open(proxy_path) as tile:
+            tile.thumbnail((tile_width, tile_height)); sheet.paste(tile, ((i % columns) * tile_width, (i // columns) * tile_height))
+    sheet.save(sheet_path, "JPEG", quality=85)
+    return sheet_path
+
+def daily_pool_size(config_data):
+    """'daily_workers' from config, else the cores this process may actually run on."""
+    if config_data.get("daily_workers"): return config_data["daily_workers"]
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+class DailyBuilder:
+    """
+    Builds dailies on a process pool while a publish is still running. submit() queues the frames
+    of a version that has just landed and returns at once, so proxies are made while the next
+    transfer runs; finish() waits for what is left and writes the remaining contact sheets.
+    """
+    def __init__(self, config_data, log_callback=print):
+        self.config_data = config_data; self.log_callback = log_callback
+        self.max_size = config_data.get("daily_proxy_size", 1024); self.quality = config_data.get("daily_quality", 85)
+        self._executor = None; self._versions = [] # [label, daily_dir, chunk futures, skipped count, sheet future]
+
+    def submit(self, version_path, daily_dir):
+        from concurrent.futures import ProcessPoolExecutor
+        if self._executor is None: self._executor = ProcessPoolExecutor(max_workers=daily_pool_size(self.config_data))
+        frames, skipped = [], 0
+        for dirpath, dirnames, filenames in os.walk(version_path):
+            for name in sorted(filenames):
+                if name.lower().endswith(DAILY_FRAME_EXTENSIONS): frames.append(os.path.join(dirpath, name))
+                else: skipped += 1
+        proxy_dir = os.path.join(daily_dir, "proxy"); os.makedirs(proxy_dir, exist_ok=True)
+        chunks = [self._executor.submit(make_proxy_frames, frames[i:i + DAILY_CHUNK_FRAMES], proxy_dir, self.max_size, self.quality, version_path) for i in range(0, len(frames), DAILY_CHUNK_FRAMES)]
+        self._versions.append([os.path.basename(version_path), daily_dir, chunks, skipped, None])
+        self._submit_ready_sheets()
+
+    def _submit_ready_sheets(self, wait=False):
+        for version in self._versions:
+            label, daily_dir, chunks, skipped, sheet = version
+            if sheet is not None or not (wait or all(f.done() for f in chunks)): continue
+            results = [r for f in chunks for r in f.result()]
+            proxies = [path for path, status in results if path]
+            version[4] = self._executor.submit(build_contact_sheet, proxies, os.path.join(daily_dir, "contact_sheet.jpg"), self.config_data.get("daily_contact_sheet_tiles", 48))
+            version.append(results)
+
+    def finish(self):
+        """Blocks until every daily is written. Returns True if all frames and sheets succeeded."""
+        if self._executor is None: return True
+        success = True
+        try:
+            self._submit_ready_sheets(wait=True)
+            for label, daily_dir, chunks, skipped, sheet, results in self._versions:
+                errors = [status for path, status in results if not path]
+                made = sum(1 for path, status in results if status == "made"); cached = sum(1 for path, status in results if status == "cached")
+                try: sheet_path = sheet.result()
+                except Exception as e: sheet_path = None; errors.append(f"contact sheet: {e}")
+                self.log_callback(f"Daily '{label}': {made} proxies made, {cached} cached" + (f", {skipped} files skipped (not PNG/JPEG/TIFF)" if skipped else "") + (f", contact sheet {sheet_path}" if sheet_path else ""))
+                for error in errors[:10]: self.log_callback(f"  ERROR: {error}")
+                success = success and not errors
+        finally:
+            self._executor.shutdown(); self._executor = None; self._versions = []
+        return success
+
+    def cancel(self):
+        if self._executor is not None: self._executor.shutdown(wait=False, cancel_futures=True); self._executor = None; self._versions = []
+
+# /////////////////////////////////////////////
+# NEW - Version Thumbnails
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# The publisher tree shows the middle frame of each version (PNG/JPEG/TIFF, as for dailies).
+# Thumbnails are made on a small process pool and kept as JPEGs in cache_dir/thumbnails, named
+# <hash of the version path>-<hash of its stamp>. The stamp is the newest mtime of the version
+# folder and its sub-folders plus the chosen frame and its mtime, so frames re-rendered into an
+# AOV folder (which leaves the version folder's mtime alone) still give a new thumbnail. Working
+# the stamp out needs a walk, so a cached thumbnail is shown at once and checked on the pool once
+# per session and version mtime; a stale one is replaced. The folder is an LRU bounded by
+# 'thumbnail_cache_mb': a hit bumps the file's mtime and the least recently used files go once
+# the total passes the limit. Only rows in view are requested.
+THUMBNAIL_ROLE = QtCore.Qt.UserRole + 2 # QPixmap drawn by ThumbnailDelegate; a null one means the version has no frames to show
+
+def thumbnail_source(version_path):
+    """(frame, stamp): the middle PNG/JPEG/TIFF frame of a version (its own folder first, then sub-folders in name order)
+    or None, and the stamp the cached thumbnail is named by (see the section comment)."""
+    frame = None; newest = 0.0
+    for dirpath, dirnames, filenames in os.walk(version_path):
+        try: newest = max(newest, os.stat(dirpath).st_mtime)
+        except OSError: pass
+        if frame is None:
+            frames = sorted(name for name in filenames if name.lower().endswith(DAILY_FRAME_EXTENSIONS))
+            if frames: frame = os.path.join(dirpath, frames[len(frames) // 2])
+        dirnames.sort()
+    try: frame_mtime = os.stat(frame).st_mtime if frame else 0
+    except OSError: frame_mtime = 0
+    return frame, f"{newest}|{frame}|{frame_mtime}"
+
+def make_version_thumbnail(version_path, cache_dir, size, current=None):
+    """Writes the middle frame of a version into cache_dir as a JPEG fitting size x size (an empty file when it has no
+    such frames) and returns its path; None when current, the name of the cached one, is still up to date. Runs in a worker process."""
+    frame, stamp = thumbnail_source(version_path); thumb_path = ThumbnailCache.file_path(cache_dir, version_path, stamp)
+    if os.path.basename(thumb_path) == current: return None
+    temp_path = f"{thumb_path}.{os.getpid()}.tmp"
+    try:
+        if frame:
+            with _open_frame_rgb(frame, size) as image: image.save(temp_path, "JPEG", quality=80)
+        else: open(temp_path, 'wb').close() # Remembered, so the version is not walked again
+        os.replace(temp_path, thumb_path)
+    finally:
+        try: os.remove(temp_path) # Only still there if writing or replacing failed
+        except OSError: pass
+    return thumb_path
+
+class ThumbnailCache:
+    """Size-bounded LRU of thumbnail files in one folder (see the section comment)."""
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir; self.max_bytes = max_bytes; self._sizes = {}; self._names = {}; self.total = 0 # file name -> size; version hash -> file name
+        os.makedirs(cache_dir, exist_ok=True)
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".jpg"): self._sizes[entry.name] = entry.stat().st_size; self._names[entry.name.split("-")[0]] = entry.name
+        self.total = sum(self._sizes.values())
+
+    @classmethod
+    def from_config(cls, config_data):
+        return cls(os.path.join(get_cache_dir(config_data), "thumbnails"), config_data.get("thumbnail_cache_mb", 256) * 1024 * 1024)
+
+    @staticmethod
+    def version_hash(version_path): return hashlib.blake2b(version_path.encode("utf-8"), digest_size=12).hexdigest()
+
+    @staticmethod
+    def file_path(cache_dir, version_path, stamp):
+        return os.path.join(cache_dir, f"{ThumbnailCache.version_hash(version_path)}-{hashlib.blake2b(stamp.encode('utf-8'), digest_size=8).hexdigest()}.jpg")
+
+    def get(self, version_path):
+        """Path of the latest cached thumbnail of a version, marked as just used, or None. It may be stale; see make_version_thumbnail."""
+        name = self._names.get(self.version_hash(version_path))
+        if name is None: return None
+        try: os.utime(os.path.join(self.cache_dir, name))
+        except OSError: self._forget(name); return None # Evicted by another instance
+        return os.path.join(self.cache_dir, name)
+
+    def _forget(self, name):
+        self.total -= self._sizes.pop(name, 0)
+        if self._names.get(name.split("-")[0]) == name: del self._names[name.split("-")[0]]
+
+    def add(self, path):
+        """Registers a thumbnail a worker wrote in place of the version's older one and evicts the least recently used ones when over the limit."""
+        name = os.path.basename(path); size = os.path.getsize(path); older = self._names.get(name.split("-")[0])
+        if older and older != name:
+            try: os.remove(os.path.join(self.cache_dir, older))
+            except OSError: pass
+            self._forget(older)
+        self.total += size - self._sizes.get(name, 0); self._sizes[name] = size; self._names[name.split("-")[0]] = name
+        if self.total > self.max_bytes: self.evict(int(self.max_bytes * 0.9)) # Some headroom, so eviction does not run on every add
+
+    def evict(self, target_bytes):
+        entries = []
+        for name in self._sizes:
+            try: entries.append((os.stat(os.path.join(self.cache_dir, name)).st_mtime, name))
+            except OSError: entries.append((0, name))
+        for mtime, name in sorted(entries):
+            if self.total <= target_bytes: break
+            try: os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError: pass
+            except OSError as e: print(f"Could not remove thumbnail {name}: {e}"); continue
+            self._forget(name)
+
+class ThumbnailLoader(QtCore.QObject):
+    """
+    Thumbnails for the publisher tree. request() answers from memory or the disk cache at once,
+    else queues the version on the process pool and thumbnail_ready(version path, pixmap) follows.
+    A cached answer is also queued, once per version mtime, to be checked against the frames, and
+    thumbnail_ready follows only if it had to be remade. cancel() drops the queued ones when the
+    shot changes. Without Pillow nothing is made or checked.
+    """
+    thumbnail_ready = QtCore.Signal(str, QtGui.QPixmap)
+    _made = QtCore.Signal(str, float, str, str) # version path, mtime, thumbnail path, error; emitted from the pool's thread
+
+    def __init__(self, config_data, parent=None):
+        super(ThumbnailLoader, self).__init__(parent)
+        self.size = config_data.get("thumbnail_size", 96); self.box = QtCore.QSize(self.size, round(self.size * 9 / 16))
+        self.workers = config_data.get("thumbnail_workers", 2); self.cache = ThumbnailCache.from_config(config_data)
+        self.memory = LRUCache(config_data.get("thumbnail_memory_items", 500)) # version path -> QPixmap
+        self.enabled = importlib.util.find_spec("PIL") is not None # Pillow itself is only imported by the workers
+        self._executor = None; self._pending = {}; self._checked = set() # (version path, mtime) a worker made or confirmed this session
+        self._made.connect(self._on_made)
+
+    def request(self, version_path, mtime):
+        """The thumbnail (a null pixmap if the version has no frames), or None while it is being made."""
+        from concurrent.futures import ProcessPoolExecutor
+        pixmap = self.memory.get(version_path)
+        if pixmap is None:
+            cached = self.cache.get(version_path)
+            if cached: pixmap = self._load(version_path, cached)
+        if (version_path, mtime) in self._checked or not self.enabled or version_path in self._pending: return pixmap
+        if self._executor is None: self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        current = self.cache.get(version_path) if pixmap is not None else None
+        future = self._executor.submit(make_version_thumbnail, version_path, self.cache.cache_dir, self.size, current and os.path.basename(current))
+        self._pending[version_path] = future
+        future.add_done_callback(lambda f: None if f.cancelled() else self._made.emit(version_path, mtime, "" if f.exception() else f.result() or "", str(f.exception() or "")))
+        return pixmap
+
+    def _load(self, version_path, thumb_path):
+        pixmap = QtGui.QPixmap(thumb_path)
+        if not pixmap.isNull(): pixmap = pixmap.scaled(self.box, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+        self.memory.put(version_path, pixmap)
+        return pixmap
+
+    def _on_made(self, version_path, mtime, thumb_path, error):
+        self._pending.pop(version_path, None); self._checked.add((version_path, mtime))
+        if error:
+            print(f"Could not make thumbnail for {version_path}: {error}")
+            if self.memory.get(version_path) is not None: return # Keep showing the cached one
+            pixmap = QtGui.QPixmap(); self.memory.put(version_path, pixmap)
+        elif not thumb_path: return # The cached one is up to date
+        else: self.cache.add(thumb_path); pixmap = self._load(version_path, thumb_path)
+        self.thumbnail_ready.emit(version_path, pixmap)
+
+    def cancel(self):
+        for future in self._pending.values(): future.cancel()
+        self._pending.clear()
+
+    def close(self):
+        if self._executor is not None: self._executor.shutdown(wait=False, cancel_futures=True); self._executor = None
+        self._pending.clear()
+
+class ThumbnailDelegate(QtWidgets.QStyledItemDelegate):
+    """Draws the THUMBNAIL_ROLE pixmap of version rows, centred, with a dim placeholder while it loads."""
+    def __init__(self, box, parent=None):
+        super(ThumbnailDelegate, self).__init__(parent); self.box = box
+
+    def sizeHint(self, option, index):
+        hint = super(ThumbnailDelegate, self).sizeHint(option, index)
+        if index.siblingAtColumn(0).data(QtCore.Qt.UserRole): hint.setHeight(max(hint.height(), self.box.height() + 4))
+        return hint
+
+    def paint(self, painter, option, index):
+        super(ThumbnailDelegate, self).paint(painter, option, index)
+        if not index.siblingAtColumn(0).data(QtCore.Qt.UserRole): return # Render layer rows
+        pixmap = index.data(THUMBNAIL_ROLE); size = pixmap.size() if isinstance(pixmap, QtGui.QPixmap) else self.box
+        rect = QtCore.QRect(0, 0, size.width(), size.height()); rect.moveCenter(option.rect.center())
+        if pixmap is None: painter.fillRect(rect, QtGui.QColor(255, 255, 255, 15))
+        elif not pixmap.isNull(): painter.drawPixmap(rect, pixmap)
+
+# /////////////////////////////////////////////
+# NEW - Staged Publish (Lock + Atomic Commit)
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# A publish is copied into <render>/.xpub_staging/<version>@<token> on the destination volume
+# while holding <render>/.xpub_staging/<version>.lock, verified against the source, and then
+# renamed onto <render>/<version>. A version folder that exists is therefore complete, and
+# dot-folders are never listed as renders or versions. A first publish is one atomic rename.
+# Republishing an existing version takes two (the old folder aside, staging in), on Windows as
+# on POSIX, since neither renames over a non-empty folder; for that instant the version is
+# absent, which readers take as not published. Like the robocopy publish it replaced, a
+# republish merges: published files the new source lacks are hardlinked into staging first,
+# unless 'publish_replace_versions' asks for the version to be replaced as a whole.
+PUBLISH_STAGING_DIR = ".xpub_staging"
+
+def get_staging_root(dest_version_path):
+    return os.path.join(os.path.dirname(os.path.normpath(dest_version_path)), PUBLISH_STAGING_DIR)
+
+class PublishLock:
+    """
+    Lock on one publish destination, shared by every workstation and the publish service: a lock
+    file created with O_EXCL, which holds even over SMB/NFS. While held, a heartbeat thread
+    touches it; a lock whose heartbeat is older than stale_after seconds, or whose process on
+    this host is gone, is broken by the next writer.
+    """
+    def __init__(self, dest_version_path, stale_after=300, heartbeat=30, poll=1.0, path=None):
+        self.path = path or os.path.join(get_staging_root(dest_version_path), os.path.basename(os.path.normpath(dest_version_path)) + ".lock")
+        self.stale_after = stale_after; self.heartbeat = heartbeat; self.poll = poll
+        self.owner = {"user": os.environ.get('USER') or os.environ.get('USERNAME', 'N/A'), "host": socket.gethostname(), "pid": os.getpid(),
+                      "since": datetime.datetime.now().strftime(LOG_DATETIME_FORMAT), "token": uuid.uuid4().hex}
+        self._stop = threading.Event(); self._thread = None
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'r', encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError): return None
+
+    def holder(self):
+        """Owner dict of the current lock file, or None."""
+        return self._read(self.path)
+
+    def _is_stale(self, holder):
+        try: age = time.time() - os.stat(self.path).st_mtime
+        except OSError: return False
+        if age > self.stale_after: return True
+        if holder and holder.get("host") == socket.gethostname() and holder.get("pid") != os.getpid():
+            import psutil
+            return not psutil.pid_exists(holder.get("pid", 0))
+        return False
+
+    def acquire(self, timeout=600, should_abort=None, on_wait=None):
+        """Waits up to timeout seconds for the lock. on_wait(holder) is called once if it is busy. Returns True once held."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        deadline = time.monotonic() + timeout; reported = False
+        while True:
+            try: fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                holder = self.holder()
+                if self._is_stale(holder):
+                    grave = f"{self.path}.{uuid.uuid4().hex[:8]}.stale" # Rename first so only one writer breaks it
+                    try: os.rename(self.path, grave); os.remove(grave)
+                    except OSError: pass
+                    continue
+                if on_wait and not reported: on_wait(holder); reported = True
+                if time.monotonic() >= deadline or (should_abort and should_abort()): return False
+                time.sleep(self.poll); continue
+            with os.fdopen(fd, 'w', encoding="utf-8") as f: json.dump(self.owner, f)
+            self._stop.clear(); self._thread = threading.Thread(target=self._beat, name="xPubLockHeartbeat", daemon=True); self._thread.start()
+            return True
+
+    def _beat(self):
+        while not self._stop.wait(self.heartbeat):
+            try: os.utime(self.path)
+            except OSError: pass
+
+    def release(self):
+        self._stop.set()
+        if self._thread: self._thread.join(); self._thread = None
+        holder = self.holder()
+        if holder and holder.get("token") == self.owner["token"]:
+            try: os.remove(self.path)
+            except OSError as e: print(f"Could not remove publish lock {self.path}: {e}")
+
+def describe_lock_holder(holder):
+    return f"{holder.get('user', '?')}@{holder.get('host', '?')} (since {holder.get('since', '?')})" if holder else "another publish"
+
+def new_staging_dir(dest_version_path):
+    """Unused staging path for dest. Not created here, so the dedup stage still sees a fresh folder."""
+    return os.path.join(get_staging_root(dest_version_path), f"{os.path.basename(os.path.normpath(dest_version_path))}@{uuid.uuid4().hex[:8]}")
+
+def sweep_staging(dest_version_path, log_callback=print, keep=None):
+    """Removes staging leftovers of dest from crashed or aborted publishes. Only call while holding dest's PublishLock.
+    Folders marked '@failed-' hold the only copy of a failed move and are kept, as is keep (a move being resumed)."""
+    version = os.path.basename(os.path.normpath(dest_version_path)); staging_root = get_staging_root(dest_version_path)
+    for name in list_subdirs(staging_root):
+        if name.startswith(version + "@") and not name.startswith(version + "@failed-") and not (keep and os.path.join(staging_root, name) == os.path.normpath(keep)):
+            log_callback(f"  Removing stale staging folder '{name}'"); shutil.rmtree(os.path.join(staging_root, name), ignore_errors=True)
+
+def snapshot_manifest(root):
+    """{relative path: size} of every file under root."""
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try: manifest[os.path.relpath(path, root)] = os.stat(path).st_size
+            except OSError: continue
+    return manifest
+
+def verify_staged_version(manifest, staging_dir):
+    """Problems (missing or wrong-sized files) of staging_dir against the source manifest; empty when complete."""
+    staged = snapshot_manifest(staging_dir); problems = []
+    for rel, size in manifest.items():
+        if rel not in staged: problems.append(f"missing '{rel}'")
+        elif staged[rel] != size: problems.append(f"'{rel}' is {staged[rel]} bytes, expected {size}")
+    return problems
+
+def carry_over_published_files(dest_version_path, staging_dir, manifest):
+    """Hardlinks into staging_dir (copies where links are refused) every file of an existing dest that the new source,
+    given as its manifest, does not have, so a republish of part of a version keeps the frames already published.
+    Returns the relative paths carried over."""
+    carried = []
+    for rel in snapshot_manifest(dest_version_path) if os.path.isdir(dest_version_path) else {}:
+        target = os.path.join(staging_dir, rel)
+        if rel in manifest or os.path.exists(target): continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try: os.link(os.path.join(dest_version_path, rel), target)
+        except OSError: shutil.copy2(os.path.join(dest_version_path, rel), target)
+        carried.append(rel)
+    return carried
+
+def commit_staged_version(staging_dir, dest_version_path):
+    """Publishes staging_dir as dest: one rename for a new version. An existing dest is renamed aside first, so replacing
+    one takes two renames and is not atomic (see the section comment); the old folder is deleted once the new one is in place."""
+    os.makedirs(staging_dir, exist_ok=True) # An empty source never creates it
+    replaced = None
+    if os.path.exists(dest_version_path):
+        replaced = os.path.join(get_staging_root(dest_version_path), f"{os.path.basename(os.path.normpath(dest_version_path))}@replaced-{uuid.uuid4().hex[:8]}")
+        os.rename(dest_version_path, replaced)
+    try: os.rename(staging_dir, dest_version_path)
+    except OSError:
+        if replaced: os.rename(replaced, dest_version_path)
+        raise
+    if replaced: shutil.rmtree(replaced, ignore_errors=True)
+
+def move_journal_path(dest_version_path):
+    return os.path.join(get_staging_root(dest_version_path), os.path.basename(os.path.normpath(dest_version_path)) + ".journal")
+
+class MoveJournal:
+    """
+    Append-only record of a streaming move into one staging folder. The first line names the source
+    and the staging folder; every further line is a file whose staged copy was verified, written and
+    fsynced before the source file is deleted. Whatever it lists is therefore safe in staging, and a
+    move that stopped half way resumes from it exactly.
+    """
+    def __init__(self, path):
+        self.path = path; self._file = None; self._intact = None # Bytes up to the end of the last complete line, once loaded
+
+    def load(self):
+        """(header or None, {rel: size}). A torn last line from a crash is ignored, and resume() cuts it off."""
+        header, released = None, {}; self._intact = 0
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"): break
+                    try: record = json.loads(line)
+                    except ValueError: break
+                    if header is None: header = record
+                    else: released[record["rel"]] = record["size"]
+                    self._intact += len(line)
+        except OSError: pass
+        return header, released
+
+    def start(self, source, staging):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'w', encoding="utf-8"); self.release([], header={"source": source, "staging": staging, "started": datetime.datetime.now().strftime(LOG_DATETIME_FORMAT)})
+
+    def resume(self):
+        if self._intact is not None: # Lines appended after a torn one would never be read back
+            with open(self.path, 'r+b') as f: f.truncate(self._intact)
+        self._file = open(self.path, 'a', encoding="utf-8")
+
+    def release(self, entries, header=None):
+        """Durably records (rel, size) entries; returns once they are on disk."""
+        lines = ([json.dumps(header)] if header else []) + [json.dumps({"rel": rel, "size": size}) for rel, size in entries]
+        self._file.write("".join(line + "\n" for line in lines)); self._file.flush(); os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file: self._file.close(); self._file = None
+
+    def remove(self):
+        self.close()
+        try: os.remove(self.path)
+        except FileNotFoundError: pass
+
+# /////////////////////////////////////////////
+# NEW - Transfer Priority
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# Publishes and purges can run below the artist's interactive work. A priority name maps to an
+# I/O class and a CPU niceness ('priority_levels' overrides or adds levels). On Linux both are
+# per thread, so only the engine's and the archiver's threads are lowered, not the GUI, and any
+# thread or process they start inherits it. On Windows only child processes (robocopy) are
+# lowered, to the matching I/O priority and priority class.
+PRIORITY_LEVELS = {"Normal": {"io_class": "best-effort", "io_level": 4, "nice": 0},
+                   "Low": {"io_class": "best-effort", "io_level": 7, "nice": 10},
+                   "Idle": {"io_class": "idle", "nice": 19}}
+
+def priority_levels(config_data):
+    return {**PRIORITY_LEVELS, **config_data.get("priority_levels", {})}
+
+def apply_priority(settings, pid=None):
+    """Sets the I/O class and niceness of the calling thread (Linux) or of process pid. Returns a list of problems."""
+    import psutil # Deferred like the other psutil users
+    linux = sys.platform.startswith("linux")
+    if pid is None and not linux: return [] # Windows priorities are per process; never lower the GUI's
+    try: process = psutil.Process(pid or threading.get_native_id()) # A thread id addresses one thread on Linux
+    except psutil.Error as e: return [str(e)]
+    problems, io_class, nice = [], settings.get("io_class", "best-effort"), settings.get("nice", 0)
+    try:
+        if linux: process.ionice(psutil.IOPRIO_CLASS_IDLE) if io_class == "idle" else process.ionice(psutil.IOPRIO_CLASS_BE, settings.get("io_level", 4))
+        else: process.ionice(psutil.IOPRIO_VERYLOW if io_class == "idle" else psutil.IOPRIO_LOW if settings.get("io_level", 4) >= 6 else psutil.IOPRIO_NORMAL)
+    except (psutil.Error, OSError, AttributeError) as e: problems.append(f"I/O class not set: {e}")
+    try:
+        if linux: process.nice(nice)
+        else: process.nice(psutil.IDLE_PRIORITY_CLASS if nice >= 19 else psutil.BELOW_NORMAL_PRIORITY_CLASS if nice > 0 else psutil.NORMAL_PRIORITY_CLASS)
+    except psutil.AccessDenied: problems.append(f"CPU niceness stays at {process.nice()}; raising it again needs admin rights")
+    except (psutil.Error, OSError, AttributeError) as e: problems.append(f"CPU niceness not set: {e}")
+    return problems
+
+def lower_worker_process(settings):
+    """ProcessPoolExecutor initializer: the whole worker process runs at settings."""
+    apply_priority(settings, os.getpid())
+
+class PriorityControl:
+    """
+    Priority of one running job. Worker threads call apply_here() before each file and pick up a
+    change made with set() (from the ProgressDialog, on another thread) on their next file; set()
+    re-prioritizes registered child processes straight away. Each problem is logged once.
+    """
+    def __init__(self, config_data, name="Normal", log_callback=print):
+        self.levels = priority_levels(config_data); self.name = name if name in self.levels else "Normal"; self.log_callback = log_callback
+        self._generation = 0; self._local = threading.local(); self._pids = set(); self._reported = set(); self._lock = threading.Lock()
+
+    def set(self, name):
+        if name not in self.levels: self.log_callback(f"Unknown priority '{name}'"); return
+        with self._lock: self.name = name; self._generation += 1; pids = list(self._pids)
+        for pid in pids: self._report(apply_priority(self.levels[name], pid))
+        self.log_callback(f"--- PRIORITY: {name.upper()} ---")
+
+    def apply_here(self):
+        generation = self._generation
+        if getattr(self._local, "generation", None) == generation: return
+        self._local.generation = generation
+        if generation or self.name != "Normal": self._report(apply_priority(self.levels[self.name]))
+
+    def add_process(self, pid):
+        with self._lock: self._pids.add(pid)
+        if self._generation or self.name != "Normal": self._report(apply_priority(self.levels[self.name], pid))
+
+    def remove_process(self, pid):
+        with self._lock: self._pids.discard(pid)
+
+    def _report(self, problems):
+        for problem in problems:
+            if problem not in self._reported: self._reported.add(problem); self.log_callback(f"  WARNING: Priority {self.name}: {problem}")
+
+def io_scheduler(path):
+    """Block I/O scheduler of the device holding path (Linux), e.g. 'bfq'; I/O classes only take effect under bfq/cfq. None when unknown."""
+    try:
+        device = os.stat(path).st_dev; block = f"/sys/dev/block/{os.major(device)}:{os.minor(device)}"
+        for queue in (os.path.join(block, "queue", "scheduler"), os.path.join(block, "..", "queue", "scheduler")): # Partitions use their disk's queue
+            if os.path.exists(queue):
+                with open(queue) as f: text = f.read()
+                match = re.search(r"\[(\w[\w-]*)\]", text)
+                return match.group(1) if match else text.strip()
+    except (OSError, AttributeError): pass
+    return None
+
+def _drop_file_cache(path):
+    """Asks the kernel to forget path's cached pages so the next read goes to disk (Linux; a no-op elsewhere)."""
+    if not hasattr(os, "posix_fadvise"): return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try: os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally: os.close(fd)
+    except OSError: pass
+
+BENCH_MARKER = ".xpub_bench" # Benchmarks only write to, and the CLI only removes, folders carrying it
+
+def claim_bench_folder(root):
+    """Creates root, or reuses one an earlier benchmark made, and marks it. Raises ValueError for any other non-empty folder."""
+    os.makedirs(root, exist_ok=True)
+    if os.listdir(root) and not os.path.exists(os.path.join(root, BENCH_MARKER)): raise ValueError(f"'{root}' is not empty and is not a benchmark folder")
+    open(os.path.join(root, BENCH_MARKER), 'w').close()
+
+def remove_bench_folder(root):
+    """Deletes a benchmark folder, but only one that carries BENCH_MARKER."""
+    if os.path.exists(os.path.join(root, BENCH_MARKER)): shutil.rmtree(root, ignore_errors=True)
+
+def benchmark_priority(root, config_data, levels=("Normal", "Low", "Idle"), data_mb=512, file_mb=8, read_kb=64, log_callback=print):
+    """
+    Foreground/background benchmark in a scratch folder: an interactive-style reader does random
+    uncached reads of one file while a TransferEngine copies data_mb at each priority. Returns one
+    row per run (the first without a background copy) with the reader's latency and the copy's MB/s.
+    """
+    claim_bench_folder(root); rng = random.Random(7)
+    foreground, source = os.path.join(root, "foreground.bin"), os.path.join(root, "source")
+    if not os.path.exists(foreground) or os.path.getsize(foreground) < 256 * 1024 * 1024:
+        log_callback("Writing foreground file...")
+        with open(foreground, 'wb') as f:
+            for _ in range(256): f.write(os.urandom(1024 * 1024))
+    if len(snapshot_manifest(source)) != max(1, data_mb // file_mb):
+        log_callback(f"Writing {data_mb} MB background source...")
+        shutil.rmtree(source, ignore_errors=True); os.makedirs(source)
+        for i in range(max(1, data_mb // file_mb)):
+            with open(os.path.join(source, f"frame.{1001 + i}.exr"), 'wb') as f: f.write(os.urandom(file_mb * 1024 * 1024))
+    bench_config = dict(config_data, staged_publish=False, throughput_history=False, auto_tune_transfers=False, log_flush_ms=1000)
+    block, blocks = read_kb * 1024, os.path.getsize(foreground) // (read_kb * 1024)
+
+    def measure(level):
+        for path in [foreground] + [os.path.join(source, rel) for rel in snapshot_manifest(source)]: _drop_file_cache(path)
+        dest = os.path.join(root, "dest"); shutil.rmtree(dest, ignore_errors=True)
+        outcome, latencies = {}, []
+        def background():
+            start = time.perf_counter()
+            engine = TransferEngine([(source, dest)], False, "Fast", bench_config, log_callback=lambda m: None, priority=level)
+            outcome.update(ok=engine.run(), seconds=time.perf_counter() - start)
+        worker = threading.Thread(target=background, name=f"xPubBench-{level}") if level else None
+        if worker: worker.start()
+        deadline = time.monotonic() + 5 # Without a copy: a fixed five-second sample
+        with open(foreground, 'rb', buffering=0) as f:
+            while (worker.is_alive() if worker else time.monotonic() < deadline):
+                offset = rng.randrange(blocks) * block
+                if hasattr(os, "posix_fadvise"): os.posix_fadvise(f.fileno(), offset, block, os.POSIX_FADV_DONTNEED)
+                started = time.perf_counter(); f.seek(offset); f.read(block); latencies.append((time.perf_counter() - started) * 1000)
+                time.sleep(0.002) # Interactive, not a second bulk reader
+        if worker: worker.join()
+        latencies.sort(); shutil.rmtree(dest, ignore_errors=True)
+        return {"priority": level or "(no copy)", "reads": len(latencies), "p50_ms": size_percentile(latencies, 0.5), "p99_ms": size_percentile(latencies, 0.99),
+                "copy_mbps": data_mb / outcome["seconds"] if outcome.get("ok") else None, "copy_s": outcome.get("seconds")}
+
+    rows = []
+    for level in (None,) + tuple(levels):
+        log_callback(f"Measuring {level or 'baseline'}..."); rows.append(measure(level))
+    return rows
+
+# /////////////////////////////////////////////
+# NEW - Small File Batching
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# Thousands of tiny sidecars (AOV JSON, thumbnails) cost a create/write/close round trip each on
+# a remote share. Files under 'small_file_kb' are packed into in-memory tar batches (up to
+# 'small_batch_mb' / 'small_batch_files' each), written to the destination as one sequential
+# file and unpacked where the data lands by the publish service ('small_file_unpack' "service",
+# which needs 'service_url'; without one nothing is batched). "local" unpacks in this process,
+# which still creates every file over the link; it is there for testing and comparison. Large
+# files keep the normal parallel path (robocopy with /MIN, or the Python copier).
+SMALL_BATCH_PREFIX = ".xpub_batch_"
+
+def plan_small_batches(manifest, exclude, threshold, batch_bytes, batch_files):
+    """Groups the files below threshold (minus exclude) into batches. Returns (batches [[rel, ...]], set of batched rels)."""
+    small = sorted(rel for rel, size in manifest.items() if size < threshold and rel not in exclude)
+    batches, current, current_bytes = [], [], 0
+    for rel in small:
+        if current and (len(current) >= batch_files or current_bytes + manifest[rel] > batch_bytes): batches.append(current); current, current_bytes = [], 0
+        current.append(rel); current_bytes += manifest[rel]
+    if current: batches.append(current)
+    return batches, set(small)
+
+def build_small_batch(source, rels):
+    """Uncompressed PAX tar of source's rels with a CRC per member, built in memory. Returns bytes."""
+    import tarfile
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w", format=tarfile.PAX_FORMAT) as tar:
+        for rel in rels:
+            with open(os.path.join(source, rel), 'rb') as f: data = f.read(); st = os.fstat(f.fileno())
+            member = tarfile.TarInfo(rel.replace(os.sep, "/")); member.size = len(data); member.mtime = st.st_mtime; member.mode = stat.S_IMODE(st.st_mode)
+            member.pax_headers = {"XPUB.crc32": str(zlib.crc32(data))}
+            tar.addfile(member, io.BytesIO(data))
+    return buffer.getvalue()
+
+def unpack_small_batch(archive, dest):
+    """Extracts a batch (a path or the bytes themselves) into dest, checking each member's CRC. Returns {member name: size}.
+    Members are refused unless they are plain files whose resolved target lies inside dest."""
+    import tarfile
+    unpacked = {}; real_dest = os.path.realpath(dest)
+    with tarfile.open(fileobj=io.BytesIO(archive), mode="r") if isinstance(archive, bytes) else tarfile.open(archive, "r") as tar:
+        for member in tar:
+            name = member.name.replace("\\", "/"); parts = name.split("/")
+            if not member.isfile() or name.startswith("/") or any(part in ("", ".", "..") for part in parts) or ":" in name: raise ValueError(f"Unsafe batch member '{member.name}'")
+            target = os.path.join(dest, *parts)
+            if os.path.commonpath([os.path.realpath(target), real_dest]) != real_dest: raise ValueError(f"Batch member '{member.name}' resolves outside '{dest}'")
+            data = tar.extractfile(member).read()
+            if "XPUB.crc32" in member.pax_headers and int(member.pax_headers["XPUB.crc32"]) != zlib.crc32(data): raise ValueError(f"CRC mismatch in batch member '{member.name}'")
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f: f.write(data)
+            os.utime(target, (member.mtime, member.mtime)); os.chmod(target, member.mode or stat.S_IWRITE | stat.S_IREAD)
+            unpacked[name] = len(data)
+    return unpacked
+
+def benchmark_small_files(root, config_data, small_files=3000, small_kb=8, large_files=4, large_mb=16, latency_ms=5.0, log_callback=print):
+    """
+    Copies one synthetic version (many small files and a few large ones) per file, batched with
+    local unpacking and batched with unpacking by an in-process publish service. latency_ms is
+    added per file created over the "link", as AsyncScanner does for scans. Returns result rows.
+    """
+    claim_bench_folder(root); source = os.path.join(root, "source")
+    if len(snapshot_manifest(source)) != small_files + large_files:
+        log_callback(f"Writing {small_files} small and {large_files} large files..."); shutil.rmtree(source, ignore_errors=True)
+        for i in range(small_files):
+            path = os.path.join(source, f"aov{i % 8}", f"meta.{1001 + i}.json"); os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f: f.write(os.urandom(small_kb * 1024))
+        for i in range(large_files):
+            with open(os.path.join(source, f"beauty.{1001 + i}.exr"), 'wb') as f: f.write(os.urandom(large_mb * 1024 * 1024))
+    expected = snapshot_manifest(source)
+    service = PublishService(dict(config_data, project_root=root, cache_dir=os.path.join(root, "cache")), host="127.0.0.1"); service.port = 0 # Any free port
+    threading.Thread(target=service.serve_forever, name="xPubBenchService", daemon=True).start()
+    while service.server is None: time.sleep(0.01)
+    modes = [("per file", {"small_file_batching": False}), ("batched, local unpack", {"small_file_batching": True, "small_file_unpack": "local"}),
+             ("batched, service unpack", {"small_file_batching": True, "small_file_unpack": "service", "service_url": f"http://127.0.0.1:{service.server.server_port}", "service_token": ""})]
+    rows = []
+    try:
+        for name, overrides in modes:
+            log_callback(f"Copying {name}..."); dest = os.path.join(root, "dest"); shutil.rmtree(dest, ignore_errors=True)
+            bench_config = dict(config_data, staged_publish=False, throughput_history=False, auto_tune_transfers=False, log_flush_ms=1000, **overrides)
+            engine = TransferEngine([(source, dest)], False, "Fast", bench_config, log_callback=lambda m: None); engine.latency = latency_ms / 1000.0
+            start = time.perf_counter(); ok = engine.run(); seconds = time.perf_counter() - start
+            rows.append({"mode": name, "ok": ok and snapshot_manifest(dest) == expected, "seconds": seconds, "files_per_s": len(expected) / seconds})
+    finally: service.server.shutdown()
+    shutil.rmtree(os.path.join(root, "dest"), ignore_errors=True)
+    return rows
+
+# /////////////////////////////////////////////
+# NEW - Transfer Retries
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# A file that fails is retried on its own with jittered exponential backoff. If it still fails
+# it is quarantined: the rest of the version and of the publish carry on, and the quarantined
+# files are tried once more after the last job. A job whose quarantine grows past its error
+# budget ('transfer_error_budget_files', or 'transfer_error_budget_pct' of its files if more)
+# is failing as a whole and stops the publish, as any failed job does.
+class RetryPolicy:
+    """
+    Up to 'transfer_retries' extra attempts per file. Each wait is random between 0 and
+    retry_base_s * 2^attempt (capped at retry_max_s), so threads failing against the same busy
+    NAS spread out instead of retrying in step.
+    """
+    def __init__(self, retries=4, base=0.5, cap=30.0, rng=None):
+        self.retries = max(0, retries); self.base = base; self.cap = cap; self._rng = rng or random.Random()
+
+    @classmethod
+    def from_config(cls, config_data):
+        return cls(config_data.get("transfer_retries", 4), config_data.get("retry_base_s", 0.5), config_data.get("retry_max_s", 30.0))
+
+    def backoff(self, attempt): return self._rng.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+    def run(self, func, wait=time.sleep, on_retry=None, retryable=is_transient_error):
+        """Calls func() until it returns. wait(seconds) sleeps and returns True to give up early (abort). Errors retryable()
+        rejects are raised at once; otherwise the last error is re-raised once the retries are used up."""
+        for attempt in itertools.count():
+            try: return func()
+            except Exception as e:
+                if attempt >= self.retries or not retryable(e): raise
+                delay = self.backoff(attempt)
+                if on_retry: on_retry(attempt + 1, delay, e)
+                if wait(delay): raise
+
+def error_budget(config_data, file_count):
+    """Files a job may quarantine before it counts as failed."""
+    return max(config_data.get("transfer_error_budget_files", 3), math.ceil(file_count * config_data.get("transfer_error_budget_pct", 1.0) / 100))
+
+ROBOCOPY_FILE_ERROR = re.compile(r"ERROR \d+ \(0x[0-9A-Fa-f]+\) (?:Copying|Accessing|Creating|Changing|Deleting) (?:File|Source File|Destination File)\s+(.+)$")
+
+# /////////////////////////////////////////////
+# NEW - Throughput History & Transfer Tuning
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+def storage_root(path):
+    """Volume a path lives on: 's3://bucket', a UNC share, a drive letter or the first folder of a POSIX path."""
+    if is_object_store_path(path): return OBJECT_STORE_SCHEME + ObjectStoreBackend.split(path)[0]
+    drive, rest = os.path.splitdrive(os.path.normpath(path))
+    if drive: return drive.upper() if len(drive) == 2 else drive.lower()
+    parts = [p for p in rest.split(os.sep) if p]
+    return os.sep + parts[0] if parts else os.sep
+
+def transfer_route(source, dest): return f"{storage_root(source)} -> {storage_root(dest)}"
+
+def size_percentile(sorted_sizes, fraction):
+    return sorted_sizes[min(len(sorted_sizes) - 1, int(len(sorted_sizes) * fraction))] if sorted_sizes else 0
+
+class AIMDTuner:
+    """
+    Additive-increase / multiplicative-decrease concurrency on observed MB/s. Each observe()
+    compares a window with the previous one: a gain beyond tolerance adds 'increase' threads,
+    a drop beyond tolerance (or any error) multiplies them by 'decrease', anything else holds.
+    """
+    def __init__(self, start, minimum=1, maximum=32, increase=1, decrease=0.5, tolerance=0.15):
+        self.minimum = minimum; self.maximum = max(minimum, maximum); self.increase = increase; self.decrease = decrease; self.tolerance = tolerance
+        self.threads = min(self.maximum, max(self.minimum, int(start))); self._last = None
+
+    @classmethod
+    def from_config(cls, config_data, start):
+        return cls(start, 1, config_data.get("transfer_threads_max", 32))
+
+    def observe(self, mbps, errors=0):
+        """Feeds one window's throughput; returns the thread count to use next."""
+        if errors or (self._last is not None and mbps < self._last * (1 - self.tolerance)):
+            self.threads = max(self.minimum, int(self.threads * self.decrease))
+        elif self._last is None or mbps > self._last * (1 + self.tolerance):
+            self.threads = min(self.maximum, self.threads + self.increase)
+        self._last = mbps
+        return self.threads
+
+class ConcurrencyGate:
+    """Semaphore whose limit can change while it is in use; used as 'with gate:' around each file."""
+    def __init__(self, limit):
+        self.limit = max(1, limit); self._active = 0; self._condition = threading.Condition()
+
+    def set_limit(self, limit):
+        with self._condition: self.limit = max(1, limit); self._condition.notify_all()
+
+    def __enter__(self):
+        with self._condition:
+            while self._active >= self.limit: self._condition.wait()
+            self._active += 1
+
+    def __exit__(self, *exc_info):
+        with self._condition: self._active -= 1; self._condition.notify()
+
+class TransferMeter:
+    """
+    Throughput bookkeeping of one transfer job. add() counts finished bytes; every interval
+    seconds the window's MB/s goes to the tuner and the gate gets the new limit. The samples
+    and the totals are what ThroughputHistory records.
+    """
+    def __init__(self, threads, tuner=None, gate=None, interval=2.0, log_callback=None):
+        self.threads_start = self.threads = threads; self.tuner = tuner; self.gate = gate; self.interval = interval; self.log_callback = log_callback
+        self.start = self._window_start = time.monotonic(); self.bytes = 0; self._window_bytes = 0; self.errors = 0; self._window_errors = 0
+        self.retries = 0; self.stall_s = 0.0 # File retries and the backoff time spent waiting on them
+        self.samples = [] # (seconds since start, threads, MB/s)
+
+    def add(self, size):
+        self.bytes += size; self._window_bytes += size; now = time.monotonic()
+        if now - self._window_start >= self.interval: self._close_window(now)
+
+    def error(self): self.errors += 1; self._window_errors += 1
+    def retry(self, delay): self._window_errors += 1; self.retries += 1; self.stall_s += delay # The tuner backs off; the error count is for files that failed
+
+    def _close_window(self, now):
+        mbps = self._window_bytes / (1024 * 1024) / max(now - self._window_start, 1e-6)
+        self.samples.append((round(now - self.start, 2), self.threads, round(mbps, 2)))
+        if self.tuner:
+            threads = self.tuner.observe(mbps, self._window_errors)
+            if threads != self.threads and self.log_callback: self.log_callback(f"  Tuner: {self.threads} -> {threads} threads ({mbps:.1f} MB/s)")
+            self.threads = threads
+            if self.gate: self.gate.set_limit(threads)
+        self._window_start = now; self._window_bytes = 0; self._window_errors = 0
+
+    def seconds(self): return max(time.monotonic() - self.start, 1e-6)
+    def mbps(self): return self.bytes / (1024 * 1024) / self.seconds()
+
+class ThroughputHistory:
+    """
+    Local SQLite record of every transfer job: route (source volume -> destination volume),
+    tool, thread counts, file count and size distribution, bytes, duration, MB/s and errors.
+    best_threads() seeds the tuner; report() is the per-route summary behind the report view.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS transfers (id INTEGER PRIMARY KEY, ts REAL, route TEXT, tool TEXT, throttle TEXT, threads_start INTEGER, threads_end INTEGER,
+        files INTEGER, bytes INTEGER, seconds REAL, mbps REAL, errors INTEGER, size_p50 INTEGER, size_p90 INTEGER, success INTEGER, host TEXT, samples TEXT,
+        retries INTEGER DEFAULT 0, stall_s REAL DEFAULT 0);
+    CREATE INDEX IF NOT EXISTS idx_transfers_route ON transfers(route, tool, ts);
+    """
+    ADDED_COLUMNS = {"retries": "INTEGER DEFAULT 0", "stall_s": "REAL DEFAULT 0"} # Missing from databases written by older versions
+    MIN_BYTES = 64 * 1024 * 1024 # Smaller jobs are recorded but too short to rank settings by
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA); present = {row[1] for row in conn.execute("PRAGMA table_info(transfers)")}
+            for column, definition in self.ADDED_COLUMNS.items():
+                if column not in present: conn.execute(f"ALTER TABLE transfers ADD COLUMN {column} {definition}")
+
+    @classmethod
+    def from_config(cls, config_data):
+        return cls(os.path.join(get_cache_dir(config_data), "xPubThroughput.db"))
+
+    def _connect(self):
+        import sqlite3
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL"); conn.row_factory = sqlite3.Row
+        return conn
+
+    def record(self, route, tool, throttle, meter, sizes, success):
+        sizes = sorted(sizes)
+        with self._connect() as conn:
+            conn.execute("INSERT INTO transfers (ts, route, tool, throttle, threads_start, threads_end, files, bytes, seconds, mbps, errors, size_p50, size_p90, success, host, samples, retries, stall_s) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                         (time.time(), route, tool, throttle, meter.threads_start, meter.threads, len(sizes), meter.bytes, meter.seconds(), meter.mbps(), meter.errors,
+                          size_percentile(sizes, 0.5), size_percentile(sizes, 0.9), int(success), socket.gethostname(), json.dumps(meter.samples), meter.retries, meter.stall_s))
+
+    def best_threads(self, route, tool, recent=50):
+        """Thread count with the best mean MB/s over the route's recent successful Fast jobs, or None without history."""
+        with self._connect() as conn:
+            row = conn.execute("""SELECT threads_end, AVG(mbps) AS avg_mbps FROM (SELECT * FROM transfers WHERE route = ? AND tool = ? AND throttle = 'Fast' AND success = 1 AND bytes >= ? ORDER BY ts DESC LIMIT ?)
+                                  GROUP BY threads_end ORDER BY avg_mbps DESC LIMIT 1""", (route, tool, self.MIN_BYTES, recent)).fetchone()
+        return row["threads_end"] if row else None
+
+    def report(self, route=None, since=None):
+        """Rows per (route, tool, threads): jobs, data moved, mean/best MB/s, error rate, retries, backoff time and typical file size."""
+        clauses, params = ["1 = 1"], []
+        if route: clauses.append("route = ?"); params.append(route)
+        if since: clauses.append("ts >= ?"); params.append(since)
+        with self._connect() as conn:
+            return [dict(r) for r in conn.execute(f"""SELECT route, tool, threads_end AS threads, COUNT(*) AS jobs, SUM(bytes) AS bytes, AVG(mbps) AS avg_mbps, MAX(mbps) AS best_mbps,
+                       CAST(SUM(errors) AS REAL) / MAX(SUM(files), 1) AS error_rate, SUM(retries) AS retries, SUM(stall_s) AS stall_s, AVG(size_p50) AS size_p50, MAX(ts) AS last_ts
+                       FROM transfers WHERE {' AND '.join(clauses)} GROUP BY route, tool, threads_end ORDER BY route, tool, avg_mbps DESC""", params)]
+
+    def routes(self):
+        with self._connect() as conn: return [r[0] for r in conn.execute("SELECT DISTINCT route FROM transfers ORDER BY route")]
+
+class ThroughputReportDialog(QtWidgets.QDialog):
+    """Per-route table of recorded transfer throughput; the best thread count of each route/tool is highlighted."""
+    COLUMNS = ["Route", "Tool", "Threads", "Jobs", "Data", "Avg MB/s", "Best MB/s", "Error Rate", "Retries", "Backoff", "Median File", "Last Used"]
+
+    def __init__(self, config_data, parent=None):
+        super(ThroughputReportDialog, self).__init__(parent)
+        self.setWindowTitle("Transfer Throughput Report"); self.setMinimumSize(950, 450)
+        self.history = ThroughputHistory.from_config(config_data)
+        self.routeComBox = QtWidgets.QComboBox(); self.routeComBox.addItems(["All Routes"] + self.history.routes())
+        self.table = QtWidgets.QTableWidget(); self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers); self.table.setSortingEnabled(True)
+        top_layout = QtWidgets.QHBoxLayout(); top_layout.addWidget(QtWidgets.QLabel("Route")); top_layout.addWidget(self.routeComBox); top_layout.addStretch()
+        layout = QtWidgets.QVBoxLayout(self); layout.addLayout(top_layout); layout.addWidget(self.table)
+        self.routeComBox.currentTextChanged.connect(self._populate); self._populate()
+
+    def _populate(self):
+        route = self.routeComBox.currentText(); rows = self.history.report(None if route == "All Routes" else route)
+        best = {}
+        for row in rows: best[(row["route"], row["tool"])] = max(best.get((row["route"], row["tool"]), 0), row["avg_mbps"])
+        self.table.setSortingEnabled(False); self.table.clear(); self.table.setColumnCount(len(self.COLUMNS)); self.table.setRowCount(len(rows)); self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        for row_index, row in enumerate(rows):
+            cells = [(row["route"], row["route"]), (row["tool"], row["tool"]), (str(row["threads"]), row["threads"]), (str(row["jobs"]), row["jobs"]),
+                     (format_size(row["bytes"] or 0), row["bytes"] or 0), (f"{row['avg_mbps']:.1f}", row["avg_mbps"]), (f"{row['best_mbps']:.1f}", row["best_mbps"]),
+                     (f"{row['error_rate'] * 100:.2f}%", row["error_rate"]), (str(row["retries"] or 0), row["retries"] or 0), (f"{row['stall_s'] or 0:.0f}s", row["stall_s"] or 0),
+                     (format_size(row["size_p50"] or 0), row["size_p50"] or 0),
+                     (datetime.datetime.fromtimestamp(row["last_ts"]).strftime(LOG_DATETIME_FORMAT), row["last_ts"])]
+            for col_index, (text, value) in enumerate(cells):
+                item = SortableTableWidgetItem(text); item.setData(SORT_ROLE, value)
+                if row["avg_mbps"] == best[(row["route"], row["tool"])]: item.setBackground(QtGui.QColor(50, 205, 50, 60))
+                self.table.setItem(row_index, col_index, item)
+        self.table.setSortingEnabled(True); self.table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+
+# /////////////////////////////////////////////
+# NEW - Transfer Engine
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+def append_json_log(log_file, entry, timeout=120):
+    """
+    Appends an entry to a read-only JSON list log (shot publish log / sequence archive log).
+    Writers on every machine hold <log>.lock (a PublishLock) while they re-read the log and swap
+    the extended list in with os.replace, so concurrent appends are not lost and readers never
+    see a half-written file. Raises TimeoutError if the lock is not free within timeout seconds.
+    """
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    lock = PublishLock(log_file, stale_after=60, heartbeat=10, poll=0.05, path=log_file + ".lock")
+    if not lock.acquire(timeout): raise TimeoutError(f"Log '{log_file}' is locked by {describe_lock_holder(lock.holder())}")
+    try:
+        all_logs = []
+        try:
+            with open(log_file, 'r', encoding="utf-8") as f: all_logs = json.load(f)
+            if not isinstance(all_logs, list): all_logs = [all_logs]
+        except FileNotFoundError: pass
+        except json.JSONDecodeError: all_logs = []
+        all_logs.append(entry)
+        temp_path = f"{log_file}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(temp_path, 'w', encoding="utf-8") as f: json.dump(all_logs, f, indent=4)
+            os.chmod(temp_path, stat.S_IREAD)
+            if os.path.exists(log_file): os.chmod(log_file, stat.S_IWRITE) # Windows will not replace a read-only file
+            os.replace(temp_path, log_file)
+        except BaseException:
+            try: os.remove(temp_path)
+            except OSError: pass
+            raise
+    finally: lock.release()
+
+class TransferEngine:
+    """
+    Runs (source, dest) copy jobs with robocopy, including the dedup and daily stages. It has no
+    Qt dependency, so RobocopyWorker (GUI) and PublishService (next to the storage) share it.
+    Output goes to plain callbacks; log lines are coalesced (see LogCoalescer). Where robocopy
+    does not exist (Linux file servers, tests) an equivalent Python copier is used. With
+    'staged_publish' each version is copied into a staging folder and committed by rename.
+    Fast transfers start at the thread count that was quickest on the route before (see
+    ThroughputHistory) and AIMDTuner adjusts it: robocopy's /MT between jobs, the Python
+    copier and object store uploads while they run. Failing files are retried with backoff and
+    quarantined for a last pass after all jobs (see RetryPolicy).
+    """
+    def __init__(self, copy_jobs, is_move=False, throttle="Fast", config_data=None, dedup=False, daily_dirs=None,
+                 log_callback=print, progress_callback=None, speed_callback=None, dedup_callback=None, priority=None):
+        import sqlite3
+        self.copy_jobs = copy_jobs; self.is_move = is_move; self.throttle = throttle
+        self.config_data = config_data or {}; self.dedup = dedup; self.dedup_callback = dedup_callback
+        self.daily_dirs = daily_dirs or [None] * len(copy_jobs) # Per job: where to build its daily, or None
+        self._stream = LogCoalescer(log_callback, progress_callback, speed_callback, self.config_data.get("log_flush_ms", 100))
+        self._dailies = DailyBuilder(self.config_data, log_callback=self._stream.log) if any(self.daily_dirs) else None
+        self._is_aborted = False; self._resume = threading.Event(); self._resume.set(); self._abort_event = threading.Event()
+        self.process = None; self._psutil_process = None
+        self.retry = RetryPolicy.from_config(self.config_data); self._retries = 0; self._stall_s = 0.0; self._counter_lock = threading.Lock()
+        self._quarantine = {} # Job index -> record of its quarantined files (see _quarantine_file); finished by _retry_quarantined
+        self._job_budget = 0
+        self.priority = PriorityControl(self.config_data, priority or self.config_data.get("transfer_priority", "Normal"), self._stream.log)
+        self.latency = 0.0 # Seconds added per file created at the destination; benchmarks use it to stand in for a slow link
+        self.staged = self.config_data.get("staged_publish", True)
+        self.auto_tune = self.config_data.get("auto_tune_transfers", True); self._tuners = {}; self._meter = None; self._history = None
+        if self.config_data.get("throughput_history", True):
+            try: self._history = ThroughputHistory.from_config(self.config_data)
+            except (OSError, sqlite3.Error) as e: print(f"Throughput history unavailable: {e}")
+
+    def run(self):
+        """Runs every job in order. Returns True if all of them succeeded."""
+        total_jobs = len(self.copy_jobs); success = True; total_saved = 0
+        use_robocopy = shutil.which("robocopy") is not None
+        self.priority.apply_here() # Pools, dailies and subprocesses started from here inherit it on Linux
+        for i, (source, dest) in enumerate(self.copy_jobs):
+            if self._is_aborted: success = False; break
+            self.priority.apply_here(); operation = "Moving" if self.is_move else "Copying"
+            if not is_object_store_path(dest): os.makedirs(os.path.dirname(dest), exist_ok=True)
+            self._stream.log(f"{operation} '{os.path.basename(source)}'..."); self._stream.log(f"  Source: {source}\n  Destination: {dest}")
+
+            manifest = snapshot_manifest(source) # Listed once: staging verify, the copiers and the history all use it
+            self._job_budget = error_budget(self.config_data, len(manifest))
+            if is_object_store_path(dest): (job_ok, deduped, saved) = (self._run_store_job(i, total_jobs, source, dest, manifest), [], 0)
+            elif self.staged: job_ok, deduped, saved = self._run_staged_job(i, total_jobs, source, dest, use_robocopy, manifest)
+            else:
+                deduped, saved = self._dedup_job(i, source, dest, dest) if self.dedup else ([], 0)
+                job_ok = self._copy(i, total_jobs, source, dest, deduped, use_robocopy, manifest)
+            total_saved += saved
+            if self._is_aborted or not job_ok: success = False; break
+            if i in self._quarantine: # Finished after the last job
+                self._quarantine[i]["deduped"] = deduped; self._stream.log(f"  {len(self._quarantine[i]['rels'])} files quarantined; they are retried after the last job."); self._stream.flush(); continue
+            self._finish_job(i, source, dest, deduped)
+            self._stream.flush()
+        if success and self._quarantine: success = self._retry_quarantined(total_jobs)
+        elif self._quarantine: self._release_quarantined()
+
+        if self.dedup and total_saved: self._stream.log(f"Dedup saved {format_size(total_saved)} in total.")
+        if self._dailies:
+            if not success: self._dailies.cancel()
+            else:
+                self._stream.log("Finishing dailies..."); self._stream.flush()
+                try:
+                    if not self._dailies.finish(): self._stream.log("WARNING: Some daily frames failed; the publish itself is complete.")
+                except Exception as e: self._stream.log(f"WARNING: Daily generation failed: {e}")
+        self._stream.flush()
+        return success
+
+    def _finish_job(self, job_index, source, dest, deduped):
+        if deduped and self.is_move: self._remove_deduped_sources(source, deduped)
+        if self._dailies and self.daily_dirs[job_index] and not is_object_store_path(dest): # Proxies build on the pool while the next job transfers
+            try: self._dailies.submit(dest, self.daily_dirs[job_index])
+            except OSError as e: self._stream.log(f"  WARNING: Could not start daily for '{os.path.basename(dest)}': {e}")
+
+    def _note_retry(self, rel, meter, attempt, delay, error):
+        with self._counter_lock: self._retries += 1; self._stall_s += delay
+        if meter: meter.retry(delay)
+        self._stream.log(f"  Retry {attempt}/{self.retry.retries} of '{rel}' in {delay:.1f}s: {error}")
+
+    def _with_retries(self, rel, meter, func):
+        """func() with file-level retries; backoff waits end early on abort."""
+        return self.retry.run(func, self._abort_event.wait, lambda attempt, delay, error: self._note_retry(rel, meter, attempt, delay, error))
+
+    def _quarantine_file(self, job_index, source, target, rel, error, journal=None):
+        """Puts a file that ran out of retries aside for the last pass. Returns False once the job's error budget is spent."""
+        with self._counter_lock:
+            record = self._quarantine.setdefault(job_index, {"source": source, "target": target, "rels": {}, "journal": journal})
+            record["rels"][rel] = str(error); count = len(record["rels"])
+        self._stream.log(f"  QUARANTINED '{rel}': {error}")
+        if count == self._job_budget + 1: self._stream.log(f"ERROR: {count} files failed, more than the error budget of {self._job_budget}; stopping.")
+        return count <= self._job_budget
+
+    def _report_speed(self, done_bytes, start):
+        text = f"{format_size(done_bytes / max(time.monotonic() - start, 1e-3))}/sec"
+        if self._retries: text += f" | {self._retries} retries, {self._stall_s:.0f}s backoff"
+        with self._counter_lock: quarantined = sum(len(r["rels"]) for r in self._quarantine.values())
+        if quarantined: text += f", {quarantined} quarantined"
+        self._stream.speed(text)
+
+    def _send_file(self, source, target, rel, size, journal=None, same_volume=False):
+        """Copies (or moves) one file with retries and checks its size. In a streaming move the file is journaled before its source goes."""
+        src, dst = os.path.join(source, rel), os.path.join(target, rel)
+        def attempt():
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if not (journal and same_volume): shutil.copy2(src, dst)
+            if not (journal and same_volume) and os.path.getsize(dst) != size: raise OSError(f"copy is {os.path.getsize(dst)} bytes, expected {size}")
+        self._with_retries(rel, None, attempt)
+        if journal: journal.release([(rel, size)])
+        if journal and same_volume: os.replace(src, dst)
+        elif self.is_move: os.remove(src)
+
+    def _retry_quarantined(self, total_jobs):
+        """Last pass over every quarantined file; finishes (verifies, commits, builds dailies for) the jobs that come through. Returns True if all did."""
+        success = True
+        for job_index, record in sorted(self._quarantine.items()):
+            source, dest = self.copy_jobs[job_index]; rels = record["rels"]
+            self._stream.log(f"Retrying {len(rels)} quarantined files of '{os.path.basename(source)}'..."); self._stream.flush()
+            manifest = record.get("manifest") or snapshot_manifest(source); still_failing = {}
+            same_volume = bool(record["journal"]) and os.stat(source).st_dev == os.stat(record["target"]).st_dev
+            for rel in sorted(rels):
+                if self._is_aborted: still_failing[rel] = "aborted"; continue
+                try: self._send_file(source, record["target"], rel, manifest[rel], record["journal"], same_volume); self._stream.log(f"  Recovered '{rel}'")
+                except (OSError, KeyError) as e: still_failing[rel] = str(e)
+            for rel, error in list(still_failing.items())[:10]: self._stream.log(f"  ERROR: '{rel}' still fails: {error}")
+            ok = not still_failing
+            if "lock" in record: ok = self._commit_staged(source, dest, record["target"], manifest, record["journal"], ok); self._release_staged(record)
+            if ok: self._finish_job(job_index, source, dest, record.get("deduped", []))
+            else: success = False; self._stream.log(f"ERROR: '{os.path.basename(dest)}' is incomplete; {len(still_failing)} files could not be transferred.")
+            self._stream.progress(int((job_index + 1) / total_jobs * 100)); self._stream.flush()
+        self._quarantine = {}
+        return success
+
+    def _release_quarantined(self):
+        """The publish stopped before the last pass: deferred staged jobs are cleaned up like any failed job."""
+        for job_index, record in sorted(self._quarantine.items()):
+            if "lock" in record:
+                source, dest = self.copy_jobs[job_index]
+                self._commit_staged(source, dest, record["target"], record.get("manifest", {}), record["journal"], False); self._release_staged(record)
+        self._quarantine = {}
+
+    def _release_staged(self, record):
+        if record["journal"]: record["journal"].close()
+        record["lock"].release()
+
+    def _copy(self, job_index, total_jobs, source, dest, deduped, use_robocopy, manifest):
+        batches, batched = self._plan_small_batches(manifest, deduped)
+        tool = ("robocopy" if use_robocopy else "python") + ("+batch" if batches else ""); route = transfer_route(source, dest)
+        meter = self._new_meter(route, tool, self.config_data.get("transfer_threads", 8))
+        ok, unsent = self._run_small_batches(job_index, total_jobs, source, dest, batches, manifest, meter) if batches else (True, set())
+        if ok and use_robocopy:
+            ok = self._run_robocopy(job_index, total_jobs, source, dest, deduped, meter, sum(size for rel, size in manifest.items() if rel not in deduped and rel not in batched),
+                                    self.config_data.get("small_file_kb", 256) * 1024 if batches else 0)
+            for rel in sorted(unsent) if ok else []: # Below robocopy's /MIN; straight to the last pass
+                if not self._quarantine_file(job_index, source, dest, rel, "its batch failed"): ok = False; break
+        elif ok: ok = self._run_python_copy(job_index, total_jobs, source, dest, set(deduped) | (batched - unsent), manifest, meter)
+        self._record_throughput(route, tool, meter, [size for rel, size in manifest.items() if rel not in deduped], ok)
+        return ok
+
+    def _plan_small_batches(self, manifest, deduped):
+        """Batches for the files under 'small_file_kb', or none when batching is off or there are too few to be worth it."""
+        if not self.config_data.get("small_file_batching", True): return [], set()
+        if self.config_data.get("small_file_unpack", "service") == "service" and not self.config_data.get("service_url"): return [], set() # Nothing runs next to the storage to unpack
+        small_count = sum(1 for rel, size in manifest.items() if size < self.config_data.get("small_file_kb", 256) * 1024)
+        batch_files = min(self.config_data.get("small_batch_files", 2000), math.ceil(small_count / max(1, self.config_data.get("small_batch_workers", 4))) or 1) # Keep every worker busy
+        batches, batched = plan_small_batches(manifest, set(deduped), self.config_data.get("small_file_kb", 256) * 1024, self.config_data.get("small_batch_mb", 32) * 1024 * 1024, batch_files)
+        return (batches, batched) if len(batched) >= self.config_data.get("small_batch_min_files", 50) else ([], set())
+
+    def _run_small_batches(self, job_index, total_jobs, source, dest, batches, manifest, meter):
+        """Sends each batch as one sequential write and unpacks it at the destination (see plan_small_batches); 'small_batch_workers' at a time.
+        Returns (success, files of batches that failed even after retries; the caller sends those one by one)."""
+        client = PublishServiceClient.from_config(self.config_data) if self.config_data.get("small_file_unpack", "service") == "service" else None
+        self._stream.log(f"  Sending {sum(map(len, batches))} small files in {len(batches)} batches, unpacked {'by the publish service' if client else 'locally'}.")
+        total_bytes = sum(manifest.values()) or 1; done_bytes = 0; start = time.monotonic(); unsent = set()
+        def send(rels):
+            self._resume.wait(); self.priority.apply_here()
+            if self._is_aborted: return rels, None
+            return self._with_retries(f"batch of {len(rels)} from {rels[0]}", meter, lambda: send_batch(rels))
+        def send_batch(rels):
+            data = build_small_batch(source, rels); os.makedirs(dest, exist_ok=True)
+            if client: # One file crosses the link; the service creates the small files next to the storage
+                archive = os.path.join(dest, f"{SMALL_BATCH_PREFIX}{uuid.uuid4().hex[:12]}.tar")
+                try:
+                    if self.latency: time.sleep(self.latency)
+                    with open(archive, 'wb') as f: f.write(data)
+                    unpacked = client.unpack(archive, dest)["files"]
+                finally:
+                    if os.path.exists(archive): os.remove(archive)
+            else:
+                if self.latency: time.sleep(self.latency * len(rels))
+                unpacked = unpack_small_batch(data, dest)
+            wrong = [rel for rel in rels if unpacked.get(rel.replace(os.sep, "/")) != manifest[rel]]
+            if wrong: raise OSError(f"{len(wrong)} files of the batch did not arrive intact, e.g. '{wrong[0]}'")
+            if self.is_move:
+                for rel in rels: os.remove(os.path.join(source, rel))
+            return rels, sum(manifest[rel] for rel in rels)
+        with ThreadPoolExecutor(max_workers=max(1, self.config_data.get("small_batch_workers", 4)), thread_name_prefix="xPubBatch") as pool:
+            futures = {pool.submit(send, rels): rels for rels in batches}
+            for future in as_completed(futures):
+                try: rels, size = future.result()
+                except (OSError, ValueError, RuntimeError) as e:
+                    meter.error(); self._stream.log(f"  WARNING: A batch of {len(futures[future])} small files failed ({e}); they are sent one by one."); unsent.update(futures[future]); continue
+                if size is None: continue
+                done_bytes += size; meter.add(size); self._stream.log(f"  {len(rels)} small files ({format_size(size)}), e.g. {rels[0]}")
+                self._stream.progress(int(((job_index + done_bytes / total_bytes) / total_jobs) * 100))
+                self._report_speed(done_bytes, start)
+        return not self._is_aborted, unsent
+
+    def _new_meter(self, route, tool, default_threads):
+        """Meter for one job. Fast jobs share one tuner per route and tool for the whole run, seeded from the history."""
+        import sqlite3
+        if self.throttle == "Slow": return TransferMeter(1, interval=self.config_data.get("tune_interval_s", 2)) # Throttled on purpose; nothing to tune
+        if self.auto_tune and (route, tool) not in self._tuners:
+            best = None
+            if self._history:
+                try: best = self._history.best_threads(route, tool)
+                except sqlite3.Error as e: print(f"Could not read throughput history: {e}")
+            self._tuners[(route, tool)] = AIMDTuner.from_config(self.config_data, best or default_threads)
+            if best: self._stream.log(f"  Starting at {best} threads, the fastest recorded for {route}.")
+        tuner = self._tuners.get((route, tool)); threads = tuner.threads if tuner else default_threads
+        self._meter = TransferMeter(threads, tuner, ConcurrencyGate(threads), self.config_data.get("tune_interval_s", 2), self._stream.log)
+        return self._meter
+
+    def _record_throughput(self, route, tool, meter, sizes, success):
+        import sqlite3
+        if not self._history or self._is_aborted: return
+        try: self._history.record(route, tool, self.throttle, meter, sizes, success)
+        except sqlite3.Error as e: print(f"Could not record throughput: {e}")
+
+    def _run_staged_job(self, job_index, total_jobs, source, dest, use_robocopy, manifest):
+        """Copies one version into staging under dest's PublishLock, verifies it and renames it onto dest. Returns (success, deduped, bytes saved)."""
+        lock = PublishLock(dest, self.config_data.get("publish_lock_stale_s", 300))
+        on_wait = lambda holder: (self._stream.log(f"  Waiting for '{os.path.basename(dest)}', locked by {describe_lock_holder(holder)}..."), self._stream.flush())
+        try: acquired = lock.acquire(self.config_data.get("publish_lock_timeout_s", 600), lambda: self._is_aborted, on_wait)
+        except OSError as e: self._stream.log(f"ERROR: Could not lock '{dest}': {e}"); return False, [], 0
+        if not acquired:
+            if not self._is_aborted: self._stream.log(f"ERROR: '{dest}' is still locked by {describe_lock_holder(lock.holder())}; gave up waiting.")
+            return False, [], 0
+        journal = MoveJournal(move_journal_path(dest)) if self.is_move and self.config_data.get("streaming_move", True) else None
+        try:
+            header, released = journal.load() if journal else (None, {})
+            if header and header.get("source") != source and os.path.isdir(header.get("staging", "")): # A move from another source stopped here; its files may be the only copy
+                kept = os.path.join(os.path.dirname(header["staging"]), os.path.basename(header["staging"]).replace("@", "@failed-", 1)); os.rename(header["staging"], kept); self._stream.log(f"  Files of an unfinished move from '{header.get('source')}' were kept in '{kept}'")
+            if header and (header.get("source") != source or not os.path.isdir(header.get("staging", ""))): header, released = None, {}
+            sweep_staging(dest, self._stream.log, keep=header["staging"] if header else None)
+            staging = header["staging"] if header else new_staging_dir(dest)
+            if header: self._stream.log(f"  Resuming interrupted move: {len(released)} files were already moved to '{staging}'."); manifest = dict(manifest, **released)
+            deduped, saved = self._dedup_job(job_index, source, staging, dest) if self.dedup and not header else ([], 0)
+            if journal:
+                if header: journal.resume()
+                else: journal.start(source, staging)
+                ok = self._run_streaming_move(job_index, total_jobs, source, staging, deduped, manifest, journal, released)
+            else: ok = self._copy(job_index, total_jobs, source, staging, deduped, use_robocopy, manifest)
+            if ok and job_index in self._quarantine: # Stays locked and staged until _retry_quarantined finishes it
+                self._quarantine[job_index].update(lock=lock, journal=journal, manifest=manifest); lock = journal = None
+                return ok, deduped, saved
+            return self._commit_staged(source, dest, staging, manifest, journal, ok), deduped, saved
+        finally:
+            if journal: journal.close()
+            if lock: lock.release()
+
+    def _commit_staged(self, source, dest, staging, manifest, journal, ok):
+        """Verifies staging against the manifest and renames it onto dest; on failure staging is removed, or kept when it holds moved files. Returns ok."""
+        if ok:
+            problems = verify_staged_version(manifest, staging)
+            for problem in problems[:10]: self._stream.log(f"  ERROR: Verify failed, {problem}")
+            ok = not problems
+        if ok and not self.config_data.get("publish_replace_versions", False): # After the copy, so nothing ever writes through these links
+            try:
+                carried = carry_over_published_files(dest, staging, manifest)
+                if carried: self._stream.log(f"  Kept {len(carried)} published files the source does not have, e.g. '{carried[0]}'.")
+            except OSError as e: self._stream.log(f"ERROR: Could not keep the files already published in '{dest}': {e}"); ok = False
+        if ok:
+            try: commit_staged_version(staging, dest); self._stream.log(f"  Committed '{os.path.basename(dest)}' ({len(manifest)} files verified).")
+            except OSError as e: self._stream.log(f"ERROR: Could not commit '{dest}': {e}"); ok = False
+        if ok and journal: journal.remove()
+        if not ok and os.path.exists(staging):
+            if journal: self._stream.log(f"  Move stopped; the files moved so far are journaled in '{staging}'. Publish the version again to resume.")
+            elif self.is_move: # The staged files may be the only copy left; keep them out of the sweep
+                kept = os.path.join(os.path.dirname(staging), os.path.basename(staging).replace("@", "@failed-", 1)); os.rename(staging, kept); self._stream.log(f"  Moved files were kept in '{kept}'")
+            else: shutil.rmtree(staging, ignore_errors=True)
+        return ok
+
+    def _run_streaming_move(self, job_index, total_jobs, source, staging, deduped, manifest, journal, released):
+        """
+        Move mode: files go to staging in batches of 'move_batch_files'. Each staged copy is verified
+        (size, plus a content hash with 'move_verify_hash') and journaled before its source is deleted,
+        so the extra space in use is about one batch rather than the whole version. Within one volume
+        files are journaled and then renamed instead of copied.
+        """
+        os.makedirs(staging, exist_ok=True)
+        verify_hash = self.config_data.get("move_verify_hash", False); batch_files = max(1, self.config_data.get("move_batch_files", 64))
+        same_volume = os.stat(source).st_dev == os.stat(staging).st_dev
+        meter = self._new_meter(transfer_route(source, staging), "stream-move", self.config_data.get("transfer_threads", 8))
+        for rel, size in list(released.items()): # Journaled by the interrupted run; finish releasing them
+            staged_ok = os.path.exists(os.path.join(staging, rel)) and os.path.getsize(os.path.join(staging, rel)) == size
+            if not os.path.exists(os.path.join(source, rel)): continue
+            if staged_ok and not same_volume:
+                try: os.remove(os.path.join(source, rel))
+                except OSError as e: self._stream.log(f"  WARNING: Could not remove '{rel}': {e}")
+            else: del released[rel] # Never made it; move it again
+        pending = sorted(rel for rel in manifest if rel not in released and rel not in deduped and os.path.exists(os.path.join(source, rel)))
+        total_bytes = sum(manifest[rel] for rel in pending) or 1; done_bytes = 0; start = time.monotonic()
+        delay = self.config_data.get("throttle_delay_ms", 100) / 1000.0 if self.throttle == "Slow" else 0
+        def stage(rel):
+            with meter.gate or contextlib.nullcontext():
+                self._resume.wait(); self.priority.apply_here()
+                if self._is_aborted: return rel, None
+                src, dst = os.path.join(source, rel), os.path.join(staging, rel)
+                def attempt():
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    if same_volume: return rel, manifest[rel] # Renamed after journaling
+                    shutil.copy2(src, dst); size = os.path.getsize(src)
+                    if os.path.getsize(dst) != size: raise OSError(f"staged copy is {os.path.getsize(dst)} bytes, expected {size}")
+                    if verify_hash and hash_file(dst) != hash_file(src): raise OSError("staged copy does not match the source")
+                    return rel, size
+                try: result = self._with_retries(rel, meter, attempt)
+                except OSError as e: return rel, e
+                if delay: time.sleep(delay)
+                return result
+        workers = 1 if delay else (meter.tuner.maximum if meter.tuner else meter.threads); ok = True
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="xPubMove") as pool:
+            for batch_start in range(0, len(pending), batch_files):
+                batch = pending[batch_start:batch_start + batch_files]; staged = []
+                for future in [pool.submit(stage, rel) for rel in batch]:
+                    rel, size = future.result()
+                    if isinstance(size, OSError): # Its source stays; the last pass moves it or the publish stops with it journaled as missing
+                        meter.error()
+                        if not self._quarantine_file(job_index, source, staging, rel, size, journal): ok = False; break
+                        continue
+                    if size is None: ok = False; break
+                    staged.append((rel, size))
+                if staged and not self._is_aborted: journal.release(staged) # Durable before any source of the batch goes
+                for rel, size in staged if not self._is_aborted else []:
+                    try:
+                        if same_volume: os.replace(os.path.join(source, rel), os.path.join(staging, rel))
+                        else: os.remove(os.path.join(source, rel))
+                    except OSError as e:
+                        if same_volume: self._stream.log(f"ERROR: Could not move '{rel}': {e}"); ok = False; break
+                        self._stream.log(f"  WARNING: Could not remove '{rel}': {e}")
+                    done_bytes += size; meter.add(size); self._stream.log(f"  {rel}")
+                self._stream.progress(int(((job_index + done_bytes / total_bytes) / total_jobs) * 100))
+                self._report_speed(done_bytes, start)
+                if not ok or self._is_aborted: break
+        self._record_throughput(transfer_route(source, staging), "stream-move", meter, [manifest[rel] for rel in pending], ok and not self._is_aborted)
+        return ok and not self._is_aborted
+
+    def _run_store_job(self, job_index, total_jobs, source, dest, manifest):
+        """
+        Publishes one version to an object store: files go up in parallel (large ones as multipart
+        uploads), the listing is checked against the source, objects left from an earlier publish
+        of the version are deleted, and PUBLISH_MANIFEST_NAME is written last to commit it.
+        """
+        backend = storage_for(dest); total_bytes = sum(manifest.values()) or 1
+        manifest_path = storage_join(dest, PUBLISH_MANIFEST_NAME); route = transfer_route(source, dest)
+        meter = self._new_meter(route, "object-store", backend.max_workers)
+        ok = self._upload_store_job(job_index, total_jobs, source, dest, manifest, backend, manifest_path, total_bytes, meter)
+        self._record_throughput(route, "object-store", meter, list(manifest.values()), ok)
+        return ok
+
+    def _upload_store_job(self, job_index, total_jobs, source, dest, manifest, backend, manifest_path, total_bytes, meter):
+        delay = self.config_data.get("throttle_delay_ms", 100) / 1000.0 if self.throttle == "Slow" else 0
+        if self.dedup or (self._dailies and self.daily_dirs[job_index]): self._stream.log("  Dedup and dailies only apply to local publish targets; skipped.")
+        try:
+            if backend.exists(manifest_path): backend.delete([manifest_path]) # The version reads as unpublished until it is committed again
+            def upload(rel):
+                with meter.gate or contextlib.nullcontext():
+                    self._resume.wait(); self.priority.apply_here()
+                    if self._is_aborted: return rel, 0
+                    self._with_retries(rel, meter, lambda: backend.upload_file(os.path.join(source, rel), storage_join(dest, rel.replace(os.sep, "/"))))
+                    if delay: time.sleep(delay)
+                return rel, manifest[rel]
+            done_bytes, start = 0, time.monotonic()
+            workers = meter.tuner.maximum if meter.tuner else meter.threads # The gate holds the tuned number of them busy
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="xPubStoreJob") as pool:
+                futures = [pool.submit(upload, rel) for rel in sorted(manifest)]
+                for future in as_completed(futures):
+                    if self._is_aborted:
+                        for pending in futures: pending.cancel()
+                        break
+                    rel, size = future.result(); done_bytes += size; meter.add(size); self._stream.log(f"  {rel}")
+                    self._stream.progress(int(((job_index + done_bytes / total_bytes) / total_jobs) * 100))
+                    self._report_speed(done_bytes, start)
+            if self._is_aborted: return False
+            stored = {e.path[len(dest.rstrip('/')) + 1:]: e.size for e in backend.walk_files(dest)}
+            problems = [f"'{rel}' did not arrive intact" for rel, size in manifest.items() if stored.get(rel.replace(os.sep, "/")) != size]
+            if problems:
+                for problem in problems[:10]: self._stream.log(f"  ERROR: Verify failed, {problem}")
+                return False
+            expected = {rel.replace(os.sep, "/") for rel in manifest}
+            extras = [storage_join(dest, rel) for rel in stored if rel not in expected]
+            if extras: self._stream.log(f"  Removing {len(extras)} objects left from an earlier publish..."); backend.delete(extras)
+            with backend.open_write(manifest_path) as f:
+                f.write(json.dumps({"source": source, "published": datetime.datetime.now().strftime(LOG_DATETIME_FORMAT), "files": {rel.replace(os.sep, "/"): size for rel, size in manifest.items()}}).encode())
+            self._stream.log(f"  Committed '{dest}' ({len(manifest)} files verified).")
+        except Exception as e:
+            meter.error(); self._stream.log(f"ERROR: Upload to '{dest}' failed: {e}"); return False
+        if self.is_move: # Sources go only after the commit
+            for rel in manifest:
+                try: os.remove(os.path.join(source, rel))
+                except OSError as e: self._stream.log(f"  WARNING: Could not remove '{rel}': {e}")
+        return True
+
+    def _run_robocopy(self, job_index, total_jobs, source, dest, deduped, meter, job_bytes, min_size=0):
+        import psutil # Deferred: only transfers need it, so it stays off the startup path
+        retries = self.config_data.get("robocopy_retries", 0) # Robocopy's own fixed-wait retries; failed files go to the quarantine instead
+        command = ["robocopy", source, dest, "/E", f"/R:{retries}", f"/W:{5 if retries else 0}", "/NJH", "/NJS", "/ETA"]
+        if self.is_move:
+            command.append("/MOV")
+        if deduped: # Leave the hardlinked frames alone; everything else is new or different
+            command.extend(["/XC", "/XN", "/XO"])
+        if min_size: command.append(f"/MIN:{min_size}") # Smaller files went in batches
+
+        # Use the config value if "Slow" is selected
+        if self.throttle == "Slow":
+            delay = self.config_data.get("throttle_delay_ms", 100) # Read from config, fallback to 100
+            command.append(f"/IPG:{delay}")
+        else: # Fast mode; /MT is fixed for the life of the process, so the tuner can only change it between jobs
+            command.append(f"/MT:{min(meter.threads, 128)}")
+
+        try:
+            self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+            self._psutil_process = psutil.Process(self.process.pid); self.priority.add_process(self.process.pid)
+        except (OSError, psutil.Error) as e:
+            self._stream.log(f"ERROR: Could not start robocopy for {source}: {e}"); return False
+        pending = ""; unmatched = [] # ERROR lines not naming a file of this job: nothing to quarantine, so the job fails
+        for chunk in iter(lambda: self.process.stdout.read1(65536), b""):
+            lines = re.split(r"[\r\n]+", pending + chunk.decode(errors="replace")); pending = lines.pop()
+            for line in lines:
+                if self._parse_robocopy_line(line, job_index, total_jobs, source, dest): unmatched.append(line)
+        if self._parse_robocopy_line(pending, job_index, total_jobs, source, dest): unmatched.append(pending)
+        exit_code = self.process.wait(); self.priority.remove_process(self.process.pid)
+        if self._is_aborted: return False
+        quarantined = self._quarantine.get(job_index, {}).get("rels", {})
+        if exit_code >= 8 and (unmatched or not (quarantined and len(quarantined) <= self._job_budget)):
+            self._stream.log(f"ERROR: Robocopy failed with exit code {exit_code}" + (f": {unmatched[0].strip()}" if unmatched else "")); return False
+        meter.add(job_bytes) # Robocopy reports no usable byte count; the whole job is one tuner window
+        return True
+
+    def _parse_robocopy_line(self, line, job_index, total_jobs, source, dest):
+        """Logs one line of robocopy output and picks up progress, speed and failed files. Returns True for an ERROR line that names no file of the job."""
+        line = line.strip()
+        if not line: return False
+        self._stream.log(line)
+        is_error = " ERROR " in f" {line} "
+        if is_error and self._meter: self._meter.error()
+        failed = ROBOCOPY_FILE_ERROR.search(line); unmatched = is_error
+        if failed:
+            path = failed.group(1).strip(); rel = os.path.relpath(path, dest if os.path.normcase(path).startswith(os.path.normcase(dest)) else source)
+            if not rel.startswith(".."): self._quarantine_file(job_index, source, dest, rel, line); unmatched = False
+        match = re.search(r"(\d+\.?\d*)\s*%", line)
+        if match:
+            percentage = float(match.group(1)); overall_progress = int(((job_index + (percentage / 100.0)) / total_jobs) * 100); self._stream.progress(overall_progress)
+
+        # FIX: More robust regex to capture any speed unit
+        speed_match = re.search(r"Speed:\s+([\d,.]+\s+[KMG]?B/sec)", line)
+        if speed_match:
+            self._stream.speed(speed_match.group(1).strip())
+        return unmatched
+
+    def _run_python_copy(self, job_index, total_jobs, source, dest, deduped, manifest, meter):
+        """
+        Robocopy stand-in: /E copy (or /MOV) with byte progress. Files are copied on a pool whose
+        busy threads are capped by the meter's gate, which the tuner widens or narrows while the
+        job runs. Slow mode copies one file at a time and sleeps throttle_delay_ms between files.
+        """
+        files = sorted(rel for rel in manifest if rel not in deduped)
+        total_bytes = sum(manifest[rel] for rel in files) or 1
+        done_bytes = 0; start = time.monotonic(); failed = threading.Event()
+        delay = self.config_data.get("throttle_delay_ms", 100) / 1000.0 if self.throttle == "Slow" else 0
+        def copy_one(rel):
+            with meter.gate or contextlib.nullcontext():
+                self._resume.wait(); self.priority.apply_here()
+                if self._is_aborted or failed.is_set(): return rel, None
+                src, dst = os.path.join(source, rel), os.path.join(dest, rel)
+                def attempt():
+                    if self.latency: time.sleep(self.latency)
+                    os.makedirs(os.path.dirname(dst), exist_ok=True); shutil.copy2(src, dst)
+                    if os.path.getsize(dst) != manifest[rel]: raise OSError(f"copy is {os.path.getsize(dst)} bytes, expected {manifest[rel]}")
+                    if self.is_move: os.remove(src)
+                try: self._with_retries(rel, meter, attempt)
+                except OSError as e:
+                    if not self._quarantine_file(job_index, source, dest, rel, e): failed.set()
+                    return rel, e
+                if delay: time.sleep(delay)
+                return rel, os.path.getsize(dst)
+        workers = 1 if delay else (meter.tuner.maximum if meter.tuner else meter.threads)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="xPubCopy") as pool:
+            futures = [pool.submit(copy_one, rel) for rel in files]
+            for future in as_completed(futures):
+                rel, result = future.result()
+                if isinstance(result, OSError):
+                    meter.error()
+                    if failed.is_set():
+                        for pending in futures: pending.cancel()
+                        return False
+                    continue
+                if result is None: continue
+                done_bytes += result; meter.add(result); self._stream.log(f"  {rel}")
+                self._stream.progress(int(((job_index + done_bytes / total_bytes) / total_jobs) * 100))
+                self._report_speed(done_bytes, start)
+        return not self._is_aborted and not failed.is_set()
+
+    def _dedup_job(self, job_index, source, target, dest):
+        """Hardlinks frames identical to an earlier publish of dest into target, a fresh folder (staging, or dest itself when unstaged).
+        When staging, a dest being republished is the reference, so only changed frames are copied. Returns (linked paths, bytes saved)."""
+        if os.path.exists(target): return [], 0 # Only dedup into a fresh version folder; never touch existing publishes
+        previous = dest if target != dest and os.path.isdir(dest) else find_previous_published_version(dest)
+        if not previous: return [], 0
+        result = dedup_version(source, target, previous, self.config_data.get("dedup_hash", "blake2b"), self.config_data.get("scan_workers", 8))
+        if result["linked"]:
+            self._stream.log(f"  Dedup: {len(result['linked'])} of {result['candidates']} candidate frames identical to '{os.path.basename(previous)}', {format_size(result['bytes_saved'])} hardlinked instead of copied.")
+            if self.dedup_callback: self.dedup_callback(job_index, len(result["linked"]), float(result["bytes_saved"]))
+        return result["linked"], result["bytes_saved"]
+
+    def _remove_deduped_sources(self, source, deduped):
+        """Robocopy skipped the hardlinked frames, so in move mode their sources are removed here."""
+        for rel in deduped:
+            try: os.remove(os.path.join(source, rel))
+            except OSError as e: self._stream.log(f"  WARNING: Could not remove '{rel}': {e}")
+
+    def abort(self):
+        """Safe to call from any thread."""
+        self._stream.log("--- ABORTING ---"); self._stream.flush(); self._is_aborted = True; self._resume.set(); self._abort_event.set()
+        if self.process and self.process.poll() is None: self.process.kill()
+
+    def set_paused(self, paused):
+        """Suspends/resumes the running robocopy process (or the Python copier). Safe to call from any thread."""
+        import psutil
+        if paused: self._resume.clear()
+        else: self._resume.set()
+        if self._psutil_process and self._psutil_process.is_running():
+            try:
+                if paused and self._psutil_process.status() != psutil.STATUS_STOPPED: self._psutil_process.suspend()
+                elif not paused and self._psutil_process.status() == psutil.STATUS_STOPPED: self._psutil_process.resume()
+            except psutil.NoSuchProcess: pass
+            except Exception as e: self._stream.log(f"Pause/Resume Error: {e}")
+        self._stream.log("--- PROCESS PAUSED ---" if paused else "--- PROCESS RESUMED ---"); self._stream.flush()
+
+    def set_priority(self, name):
+        """Changes the job's I/O and CPU priority while it runs. Safe to call from any thread."""
+        self.priority.set(name); self._stream.flush()
+
+# /////////////////////////////////////////////
+# NEW - Publish Service
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# A small HTTP/JSON service that runs publish and archive jobs on the machine next to the
+# storage, so bulk copies stay on the file server instead of crossing the artist's network
+# link twice. Start it with "xPubUi serve"; it is a plain process, no installation needed.
+#   POST /jobs                      {"kind": "publish"|"archive", ...}  -> {"id": ...}
+#   GET  /jobs                      list of job summaries
+#   GET  /jobs/<id>?since=<line>    state, progress, speed and log lines from <line> on
+#   POST /jobs/<id>/abort|pause|resume
+#   POST /jobs/<id>/priority        {"priority": "Normal"|"Low"|"Idle"}
+#   POST /unpack                    {"archive": ..., "dest": ...}  -> {"files": {name: size}} (small file batches)
+# Every path a client sends must lie below the service's own project_root, archive_root or a
+# department publish_target / archive_root (after 'service_path_map'), and without a
+# 'service_token' the service only listens on the loopback interface.
+
+def translate_path(path, path_map):
+    """Rewrites a client path to the service's view of the share using the longest matching 'service_path_map' prefix."""
+    if not path or not path_map: return path
+    normalized = path.replace("\\", "/")
+    for client_prefix in sorted(path_map, key=len, reverse=True):
+        prefix = client_prefix.replace("\\", "/").rstrip("/")
+        if normalized.lower() == prefix.lower() or normalized.lower().startswith(prefix.lower() + "/"):
+            return os.path.normpath(path_map[client_prefix] + normalized[len(prefix):])
+    return path
+
+def service_roots(config_data):
+    """Roots the publish service may read, write and delete below: project_root, archive_root and every department's publish_target / archive_root."""
+    roots = [config_data.get("project_root"), config_data.get("archive_root"), config_data.get("publish_target")]
+    for settings in config_data.get("departments", {}).values(): roots += [settings.get("publish_target"), settings.get("archive_root")]
+    return [root for root in dict.fromkeys(roots) if root]
+
+def path_within(path, roots):
+    """True if path is one of roots or lies below one. Local paths are compared fully resolved; object-store URLs by key prefix, refusing '..' segments."""
+    if not isinstance(path, str) or not path: return False
+    if is_object_store_path(path):
+        if ".." in path.replace("\\", "/").split("/"): return False
+        return any(is_object_store_path(root) and (path.rstrip("/") + "/").startswith(root.rstrip("/") + "/") for root in roots)
+    real = os.path.normcase(os.path.realpath(path))
+    for root in roots:
+        if is_object_store_path(root): continue
+        root = os.path.normcase(os.path.realpath(root))
+        try:
+            if os.path.commonpath([real, root]) == root: return True
+        except ValueError: pass # Another drive
+    return False
+
+def is_loopback_host(host):
+    """True if every address host resolves to is a loopback one."""
+    import ipaddress
+    try: return all(ipaddress.ip_address(info[4][0]).is_loopback for info in socket.getaddrinfo(host, None))
+    except (OSError, ValueError): return False
+
+class ServiceJob:
+    """One submitted job: its payload, state and log. The log keeps the newest max_lines in memory and everything on disk."""
+    def __init__(self, kind, payload, log_dir, max_lines=20000):
+        self.id = uuid.uuid4().hex[:12]; self.kind = kind; self.payload = payload
+        self.state = "queued"; self.progress = 0; self.speed = ""; self.result = {}
+        self.created = datetime.datetime.now().strftime(LOG_DATETIME_FORMAT); self.finished_at = None
+        self.lines = collections.deque(maxlen=max_lines); self.first_line = 0 # Absolute index of lines[0]
+        self.log_path = os.path.join(log_dir, f"{self.id}.log"); self.control = None
+        self._lock = threading.Lock()
+
+    def log(self, message):
+        with self._lock:
+            for line in message.split("\n"):
+                if len(self.lines) == self.lines.maxlen: self.first_line += 1
+                self.lines.append(line)
+            with open(self.log_path, 'a', encoding="utf-8") as f: f.write(message + "\n")
+
+    def status(self, since=0, max_lines=2000):
+        with self._lock:
+            start = max(since, self.first_line); end = min(self.first_line + len(self.lines), start + max_lines)
+            lines = list(itertools.islice(self.lines, start - self.first_line, end - self.first_line))
+        return {"id": self.id, "kind": self.kind, "state": self.state, "progress": self.progress, "speed": self.speed,
+                "created": self.created, "finished": self.finished_at, "result": self.result, "log": lines, "next": end}
+
+class PublishService:
+    """Queues jobs and runs up to 'service_max_jobs' of them at once with TransferEngine / ArchiveWorker."""
+    def __init__(self, config_data, host=None, port=None, token=None):
+        self.config_data = config_data
+        self.host = host or config_data.get("service_host", "127.0.0.1"); self.port = port or config_data.get("service_port", 8765)
+        self.token = token if token is not None else config_data.get("service_token", "")
+        self.path_map = config_data.get("service_path_map", {}); self.roots = service_roots(config_data)
+        self.log_dir = os.path.join(get_cache_dir(config_data), "service_logs"); os.makedirs(self.log_dir, exist_ok=True)
+        self.jobs = collections.OrderedDict(); self._slots = threading.Semaphore(config_data.get("service_max_jobs", 2))
+        self.server = None
+
+    def check_paths(self, paths):
+        """Raises ValueError unless every client path, translated to the service's view, lies below one of the service roots."""
+        for path in paths:
+            if not path_within(translate_path(path, self.path_map), self.roots): raise ValueError(f"'{path}' is outside the roots this service may write to")
+
+    def submit(self, kind, payload):
+        if kind not in ("publish", "archive"): raise ValueError(f"Unknown job kind '{kind}'")
+        if kind == "publish": paths = [path for copy_job in payload["copy_jobs"] for path in copy_job] + [d for d in payload.get("daily_dirs") or [] if d]
+        else: paths = list(payload["shot_paths"])
+        self.check_paths(paths + ([payload["log_file"]] if payload.get("log_file") else []))
+        job = ServiceJob(kind, payload, self.log_dir); self.jobs[job.id] = job
+        threading.Thread(target=self._run_job, args=(job,), name=f"xPubJob-{job.id}", daemon=True).start()
+        return job
+
+    def _run_job(self, job):
+        with self._slots:
+            if job.state == "aborted": return
+            job.state = "running"; job.log(f"Job {job.id} ({job.kind}) started on {socket.gethostname()}")
+            try: success = self._run_publish(job) if job.kind == "publish" else self._run_archive(job)
+            except Exception as e: job.log(f"FATAL ERROR: {e}"); success = False
+            if job.state != "aborted": job.state = "done" if success else "failed"
+            job.finished_at = datetime.datetime.now().strftime(LOG_DATETIME_FORMAT); job.control = None
+
+    def _set_progress(self, job, value): job.progress = value
+    def _set_speed(self, job, value): job.speed = value
+
+    def _run_publish(self, job):
+        p = job.payload; translate = lambda path: translate_path(path, self.path_map)
+        copy_jobs = [(translate(source), translate(dest)) for source, dest in p["copy_jobs"]]
+        daily_dirs = [translate(d) if d else None for d in p.get("daily_dirs") or []] or None
+        entry = p.get("log_entry")
+        def on_dedup(index, files, saved):
+            if entry: entry["Publishes"][index].update({"dedup_files": files, "dedup_bytes": int(saved)})
+        engine = TransferEngine(copy_jobs, p.get("is_move", False), p.get("throttle", "Fast"), self.config_data, p.get("dedup", False), daily_dirs,
+                                log_callback=job.log, progress_callback=lambda v: self._set_progress(job, v), speed_callback=lambda v: self._set_speed(job, v), dedup_callback=on_dedup,
+                                priority=p.get("priority"))
+        job.control = engine
+        success = engine.run()
+        if success and entry and p.get("log_file"):
+            append_json_log(translate(p["log_file"]), entry); job.log(f"Successfully updated log file: {p['log_file']}")
+        return success
+
+    def _run_archive(self, job):
+        p = job.payload; translate = lambda path: translate_path(path, self.path_map)
+        max_age_days = p.get("max_age_days"); max_age_days = float('inf') if max_age_days is None else max_age_days
+        worker = ArchiveWorker([translate(s) for s in p["shot_paths"]], p["threshold"], max_age_days, p.get("max_age_enabled", False), self.config_data, p.get("mode", "Purge"), p.get("priority"), p.get("departments"))
+        outcome = {}
+        def on_summary(cleaned, packs):
+            job.result = {"cleaned": cleaned, "packs": packs}
+            entry = p.get("log_entry")
+            if entry and p.get("log_file"):
+                entry["CleanedVersions"] = cleaned
+                if packs: entry["Packs"] = packs
+                append_json_log(translate(p["log_file"]), entry)
+        worker.log_message.connect(job.log); worker.progress_updated.connect(lambda v: self._set_progress(job, v))
+        worker.archive_summary_ready.connect(on_summary); worker.finished.connect(lambda ok: outcome.update(ok=ok))
+        job.control = worker
+        worker.run() # Runs synchronously on this job thread; signals are delivered directly
+        return outcome.get("ok", False)
+
+    def control(self, job, action, options=None):
+        """abort / pause / resume / priority (options {"priority": name}) a job."""
+        if action == "abort":
+            if job.state == "queued": job.state = "aborted"; job.log("--- ABORTED BEFORE START ---"); return
+            job.state = "aborted"
+            if job.control: job.control.abort()
+        elif action in ("pause", "resume") and isinstance(job.control, TransferEngine): job.control.set_paused(action == "pause")
+        elif action == "priority" and job.control: job.control.set_priority(str((options or {}).get("priority", "")))
+        else: raise ValueError(f"Cannot {action} a {job.kind} job")
+
+    def unpack(self, payload):
+        """Unpacks a small file batch a client wrote into dest and removes it. Only batch files directly inside a dest below the service roots are accepted."""
+        self.check_paths([payload["dest"]])
+        archive, dest = translate_path(payload["archive"], self.path_map), translate_path(payload["dest"], self.path_map)
+        if not os.path.basename(archive).startswith(SMALL_BATCH_PREFIX) or os.path.dirname(os.path.normpath(archive)) != os.path.normpath(dest): raise ValueError(f"'{archive}' is not a batch in '{dest}'")
+        try: return {"files": unpack_small_batch(archive, dest)}
+        finally:
+            try: os.remove(archive)
+            except OSError: pass
+
+    def serve_forever(self):
+        import hmac
+        import http.server
+        import urllib.parse
+        service = self
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args): pass # Keep the console for job output
+            def _reply(self, code, data):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(code); self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(body))); self.end_headers()
+                self.wfile.write(body)
+            def _authorized(self):
+                if service.token and not hmac.compare_digest(self.headers.get("X-xPub-Token", "").encode("utf-8"), service.token.encode("utf-8")): self._reply(403, {"error": "Bad or missing X-xPub-Token"}); return False
+                return True
+            def _job(self, job_id):
+                job = service.jobs.get(job_id)
+                if not job: self._reply(404, {"error": f"No job '{job_id}'"})
+                return job
+            def do_GET(self):
+                if not self._authorized(): return
+                url = urllib.parse.urlsplit(self.path); parts = [p for p in url.path.split("/") if p]
+                if parts == ["jobs"]: self._reply(200, [{k: v for k, v in job.status(max_lines=0).items() if k not in ("log", "next")} for job in service.jobs.values()]); return
+                if len(parts) == 2 and parts[0] == "jobs":
+                    try: since = int(urllib.parse.parse_qs(url.query).get("since", ["0"])[0])
+                    except ValueError: self._reply(400, {"error": "'since' must be a line number"}); return
+                    job = self._job(parts[1])
+                    if job: self._reply(200, job.status(since))
+                    return
+                self._reply(404, {"error": "Not found"})
+            def do_POST(self):
+                if not self._authorized(): return
+                parts = [p for p in urllib.parse.urlsplit(self.path).path.split("/") if p]
+                try:
+                    payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                    if parts == ["jobs"]:
+                        job = service.submit(payload.pop("kind", None), payload); print(f"Accepted {job.kind} job {job.id}"); self._reply(200, {"id": job.id}); return
+                    if parts == ["unpack"]: self._reply(200, service.unpack(payload)); return
+                    if len(parts) == 3 and parts[0] == "jobs":
+                        job = self._job(parts[1])
+                        if job: service.control(job, parts[2], payload); self._reply(200, {"id": job.id, "state": job.state})
+                        return
+                    self._reply(404, {"error": "Not found"})
+                except (ValueError, KeyError, TypeError, OSError) as e: self._reply(400, {"error": str(e)})
+        if not self.token and not is_loopback_host(self.host):
+            raise ValueError(f"Refusing to listen on '{self.host}' without a 'service_token': anyone who can reach it could move or delete files. Set service_token (or --token), or listen on 127.0.0.1.")
+        self.server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        print(f"xPub publish service listening on http://{self.host}:{self.server.server_port} (logs: {self.log_dir})")
+        try: self.server.serve_forever()
+        except KeyboardInterrupt: pass
+        finally: self.server.server_close()
+
+class PublishServiceClient:
+    """Minimal JSON client for PublishService."""
+    def __init__(self, base_url, token="", timeout=10):
+        self.base_url = base_url.rstrip("/"); self.token = token; self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, config_data):
+        return cls(config_data.get("service_url", ""), config_data.get("service_token", ""))
+
+    def _request(self, method, path, data=None):
+        import urllib.error
+        import urllib.request
+        request = urllib.request.Request(self.base_url + path, method=method, data=json.dumps(data).encode("utf-8") if data is not None else None,
+                                         headers={"Content-Type": "application/json", "X-xPub-Token": self.token})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response: return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"Service error {e.code}: {e.read().decode(errors='replace')}") from None
+
+    def submit(self, kind, payload): return self._request("POST", "/jobs", dict(payload, kind=kind))["id"]
+    def status(self, job_id, since=0): return self._request("GET", f"/jobs/{job_id}?since={since}")
+    def control(self, job_id, action, data=None): return self._request("POST", f"/jobs/{job_id}/{action}", data or {})
+    def jobs(self): return self._request("GET", "/jobs")
+    def unpack(self, archive, dest): return self._request("POST", "/unpack", {"archive": archive, "dest": dest})
+
+class RemoteJobWorker(QtCore.QObject):
+    """
+    Submits a job to the publish service and streams its progress back with the same signals as
+    RobocopyWorker. The service writes the publish/archive log itself. detach() stops following the job without stopping it, so jobs
+    outlive the GUI. run() blocks its thread: connect abort/toggle_pause with DirectConnection.
+    """
+    progress_updated = QtCore.Signal(int); log_message = QtCore.Signal(str); finished = QtCore.Signal(bool)
+    speed_updated = QtCore.Signal(str)
+
+    def __init__(self, client, kind, payload, poll_interval_ms=250):
+        super().__init__()
+        self.client = client; self.kind = kind; self.payload = payload; self.poll_interval = poll_interval_ms / 1000.0
+        self.job_id = None; self._detached = False
+
+    def run(self):
+        success = False
+        try:
+            self.job_id = self.client.submit(self.kind, self.payload)
+            self.log_message.emit(f"Submitted {self.kind} job {self.job_id} to {self.client.base_url}")
+            since, failures = 0, 0
+            while not self._detached:
+                try: status = self.client.status(self.job_id, since); failures = 0
+                except (OSError, RuntimeError) as e:
+                    failures += 1
+                    if failures >= 20: raise
+                    time.sleep(self.poll_interval * failures); continue
+                if status["log"]: self.log_message.emit("\n".join(status["log"]))
+                since = status["next"]; self.progress_updated.emit(status["progress"])
+                if status["speed"]: self.speed_updated.emit(status["speed"])
+                if status["state"] in ("done", "failed", "aborted") and not status["log"]: # Log fully drained
+                    success = status["state"] == "done"; break
+                if not status["log"]: time.sleep(self.poll_interval)
+            if self._detached: self.log_message.emit(f"Detached; job {self.job_id} keeps running on the service.")
+        except Exception as e:
+            self.log_message.emit(f"ERROR: Publish service: {e}")
+        self.finished.emit(success)
+
+    def abort(self):
+        if self.job_id:
+            try: self.client.control(self.job_id, "abort")
+            except Exception as e: self.log_message.emit(f"ERROR: Could not abort job: {e}")
+
+    @QtCore.Slot(bool)
+    def toggle_pause(self, paused):
+        if self.job_id:
+            try: self.client.control(self.job_id, "pause" if paused else "resume")
+            except Exception as e: self.log_message.emit(f"Pause/Resume Error: {e}")
+
+    @QtCore.Slot(str)
+    def set_priority(self, name):
+        if self.job_id:
+            try: self.client.control(self.job_id, "priority", {"priority": name})
+            except Exception as e: self.log_message.emit(f"Priority Error: {e}")
+
+    def detach(self): self._detached = True
+
 # ... (ProgressDialog, RobocopyWorker, and InfoDialog classes are unchanged) ...
+class LogCoalescer:
+    """
+    Buffers a worker's log lines and keeps only the latest progress/speed value, forwarding them
+    at most once per interval_ms: one joined log chunk per slice instead of one cross-thread
+    signal per robocopy line. Whatever is buffered is also flushed interval_ms after it arrived,
+    so a slow trickle of lines still shows up. The worker's thread is blocked inside run(), so
+    this deadline is a threading.Timer rather than a QTimer. Call flush() at the end of each job.
+    """
+    def __init__(self, log_callback, progress_callback=None, speed_callback=None, interval_ms=100):
+        self.log_callback = log_callback; self.progress_callback = progress_callback; self.speed_callback = speed_callback
+        self.interval = interval_ms / 1000.0
+        self._lines = []; self._progress = self._speed = None; self._sent_progress = self._sent_speed = None
+        self._last_flush = time.monotonic(); self._lock = threading.RLock(); self._timer = None
+
+    def log(self, message):
+        with self._lock: self._lines.append(message)
+        self._maybe_flush()
+
+    def progress(self, value):
+        self._progress = value; self._maybe_flush()
+
+    def speed(self, speed_text):
+        self._speed = speed_text; self._maybe_flush()
+
+    def _maybe_flush(self):
+        wait = self.interval - (time.monotonic() - self._last_flush)
+        if wait <= 0: self.flush(); return
+        with self._lock:
+            if self._timer is None: self._timer = threading.Timer(wait, self.flush); self._timer.daemon = True; self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None: self._timer.cancel(); self._timer = None
+            lines, self._lines = self._lines, []; self._last_flush = time.monotonic()
+            if lines: self.log_callback("\n".join(lines))
+            if self.progress_callback and self._progress is not None and self._progress != self._sent_progress:
+                self._sent_progress = self._progress; self.progress_callback(self._progress)
+            if self.speed_callback and self._speed is not None and self._speed != self._sent_speed:
+                self._sent_speed = self._speed; self.speed_callback(self._speed)
+
 class ProgressDialog(QtWidgets.QDialog):
     abort_clicked = QtCore.Signal()
     pause_toggled = QtCore.Signal(bool)
-    def __init__(self, parent=None):
+    priority_changed = QtCore.Signal(str)
+    def __init__(self, parent=None, max_lines=5000, log_file=None):
         super(ProgressDialog, self).__init__(parent)
         self.setWindowTitle("Operation in Progress...")
         self.setMinimumSize(600, 400)
         
-        self.log_viewer = QtWidgets.QTextEdit(); self.log_viewer.setReadOnly(True)
+        # Bounded viewer: the oldest lines drop off once max_lines is reached. The full log goes to log_file.
+        self.log_viewer = QtWidgets.QPlainTextEdit(); self.log_viewer.setReadOnly(True); self.log_viewer.setMaximumBlockCount(max_lines)
+        self.log_path = log_file; self._log_file = None
+        if log_file:
+            try: self._log_file = open(log_file, 'a', encoding="utf-8")
+            except OSError as e: print(f"Could not open transfer log {log_file}: {e}"); self.log_path = None
         self.progress_bar = QtWidgets.QProgressBar(); self.progress_bar.setTextVisible(False)
         self.speed_label = QtWidgets.QLabel("Speed: N/A")
         self.pause_button = QtWidgets.QPushButton("Pause"); self.pause_button.setCheckable(True)
         self.abort_button = QtWidgets.QPushButton("Abort")
         self.close_button = QtWidgets.QPushButton("Close"); self.close_button.setEnabled(False)
+        self.priority_label = QtWidgets.QLabel("Priority:"); self.priority_combo = QtWidgets.QComboBox()
+        self.priority_label.setVisible(False); self.priority_combo.setVisible(False) # Shown by enable_priority for jobs that support it
         
         progress_layout = QtWidgets.QHBoxLayout(); progress_layout.addWidget(self.progress_bar); progress_layout.addWidget(self.speed_label)
-        button_layout = QtWidgets.QHBoxLayout(); button_layout.addStretch(); button_layout.addWidget(self.pause_button); button_layout.addWidget(self.abort_button); button_layout.addWidget(self.close_button)
+        button_layout = QtWidgets.QHBoxLayout(); button_layout.addWidget(self.priority_label); button_layout.addWidget(self.priority_combo); button_layout.addStretch(); button_layout.addWidget(self.pause_button); button_layout.addWidget(self.abort_button); button_layout.addWidget(self.close_button)
         main_layout = QtWidgets.QVBoxLayout(self); main_layout.addWidget(QtWidgets.QLabel("Log:")); main_layout.addWidget(self.log_viewer); main_layout.addLayout(progress_layout); main_layout.addLayout(button_layout)
         
         self.abort_button.clicked.connect(self.abort_clicked.emit); self.pause_button.toggled.connect(self.on_pause_toggled); self.close_button.clicked.connect(self.accept)
     
     def on_pause_toggled(self, checked):
         self.pause_button.setText("Resume" if checked else "Pause"); self.pause_toggled.emit(checked)
+
+    def enable_priority(self, names, current):
+        """Shows the priority selector; changing it emits priority_changed while the job runs."""
+        self.priority_combo.addItems(names); self.priority_combo.setCurrentText(current)
+        self.priority_label.setVisible(True); self.priority_combo.setVisible(True)
+        self.priority_combo.currentTextChanged.connect(self.priority_changed.emit)
     
     @QtCore.Slot(str)
-    def add_log(self, message): self.log_viewer.append(message)
+    def add_log(self, message):
+        self.log_viewer.appendPlainText(message)
+        if self._log_file: self._log_file.write(message + "\n")
     
     @QtCore.Slot(int)
-    def set_progress(self, value): self.progress_bar.setValue(value)
+    def set_progress(self, value):
+        if value != self.progress_bar.value(): self.progress_bar.setValue(value)
     
     @QtCore.Slot(str)
     def set_speed(self, speed_text): self.speed_label.setText(f"Speed: {speed_text}")
 
     def on_finished(self, success, success_message="OPERATION COMPLETED SUCCESSFULLY", failure_message="OPERATION FAILED OR ABORTED"):
-        self.pause_button.setEnabled(False); self.abort_button.setEnabled(False); self.close_button.setEnabled(True)
+        self.pause_button.setEnabled(False); self.abort_button.setEnabled(False); self.priority_combo.setEnabled(False); self.close_button.setEnabled(True)
         if success:
             self.add_log(f"\n--- {success_message} ---"); self.progress_bar.setValue(100)
         else:
             self.add_log(f"\n--- {failure_message} ---")
+        if self.log_path: self.add_log(f"Full log: {self.log_path}")
+        if self._log_file: self._log_file.flush() # Closed already if the dialog was dismissed first
         self.setWindowTitle("Operation Finished")
 
+    def done(self, result):
+        if self._log_file: self._log_file.close(); self._log_file = None
+        super(ProgressDialog, self).done(result)
+
 class RobocopyWorker(QtCore.QObject):
+    """Qt adapter: runs a TransferEngine in a QThread and re-emits its callbacks as signals.
+    run() blocks its thread, so connect abort/toggle_pause with QtCore.Qt.DirectConnection."""
     progress_updated = QtCore.Signal(int); log_message = QtCore.Signal(str); finished = QtCore.Signal(bool)
     speed_updated = QtCore.Signal(str)
+    job_deduped = QtCore.Signal(int, int, float) # job index, files linked, bytes saved
 
-    def __init__(self, copy_jobs, is_move=False, throttle="Fast", config_data={}):
-        super().__init__()
-        self.copy_jobs = copy_jobs; self.is_move = is_move; self.throttle = throttle
-        self.config_data = config_data # Store config data
-        self._is_aborted = False; self.process = None; self._psutil_process = None
-    
-    def run(self):
-        total_jobs = len(self.copy_jobs); success = True
-        for i, (source, dest) in enumerate(self.copy_jobs):
-            if self._is_aborted: success = False; break
-            operation = "Moving" if self.is_move else "Copying"; os.makedirs(os.path.dirname(dest), exist_ok=True)
-            self.log_message.emit(f"{operation} '{os.path.basename(source)}'..."); self.log_message.emit(f"  Source: {source}\n  Destination: {dest}")
-            
-            command = ["robocopy", source, dest, "/E", "/R:2", "/W:5", "/NJH", "/NJS", "/ETA"]
-            if self.is_move: 
-                command.append("/MOV")
-
-            # Use the config value if "Slow" is selected
-            if self.throttle == "Slow":
-                delay = self.config_data.get("throttle_delay_ms", 100) # Read from config, fallback to 100
-                command.append(f"/IPG:{delay}")
-            else: # Fast mode
-                command.append("/MT")
-            
-            self.process = QtCore.QProcess(); self.process.readyReadStandardOutput.connect(lambda: self._read_stdout(i, total_jobs))
-            loop = QtCore.QEventLoop(); self.process.finished.connect(loop.quit); self.process.start("robocopy", command[1:])
-            
-            if self.process.waitForStarted(): self._psutil_process = psutil.Process(self.process.processId()); loop.exec()
-            else: self.log_message.emit(f"ERROR: Could not start robocopy for {source}"); success = False; break
-            
-            if self._is_aborted: success = False; break
-            if self.process.exitCode() >= 8: self.log_message.emit(f"ERROR: Robocopy failed with exit code {self.process.exitCode()}"); success = False; break
-        
-        self.finished.emit(success)
+    def __init__(self, copy_jobs, is_move=False, throttle="Fast", config_data={}, dedup=False, daily_dirs=None):
+        super().__init__()
+        self.engine = TransferEngine(copy_jobs, is_move, throttle, config_data, dedup, daily_dirs,
+                                     log_callback=self.log_message.emit, progress_callback=self.progress_updated.emit,
+                                     speed_callback=self.speed_updated.emit, dedup_callback=self.job_deduped.emit)
 
-    def _read_stdout(self, job_index, total_jobs):
-        if not self.process: return
-        output = self.process.readAllStandardOutput().data().decode().strip()
-        if not output: return
-        for line in output.split('\r'):
-            line = line.strip(); 
-            if not line: continue
-            self.log_message.emit(line)
-            match = re.search(r"(\d+\.?\d*)\s*%", line)
-            if match:
-                percentage = float(match.group(1)); overall_progress = int(((job_index + (percentage / 100.0)) / total_jobs) * 100); self.progress_updated.emit(overall_progress)
-            
-            # FIX: More robust regex to capture any speed unit
-            speed_match = re.search(r"Speed:\s+([\d,.]+\s+[KMG]?B/sec)", line)
-            if speed_match:
-                self.speed_updated.emit(speed_match.group(1).strip())
+    def run(self):
+        self.finished.emit(self.engine.run())
 
     def abort(self):
-        self.log_message.emit("--- ABORTING ---"); self._is_aborted = True
-        if self.process and self.process.state() == QtCore.QProcess.Running: self.process.kill()
-    
+        self.engine.abort()
+
     @QtCore.Slot(bool)
     def toggle_pause(self, paused):
-        if not self._psutil_process or not self._psutil_process.is_running(): return
-        try:
-            if paused and self._psutil_process.status() == psutil.STATUS_RUNNING: self._psutil_process.suspend(); self.log_message.emit("--- PROCESS PAUSED ---")
-            elif not paused and self._psutil_process.status() == psutil.STATUS_STOPPED: self._psutil_process.resume(); self.log_message.emit("--- PROCESS RESUMED ---")
-        except psutil.NoSuchProcess: pass
-        except Exception as e: self.log_message.emit(f"Pause/Resume Error: {e}")
+        self.engine.set_paused(paused)
+
+    @QtCore.Slot(str)
+    def set_priority(self, name):
+        self.engine.set_priority(name)
 
 
 # /////////////////////////////////////////////
@@ -131,85 +3932,69 @@ class ArchiveWorker(QtCore.QObject):
     progress_updated = QtCore.Signal(int)
     log_message = QtCore.Signal(str)
     finished = QtCore.Signal(bool)
-    archive_summary_ready = QtCore.Signal(list)
+    archive_summary_ready = QtCore.Signal(list, list) # cleaned versions, pack paths
 
-    def __init__(self, shot_paths, threshold, max_age_days, max_age_enabled, config_data):
+    def __init__(self, shot_paths, threshold, max_age_days, max_age_enabled, config_data, mode="Purge", priority=None, departments=None):
         super().__init__()
         self.shot_paths = shot_paths
+        self.departments = departments or [config_data.get("active_department")]
+        self.folder_departments = {} # Version path -> department, for the department's archive_root
         self.threshold = threshold
         self.max_age_days = max_age_days
         self.max_age_enabled = max_age_enabled
         self.config_data = config_data
+        self.mode = mode # "Purge" deletes file contents, "Pack" moves them into cold storage packs first
         self._is_aborted = False
+        self.priority = PriorityControl(config_data, priority or config_data.get("purge_priority", "Low"), self.log_message.emit)
 
     def run(self):
         try:
-            dept = self.config_data.get("active_department")
-            source_template = self.config_data.get("departments", {}).get(dept, {}).get("source_path")
-            if not source_template:
-                self.log_message.emit("ERROR: No 'source_path' in config for active department.")
+            self.priority.apply_here() # Scan, deletes and the pack pool all run below the artists' own work
+            departments = [dept for dept in self.departments if self.config_data.get("departments", {}).get(dept, {}).get("source_path")]
+            if not departments:
+                self.log_message.emit(f"ERROR: No 'source_path' in config for department {', '.join(map(str, self.departments))}.")
                 self.finished.emit(False); return
 
             folders_to_clean = []
             cleaned_paths_log = []
-            
-            # Loop through all selected shots
-            for shot_path in self.shot_paths:
-                if self._is_aborted: break
-                user_base_path = os.path.join(shot_path, source_template.replace('/', os.sep))
-                if not os.path.exists(user_base_path): continue
-
-                user_dirs = [d for d in os.listdir(user_base_path) if os.path.isdir(os.path.join(user_base_path, d))]
-                for user in user_dirs:
-                    preview_path = os.path.join(user_base_path, user, "renders", "preview")
-                    if not os.path.exists(preview_path): continue
-                    render_names = [r for r in os.listdir(preview_path) if os.path.isdir(os.path.join(preview_path, r))]
-                    for render in render_names:
-                        render_path = os.path.join(preview_path, render)
-                        versions_with_mtime = []
-                        for v in os.listdir(render_path):
-                            v_path = os.path.join(render_path, v)
-                            if os.path.isdir(v_path):
-                                versions_with_mtime.append((v, os.path.getmtime(v_path)))
-                        
-                        versions_with_mtime.sort(key=lambda x: x[1])
-                        sorted_versions = [v[0] for v in versions_with_mtime]
-                        
-                        versions_to_delete = set()
-
-                        if len(sorted_versions) > self.threshold:
-                            versions_to_delete.update(sorted_versions[:-self.threshold])
-
-                        if self.max_age_enabled:
-                            for version in sorted_versions:
-                                full_path = os.path.join(render_path, version)
-                                age = self._get_folder_age_in_days(full_path)
-                                if age > self.max_age_days:
-                                    versions_to_delete.add(version)
-
-                        for version in versions_to_delete:
-                            folders_to_clean.append(os.path.join(render_path, version))
-                            cleaned_paths_log.append(f"{os.path.basename(shot_path)}/{render}/{version} ({user})")
+
+            # One concurrent scan of the selected shots, then the retention policies over all of it at once.
+            # The Archiver's threshold / max age stand in for each department's WIP keep_latest / max_age_days.
+            index = build_version_index(self.config_data, self.shot_paths, departments)
+            if self._is_aborted: self.finished.emit(False); return
+            overrides = {(dept, "WIP"): {"keep_latest": self.threshold, "max_age_days": self.max_age_days if self.max_age_enabled else None} for dept in departments}
+            plan = evaluate_retention(index, resolve_retention_policies(self.config_data, overrides), self.config_data.get("retention_pins", []), logged_versions_from_logs(self.shot_paths))
+            for row in sorted(plan.rows(), key=lambda r: (r["shot"], r["department"], r["user"], r["render"], r["mtime"])):
+                if row["source"] != "WIP": continue
+                label = f"{row['shot']}/{row['render']}/{row['version']} ({row['user']})" if len(departments) == 1 else f"{row['shot']}/{row['department']}/{row['render']}/{row['version']} ({row['user']})"
+                if row["action"] == "delete": folders_to_clean.append(row["path"]); cleaned_paths_log.append(label); self.folder_departments[row["path"]] = row["department"]
+                elif not row["reason"].startswith("within latest"): self.log_message.emit(f"Keeping {label}: {row['reason']}")
 
             if self._is_aborted: self.finished.emit(False); return
             if not folders_to_clean:
                 self.log_message.emit("All versions are within the specified filters. Nothing to archive."); self.finished.emit(True); return
 
+            if self.mode == "Pack":
+                cleaned_paths_log, pack_paths, success = self._pack_folders(folders_to_clean, cleaned_paths_log)
+                if self._is_aborted:
+                    if pack_paths: self.log_message.emit(f"Aborted after packing {len(pack_paths)} versions; they are logged."); self.archive_summary_ready.emit(cleaned_paths_log, pack_paths) # Their sources are already emptied
+                    self.finished.emit(False); return
+                self.log_message.emit("\nPack operation complete." if success else "\nPack operation finished with errors.")
+                self.archive_summary_ready.emit(cleaned_paths_log, pack_paths)
+                self.finished.emit(success); return
+
             total_to_clean = len(folders_to_clean)
             for i, folder_path in enumerate(folders_to_clean):
                 if self._is_aborted: self.finished.emit(False); return
                 
                 self.log_message.emit(f"Cleaning: .../{'/'.join(folder_path.split(os.sep)[-5:])}")
-                for root, dirs, files in os.walk(folder_path, topdown=False):
-                    for name in files:
-                        try: os.remove(os.path.join(root, name))
-                        except OSError as e: self.log_message.emit(f"  ERROR deleting file {name}: {e}")
+                self._delete_folder_contents(folder_path)
                 
                 progress = int(((i + 1) / total_to_clean) * 100)
                 self.progress_updated.emit(progress)
             
             self.log_message.emit("\nArchive operation complete.")
-            self.archive_summary_ready.emit(cleaned_paths_log)
+            self.archive_summary_ready.emit(cleaned_paths_log, [])
             self.finished.emit(True)
 
         except Exception as e:
@@ -218,6 +4003,97 @@ class ArchiveWorker(QtCore.QObject):
     def abort(self):
         self.log_message.emit("--- ABORTING ---"); self._is_aborted = True
 
+    @QtCore.Slot(str)
+    def set_priority(self, name): self.priority.set(name)
+
+    def _delete_folder_contents(self, folder_path):
+        """Deletes every file below folder_path, keeping the folder structure itself."""
+        for root, dirs, files in os.walk(folder_path, topdown=False):
+            self.priority.apply_here()
+            for name in files:
+                try: os.remove(os.path.join(root, name))
+                except OSError as e: self.log_message.emit(f"  ERROR deleting file {name}: {e}")
+
+    def _delete_packed_files(self, folder_path, members):
+        """Deletes exactly the files a pack holds, as (name, size, mtime) members. Files added to the folder after it was
+        packed, or rewritten since, are not in the pack and are kept."""
+        packed = set()
+        for name, size, mtime in members:
+            file_path = os.path.join(folder_path, *name.split("/")); packed.add(os.path.normcase(file_path))
+            try:
+                st = os.stat(file_path)
+                if st.st_size != size or int(st.st_mtime) != int(mtime): self.log_message.emit(f"  Keeping {name}: changed since it was packed"); continue
+                os.remove(file_path)
+            except FileNotFoundError: pass
+            except OSError as e: self.log_message.emit(f"  ERROR deleting file {name}: {e}")
+        added = sum(1 for dirpath, dirnames, filenames in os.walk(folder_path) for f in filenames if os.path.normcase(os.path.join(dirpath, f)) not in packed)
+        if added: self.log_message.emit(f"  Kept {added} files added after the version was packed")
+
+    def _pack_folders(self, folders_to_clean, cleaned_paths_log):
+        """
+        Packs each version folder into archive_root on a process pool. Only the files a pack holds
+        are deleted, and only once it has been written and verified. With an object-store
+        archive_root the pack is built in cache_dir and uploaded (multipart) before the source is
+        touched. On abort the queued versions are dropped, but packs already being written are
+        finished and returned like the others, so none is left without its source purged and logged.
+        Returns (packed versions, pack paths, success).
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        codec = self.config_data.get("pack_compression", "lzma")
+        workers = self.config_data.get("pack_workers") or os.cpu_count() or 2
+        jobs = []
+        for folder_path, label in zip(folders_to_clean, cleaned_paths_log):
+            if any(files for _, _, files in os.walk(folder_path)): jobs.append((folder_path, label))
+            else: self.log_message.emit(f"Skipping (already empty): {label}")
+        if not jobs: return [], [], True
+
+        packed_versions, pack_paths, success = [], [], True
+        self.log_message.emit(f"Packing {len(jobs)} versions with {codec} on {min(workers, len(jobs))} processes...")
+        targets, spool_dir = {}, os.path.join(get_cache_dir(self.config_data), "pack_upload")
+        for folder_path, label in jobs:
+            target = get_pack_path(self.config_data, folder_path, self.folder_departments.get(folder_path, self.departments[0]))
+            targets[folder_path] = (target, os.path.join(spool_dir, f"{uuid.uuid4().hex}.tar") if is_object_store_path(target) else target)
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=lower_worker_process, initargs=(self.priority.levels[self.priority.name],)) as pool:
+            futures = {pool.submit(pack_version_folder, folder_path, targets[folder_path][1], codec): label for folder_path, label in jobs}
+            cancelled = False
+            for done, future in enumerate(as_completed(futures), start=1):
+                if self._is_aborted and not cancelled:
+                    for pending in futures: pending.cancel() # Only queued ones; running packs finish and are handled below
+                    cancelled = True
+                if future.cancelled(): continue
+                label = futures[future]
+                try: summary = future.result()
+                except Exception as e: summary = {"error": str(e)}
+                if not summary["error"] and summary["pack"] != targets[summary["source"]][0]:
+                    summary["error"] = self._upload_pack(summary["pack"], targets[summary["source"]][0])
+                    if not summary["error"]: summary["pack"] = targets[summary["source"]][0]
+                if summary["error"]:
+                    self.log_message.emit(f"ERROR packing {label}: {summary['error']} (source kept)"); success = False
+                else:
+                    ratio = summary["packed_bytes"] / summary["bytes"] * 100 if summary["bytes"] else 0
+                    self.log_message.emit(f"Packed: {label} ({summary['files']} files, {format_size(summary['bytes'])} -> {format_size(summary['packed_bytes'])}, {ratio:.0f}%)")
+                    self._delete_packed_files(summary["source"], summary["members"])
+                    packed_versions.append(label); pack_paths.append(summary["pack"])
+                self.progress_updated.emit(int(done / len(jobs) * 100))
+        return packed_versions, pack_paths, success
+
+    def _upload_pack(self, local_pack, target):
+        """Uploads a finished pack and its index to the object store and checks the stored size. The local copy is dropped either way
+        (on failure the source is kept). Returns an error or None."""
+        backend = storage_for(target)
+        try:
+            self.log_message.emit(f"  Uploading {format_size(os.path.getsize(local_pack))} to {target}...")
+            backend.upload_file(local_pack, target)
+            if os.path.exists(local_pack + ".index.json"): backend.upload_file(local_pack + ".index.json", target + ".index.json")
+            stored = backend.stat(target)
+            if stored is None or stored.size != os.path.getsize(local_pack): return f"uploaded pack size mismatch for {target}"
+        except Exception as e: return f"upload failed: {e}"
+        finally:
+            for path in (local_pack, local_pack + ".index.json"):
+                try: os.remove(path)
+                except OSError: pass
+        return None
+
     def _get_directory_size(self, path):
         # ... (unchanged)
         total_size = 0; 
@@ -249,55 +4125,672 @@ class InfoDialog(QtWidgets.QDialog):
 # /////////////////////////////////////////////
 # REVISED - Shot Scanner Worker
 # \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
-class ShotScannerWorker(QtCore.QObject):
-    """Scans all shots in a sequence to get their total size based on data source."""
-    shot_found = QtCore.Signal(str, float) # FIX: Changed from int to float
-    finished = QtCore.Signal()
+class ShotScannerWorker(AsyncScanBridge):
+    """Scans all shots in a sequence to get their total size per department, based on data source.
+    Shots and their departments are sized concurrently; batch_ready delivers lists of (scan_id, shot_name, department, SizeEstimate)
+    as they finish. With 'size_estimates' every shot first gets a sampled estimate, then its exact size. scan_id lets the
+    receiver drop results of a sequence it left."""
 
-    def __init__(self, seq_path, config_data, source_mode):
-        super().__init__()
+    def __init__(self, seq_path, config_data, source_mode, departments=None, scan_id=0):
+        super().__init__(config_data)
         self.seq_path = seq_path
-        self.config_data = config_data
         self.source_mode = source_mode
+        self.departments = departments or [config_data.get("active_department")]; self.scan_id = scan_id
 
-    def run(self):
+    async def iter_results(self, scanner):
+        department_roots = lambda shot_path: {dept: get_department_root(self.config_data, dept, shot_path, self.source_mode) for dept in self.departments}
+        exact = set()
+        if self.config_data.get("size_estimates", True):
+            async for shot, estimates in scanner.iter_shot_sizes(self.seq_path, department_roots, sample_size=self.config_data.get("size_sample_files", 48)):
+                for dept, estimate in estimates.items():
+                    if estimate.exact: exact.add((shot, dept))
+                    yield self.scan_id, shot, dept, estimate
+        async for shot, sizes in scanner.iter_shot_sizes(self.seq_path, department_roots, skip=exact):
+            for dept, size_estimate in sizes.items(): yield self.scan_id, shot, dept, size_estimate
+
+class VersionSizeWorker(AsyncScanBridge):
+    """Exact sizes of a shot's version folders; batch_ready delivers lists of (path, size) as each finishes,
+    and completed(shot_name) follows the last batch unless cancelled."""
+    completed = QtCore.Signal(str)
+
+    def __init__(self, shot_name, paths, config_data):
+        super().__init__(config_data)
+        self.shot_name = shot_name; self.paths = paths
+
+    async def _consume(self, scanner):
+        await super()._consume(scanner)
+        if not self._is_cancelled: self.completed.emit(self.shot_name)
+
+    async def iter_results(self, scanner):
+        import asyncio
+        async def sized(path): return path, await scanner.directory_size(path)
+        for next_done in asyncio.as_completed([sized(p) for p in self.paths]):
+            yield await next_done
+
+async def scan_version_sizes(scanner, base_path, source_mode, sample_size=None):
+    """Lists every version under a WIP source or publish root and sizes them all concurrently. Returns version dicts
+    (see AsyncScanner.iter_wip_versions) with an added 'size' key; with sample_size, 'size' comes from
+    AsyncScanner.estimate_size and 'estimate' holds the SizeEstimate."""
+    import asyncio
+    versions = await collect_async(scanner.iter_wip_versions(base_path) if source_mode == "WIP" else scanner.iter_publish_versions(base_path))
+    if sample_size:
+        estimates = await asyncio.gather(*(scanner.estimate_size(v['path'], sample_size) for v in versions))
+        for version_data, size_estimate in zip(versions, estimates): version_data['size'] = size_estimate.size; version_data['estimate'] = size_estimate
+    else:
+        sizes = await asyncio.gather(*(scanner.directory_size(v['path']) for v in versions))
+        for version_data, size in zip(versions, sizes): version_data['size'] = size
+    return versions
+
+async def scan_publisher_versions(scanner, config_data, user_base_path, publish_base_path):
+    """Lists all WIP versions of a shot and sizes each source and its publish destination concurrently.
+    Adds 'source_size', 'published' and 'interrupted' (a streaming move stopped half way) to each version dict. Staged publishes are committed by rename, so existence
+    means complete; the publish is only sized ('publish_size') when 'verify_publish_sizes' is set, e.g. for older publishes."""
+    import asyncio
+    verify_sizes = config_data.get("verify_publish_sizes", False)
+    versions = await collect_async(scanner.iter_wip_versions(user_base_path))
+    async def sizes(version_data):
+        source_size = await scanner.directory_size(version_data['path'])
+        published, publish_size, interrupted = False, None, False
+        if publish_base_path:
+            publish_path = storage_join(publish_base_path, version_data['render'], version_data['version'])
+            if not is_object_store_path(publish_path): interrupted = await scanner.stat(move_journal_path(publish_path)) is not None
+        if publish_base_path and source_size:
+            published = await scanner.committed(publish_path)
+            if published and verify_sizes: publish_size = await scanner.directory_size(publish_path)
+        return source_size, published, publish_size, interrupted
+    results = await asyncio.gather(*(sizes(v) for v in versions))
+    for version_data, (source_size, published, publish_size, interrupted) in zip(versions, results):
+        version_data['source_size'] = source_size; version_data['published'] = published; version_data['interrupted'] = interrupted
+        if publish_size is not None: version_data['publish_size'] = publish_size
+    return versions
+
+class ArchiveVersionsWorker(AsyncScanBridge):
+    """Versions of one Archiver shot: every {department: root} is listed and sized concurrently (see scan_version_sizes).
+    batch_ready delivers lists of (scan_id, shot_name, department, version dicts) as each department finishes, and
+    completed(shot_name, scan_id) follows the last batch unless cancelled. scan_id lets the receiver drop results of a sequence it left."""
+    completed = QtCore.Signal(str, int)
+
+    def __init__(self, shot_name, base_paths, source_mode, config_data, scan_id=0):
+        super().__init__(config_data)
+        self.shot_name = shot_name; self.base_paths = base_paths; self.source_mode = source_mode; self.scan_id = scan_id
+
+    async def _consume(self, scanner):
+        await super()._consume(scanner)
+        if not self._is_cancelled: self.completed.emit(self.shot_name, self.scan_id)
+
+    async def iter_results(self, scanner):
+        import asyncio
+        sample_size = self.config_data.get("size_sample_files", 48) if self.config_data.get("size_estimates", True) else None
+        async def department_versions(dept, base_path): return self.scan_id, self.shot_name, dept, await scan_version_sizes(scanner, base_path, self.source_mode, sample_size)
+        for next_done in asyncio.as_completed([department_versions(dept, path) for dept, path in self.base_paths.items()]):
+            yield await next_done
+
+class PublisherVersionsWorker(AsyncScanBridge):
+    """WIP versions of the publisher's shot (see scan_publisher_versions). batch_ready delivers [(prefetch key, version dicts)]
+    once the scan is done; a warm-up of the same key already running on the prefetcher is waited for instead of repeated."""
+    def __init__(self, key, user_base_path, publish_base_path, config_data, pending=None):
+        super().__init__(config_data)
+        self.key = key; self.user_base_path = user_base_path; self.publish_base_path = publish_base_path; self.pending = pending
+
+    async def iter_results(self, scanner):
+        import asyncio
+        if self.pending is not None:
+            try:
+                versions = await asyncio.wrap_future(self.pending)
+                if isinstance(versions, list): yield self.key, versions; return
+            except (Exception, asyncio.CancelledError): pass # Cancelled or failed warm-up; scan here
+        yield self.key, await scan_publisher_versions(scanner, self.config_data, self.user_base_path, self.publish_base_path)
+
+# /////////////////////////////////////////////
+# NEW - Watch Folder Auto-Publisher
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# "xPubUi watch" publishes WIP versions as the farm finishes them. Rather than rescanning shots,
+# FolderWatcher keeps one node per folder of the WIP layout (sequence, shot source root, user,
+# render, version) in a heap ordered by when each is next due. A due folder costs one stat and is
+# only listed again when its mtime moved. Each unchanged poll doubles the folder's interval up to
+# 'watch_poll_max_s', a change resets it to 'watch_poll_min_s', so idle shots cost next to nothing.
+# A version is complete when 'watch_marker' appears in it (the default), or (watch_completion
+# "stable" or "either") when its files have not changed for 'watch_stable_s'. Stability alone can
+# mistake a render paused between frames for a finished one, so it is opt-in. A finished version
+# is still stat'ed every 'watch_poll_max_s' (and listed, if it finished by stability); when it
+# changes again, e.g. a re-render, it is watched afresh and republished. Complete versions go to
+# AutoPublisher, which publishes them one at a time like the GUI does (TransferEngine, or the
+# publish service with 'watch_use_service') and writes the shot log entry with 'watch_comment'.
+WATCH_CHILD_LEVEL = {"root": "seq", "seq": "shot", "shot": "user", "user": "render", "render": "version"}
+
+class WatchNode:
+    __slots__ = ("path", "level", "info", "mtime", "interval", "due", "children", "signature", "stable_since", "retired", "marker_mtime", "rearmed")
+    def __init__(self, path, level, info, interval, due):
+        self.path = path; self.level = level; self.info = info; self.mtime = None; self.interval = interval; self.due = due
+        self.children = {}; self.signature = None; self.stable_since = None; self.retired = False; self.marker_mtime = None; self.rearmed = False
+
+class FolderWatcher:
+    """Polls the WIP trees of the given shows and calls on_complete(info) once per completed version (see the section comment)."""
+    def __init__(self, config_data, shows, on_complete, log_callback=print, clock=time.time):
+        self.config_data = config_data; self.on_complete = on_complete; self.log = log_callback; self.clock = clock
+        self.min_interval = config_data.get("watch_poll_min_s", 15); self.max_interval = max(self.min_interval, config_data.get("watch_poll_max_s", 600))
+        self.completion = config_data.get("watch_completion", "marker"); self.marker = config_data.get("watch_marker", "_COMPLETE")
+        self.stable_s = config_data.get("watch_stable_s", 600)
+        self.not_before = clock() - config_data.get("watch_catch_up_hours", 24) * 3600 # Versions untouched since are left alone
+        self.source_template = config_data.get("departments", {}).get(config_data.get("active_department"), {}).get("source_path", "").replace('/', os.sep)
+        self.nodes = {}; self._heap = []; self._rearm = collections.deque()
+        self.stats = collections.Counter() # stats / listings / completed since the last report
+        for show in shows: self._add(get_shots_root(config_data.get("project_root", ""), show), "root", {"show": show}, clock())
+
+    def _add(self, path, level, info, due):
+        node = self.nodes[path] = WatchNode(path, level, info, self.min_interval, due)
+        heapq.heappush(self._heap, (due, path))
+        return node
+
+    def _drop(self, path):
+        node = self.nodes.pop(path, None)
+        for child in list(node.children) if node else []: self._drop(child)
+
+    def _child(self, node, name):
+        """(path, info) of a child folder; shot nodes watch the shot's WIP source root, user nodes its renders/preview folder."""
+        info = dict(node.info); level = WATCH_CHILD_LEVEL[node.level]; info[level] = name
+        if level == "shot": info["shot_path"] = os.path.join(node.path, name); return os.path.join(node.path, name, self.source_template), info
+        if level == "user": return os.path.join(node.path, name, "renders", "preview"), info
+        return os.path.join(node.path, name), info
+
+    def rearm(self, path):
+        """Watches a version again (its publish failed); thread safe."""
+        self._rearm.append(path)
+
+    def next_due(self): return self._heap[0][0] if self._heap else None
+
+    def poll(self):
+        """Checks every folder that is due. Returns the number checked."""
+        now = self.clock(); checked = 0
+        while self._rearm:
+            node = self.nodes.get(self._rearm.popleft())
+            if node: # Judged afresh
+                node.retired = False; node.mtime = None; node.marker_mtime = None; node.interval = self.max_interval
+                node.due = now + node.interval; heapq.heappush(self._heap, (node.due, node.path))
+        while self._heap and self._heap[0][0] <= now:
+            due, path = heapq.heappop(self._heap); node = self.nodes.get(path)
+            if not node or node.due != due: continue # Dropped or rescheduled
+            changed = self._check(node, now); checked += 1
+            if path not in self.nodes: continue
+            if node.retired: node.interval = self.max_interval # Finished; only watched for a re-render
+            else:
+                node.interval = self.min_interval if changed else min(self.max_interval, node.interval * 2)
+                if node.level == "version" and self.completion != "marker": node.interval = min(node.interval, max(self.min_interval, self.stable_s / 2)) # Stability is judged on every poll
+            node.due = now + node.interval; heapq.heappush(self._heap, (node.due, path))
+        return checked
+
+    def _check(self, node, now):
+        self.stats["stats"] += 1
+        try: mtime = os.stat(node.path).st_mtime
+        except OSError:
+            if node.level not in ("root", "shot"): self._drop(node.path); return False # The folder went away; its parent relists
+            mtime = None # A show or shot without the WIP root yet; keep looking for it
+        changed = mtime != node.mtime; node.mtime = mtime
+        if node.level == "version": return self._check_version(node, now, changed)
+        if changed and mtime is not None:
+            self.stats["listings"] += 1; names = set(list_subdirs(node.path))
+            if node.level == "root": names = {n for n in names if not n.endswith("_Seq")} # Archive log holders
+            for name in names - set(node.children.values()):
+                path, info = self._child(node, name); node.children[path] = name; self._add(path, WATCH_CHILD_LEVEL[node.level], info, now)
+            for path, name in list(node.children.items()):
+                if name not in names: del node.children[path]; self._drop(path)
+        return changed
+
+    def _marker_mtime(self, node):
+        try: return os.stat(os.path.join(node.path, self.marker)).st_mtime
+        except OSError: return None
+
+    def _check_version(self, node, now, changed):
+        if node.retired:
+            if not changed and node.signature and self.completion != "marker":
+                self.stats["listings"] += 1; changed = snapshot_manifest(node.path) != node.signature
+            if not changed: return False
+            node.retired = False; node.rearmed = True; node.signature = None; node.stable_since = now
+            self.log(f"'{node.path}' changed after it was finished; watching it again.")
+        first = node.stable_since is None
+        if first: node.stable_since = now
+        if first and node.mtime < self.not_before: # Finished long before the watch started
+            node.retired = True; node.marker_mtime = self._marker_mtime(node); return False
+        if self.completion != "stable" and changed: # Creating the marker moves the folder mtime; one left from an earlier completion does not count
+            marker_mtime = self._marker_mtime(node)
+            if marker_mtime is not None and marker_mtime != node.marker_mtime: node.marker_mtime = marker_mtime; return self._complete(node, "marker")
+        if self.completion == "marker": return changed
+        if changed: self.stats["listings"] += 1; node.signature = snapshot_manifest(node.path); node.stable_since = now; return True
+        if not node.signature or now - node.stable_since < self.stable_s: return False
+        self.stats["listings"] += 1; signature = snapshot_manifest(node.path) # Files rewritten in place do not move the folder mtime; their sizes do
+        if signature != node.signature: node.signature = signature; node.stable_since = now; return True
+        return self._complete(node, "stable")
+
+    def _complete(self, node, trigger):
+        node.retired = True; self.stats["completed"] += 1
+        self.on_complete(dict(node.info, path=node.path, trigger=trigger, republish=node.rearmed))
+        return True
+
+    def run(self, stop_event, report_s=None):
+        """Polls until stop_event is set, sleeping until the next folder is due."""
+        report_s = report_s or self.config_data.get("watch_report_s", 600); last_report = self.clock()
+        while not stop_event.is_set():
+            self.poll()
+            if self.clock() - last_report >= report_s:
+                watched = sum(1 for n in self.nodes.values() if not n.retired); pending = sum(1 for n in self.nodes.values() if n.level == "version" and not n.retired)
+                self.log(f"Watching {watched} folders ({pending} versions in progress); {self.stats['stats']} stats, {self.stats['listings']} listings, {self.stats['completed']} completed in the last {report_s:.0f}s.")
+                self.stats.clear(); last_report = self.clock()
+            due = self.next_due()
+            stop_event.wait(max(0.5, min(report_s, (due - self.clock()) if due else report_s)))
+
+def format_watch_comment(template, info):
+    """Fills 'watch_comment' ({show} {seq} {shot} {user} {render} {version} {trigger} {host}); an unknown field leaves it as written."""
+    try: return template.format(**dict(info, host=socket.gethostname()))
+    except (KeyError, IndexError, ValueError): return template
+
+class AutoPublisher:
+    """
+    Publishes versions the watcher found complete, one at a time on a background thread, through
+    the same TransferEngine + append_json_log path as a GUI publish (or as a publish service job).
+    A version whose destination is already committed is skipped, unless the watcher saw it change
+    after it was finished (info["republish"]); a failed one is handed back to on_failed for
+    another try.
+    """
+    def __init__(self, config_data, is_move=False, dry_run=False, on_failed=None, log_callback=print):
+        self.config_data = config_data; self.is_move = is_move; self.dry_run = dry_run; self.on_failed = on_failed; self.log = log_callback
+        self.queue = queue.Queue(); self.published = 0; self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="xPubAutoPublish", daemon=True); self._thread.start()
+
+    def submit(self, info): self.queue.put(info)
+
+    def close(self):
+        """Waits for the queued publishes and stops the thread."""
+        self.queue.put(None); self._thread.join()
+
+    def _run(self):
+        while True:
+            info = self.queue.get()
+            if info is None: return
+            try: ok = self.publish(info)
+            except Exception as e: self.log(f"ERROR: Auto-publish of '{info['path']}' failed: {e}"); ok = False
+            if ok is False:
+                self.failed += 1
+                if self.on_failed: self.on_failed(info["path"])
+
+    def publish(self, info):
+        """Returns True when published, None when skipped, False when it failed."""
+        dest = storage_join(get_publish_base(self.config_data, info["shot_path"]), info["render"], info["version"])
+        label = f"{info['seq']}/{info['shot']} {info['render']}/{info['version']} ({info['user']})"
+        if not info.get("republish") and storage_for(dest).version_committed(dest): self.log(f"Skipping {label}: already published."); return None
+        if self.dry_run: self.log(f"Would publish {label} ({info['trigger']}) to {dest}"); return None
+        daily_dir = get_daily_path(self.config_data, info["shot_path"], info["render"], info["version"]) if self.config_data.get("watch_daily", False) else None
+        publish = {"source": info["path"], "destination": dest}
+        if daily_dir: publish["daily"] = daily_dir
+        entry = {"User": info["user"], "Host": socket.gethostname(), "DateTime": datetime.datetime.now().strftime(LOG_DATETIME_FORMAT), "Mode": "Move" if self.is_move else "Copy",
+                 "Comment": format_watch_comment(self.config_data.get("watch_comment", "Auto-published by the watch folder ({trigger})"), info), "AutoPublish": info["trigger"], "Publishes": [publish]}
+        log_file = get_shot_log_path(self.config_data.get("project_root", ""), info["show"], info["seq"], info["shot"])
+        dedup = self.config_data.get("watch_dedup", self.config_data.get("dedup_on_publish", False))
+        self.log(f"Publishing {label} ({info['trigger']})...")
+        if self.config_data.get("watch_use_service", False) and self.config_data.get("service_url"):
+            payload = {"copy_jobs": [(info["path"], dest)], "is_move": self.is_move, "throttle": self.config_data.get("watch_throttle", "Fast"), "dedup": dedup, "daily_dirs": [daily_dir],
+                       "log_file": log_file, "log_entry": entry, "priority": self.config_data.get("watch_priority", "Low")}
+            job_id = PublishServiceClient.from_config(self.config_data).submit("publish", payload); self.log(f"  Queued as service job {job_id}.")
+            self.published += 1; return True
+        def on_dedup(index, files, saved): publish.update({"dedup_files": files, "dedup_bytes": int(saved)})
+        engine = TransferEngine([(info["path"], dest)], self.is_move, self.config_data.get("watch_throttle", "Fast"), self.config_data, dedup, [daily_dir],
+                                log_callback=lambda text: self.log("  " + text.replace("\n", "\n  ")), dedup_callback=on_dedup, priority=self.config_data.get("watch_priority", "Low"))
+        if not engine.run(): self.log(f"ERROR: Auto-publish of {label} failed; it is retried later."); return False
+        append_json_log(log_file, entry); self.log(f"Published {label}; logged to {log_file}")
+        self.published += 1; return True
+
+# /////////////////////////////////////////////
+# NEW - Publish Scrub
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# "xPubUi scrub" checks the published versions of every department against digests recorded the
+# first time it saw them (ScrubIndex, an SQLite file at 'scrub_db'). Paths are stored as the
+# scrubbing machine sees them and are not translated ('service_path_map' does not apply), so the
+# Archiver only finds the results where it sees the publish area under the same paths; put the
+# file on a share only for machines that mount it alike. A pass walks the versions in a fixed order and saves
+# its position after each one, so an interrupted pass (Ctrl+C, --max-hours) resumes where it
+# stopped. A file whose size and mtime are unchanged is only hashed again once its last check is
+# 'scrub_reverify_days' old (spread per file, so one pass does not re-hash everything at once).
+# Hashing runs on 'scrub_workers' threads at 'scrub_priority', capped at 'scrub_mb_per_s', and
+# drops the pages it read from the OS cache. Findings per file:
+#   corrupt   - same size and mtime, different content (bit rot)
+#   truncated - smaller than when it was recorded
+#   modified  - rewritten in place with different content
+#   missing   - gone from a version that is still there
+# Publishing a version again replaces its folder (new inode), which re-records it from scratch.
+# A version a complete pass did not reach is forgotten only if it lies below a publish root that
+# pass walked and a listing of its render folder that succeeded no longer has it; a version or
+# file that could not be listed or stat'ed this time keeps its records and findings.
+SCRUB_PROBLEMS = ("corrupt", "truncated", "modified", "missing")
+
+class ScrubIndex:
+    """Recorded digests and findings of published files (see the section comment)."""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, version TEXT, size INTEGER, mtime_ns INTEGER, digest TEXT, verified_ts REAL, status TEXT, detail TEXT);
+    CREATE INDEX IF NOT EXISTS idx_files_version ON files(version);
+    CREATE INDEX IF NOT EXISTS idx_files_status ON files(status, version);
+    CREATE TABLE IF NOT EXISTS versions (path TEXT PRIMARY KEY, show TEXT, identity TEXT, pass_id INTEGER, checked_ts REAL);
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+
+    def __init__(self, db_path):
+        import sqlite3
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=60) # No WAL: the file may live on a share
+        self.conn.executescript(self.SCHEMA)
+
+    @classmethod
+    def from_config(cls, config_data):
+        return cls(get_scrub_db_path(config_data))
+
+    def close(self): self.conn.close()
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+
+    def version_rows(self, version_path):
+        """{file path: (size, mtime_ns, digest, verified_ts, status)} recorded for a version."""
+        return {r[0]: r[1:] for r in self.conn.execute("SELECT path, size, mtime_ns, digest, verified_ts, status FROM files WHERE version = ?", (version_path,))}
+
+    def forget_version(self, version_path):
+        """Drops what is recorded for a version, so the next pass records it afresh (e.g. after a known rewrite)."""
+        with self.conn:
+            self.conn.execute("DELETE FROM files WHERE version = ?", (version_path,)); self.conn.execute("DELETE FROM versions WHERE path = ?", (version_path,))
+
+    def problems(self, prefix):
+        """{version path: {status: file count}} of the problem files of every version below prefix (a folder)."""
+        prefix = os.path.join(os.path.normpath(prefix), ""); found = {}
+        for version, status, count in self.conn.execute("SELECT version, status, COUNT(*) FROM files WHERE status != 'ok' AND version >= ? AND version < ? GROUP BY version, status", (prefix, prefix + "\uffff")):
+            found.setdefault(version, {})[status] = count
+        return found
+
+    def problem_files(self, prefix=""):
+        """(path, status, detail, verified_ts) of every problem file below prefix."""
+        prefix = os.path.join(os.path.normpath(prefix), "") if prefix else ""
+        return self.conn.execute("SELECT path, status, detail, verified_ts FROM files WHERE status != 'ok' AND path >= ? AND path < ? ORDER BY path", (prefix, prefix + "\uffff")).fetchall()
+
+def get_scrub_db_path(config_data):
+    return config_data.get("scrub_db") or os.path.join(get_cache_dir(config_data), "xPubScrub.db")
+
+def describe_scrub_problems(counts):
+    """'2 corrupt, 1 missing' for a {status: file count} dict."""
+    return ", ".join(f"{counts[status]} {status}" for status in SCRUB_PROBLEMS if counts.get(status))
+
+class ByteBudget:
+    """Token bucket shared by worker threads: take(n) blocks until n more bytes fit under bytes_per_s (0 = no limit)."""
+    def __init__(self, bytes_per_s, burst_s=1.0):
+        self.rate = bytes_per_s; self.capacity = bytes_per_s * burst_s; self.tokens = self.capacity; self.stamp = time.monotonic(); self._lock = threading.Lock()
+
+    def take(self, n):
+        if self.rate <= 0: return
+        with self._lock: # Held while sleeping, so waiters queue up instead of all waking at once
+            now = time.monotonic(); self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate); self.stamp = now
+            self.tokens -= n
+            if self.tokens < 0: time.sleep(-self.tokens / self.rate)
+
+def iter_publish_versions_for_scrub(config_data, shows, departments=None, walked=None):
+    """(key, show, version path) of every local published version, in key order; key is (show, seq, shot, department, render, version).
+    The publish roots that exist are added to walked (a set), if given."""
+    departments = sorted(departments or config_data.get("departments", {}))
+    for show in sorted(shows):
+        for seq, shot, shot_path in list_show_shots(config_data, show):
+            for dept in departments:
+                publish_base = get_publish_base(config_data, shot_path, dept)
+                if not publish_base or is_object_store_path(publish_base): continue # Object stores keep their own checksums
+                if walked is not None and os.path.isdir(publish_base): walked.add(os.path.normpath(publish_base))
+                for render in sorted(r for r in list_subdirs(publish_base) if not r.startswith(".")):
+                    for version in sorted(v for v in list_subdirs(os.path.join(publish_base, render)) if not v.startswith(".")):
+                        yield (show, seq, shot, dept, render, version), show, os.path.normpath(os.path.join(publish_base, render, version))
+
+def _scrub_version_gone(version_path):
+    """True only when a listing that succeeded shows the version, or its render folder, is no longer there. A listing that fails
+    (a share hiccup) counts as not gone."""
+    render_path = os.path.dirname(version_path)
+    try: return os.path.basename(version_path) not in os.listdir(render_path)
+    except FileNotFoundError:
+        try: return os.path.basename(render_path) not in os.listdir(os.path.dirname(render_path))
+        except OSError: return False
+    except OSError: return False
+
+def _scrub_due(path, verified_ts, reverify_s, now):
+    """True once a file's last check is old enough; each file gets a fixed 75-100% share of the interval."""
+    spread = int.from_bytes(hashlib.blake2b(path.encode("utf-8"), digest_size=2).digest(), "little") / 65535
+    return now - (verified_ts or 0) >= reverify_s * (0.75 + 0.25 * spread)
+
+class PublishScrubber:
+    """One scrub pass over the published versions of some shows (see the section comment)."""
+    def __init__(self, config_data, index=None, log_callback=print):
+        self.config_data = config_data; self.index = index or ScrubIndex.from_config(config_data); self.log = log_callback
+        self.workers = config_data.get("scrub_workers", 4); self.reverify_s = config_data.get("scrub_reverify_days", 30) * 86400
+        self.budget = ByteBudget(config_data.get("scrub_mb_per_s", 50) * 1024 * 1024)
+        self.priority = PriorityControl(config_data, config_data.get("scrub_priority", "Idle"), log_callback)
+        self.drop_cache = config_data.get("scrub_drop_cache", True); self.algorithm = config_data.get("scrub_algorithm", "blake2b")
+        self.stats = collections.Counter()
+
+    def _hash(self, path):
+        """Digest of a file read under the byte budget, or None if it could not be read."""
+        self.priority.apply_here(); digest = hashlib.new(self.algorithm)
         try:
-            dept = self.config_data.get("active_department")
-            dept_paths = self.config_data.get("departments", {}).get(dept, {})
-            
-            shots = [s for s in os.listdir(self.seq_path) if os.path.isdir(os.path.join(self.seq_path, s))]
-            for shot in sorted(shots):
-                total_size = 0.0 # Use float
-                
-                if self.source_mode == "WIP":
-                    source_template = dept_paths.get("source_path")
-                    if source_template:
-                        user_base_path = os.path.join(self.seq_path, shot, source_template.replace('/', os.sep))
-                        total_size = self._get_directory_size(user_base_path)
-                
-                elif self.source_mode == "FINAL":
-                    publish_template = dept_paths.get("publish_path")
-                    if publish_template:
-                        publish_base_path = os.path.join(self.seq_path, shot, publish_template.replace('/', os.sep))
-                        total_size = self._get_directory_size(publish_base_path)
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(DEDUP_CHUNK_SIZE), b""): self.budget.take(len(chunk)); digest.update(chunk)
+        except OSError as e: self.log(f"  Could not read '{path}': {e}"); return None
+        if self.drop_cache: _drop_file_cache(path) # The scrub should not push the artists' working set out of the cache
+        return digest.hexdigest()
+
+    def run(self, shows, departments=None, max_seconds=None, restart=False, stop_event=None):
+        """Scrubs from the saved position (or from the start). Returns True when the pass completed, False when it stopped early."""
+        state = self.index.get_meta("pass")
+        if restart or not state or state.get("completed") or state.get("shows") != sorted(shows) or state.get("departments") != sorted(departments or []):
+            state = {"id": (state or {}).get("id", 0) + 1, "shows": sorted(shows), "departments": sorted(departments or []), "cursor": None, "started": time.time()}
+            with self.index.conn: self.index.set_meta("pass", state)
+            self.log(f"Starting scrub pass {state['id']} over {', '.join(state['shows'])}.")
+        else: self.log(f"Resuming scrub pass {state['id']} after {'/'.join(state['cursor']) if state['cursor'] else 'the start'}.")
+        cursor = tuple(state["cursor"]) if state["cursor"] else None
+        deadline = time.monotonic() + max_seconds if max_seconds else None; report_at = time.monotonic() + self.config_data.get("scrub_report_s", 60); started = time.monotonic()
+        walked = set() # Publish roots of this pass; nothing outside them is forgotten
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for key, show, version_path in iter_publish_versions_for_scrub(self.config_data, shows, departments, walked):
+                if cursor and key <= cursor: continue
+                if (deadline and time.monotonic() >= deadline) or (stop_event and stop_event.is_set()):
+                    self._report(started); self.log(f"Stopped after {'/'.join(cursor) if cursor else 'the start'}; the next run resumes there."); return False
+                self._scrub_version(pool, show, version_path, state["id"])
+                cursor = key; state["cursor"] = list(key)
+                with self.index.conn: self.index.set_meta("pass", state)
+                if time.monotonic() >= report_at: self._report(started); report_at = time.monotonic() + self.config_data.get("scrub_report_s", 60)
+        with self.index.conn: # Versions not met in a complete pass may have been deleted (e.g. by the Archiver); see the section comment
+            unmet = [r[0] for r in self.index.conn.execute(f"SELECT path FROM versions WHERE pass_id != ? AND show IN ({','.join('?' * len(shows))})", [state["id"]] + list(shows))]
+            gone = [path for path in unmet if os.path.dirname(os.path.dirname(path)) in walked and _scrub_version_gone(path)]
+            for path in gone: self.index.conn.execute("DELETE FROM files WHERE version = ?", (path,)); self.index.conn.execute("DELETE FROM versions WHERE path = ?", (path,))
+            state.update(cursor=None, completed=time.time()); self.index.set_meta("pass", state); self.index.set_meta("last_completed", state)
+        self.stats["forgotten"] += len(gone); self._report(started)
+        return True
+
+    def _report(self, started):
+        elapsed = max(time.monotonic() - started, 1e-9); s = self.stats
+        self.log(f"  {s['versions']} versions, {s['files']} files: {s['hashed']} hashed ({format_size(s['bytes'])}, {format_size(s['bytes'] / elapsed)}/sec), {s['skipped']} unchanged; "
+                 + (describe_scrub_problems(s) or "no problems") + ".")
+
+    def _scrub_version(self, pool, show, version_path, pass_id):
+        try: st = os.stat(version_path)
+        except OSError: return # Deleted since it was listed
+        identity = str(st.st_ino) if st.st_ino else f"m{st.st_mtime_ns}" # Shares without inode numbers fall back to the folder mtime
+        known = self.index.conn.execute("SELECT identity FROM versions WHERE path = ?", (version_path,)).fetchone()
+        if known and known[0] != identity: self.index.forget_version(version_path); self.stats["republished"] += 1 # Published again: a new baseline
+        rows = self.index.version_rows(version_path); now = time.time()
+        on_disk = {}; unlisted = []; unreadable = set()
+        for dirpath, dirnames, filenames in os.walk(version_path, onerror=unlisted.append):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try: file_st = os.stat(path)
+                except FileNotFoundError: continue
+                except OSError: unreadable.add(path); continue # Not missing, just not stat'able this time
+                on_disk[path] = (file_st.st_size, file_st.st_mtime_ns)
+        if unlisted: # Files of an unlisted folder would all read as missing; leave the version for the next pass
+            self.log(f"  Could not list '{unlisted[0].filename}' ({unlisted[0].strerror}); its version is left for the next pass."); self.stats["unlisted"] += 1; return
+        updates, to_hash = [], []
+        for path, (size, mtime_ns) in on_disk.items():
+            row = rows.get(path)
+            if row is None: to_hash.append(path); continue
+            rec_size, rec_mtime, digest, verified_ts, status = row
+            if size < rec_size: updates.append((path, "truncated", f"{size} of {rec_size} bytes")); continue # No need to read it
+            if size != rec_size or mtime_ns != rec_mtime or status != "ok" or _scrub_due(path, verified_ts, self.reverify_s, now): to_hash.append(path)
+            else: self.stats["skipped"] += 1
+        digests = dict(zip(to_hash, pool.map(self._hash, to_hash)))
+        with self.index.conn:
+            for path, digest in digests.items():
+                size, mtime_ns = on_disk[path]; row = rows.get(path)
+                if digest is None: continue # Unreadable this time; tried again next pass
+                self.stats["hashed"] += 1; self.stats["bytes"] += size
+                if row is None or row[2] == digest: # New, or still matching (a touched mtime is taken as is)
+                    self.index.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, 'ok', '')", (path, version_path, size, mtime_ns, digest, now))
+                    continue
+                status = "corrupt" if (size, mtime_ns) == row[:2] else "modified"
+                updates.append((path, status, f"digest {digest[:12]} != recorded {row[2][:12]}"))
+            updates.extend((path, "missing", "") for path in rows.keys() - on_disk.keys() - unreadable)
+            for path, status, detail in updates: # The recorded size/mtime/digest stay as the baseline
+                self.index.conn.execute("UPDATE files SET status = ?, detail = ?, verified_ts = ? WHERE path = ?", (status, detail, now, path)); self.stats[status] += 1
+                if rows.get(path, (None,) * 5)[4] != status: self.log(f"  {status.upper()}: {path}" + (f" ({detail})" if detail else ""))
+            self.index.conn.execute("INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?, ?)", (version_path, show, identity, pass_id, now))
+        self.stats["versions"] += 1; self.stats["files"] += len(on_disk)
+
+# /////////////////////////////////////////////
+# NEW - Load Test Harness
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+# Reproduces delivery crunch on a scratch folder: N artist processes scan, publish (through
+# TransferEngine, like RobocopyWorker and the publish service) and append to shot logs with
+# random think times, all against one synthetic show. Afterwards every shot log is parsed and
+# counted against the appends that reported success, and every published version is compared
+# file by file with its source, so lost or torn log writes and bad copies show up as numbers.
+LOADTEST_SHOW = "xPubLoadTest"
+LOADTEST_MARKER = ".xpub_loadtest" # Only folders carrying it are ever written to or removed
 
-                self.shot_found.emit(shot, total_size)
+def build_loadtest_show(root, config_data, shots=6, users=3, renders=2, versions=3, frames=10, frame_bytes=256 * 1024, seed=1):
+    """Creates the synthetic show below root (WIP versions of the active department) and returns its shot paths."""
+    os.makedirs(root, exist_ok=True)
+    if os.listdir(root) and not os.path.exists(os.path.join(root, LOADTEST_MARKER)): raise ValueError(f"'{root}' is not empty and is not a load test folder")
+    open(os.path.join(root, LOADTEST_MARKER), 'w').close()
+    source_template = config_data.get("departments", {}).get(config_data.get("active_department"), {}).get("source_path", "lighting/houdini")
+    rng = random.Random(seed); shot_paths = []
+    for shot_index in range(shots):
+        seq = f"LT{shot_index // 10 + 1:03d}"; shot_path = os.path.join(get_shots_root(root, LOADTEST_SHOW), seq, f"{seq}_{shot_index % 10 * 10 + 10:04d}"); shot_paths.append(shot_path)
+        for user, render, version in itertools.product(range(users), range(renders), range(versions)):
+            version_path = os.path.join(shot_path, source_template.replace('/', os.sep), f"artist{user:02d}", "renders", "preview", f"render{render}", f"v{version + 1:03d}")
+            os.makedirs(version_path, exist_ok=True)
+            for frame in range(1001, 1001 + frames):
+                with open(os.path.join(version_path, f"render{render}.{frame}.exr"), 'wb') as f: f.write(rng.randbytes(frame_bytes))
+    return shot_paths
+
+def _loadtest_artist(spec):
+    """One simulated artist (runs in its own process). Returns a list of operation records."""
+    import asyncio
+    artist, config_data, shot_paths, ops, think_ms, mix, latency_ms, start_at, seed = spec
+    rng = random.Random(seed); records = []
+    source_template = config_data["departments"][config_data["active_department"]]["source_path"]
+    time.sleep(max(0.0, start_at - time.time())) # Everyone starts together
+    for op_index in range(ops):
+        time.sleep(rng.expovariate(1000.0 / think_ms) if think_ms else 0)
+        op = rng.choices(list(mix), weights=list(mix.values()))[0]; shot_path = rng.choice(shot_paths)
+        record = {"artist": artist, "op": op, "ok": True, "start": time.time(), "bytes": 0, "waited_s": 0.0, "error": ""}
+        started = time.perf_counter()
+        try:
+            if op == "scan":
+                async def scan():
+                    with AsyncScanner.from_config(config_data, latency_ms=latency_ms) as scanner:
+                        wip = await collect_async(scanner.iter_wip_versions(os.path.join(shot_path, source_template.replace('/', os.sep))))
+                        publish_base = get_publish_base(config_data, shot_path)
+                        return wip + (await collect_async(scanner.iter_publish_versions(publish_base)) if publish_base else [])
+                record["items"] = len(asyncio.run(scan()))
+            elif op in ("publish", "log"):
+                log_file = get_shot_log_path_for(shot_path)
+                entry = {"User": f"artist{artist:02d}", "Host": socket.gethostname(), "DateTime": datetime.datetime.now().strftime(LOG_DATETIME_FORMAT), "Comment": "load test", "LoadTestId": f"{artist}-{op_index}"}
+                if op == "publish":
+                    wip = os.path.join(shot_path, source_template.replace('/', os.sep))
+                    user = rng.choice(list_subdirs(wip)); render_root = os.path.join(wip, user, "renders", "preview"); render = rng.choice(list_subdirs(render_root))
+                    version = rng.choice(list_subdirs(os.path.join(render_root, render))); source = os.path.join(render_root, render, version)
+                    dest = os.path.join(get_publish_base(config_data, shot_path), render, version)
+                    lines, waiting = [], [None]
+                    def on_log(text):
+                        now = time.perf_counter()
+                        if waiting[0] is not None: record["waited_s"] += now - waiting[0]; waiting[0] = None
+                        if "Waiting for" in text: waiting[0] = now
+                        lines.append(text)
+                    record["ok"] = TransferEngine([(source, dest)], False, "Fast", config_data, log_callback=on_log).run()
+                    record.update(source=source, dest=dest, bytes=sum(snapshot_manifest(source).values()), contended=any("Waiting for" in l for l in lines))
+                    if not record["ok"]: record["error"] = next((l.strip() for l in "\n".join(lines).splitlines() if "ERROR" in l), "publish failed")
+                    entry["Publishes"] = [{"source": source, "destination": dest}]
+                if record["ok"]: append_json_log(log_file, entry); record.update(log_file=log_file, log_id=entry["LoadTestId"])
         except Exception as e:
-            print(f"Shot Scanner Error: {e}")
-        finally:
-            self.finished.emit()
+            record["ok"] = False; record["error"] = f"{type(e).__name__}: {e}"
+        record["seconds"] = time.perf_counter() - started; records.append(record)
+    return records
 
-    def _get_directory_size(self, path):
-        total_size = 0.0 # FIX: Use float to prevent overflow
+def verify_loadtest(records):
+    """Checks the shot logs and published versions the artists reported as written. Returns a dict of problem lists."""
+    problems = {"corrupt_logs": [], "lost_entries": [], "duplicate_entries": [], "bad_files": []}
+    expected = {}
+    for r in records:
+        if r.get("log_file"): expected.setdefault(r["log_file"], []).append(r["log_id"])
+    for log_file, ids in expected.items():
         try:
-            for dirpath, dirnames, filenames in os.walk(path):
-                for f in filenames:
-                    fp = os.path.join(dirpath, f)
-                    if not os.path.islink(fp): 
-                        total_size += os.path.getsize(fp)
-        except FileNotFoundError: 
-            return 0.0
-        return total_size
+            with open(log_file, 'r', encoding="utf-8") as f: entries = json.load(f)
+        except (OSError, ValueError) as e: problems["corrupt_logs"].append(f"{log_file}: {e}"); continue
+        found = collections.Counter(e.get("LoadTestId") for e in entries if isinstance(e, dict))
+        problems["lost_entries"].extend(f"{log_file}: {i}" for i in ids if not found[i])
+        problems["duplicate_entries"].extend(f"{log_file}: {i} x{n}" for i, n in found.items() if i and n > 1)
+    # Artists publish different users' versions onto the same destination, so a destination is
+    # intact when it matches one of its sources completely; a mix of two is a torn publish.
+    candidates = {}
+    for r in sorted((r for r in records if r["op"] == "publish" and r["ok"]), key=lambda r: r["start"] + r["seconds"]): candidates.setdefault(r["dest"], []).append(r["source"])
+    def mismatches(source, dest):
+        bad = []
+        for rel, size in snapshot_manifest(source).items():
+            try:
+                if os.path.getsize(os.path.join(dest, rel)) != size or hash_file(os.path.join(dest, rel)) != hash_file(os.path.join(source, rel)): bad.append(os.path.join(dest, rel))
+            except OSError: bad.append(f"{os.path.join(dest, rel)} (missing)")
+        return bad
+    for dest, sources in sorted(candidates.items()):
+        results = [mismatches(source, dest) for source in dict.fromkeys(reversed(sources))] # Last committed first
+        if all(results): problems["bad_files"].extend(results[0])
+    return problems
+
+def run_loadtest(root, config_data, artists=8, ops=20, think_ms=200, mix=None, latency_ms=0, show_options=None, log_callback=print):
+    """Builds the show, runs the artists on a process pool and returns (records, problems, wall seconds)."""
+    from concurrent.futures import ProcessPoolExecutor
+    mix = mix or {"scan": 4, "publish": 4, "log": 2}
+    test_config = dict(config_data, project_root=root, cache_dir=os.path.join(root, "cache"), log_flush_ms=0, dedup_on_publish=False, throughput_history=False)
+    test_config["departments"] = {dept: {k: v for k, v in settings.items() if k != "publish_target"} for dept, settings in config_data.get("departments", {}).items()} # Never publish outside root
+    test_config["active_department"] = config_data.get("active_department") if config_data.get("active_department") in test_config["departments"] else next(iter(test_config["departments"]), None)
+    if not test_config["active_department"]: raise ValueError("The config has no departments")
+    log_callback(f"Building synthetic show in {root}...")
+    shot_paths = build_loadtest_show(root, test_config, **(show_options or {}))
+    start_at = time.time() + 2 + artists * 0.1 # Time for every process to start and import
+    specs = [(a, dict(test_config, cache_dir=os.path.join(root, "cache", f"artist{a:02d}")), shot_paths, ops, think_ms, mix, latency_ms, start_at, a + 1) for a in range(artists)]
+    log_callback(f"Running {artists} artists x {ops} operations (mix {mix}, think {think_ms} ms)...")
+    with ProcessPoolExecutor(max_workers=artists) as pool:
+        records = [r for artist_records in pool.map(_loadtest_artist, specs) for r in artist_records]
+    wall = max((r["start"] + r["seconds"] for r in records), default=start_at) - start_at
+    log_callback("Verifying logs and published files...")
+    return records, verify_loadtest(records), wall
+
+def format_loadtest_report(records, problems, wall):
+    lines = [f"{'Operation':<10}{'Count':>7}{'Failed':>8}{'Ops/s':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'Max ms':>9}"]
+    for op in sorted({r["op"] for r in records}):
+        rows = [r for r in records if r["op"] == op]; times = sorted(r["seconds"] * 1000 for r in rows)
+        lines.append(f"{op:<10}{len(rows):>7}{sum(not r['ok'] for r in rows):>8}{len(rows) / max(wall, 1e-9):>8.2f}" + "".join(f"{size_percentile(times, q):>9.0f}" for q in (0.5, 0.9, 0.99)) + f"{times[-1]:>9.0f}")
+    publishes = [r for r in records if r["op"] == "publish"]
+    if publishes:
+        contended = [r for r in publishes if r.get("contended")]; moved = sum(r["bytes"] for r in publishes if r["ok"])
+        lines.append(f"Publish throughput: {format_size(moved / max(wall, 1e-9))}/sec over {wall:.1f}s")
+        lines.append(f"Lock contention: {len(contended)} of {len(publishes)} publishes waited, {sum(r['waited_s'] for r in contended):.1f}s in total, longest {max((r['waited_s'] for r in contended), default=0):.1f}s")
+    errors = collections.Counter(r["error"] for r in records if r["error"])
+    for error, count in errors.most_common(5): lines.append(f"  {count} x {error}")
+    for name, items in problems.items():
+        lines.append(f"{name.replace('_', ' ').capitalize()}: {len(items)}")
+        lines.extend(f"  {item}" for item in items[:10])
+    return "\n".join(lines)
 
 # /////////////////////////////////////////////
 # NEW - Status Icon Summary Widget
@@ -346,12 +4839,19 @@ class mainWindow(QtWidgets.QWidget):
         
         self.config_data = {}; self.show_root_path = ""
         self.icon_age_threshold = 30 
+        self.prefetcher = NavigationPrefetcher()
+        self.thumbnails = None; self._thumbnail_items = {} # Publisher tree: version path -> item (see ThumbnailLoader)
 
         self.menuBar = QtWidgets.QMenuBar(self)
         self.mainMenu = self.menuBar.addMenu("Menu")
         self.configMenu = self.mainMenu.addMenu("Config")
+        self.toolsMenu = self.mainMenu.addMenu("Tools")
         self.helpMenu = self.mainMenu.addMenu("Help")
         self.load_config_action = self.configMenu.addAction("Load Config File...")
+        self.history_search_action = self.toolsMenu.addAction("Publish History Search...")
+        self.storage_report_action = self.toolsMenu.addAction("Storage Usage Report...")
+        self.throughput_report_action = self.toolsMenu.addAction("Transfer Throughput Report...")
+        self.restore_pack_action = self.toolsMenu.addAction("Restore Pack...")
         self.how_to_action = self.helpMenu.addAction("How To Operate")
         self.release_notes_action = self.helpMenu.addAction("Release Notes")
         self.baseLayout.setMenuBar(self.menuBar)
@@ -379,17 +4879,20 @@ class mainWindow(QtWidgets.QWidget):
         self.throttlePubLbl = QtWidgets.QLabel("Throttle IPG | MT")
         self.throttlePubComboBox = QtWidgets.QComboBox(); self.throttlePubComboBox.addItems(["Slow", "Fast"])
         self.rendersTree = QtWidgets.QTreeWidget()
-        self.rendersTree.setHeaderLabels(["Render / Version", "Date Modified", "Frame Status"]) # New headers
+        self.rendersTree.setHeaderLabels(["Render / Version", "Date Modified", "Frame Status", "Thumbnail"]) # New headers
         self.rendersTree.setAlternatingRowColors(True)
         self.rendersTree.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
         self.rendersTree.header().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
         self.rendersTree.setColumnWidth(1, 120) # Width for Date column
         self.rendersTree.setColumnWidth(2, 40)  # Width for Status icons
+        self.thumbnail_timer = QtCore.QTimer(self); self.thumbnail_timer.setSingleShot(True); self.thumbnail_timer.setInterval(60) # Coalesces scroll steps into one request
         self.projectGBox = QtWidgets.QGroupBox(""); self.projectGBoxLayout = QtWidgets.QVBoxLayout(self.projectGBox)
         self.commentGBox = QtWidgets.QGroupBox("Comment"); self.commentGBoxLayout = QtWidgets.QVBoxLayout(self.commentGBox)
         self.commentTextEdit = QtWidgets.QTextEdit(); self.commentTextEdit.setPlaceholderText("Select a project to begin..."); self.commentTextEdit.setToolTip("Add Comment for record/Log while releasing"); self.commentTextEdit.setMinimumHeight(100)
         self.move_radio_btn = QtWidgets.QRadioButton("⚠️ Clear Source"); self.move_radio_btn.setToolTip("Check this to MOVE files and clear the source directory after publishing."); self.move_radio_btn.setEnabled(False)
-        self.daily_check_box = QtWidgets.QCheckBox("Make Daily"); self.daily_check_box.setToolTip("Future implementation for creating dailies."); self.daily_check_box.setEnabled(False)
+        self.dedup_check_box = QtWidgets.QCheckBox("Dedup Frames"); self.dedup_check_box.setToolTip("Hardlink frames that are byte-identical to the previous published version of the same render instead of copying them.")
+        self.service_check_box = QtWidgets.QCheckBox("Run on Service"); self.service_check_box.setToolTip("Run the publish on the publish service next to the storage ('service_url' in config). The job keeps running if this window is closed."); self.service_check_box.setEnabled(False)
+        self.daily_check_box = QtWidgets.QCheckBox("Make Daily"); self.daily_check_box.setToolTip("Build proxy frames and a contact sheet (PNG/JPEG/TIFF) into the department's 'daily_path' while publishing."); self.daily_check_box.setEnabled(False)
         self.publishBtn = QtWidgets.QPushButton("Publish"); self.publishBtn.setEnabled(False); self.publishBtn.setToolTip("Select a version and add a comment to enable.")
         self.cancelBtn = QtWidgets.QPushButton("Cancel"); self.cancelBtn.setToolTip("to Close/Cancel UI")
         self.prevLogBtn = QtWidgets.QPushButton("▲"); self.nextLogBtn = QtWidgets.QPushButton("▼"); self.prevLogBtn.setFixedWidth(30); self.nextLogBtn.setFixedWidth(30); self.prevLogBtn.setFixedHeight(30); self.nextLogBtn.setFixedHeight(30)
@@ -400,12 +4903,16 @@ class mainWindow(QtWidgets.QWidget):
         self.archiveShowLbl = QtWidgets.QLabel("Show"); self.archiveShowComBox = QtWidgets.QComboBox()
         self.archiveSeqLbl = QtWidgets.QLabel("Sequence"); self.archiveSeqComBox = QtWidgets.QComboBox()
         self.archiveDataSourceLbl = QtWidgets.QLabel("Data Source"); self.archiveDataSourceComBox = QtWidgets.QComboBox(); self.archiveDataSourceComBox.addItems(["WIP", "FINAL"])
+        self.archiveDeptLbl = QtWidgets.QLabel("Department"); self.archiveDeptComBox = QtWidgets.QComboBox(); self.archiveDeptComBox.setToolTip("Every department is scanned together; switching only redraws the tree.")
         self.statusSummary = StatusIconSummary(); self.statusSummary.reset(self.summary_icons)
-        self.archiveTree = QtWidgets.QTreeWidget(); self.archiveTree.setHeaderLabels(["Shot / Render / Version", "Size", "Weight"]); self.archiveTree.setAlternatingRowColors(True); self.archiveTree.header().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch); self.archiveTree.setColumnWidth(1, 80); self.archiveTree.setColumnWidth(2, 40); self.archiveTree.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.archiveTree = QtWidgets.QTreeWidget(); self.archiveTree.setHeaderLabels(["Shot / Render / Version", "Size", "Weight"]); self.archiveTree.setAlternatingRowColors(True); self.archiveTree.header().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch); self.archiveTree.setColumnWidth(1, 90); self.archiveTree.setColumnWidth(2, 40); self.archiveTree.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
         self.archiveFilterGBox = QtWidgets.QGroupBox("Filters"); self.archiveFilterGBoxLayout = QtWidgets.QHBoxLayout(self.archiveFilterGBox)
         self.thresholdLbl = QtWidgets.QLabel("Threshold:"); self.thresholdSpinBox = QtWidgets.QSpinBox(); self.thresholdSpinBox.setRange(0, 50); self.thresholdSpinBox.setValue(5)
         self.maxAgeRadioButton = QtWidgets.QRadioButton("Max Age"); self.maxAgeLineEdit = QtWidgets.QLineEdit("30"); self.maxAgeLineEdit.setValidator(QtGui.QIntValidator(1, 999)); self.maxAgeLineEdit.setFixedWidth(40); self.maxAgeLineEdit.setEnabled(False)
         self.maxAgeDaysLbl = QtWidgets.QLabel("Days")
+        self.archiveModeLbl = QtWidgets.QLabel("Mode:"); self.archiveModeComboBox = QtWidgets.QComboBox(); self.archiveModeComboBox.addItems(["Purge", "Pack"])
+        self.archiveModeComboBox.setToolTip("Purge: delete the contents of targeted versions.\nPack: compress them into 'archive_root' first, then delete once the pack is verified.")
+        self.archiveServiceCheckBox = QtWidgets.QCheckBox("Run on Service"); self.archiveServiceCheckBox.setToolTip("Run the archive on the publish service next to the storage ('service_url' in config)."); self.archiveServiceCheckBox.setEnabled(False)
         self.throttleLbl = QtWidgets.QLabel("Throttle:"); self.throttleComboBox = QtWidgets.QComboBox(); self.throttleComboBox.addItems(["Fast", "Slow"])
         self.archiveCommentGBox = QtWidgets.QGroupBox("Comment"); self.archiveCommentGBoxLayout = QtWidgets.QVBoxLayout(self.archiveCommentGBox)
         self.archiveCommentTextEdit = QtWidgets.QTextEdit(); self.archiveCommentTextEdit.setPlaceholderText("Add comments for the archive operation..."); self.archiveCommentTextEdit.setMinimumHeight(100)
@@ -421,7 +4928,7 @@ class mainWindow(QtWidgets.QWidget):
         for label, widget in [(self.jobLbl, self.jobComBox), (self.seqNameLbl, self.seqNameComBox), (self.shotNameLbl, self.shotNameComBox), (self.throttlePubLbl, self.throttlePubComboBox)]:
             col = QtWidgets.QVBoxLayout(); col.addWidget(label); col.addWidget(widget); self.inputFilterLayout.addLayout(col)
         self.projectGBoxLayout.addLayout(self.inputFilterLayout)
-        self.shotBrowserLayout = QtWidgets.QHBoxLayout(); self.shotBrowserLayout.addWidget(self.move_radio_btn); self.shotBrowserLayout.addStretch(); self.shotBrowserLayout.addWidget(self.prevLogBtn); self.shotBrowserLayout.addWidget(self.nextLogBtn)
+        self.shotBrowserLayout = QtWidgets.QHBoxLayout(); self.shotBrowserLayout.addWidget(self.move_radio_btn); self.shotBrowserLayout.addWidget(self.dedup_check_box); self.shotBrowserLayout.addWidget(self.service_check_box); self.shotBrowserLayout.addStretch(); self.shotBrowserLayout.addWidget(self.prevLogBtn); self.shotBrowserLayout.addWidget(self.nextLogBtn)
         self.commentGBoxLayout.addLayout(self.shotBrowserLayout); self.commentGBoxLayout.addWidget(self.commentTextEdit)
         
         pub_legend_layout = self._create_publisher_legend()
@@ -436,11 +4943,13 @@ class mainWindow(QtWidgets.QWidget):
         archive_seq_col = QtWidgets.QVBoxLayout(); archive_seq_col.addWidget(self.archiveSeqLbl)
         archive_seq_hbox = QtWidgets.QHBoxLayout(); archive_seq_hbox.addWidget(self.archiveSeqComBox); archive_seq_hbox.addWidget(self.statusSummary); archive_seq_col.addLayout(archive_seq_hbox)
         archive_ds_col = QtWidgets.QVBoxLayout(); archive_ds_col.addWidget(self.archiveDataSourceLbl); archive_ds_col.addWidget(self.archiveDataSourceComBox)
-        self.archiveProjectGBoxLayout.addLayout(archive_show_col); self.archiveProjectGBoxLayout.addLayout(archive_seq_col); self.archiveProjectGBoxLayout.addLayout(archive_ds_col); self.archiveProjectGBoxLayout.addStretch()
+        archive_dept_col = QtWidgets.QVBoxLayout(); archive_dept_col.addWidget(self.archiveDeptLbl); archive_dept_col.addWidget(self.archiveDeptComBox)
+        self.archiveProjectGBoxLayout.addLayout(archive_show_col); self.archiveProjectGBoxLayout.addLayout(archive_seq_col); self.archiveProjectGBoxLayout.addLayout(archive_ds_col); self.archiveProjectGBoxLayout.addLayout(archive_dept_col); self.archiveProjectGBoxLayout.addStretch()
         
         self.archiveFilterGBoxLayout.addWidget(self.thresholdLbl); self.archiveFilterGBoxLayout.addWidget(self.thresholdSpinBox); self.archiveFilterGBoxLayout.addWidget(self.maxAgeRadioButton); self.archiveFilterGBoxLayout.addWidget(self.maxAgeLineEdit); self.archiveFilterGBoxLayout.addWidget(self.maxAgeDaysLbl)
         self.archiveFilterGBoxLayout.addStretch()
-        self.archiveFilterGBoxLayout.addWidget(self.throttleLbl); self.archiveFilterGBoxLayout.addWidget(self.throttleComboBox)
+        self.archiveFilterGBoxLayout.addWidget(self.archiveModeLbl); self.archiveFilterGBoxLayout.addWidget(self.archiveModeComboBox)
+        self.archiveFilterGBoxLayout.addWidget(self.throttleLbl); self.archiveFilterGBoxLayout.addWidget(self.throttleComboBox); self.archiveFilterGBoxLayout.addWidget(self.archiveServiceCheckBox)
         archiveCommentHeaderLayout = QtWidgets.QHBoxLayout(); archiveCommentHeaderLayout.addStretch(); archiveCommentHeaderLayout.addWidget(self.prevArchiveLogBtn); archiveCommentHeaderLayout.addWidget(self.nextArchiveLogBtn)
         self.archiveCommentGBoxLayout.addLayout(archiveCommentHeaderLayout); self.archiveCommentGBoxLayout.addWidget(self.archiveCommentTextEdit)
         
@@ -463,7 +4972,18 @@ class mainWindow(QtWidgets.QWidget):
 
         self.baseLayout.addWidget(self.tabWidget)
         
-        self._connect_signals(); self._load_config(); self._populate_user_info(); self._populate_project_combos()
+        STARTUP_TIMER.mark("widgets")
+        # Scan state comes before _connect_signals/_load_config: filling the combos fires the selection slots, which cancel and reset it
+        self.size_refiners = {}; self.estimated_items = {} # Archive tree: shot -> (thread, VersionSizeWorker); version path -> item awaiting its exact size
+        # Archive scan results of the current sequence for every scanned department: shot -> {department: SizeEstimate},
+        # shot -> {department: version dicts} and version path -> version dict
+        self.archive_shot_sizes = {}; self.archive_versions = {}; self.archive_version_data = {}; self.archive_scan_id = 0
+        self.version_scanners = {} # (archive shot, department) -> (thread, ArchiveVersionsWorker) while that department's versions are scanned
+        self.publisher_scan = None # (thread, PublisherVersionsWorker, prefetch key) of the publisher shot being scanned
+        self._connect_signals(); self._load_config(); self._populate_user_info()
+        STARTUP_TIMER.mark("config + shows")
+        self.snapshot_thread = None; self._restore_session_snapshot()
+        STARTUP_TIMER.mark("session snapshot")
         self.clock_timer = QtCore.QTimer(self); self.clock_timer.timeout.connect(self._update_datetime); self.clock_timer.start(1000)
 
 
@@ -472,29 +4992,7 @@ class mainWindow(QtWidgets.QWidget):
         Get absolute path to resource. First, check for an external file next to the executable.
         If not found, fall back to the bundled file inside the PyInstaller temp folder.
         """
-        # Path for the external file (next to the .exe or script)
-        if getattr(sys, 'frozen', False): # Running as a bundled exe
-            base_path = os.path.dirname(sys.executable)
-        else: # Running as a .py script
-            # FIX: Use the script's directory, not the current working directory
-            base_path = os.path.dirname(__file__)
-        
-        external_path = os.path.join(base_path, relative_path)
-        
-        # 1. Prioritize the external file if it exists
-        if os.path.exists(external_path):
-            return external_path
-
-        # 2. Fallback to the internal, bundled file
-        try:
-            internal_base_path = sys._MEIPASS
-            internal_path = os.path.join(internal_base_path, relative_path)
-            if os.path.exists(internal_path):
-                return internal_path
-        except Exception:
-            pass
-
-        return external_path
+        return get_resource_path(relative_path)
 
 
 
@@ -525,7 +5023,7 @@ class mainWindow(QtWidgets.QWidget):
         sl_layout.addWidget(QtWidgets.QLabel("<b>SL:</b>"))
         sl_layout.addWidget(QtWidgets.QLabel(pixmap=self.summary_icons['grey'])); sl_layout.addWidget(QtWidgets.QLabel("NoData"))
         sl_layout.addWidget(QtWidgets.QLabel(pixmap=self.summary_icons['blue'])); sl_layout.addWidget(QtWidgets.QLabel("Not Published"))
-        sl_layout.addWidget(QtWidgets.QLabel(pixmap=self.summary_icons['red'])); sl_layout.addWidget(QtWidgets.QLabel("Corrupted"))
+        sl_layout.addWidget(QtWidgets.QLabel(pixmap=self.summary_icons['red'])); sl_layout.addWidget(QtWidgets.QLabel("Incomplete"))
         sl_layout.addWidget(QtWidgets.QLabel(pixmap=self.summary_icons['limeGreen'])); sl_layout.addWidget(QtWidgets.QLabel("Published"))
         
         # Frame Status (SR)
@@ -541,76 +5039,124 @@ class mainWindow(QtWidgets.QWidget):
         return layout
 
     def _analyze_and_update_summary(self, shot_item):
-        """Analyzes all versions within a shot and updates the summary widget."""
+        """Analyzes all versions of a shot in the shown departments and updates the summary widget."""
         counts = {'red': 0, 'yellow': 0, 'green': 0}
-        
-        shot_name = shot_item.text(0)
-        show_name = self.archiveShowComBox.currentText()
-        seq_name = self.archiveSeqComBox.currentText()
-        dept = self.config_data.get("active_department")
-        dept_paths = self.config_data.get("departments", {}).get(dept, {})
-        source_mode = self.archiveDataSourceComBox.currentText()
-
         try:
-            if source_mode == "WIP":
-                source_template = dept_paths.get("source_path")
-                if not source_template: return
-                user_base_path = os.path.join(self.show_root_path, show_name, "Production", "Shots", seq_name, shot_name, source_template.replace('/', os.sep))
-                if not os.path.exists(user_base_path): return
-                
-                user_dirs = [d for d in os.listdir(user_base_path) if os.path.isdir(os.path.join(user_base_path, d))]
-                for user in user_dirs:
-                    preview_path = os.path.join(user_base_path, user, "renders", "preview")
-                    if not os.path.exists(preview_path): continue
-                    render_names = [r for r in os.listdir(preview_path) if os.path.isdir(os.path.join(preview_path, r))]
-                    for render in render_names:
-                        version_path = os.path.join(preview_path, render)
-                        versions = [v for v in os.listdir(version_path) if os.path.isdir(os.path.join(version_path, v))]
-                        for version in versions:
-                            full_path = os.path.join(version_path, version)
-                            size = self._get_directory_size(full_path)
-                            age = self._get_folder_age_in_days(full_path)
-                            # FLIPPED LOGIC
-                            if size < 5120: counts['green'] += 1
-                            elif size >= 5120 and age > self.icon_age_threshold: counts['yellow'] += 1
-                            elif size >= 5120 and age <= self.icon_age_threshold: counts['red'] += 1
-            
-            elif source_mode == "FINAL":
-                publish_template = dept_paths.get("publish_path")
-                if not publish_template: return
-                publish_base_path = os.path.join(self.show_root_path, show_name, "Production", "Shots", seq_name, shot_name, publish_template.replace('/', os.sep))
-                if not os.path.exists(publish_base_path): return
-
-                render_names = [r for r in os.listdir(publish_base_path) if os.path.isdir(os.path.join(publish_base_path, r))]
-                for render in render_names:
-                    version_path = os.path.join(publish_base_path, render)
-                    versions = [v for v in os.listdir(version_path) if os.path.isdir(os.path.join(version_path, v))]
-                    for version in versions:
-                        full_path = os.path.join(version_path, version)
-                        size = self._get_directory_size(full_path)
-                        age = self._get_folder_age_in_days(full_path)
-                        # FLIPPED LOGIC
-                        if size < 5120: counts['green'] += 1
-                        elif size >= 5120 and age > self.icon_age_threshold: counts['yellow'] += 1
-                        elif size >= 5120 and age <= self.icon_age_threshold: counts['red'] += 1
-
+            shot_versions = self._archive_shot_versions(shot_item.text(0))
+            if shot_versions is None: self.statusSummary.reset(self.summary_icons); return # Updated when the scan lands
+            for versions in shot_versions.values():
+                for version_data in versions: counts[self._weight_color(version_data['size'], version_data['mtime'])] += 1
         except Exception as e:
             print(f"Error during summary analysis: {e}")
 
         self.statusSummary.update_summary(counts, self.summary_icons)
 
+    def _archive_shown_departments(self):
+        """Departments the archive tree shows: the chosen one, or every scanned one for 'All Departments'."""
+        dept = self.archiveDeptComBox.currentData()
+        return get_scan_departments(self.config_data) if dept == "*" else [dept] if dept else []
+
+    def _archive_shot_path(self, shot_name):
+        return os.path.join(get_shots_root(self.show_root_path, self.archiveShowComBox.currentText()), self.archiveSeqComBox.currentText(), shot_name)
+
+    def _archive_shot_versions(self, shot_name):
+        """{department: version dicts} of a shot for the shown departments, from the cache. Departments not cached yet are
+        listed on an ArchiveVersionsWorker and None is returned; _on_archive_versions_scanned redraws the shot."""
+        departments = self._archive_shown_departments(); cached = self.archive_versions.setdefault(shot_name, {})
+        missing = [dept for dept in departments if dept not in cached]
+        if missing: self._start_version_scan(shot_name, missing)
+        if any(dept not in cached for dept in departments): return None
+        return {dept: cached[dept] for dept in departments}
+
+    def _start_version_scan(self, shot_name, departments):
+        """Scans the given departments of a shot that are not being scanned already; one without such a root is cached as empty."""
+        shot_path = self._archive_shot_path(shot_name); source_mode = self.archiveDataSourceComBox.currentText(); roots = {}
+        for dept in departments:
+            if (shot_name, dept) in self.version_scanners: continue
+            root = get_department_root(self.config_data, dept, shot_path, source_mode)
+            if root: roots[dept] = root
+            else: self.archive_versions.setdefault(shot_name, {})[dept] = []
+        if not roots: return
+        thread = QtCore.QThread(self); worker = ArchiveVersionsWorker(shot_name, roots, source_mode, self.config_data, self.archive_scan_id); worker.moveToThread(thread)
+        worker.batch_ready.connect(self._on_archive_versions_batch)
+        worker.completed.connect(self._on_archive_versions_scanned)
+        thread.started.connect(worker.run)
+        worker.finished.connect(thread.quit)
+        worker.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        for dept in roots: self.version_scanners[(shot_name, dept)] = (thread, worker)
+        thread.start()
+
+    def _on_archive_versions_batch(self, batch):
+        """Caches each department's versions as its scan finishes."""
+        for scan_id, shot_name, dept, versions in batch:
+            if scan_id != self.archive_scan_id: continue # Left over from an earlier sequence
+            self.version_scanners.pop((shot_name, dept), None); self.archive_versions.setdefault(shot_name, {})[dept] = versions
+            for version_data in versions: self.archive_version_data[version_data['path']] = version_data
+
+    def _on_archive_versions_scanned(self, shot_name, scan_id):
+        """Fills in whatever was waiting for a shot's scanned versions: the expanded shot and the summary."""
+        if scan_id != self.archive_scan_id: return
+        items = self.archiveTree.findItems(shot_name, QtCore.Qt.MatchExactly, 0)
+        if not items: return
+        if items[0].isExpanded() and items[0].childCount() == 1 and items[0].child(0).text(0) == "Loading...":
+            items[0].takeChild(0); self._fill_archive_shot(items[0])
+        current = self.archiveTree.currentItem()
+        while current is not None and current.parent() is not None: current = current.parent()
+        if current is items[0]: self._analyze_and_update_summary(current)
+
+    def _cancel_version_scans(self):
+        for thread, worker in set(self.version_scanners.values()): worker.cancel()
+        self.version_scanners.clear()
+
+    def _populate_archive_departments(self):
+        """One entry per scanned department, plus 'All Departments' when there are several; starts on active_department."""
+        departments = get_scan_departments(self.config_data)
+        self.archiveDeptComBox.blockSignals(True); self.archiveDeptComBox.clear()
+        for dept in departments: self.archiveDeptComBox.addItem(dept, dept)
+        if len(departments) > 1: self.archiveDeptComBox.addItem("All Departments", "*")
+        self.archiveDeptComBox.setCurrentIndex(max(0, self.archiveDeptComBox.findData(self.config_data.get("active_department"))))
+        self.archiveDeptComBox.blockSignals(False)
+
+    def _on_archive_department_changed(self):
+        """Redraws the archive tree for the chosen department(s) from what was already scanned; versions of departments
+        not listed yet are scanned for the expanded and selected shots only."""
+        self._cancel_size_refiners()
+        for i in range(self.archiveTree.topLevelItemCount()):
+            shot_item = self.archiveTree.topLevelItem(i); self._show_shot_size(shot_item)
+            if shot_item.childCount() == 1 and shot_item.child(0).text(0) == "Loading...": continue
+            shot_item.takeChildren()
+            if shot_item.isExpanded(): self._fill_archive_shot(shot_item)
+            else: shot_item.addChild(QtWidgets.QTreeWidgetItem(["Loading..."]))
+        if self.archiveDataSourceComBox.currentText() == "FINAL": self._flag_scrubbed_shots()
+        current = self.archiveTree.currentItem()
+        while current is not None and current.parent() is not None: current = current.parent()
+        if current is not None: self._analyze_and_update_summary(current)
+        else: self.statusSummary.reset(self.summary_icons)
+
+    def _weight_color(self, size, mtime):
+        """Data weight of a version: 'green' (tiny/empty), 'yellow' (aged) or 'red' (recent and heavy)."""
+        # FLIPPED LOGIC
+        if size < 5120: return 'green'
+        return 'yellow' if (time.time() - mtime) / (24 * 3600) > self.icon_age_threshold else 'red'
+
     
     def _on_publish_clicked(self):
         selected_items = self.rendersTree.selectedItems();
         if not selected_items: return
         
         is_move = self.move_radio_btn.isChecked()
-        copy_jobs, self.published_versions = [], []
+        copy_jobs, self.published_versions, daily_dirs = [], [], []
         
         show_name, seq_name, shot_name = self.jobComBox.currentText(), self.seqNameComBox.currentText(), self.shotNameComBox.currentText()
         dept = self.config_data.get("active_department")
         dept_paths = self.config_data.get("departments", {}).get(dept, {}); publish_template = dept_paths.get("publish_path")
         if not publish_template: QtWidgets.QMessageBox.critical(self, "Error", f"No 'publish_path' defined for department '{dept}' in config."); return
+        make_daily = self.daily_check_box.isChecked()
+        if make_daily and not dept_paths.get("daily_path"): QtWidgets.QMessageBox.critical(self, "Error", f"No 'daily_path' defined for department '{dept}' in config."); return
+        if make_daily:
+            try: import PIL
+            except ImportError: QtWidgets.QMessageBox.critical(self, "Error", "Make Daily needs the Pillow package (pip install Pillow)."); return
         
         for item in selected_items:
             # New, simpler way to get the path
@@ -623,13 +5169,22 @@ class mainWindow(QtWidgets.QWidget):
             version_name = path_parts[-1]
 
             base_shot_path = os.path.join(self.show_root_path, show_name, "Production", "Shots", seq_name, shot_name)
-            dest_path = os.path.join(base_shot_path, publish_template.replace('/', os.sep), render_name, version_name)
+            dest_path = storage_join(get_publish_base(self.config_data, base_shot_path), render_name, version_name) # Local, or the department's publish_target
             
             copy_jobs.append((source_path, dest_path))
             self.published_versions.append({ "source": source_path, "destination": dest_path })
+            daily_dir = get_daily_path(self.config_data, base_shot_path, render_name, version_name) if make_daily else None
+            daily_dirs.append(daily_dir)
+            if daily_dir: self.published_versions[-1]["daily"] = daily_dir
         
-        self.progress_dialog = ProgressDialog(self); self.thread = QtCore.QThread()
-        self.worker = RobocopyWorker(copy_jobs, is_move)
+        self.progress_dialog = self._make_progress_dialog("publish"); self.thread = QtCore.QThread()
+        if self.service_check_box.isChecked():
+            payload = {"copy_jobs": copy_jobs, "is_move": is_move, "throttle": self.throttlePubComboBox.currentText(), "dedup": self.dedup_check_box.isChecked(), "daily_dirs": daily_dirs,
+                       "log_file": self._publish_log_path(), "log_entry": self._build_publish_log_entry(), "priority": self.config_data.get("transfer_priority", "Normal")}
+            self.worker = RemoteJobWorker(PublishServiceClient.from_config(self.config_data), "publish", payload)
+        else:
+            self.worker = RobocopyWorker(copy_jobs, is_move, self.throttlePubComboBox.currentText(), self.config_data, self.dedup_check_box.isChecked(), daily_dirs)
+            self.worker.job_deduped.connect(self._on_publish_job_deduped)
         self.worker.moveToThread(self.thread); 
         
         self.thread.started.connect(self.worker.run)
@@ -640,12 +5195,24 @@ class mainWindow(QtWidgets.QWidget):
         self.worker.log_message.connect(self.progress_dialog.add_log)
         self.worker.progress_updated.connect(self.progress_dialog.set_progress)
         self.worker.speed_updated.connect(self.progress_dialog.set_speed)
-        self.progress_dialog.abort_clicked.connect(self.worker.abort)
-        self.progress_dialog.pause_toggled.connect(self.worker.toggle_pause)
+        self.progress_dialog.abort_clicked.connect(self.worker.abort, QtCore.Qt.DirectConnection) # The worker's thread is busy in run()
+        self.progress_dialog.pause_toggled.connect(self.worker.toggle_pause, QtCore.Qt.DirectConnection)
+        self.progress_dialog.enable_priority(list(priority_levels(self.config_data)), self.config_data.get("transfer_priority", "Normal"))
+        self.progress_dialog.priority_changed.connect(self.worker.set_priority, QtCore.Qt.DirectConnection)
         
         self.thread.start(); self.progress_dialog.exec()
     
 
+    def _make_progress_dialog(self, operation):
+        """ProgressDialog with a bounded viewer; also writes the full log to cache_dir/logs when 'keep_transfer_logs' is set."""
+        log_file = None
+        if self.config_data.get("keep_transfer_logs", True):
+            try:
+                log_dir = os.path.join(get_cache_dir(self.config_data), "logs"); os.makedirs(log_dir, exist_ok=True)
+                log_file = os.path.join(log_dir, f"{datetime.datetime.now():%Y%m%d_%H%M%S}_{operation}.log")
+            except OSError as e: print(f"Could not create transfer log folder: {e}")
+        return ProgressDialog(self, self.config_data.get("log_viewer_lines", 5000), log_file)
+
     def _get_folder_age_in_days(self, path):
         """Returns the age of a folder in days."""
         try:
@@ -658,23 +5225,7 @@ class mainWindow(QtWidgets.QWidget):
 
     def _format_size(self, size_bytes):
         """Formats a size in bytes to a human-readable string (KB, MB, GB...)."""
-        if size_bytes < 1024:
-            return "0.0 KB"
-        
-        # Define units and their corresponding byte values
-        TB = 1024**4
-        GB = 1024**3
-        MB = 1024**2
-        KB = 1024
-        
-        if size_bytes >= TB:
-            return f"{size_bytes / TB:.1f} TB"
-        elif size_bytes >= GB:
-            return f"{size_bytes / GB:.1f} GB"
-        elif size_bytes >= MB:
-            return f"{size_bytes / MB:.1f} MB"
-        else: # Must be at least 1 KB
-            return f"{size_bytes / KB:.1f} KB"
+        return format_size(size_bytes)
 
 
     # --- NEW ARCHIVER METHODS ---
@@ -689,7 +5240,8 @@ class mainWindow(QtWidgets.QWidget):
         self.archiveSeqComBox.setCurrentIndex(0)
 
     def _on_archive_seq_selected(self, seq_name):
-        self.archiveTree.clear()
+        self._cancel_size_refiners(); self._cancel_version_scans(); self.archiveTree.clear()
+        self.archive_shot_sizes = {}; self.archive_versions = {}; self.archive_version_data = {}; self.archive_scan_id += 1
         self.statusSummary.reset(self.summary_icons)
         show_name = self.archiveShowComBox.currentText()
         if not all([show_name and show_name != "Select Show...", seq_name and seq_name != "Select Sequence..."]): return
@@ -713,13 +5265,15 @@ class mainWindow(QtWidgets.QWidget):
 
         # Get the currently selected data source
         source_mode = self.archiveDataSourceComBox.currentText()
+        if source_mode == "FINAL": self._flag_scrubbed_shots()
 
-        # Start background scanner to update the sizes
+        # Start background scanner to update the sizes of every scanned department at once
         self.scanner_thread = QtCore.QThread()
-        self.scanner_worker = ShotScannerWorker(seq_path, self.config_data, source_mode) # Pass source_mode
+        self.scanner_worker = ShotScannerWorker(seq_path, self.config_data, source_mode, get_scan_departments(self.config_data), self.archive_scan_id)
         self.scanner_worker.moveToThread(self.scanner_thread)
         
-        self.scanner_worker.shot_found.connect(self._update_shot_size_in_tree)
+        # A bound method of this window runs on the GUI thread; a lambda would run on the worker's thread
+        self.scanner_worker.batch_ready.connect(self._update_shot_sizes_in_tree)
         self.scanner_thread.started.connect(self.scanner_worker.run)
         self.scanner_worker.finished.connect(self.scanner_thread.quit)
         self.scanner_worker.finished.connect(self.scanner_worker.deleteLater)
@@ -727,12 +5281,30 @@ class mainWindow(QtWidgets.QWidget):
         
         self.scanner_thread.start()
 
-    def _update_shot_size_in_tree(self, shot_name, total_size):
-        """Finds a shot item in the tree and updates its size column."""
-        items = self.archiveTree.findItems(shot_name, QtCore.Qt.MatchExactly, 0)
-        if items:
-            shot_item = items[0]
-            shot_item.setText(1, self._format_size(total_size))
+    def _update_shot_sizes_in_tree(self, batch):
+        """Caches a batch of (scan_id, shot_name, department, SizeEstimate) results from the scanner and updates the shots' size column.
+        An exact size is never replaced by an estimate; batches still queued from a previous sequence are dropped."""
+        batch = [item for item in batch if item[0] == self.archive_scan_id]
+        for scan_id, shot_name, dept, size_estimate in batch:
+            sizes = self.archive_shot_sizes.setdefault(shot_name, {})
+            if size_estimate.exact or not (dept in sizes and sizes[dept].exact): sizes[dept] = size_estimate
+        for shot_name in {item[1] for item in batch}:
+            items = self.archiveTree.findItems(shot_name, QtCore.Qt.MatchExactly, 0)
+            if items: self._show_shot_size(items[0])
+
+    def _show_shot_size(self, shot_item):
+        """Size column of a shot: the total over the shown departments once each has a size; estimated if any part is."""
+        sizes = self.archive_shot_sizes.get(shot_item.text(0), {}); parts = [sizes.get(dept) for dept in self._archive_shown_departments()]
+        if not parts or None in parts: shot_item.setText(1, "Calculating..."); shot_item.setToolTip(1, ""); shot_item.setData(1, QtCore.Qt.UserRole, None); return
+        self._set_size_text(shot_item, SizeEstimate(sum(p.size for p in parts), sum(p.low for p in parts), sum(p.high for p in parts), all(p.exact for p in parts)))
+
+    def _set_size_text(self, item, size_estimate):
+        """Size column of an archive tree item. Estimates read '≈ <size>' and carry their bound in the tooltip."""
+        if size_estimate.exact: item.setText(1, self._format_size(size_estimate.size)); item.setToolTip(1, "")
+        else:
+            item.setText(1, f"≈ {self._format_size(size_estimate.size)}")
+            item.setToolTip(1, f"Estimated from a sample of files: {self._format_size(size_estimate.low)} to {self._format_size(size_estimate.high)} (95%). The exact size follows.")
+        item.setData(1, QtCore.Qt.UserRole, size_estimate.exact)
 
     def _add_shot_to_archive_tree(self, shot_name, total_size):
         """Slot to receive data from the scanner and add a shot to the tree."""
@@ -744,72 +5316,108 @@ class mainWindow(QtWidgets.QWidget):
 
     def _on_archive_item_expanded(self, item):
         if item.parent() is not None or not (item.childCount() == 1 and item.child(0).text(0) == "Loading..."): return
+        if self._archive_shot_versions(item.text(0)) is None: return # "Loading..." stays until the scan lands
         item.takeChild(0)
+        try: self._fill_archive_shot(item)
+        except Exception as e: print(f"Error expanding archive item: {e}")
 
-        shot_name = item.text(0)
-        show_name = self.archiveShowComBox.currentText()
-        seq_name = self.archiveSeqComBox.currentText()
-        
-        dept = self.config_data.get("active_department")
-        dept_paths = self.config_data.get("departments", {}).get(dept, {})
-        source_mode = self.archiveDataSourceComBox.currentText()
+    def _fill_archive_shot(self, item):
+        """Adds the render and version rows of the shown departments below a shot item (render rows read 'department / render' when several are shown)."""
+        shot_name = item.text(0); source_mode = self.archiveDataSourceComBox.currentText(); departments = self._archive_shown_departments()
+        shot_versions = self._archive_shot_versions(shot_name)
+        if shot_versions is None: item.addChild(QtWidgets.QTreeWidgetItem(["Loading..."])); return # Filled in when the scan lands
+        renders = {}
+        scrub_problems = self._scrub_problems([get_department_root(self.config_data, dept, self._archive_shot_path(shot_name), "FINAL") for dept in departments]) if source_mode == "FINAL" else {}
+        for dept, versions in shot_versions.items():
+            for version_data in versions: renders.setdefault(version_data['render'] if len(departments) == 1 else f"{dept} / {version_data['render']}", []).append(version_data)
+
+        weight_icons = {'green': self.weight_green_icon, 'yellow': self.weight_yellow_icon, 'red': self.weight_red_icon}
+        counts = {'red': 0, 'yellow': 0, 'green': 0}; estimated = []
+        for render_name in sorted(renders.keys()):
+            render_item = QtWidgets.QTreeWidgetItem(item, [render_name])
+            for version_data in sorted(renders[render_name], key=lambda v: (v.get('user', ''), version_sort_key(v['version']))):
+                version_item = QtWidgets.QTreeWidgetItem(render_item)
+                version_item.setText(0, f"    {version_data['version']} ({version_data['user']})" if source_mode == "WIP" else f"    {version_data['version']}")
+                size_estimate = version_data.get('estimate') or SizeEstimate(version_data['size'], version_data['size'], version_data['size'], True)
+                self._set_size_text(version_item, size_estimate); version_item.setTextAlignment(1, QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                weight = self._weight_color(version_data['size'], version_data['mtime'])
+                version_item.setIcon(2, weight_icons[weight]); version_item.setData(2, QtCore.Qt.UserRole, weight); counts[weight] += 1
+                if not size_estimate.exact:
+                    version_item.setData(0, QtCore.Qt.UserRole, version_data['mtime']); self.estimated_items[version_data['path']] = version_item; estimated.append(version_data['path'])
+                problems = scrub_problems.get(os.path.normpath(version_data['path']))
+                if problems: version_item.setIcon(0, self.red_dot_icon); version_item.setToolTip(0, f"Checksum scrub: {describe_scrub_problems(problems)} files. 'xPubUi scrub --problems' lists them.")
 
+        # Summary comes from the same scan instead of re-walking the shot
+        self.statusSummary.update_summary(counts, self.summary_icons)
+        if estimated: self._start_size_refiner(shot_name, estimated)
+
+    def _scrub_problems(self, publish_bases):
+        """{version path: {status: file count}} the publish scrub found below the given publish roots; empty without a scrub index."""
+        import sqlite3
+        db_path = get_scrub_db_path(self.config_data); bases = [b for b in publish_bases if b and not is_object_store_path(b)]
+        if not bases or not os.path.exists(db_path): return {}
         try:
-            if source_mode == "WIP":
-                source_template = dept_paths.get("source_path")
-                if not source_template: return
-                user_base_path = os.path.join(self.show_root_path, show_name, "Production", "Shots", seq_name, shot_name, source_template.replace('/', os.sep))
-                if not os.path.exists(user_base_path): return
-                
-                renders = {}
-                user_dirs = [d for d in os.listdir(user_base_path) if os.path.isdir(os.path.join(user_base_path, d))]
-                for user in user_dirs:
-                    preview_path = os.path.join(user_base_path, user, "renders", "preview")
-                    if os.path.exists(preview_path):
-                        render_names = [r for r in os.listdir(preview_path) if os.path.isdir(os.path.join(preview_path, r))]
-                        for render in render_names:
-                            if render not in renders: renders[render] = []
-                            version_path = os.path.join(preview_path, render)
-                            versions = [v for v in os.listdir(version_path) if os.path.isdir(os.path.join(version_path, v))]
-                            renders[render].append({'user': user, 'versions': versions, 'path': version_path})
-
-                for render_name in sorted(renders.keys()):
-                    render_item = QtWidgets.QTreeWidgetItem(item, [render_name])
-                    for user_data in sorted(renders[render_name], key=lambda x: x['user']):
-                        for version in sorted(user_data['versions']):
-                            version_item = QtWidgets.QTreeWidgetItem(render_item); version_item.setText(0, f"    {version} ({user_data['user']})")
-                            full_version_path = os.path.join(user_data['path'], version)
-                            size = self._get_directory_size(full_version_path); age = self._get_folder_age_in_days(full_version_path)
-                            version_item.setText(1, self._format_size(size)); version_item.setTextAlignment(1, QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
-                            # FLIPPED LOGIC
-                            if size < 5120: version_item.setIcon(2, self.weight_green_icon)
-                            elif size >= 5120 and age > self.icon_age_threshold: version_item.setIcon(2, self.weight_yellow_icon)
-                            elif size >= 5120 and age <= self.icon_age_threshold: version_item.setIcon(2, self.weight_red_icon)
-            
-            elif source_mode == "FINAL":
-                publish_template = dept_paths.get("publish_path")
-                if not publish_template: return
-                publish_base_path = os.path.join(self.show_root_path, show_name, "Production", "Shots", seq_name, shot_name, publish_template.replace('/', os.sep))
-                if not os.path.exists(publish_base_path): return
-
-                render_names = [r for r in os.listdir(publish_base_path) if os.path.isdir(os.path.join(publish_base_path, r))]
-                for render_name in sorted(render_names):
-                    render_item = QtWidgets.QTreeWidgetItem(item, [render_name])
-                    version_path = os.path.join(publish_base_path, render_name)
-                    versions = [v for v in os.listdir(version_path) if os.path.isdir(os.path.join(version_path, v))]
-                    for version in sorted(versions):
-                        version_item = QtWidgets.QTreeWidgetItem(render_item); version_item.setText(0, f"    {version}")
-                        full_version_path = os.path.join(version_path, version)
-                        size = self._get_directory_size(full_version_path); age = self._get_folder_age_in_days(full_version_path)
-                        version_item.setText(1, self._format_size(size)); version_item.setTextAlignment(1, QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
-                        # FLIPPED LOGIC
-                        if size < 5120: version_item.setIcon(2, self.weight_green_icon)
-                        elif size >= 5120 and age > self.icon_age_threshold: version_item.setIcon(2, self.weight_yellow_icon)
-                        elif size >= 5120 and age <= self.icon_age_threshold: version_item.setIcon(2, self.weight_red_icon)
-            
-            self._analyze_and_update_summary(item)
+            index = ScrubIndex(db_path); found = {}
+            try:
+                for base in bases: found.update(index.problems(base))
+            finally: index.close()
+            return found
+        except sqlite3.Error as e: print(f"Could not read the scrub index: {e}"); return {}
 
-        except Exception as e: print(f"Error expanding archive item: {e}")
+    def _flag_scrubbed_shots(self):
+        """Marks the shots of the FINAL view in which the publish scrub found corrupt, truncated, modified or missing files (in the shown departments)."""
+        shot_items = [self.archiveTree.topLevelItem(i) for i in range(self.archiveTree.topLevelItemCount())]
+        bases = {item.text(0): [b for b in (get_department_root(self.config_data, dept, self._archive_shot_path(item.text(0)), "FINAL") for dept in self._archive_shown_departments()) if b] for item in shot_items}
+        problems = self._scrub_problems([b for shot_bases in bases.values() for b in shot_bases])
+        for item in shot_items:
+            prefixes = tuple(os.path.join(os.path.normpath(b), "") for b in bases[item.text(0)]); totals = collections.Counter()
+            versions = [counts for version, counts in problems.items() if prefixes and version.startswith(prefixes)]
+            for counts in versions: totals.update(counts)
+            if versions: item.setIcon(0, self.red_dot_icon); item.setToolTip(0, f"Checksum scrub: {describe_scrub_problems(totals)} files in {len(versions)} version(s).")
+            else: item.setIcon(0, QtGui.QIcon()); item.setToolTip(0, "")
+
+    def _start_size_refiner(self, shot_name, paths):
+        """Replaces the estimated version sizes of an expanded shot with exact ones in the background."""
+        previous = self.size_refiners.pop(shot_name, None)
+        if previous: previous[1].cancel()
+        thread = QtCore.QThread(self); worker = VersionSizeWorker(shot_name, paths, self.config_data); worker.moveToThread(thread)
+        worker.batch_ready.connect(self._apply_exact_version_sizes)
+        worker.completed.connect(self._on_size_refiner_finished)
+        thread.started.connect(worker.run)
+        worker.finished.connect(thread.quit)
+        worker.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        self.size_refiners[shot_name] = (thread, worker); thread.start()
+
+    def _apply_exact_version_sizes(self, batch):
+        """Applies a batch of exact (path, size) results to the archive tree, updating the weight icon too."""
+        weight_icons = {'green': self.weight_green_icon, 'yellow': self.weight_yellow_icon, 'red': self.weight_red_icon}
+        for path, size in batch:
+            version_data = self.archive_version_data.get(path)
+            if version_data is not None: version_data.update(size=size, estimate=None) # Switching department redraws it as exact
+            version_item = self.estimated_items.pop(path, None)
+            if version_item is None: continue
+            self._set_size_text(version_item, SizeEstimate(size, size, size, True))
+            weight = self._weight_color(size, version_item.data(0, QtCore.Qt.UserRole))
+            version_item.setIcon(2, weight_icons[weight]); version_item.setData(2, QtCore.Qt.UserRole, weight)
+
+    def _on_size_refiner_finished(self, shot_name):
+        """Drops the finished refiner and recounts the summary of its shot from the now exact weights."""
+        self.size_refiners.pop(shot_name, None)
+        items = self.archiveTree.findItems(shot_name, QtCore.Qt.MatchExactly, 0)
+        if not items: return
+        counts = {'red': 0, 'yellow': 0, 'green': 0}
+        for r in range(items[0].childCount()):
+            render_item = items[0].child(r)
+            for v in range(render_item.childCount()):
+                weight = render_item.child(v).data(2, QtCore.Qt.UserRole)
+                if weight in counts: counts[weight] += 1
+        self.statusSummary.update_summary(counts, self.summary_icons)
+
+    def _cancel_size_refiners(self):
+        """Stops every running refiner, e.g. before the archive tree is cleared."""
+        for thread, worker in self.size_refiners.values(): worker.cancel()
+        self.size_refiners.clear(); self.estimated_items.clear()
 
     def _on_archive_shot_clicked(self, item, column):
         """When a shot is clicked (not just expanded), re-run the analysis."""
@@ -822,11 +5430,81 @@ class mainWindow(QtWidgets.QWidget):
         """Ensures the background thread is terminated cleanly on close."""
         # FIX: Check if the thread is a valid QThread instance before checking if it's running
         if hasattr(self, 'thread') and isinstance(self.thread, QtCore.QThread) and self.thread.isRunning():
-            self.worker.abort()
+            if isinstance(self.worker, RemoteJobWorker): self.worker.detach() # Service jobs outlive the GUI
+            else: self.worker.abort()
             self.thread.quit()
             if not self.thread.wait(5000): # Wait up to 5 seconds
                 print("Warning: Robocopy thread did not terminate gracefully.")
+        if self.snapshot_thread is not None and self.snapshot_thread.isRunning(): self.snapshot_thread.wait(5000)
+        scan_threads = [thread for thread, worker in list(self.size_refiners.values()) + list(self.version_scanners.values())]; self._cancel_size_refiners(); self._cancel_version_scans()
+        if self.publisher_scan: self.publisher_scan[1].cancel(); scan_threads.append(self.publisher_scan[0]); self.publisher_scan = None
+        for thread in scan_threads: thread.quit(); thread.wait(2000)
+        self._save_session_snapshot(); self.prefetcher.close()
+        if self.thumbnails: self.thumbnails.close()
         event.accept()
+    def _session_snapshot_path(self): return os.path.join(get_cache_dir(self.config_data), "xPubSession.json")
+
+    def _save_session_snapshot(self):
+        """Saves the current show/seq/shot, combo contents and publisher tree data for a warm start."""
+        show_name, seq_name, shot_name = self.jobComBox.currentText(), self.seqNameComBox.currentText(), self.shotNameComBox.currentText()
+        if not self.config_data or not all(s and "Select" not in s for s in [show_name, seq_name, shot_name]): return
+        entry = self.prefetcher.cache.get(("versions", show_name, seq_name, shot_name))
+        snapshot = {
+            "Saved": datetime.datetime.now().strftime(LOG_DATETIME_FORMAT), "project_root": self.show_root_path, "department": self.config_data.get("active_department"),
+            "show": show_name, "seq": seq_name, "shot": shot_name,
+            "sequences": [self.seqNameComBox.itemText(i) for i in range(1, self.seqNameComBox.count())],
+            "shots": [self.shotNameComBox.itemText(i) for i in range(1, self.shotNameComBox.count())],
+            "versions": entry[1] if entry else None,
+        }
+        try:
+            with open(self._session_snapshot_path(), 'w', encoding="utf-8") as f: json.dump(snapshot, f, separators=(",", ":"))
+        except (OSError, TypeError) as e: print(f"Could not save session snapshot: {e}")
+
+    def _restore_session_snapshot(self):
+        """Shows the last session's selection and tree straight from the snapshot, then revalidates it in the background."""
+        if not self.config_data: return
+        try:
+            with open(self._session_snapshot_path(), 'r', encoding="utf-8") as f: snapshot = json.load(f)
+        except (OSError, ValueError): return
+        if snapshot.get("project_root") != self.show_root_path or snapshot.get("department") != self.config_data.get("active_department"): return
+        show_name, seq_name, shot_name = snapshot.get("show"), snapshot.get("seq"), snapshot.get("shot")
+        if self.jobComBox.findText(show_name) < 0: return
+
+        combos = (self.jobComBox, self.seqNameComBox, self.shotNameComBox)
+        for combo in combos: combo.blockSignals(True)
+        self.jobComBox.setCurrentText(show_name)
+        self.seqNameComBox.clear(); self.seqNameComBox.addItem("Select Sequence..."); self.seqNameComBox.addItems(snapshot.get("sequences", [])); self.seqNameComBox.setCurrentText(seq_name)
+        self.shotNameComBox.clear(); self.shotNameComBox.addItem("Select Shot..."); self.shotNameComBox.addItems(snapshot.get("shots", [])); self.shotNameComBox.setCurrentText(shot_name)
+        for combo in combos: combo.blockSignals(False)
+        self._reset_log_browser(); self._load_shot_logs(shot_name)
+        if snapshot.get("versions") is not None: self._populate_renders_tree(snapshot["versions"])
+        print(f"Restored session snapshot from {snapshot.get('Saved')}; revalidating in the background.")
+
+        self._snapshot = snapshot
+        loaders = {("seqs", show_name): lambda: self._list_sequences(show_name), ("shots", show_name, seq_name): lambda: self._list_shots(show_name, seq_name),
+                   ("versions", show_name, seq_name, shot_name): lambda: self._load_shot_versions(show_name, seq_name, shot_name)}
+        self.snapshot_thread = QtCore.QThread(); self.snapshot_worker = SnapshotRevalidator(loaders); self.snapshot_worker.moveToThread(self.snapshot_thread)
+        self.snapshot_thread.started.connect(self.snapshot_worker.run)
+        self.snapshot_worker.finished.connect(self._on_snapshot_revalidated)
+        self.snapshot_worker.finished.connect(self.snapshot_thread.quit); self.snapshot_worker.finished.connect(self.snapshot_worker.deleteLater)
+        self.snapshot_thread.start()
+
+    def _on_snapshot_revalidated(self, results):
+        """Seeds the prefetch cache with fresh listings and redraws whatever changed since the snapshot, if still on screen."""
+        for key, value in results.items(): self.prefetcher.put(key, value)
+        snapshot = self._snapshot; show_name, seq_name, shot_name = snapshot["show"], snapshot["seq"], snapshot["shot"]
+        if (self.jobComBox.currentText(), self.seqNameComBox.currentText(), self.shotNameComBox.currentText()) != (show_name, seq_name, shot_name): return
+        changed = False
+        for combo, key, placeholder, current in ((self.seqNameComBox, ("seqs", show_name), "Select Sequence...", seq_name), (self.shotNameComBox, ("shots", show_name, seq_name), "Select Shot...", shot_name)):
+            fresh = results.get(key)
+            if fresh is None or fresh == [combo.itemText(i) for i in range(1, combo.count())]: continue
+            combo.blockSignals(True); combo.clear(); combo.addItem(placeholder); combo.addItems(fresh); combo.setCurrentText(current); combo.blockSignals(False)
+            changed = True
+        fresh_versions = results.get(("versions", show_name, seq_name, shot_name))
+        by_path = lambda versions: sorted(versions or [], key=lambda v: v['path']) # Scan order is completion order
+        if fresh_versions is not None and by_path(fresh_versions) != by_path(snapshot.get("versions")): self._populate_renders_tree(fresh_versions); changed = True
+        print("Session snapshot revalidated" + (" (updated)." if changed else " (unchanged)."))
+
     def _create_icon_from_char(self, char, size=64):
         pixmap = QtGui.QPixmap(size, size); pixmap.fill(QtCore.Qt.transparent); painter = QtGui.QPainter(pixmap); painter.setRenderHint(QtGui.QPainter.Antialiasing)
         font = painter.font(); font.setPixelSize(int(size * 0.8)); painter.setFont(font); painter.setPen(QtGui.QColor("#f0f0f0")); painter.drawText(pixmap.rect(), QtCore.Qt.AlignCenter, char); painter.end()
@@ -886,7 +5564,7 @@ class mainWindow(QtWidgets.QWidget):
         except FileNotFoundError: return 0
         return total_size
     def _connect_signals(self):
-        self.load_config_action.triggered.connect(self._on_config_clicked); self.how_to_action.triggered.connect(self._show_how_to); self.release_notes_action.triggered.connect(self._show_release_notes)
+        self.load_config_action.triggered.connect(self._on_config_clicked); self.history_search_action.triggered.connect(self._show_history_search); self.storage_report_action.triggered.connect(self._show_storage_report); self.throughput_report_action.triggered.connect(self._show_throughput_report); self.restore_pack_action.triggered.connect(self._on_restore_pack_clicked); self.how_to_action.triggered.connect(self._show_how_to); self.release_notes_action.triggered.connect(self._show_release_notes)
         self.cancelBtn.clicked.connect(self.close)
         
         # Publisher signals
@@ -895,12 +5573,14 @@ class mainWindow(QtWidgets.QWidget):
         self.seqNameComBox.currentTextChanged.connect(self._on_seq_selected)
         self.shotNameComBox.currentTextChanged.connect(self._on_shot_selected)
         self.rendersTree.itemSelectionChanged.connect(self._update_publish_button_state); self.commentTextEdit.textChanged.connect(self._update_publish_button_state); self.rendersTree.itemExpanded.connect(self._on_item_expanded)
+        self.rendersTree.verticalScrollBar().valueChanged.connect(lambda value: self.thumbnail_timer.start()); self.rendersTree.itemExpanded.connect(lambda item: self.thumbnail_timer.start()); self.thumbnail_timer.timeout.connect(self._request_visible_thumbnails)
         self.prevLogBtn.clicked.connect(self._browse_prev_log); self.nextLogBtn.clicked.connect(self._browse_next_log)
 
         # Archiver signals
         self.archiveShowComBox.currentTextChanged.connect(self._on_archive_show_selected)
         self.archiveSeqComBox.currentTextChanged.connect(self._on_archive_seq_selected)
         self.archiveDataSourceComBox.currentTextChanged.connect(self._on_archive_seq_selected) # New connection
+        self.archiveDeptComBox.currentIndexChanged.connect(self._on_archive_department_changed)
         self.archiveTree.itemExpanded.connect(self._on_archive_item_expanded)
         self.archiveTree.itemClicked.connect(self._on_archive_shot_clicked)
         self.maxAgeRadioButton.toggled.connect(self.maxAgeLineEdit.setEnabled)
@@ -923,8 +5603,13 @@ class mainWindow(QtWidgets.QWidget):
             with open(config_path, 'r', encoding="utf-8") as f: 
                 self.config_data = json.load(f)
             
-            self.show_root_path = self.config_data.get("project_root", "")
+            self.show_root_path = self.config_data.get("project_root", ""); configure_storage(self.config_data)
             self.icon_age_threshold = self.config_data.get("icon_age_threshold", 30)
+            self.dedup_check_box.setChecked(self.config_data.get("dedup_on_publish", False))
+            has_service = bool(self.config_data.get("service_url"))
+            for check_box in (self.service_check_box, self.archiveServiceCheckBox): check_box.setEnabled(has_service); check_box.setChecked(has_service and self.config_data.get("run_on_service", False))
+            self.prefetcher.close(); self.prefetcher = NavigationPrefetcher.from_config(self.config_data)
+            self._setup_thumbnails()
             
             if "project_root" not in self.config_data or "active_department" not in self.config_data: 
                 raise KeyError("Config must contain 'project_root' and 'active_department' keys.")
@@ -933,17 +5618,51 @@ class mainWindow(QtWidgets.QWidget):
             print(f"Icon Age Threshold set to: {self.icon_age_threshold} days")
             
             self._check_user_permissions()
+            self._populate_archive_departments()
             self._populate_project_combos()
 
         except (FileNotFoundError, json.JSONDecodeError, KeyError) as e:
             self.show_root_path = ""; self.config_data = {}
             self.icon_age_threshold = 30
             QtWidgets.QMessageBox.warning(self, "Config Error", f"Could not load or parse config file.\n{e}")
-            self._check_user_permissions()
+            self._check_user_permissions(); self._populate_project_combos()
     
     def _on_config_clicked(self):
         script_dir = os.path.dirname(__file__); file_path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Load Config File", script_dir, "JSON Files (*.json)")
         if file_path: self._load_config(file_path)
+    def _show_history_search(self):
+        if not self.show_root_path: QtWidgets.QMessageBox.warning(self, "Config Error", "Load a config with a valid 'project_root' first."); return
+        show_names = [self.jobComBox.itemText(i) for i in range(1, self.jobComBox.count())]
+        current_show = self.jobComBox.currentText() if self.jobComBox.currentIndex() > 0 else self.archiveShowComBox.currentText()
+        dialog = HistorySearchDialog(self.config_data, show_names, current_show, self); dialog.exec()
+    def _show_storage_report(self):
+        if not self.show_root_path: QtWidgets.QMessageBox.warning(self, "Config Error", "Load a config with a valid 'project_root' first."); return
+        show_names = [self.archiveShowComBox.itemText(i) for i in range(1, self.archiveShowComBox.count())]
+        current_show = self.archiveShowComBox.currentText() if self.archiveShowComBox.currentIndex() > 0 else self.jobComBox.currentText()
+        dialog = StorageReportDialog(self.config_data, show_names, current_show, self); dialog.exec()
+    def _show_throughput_report(self):
+        import sqlite3
+        try: dialog = ThroughputReportDialog(self.config_data, self)
+        except (OSError, sqlite3.Error) as e: QtWidgets.QMessageBox.warning(self, "Throughput Report", f"Could not open the throughput history:\n{e}"); return
+        dialog.exec()
+    def _on_restore_pack_clicked(self):
+        """Restores cold storage packs back into their original version folders (admin only)."""
+        if not self.tabWidget.isTabEnabled(1): QtWidgets.QMessageBox.warning(self, "Permission Denied", "Only admin users can restore packs."); return
+        pack_paths, _ = QtWidgets.QFileDialog.getOpenFileNames(self, "Restore Pack", self.config_data.get("archive_root", ""), "Packs (*.tar)")
+        if not pack_paths: return
+        if QtWidgets.QMessageBox.question(self, "Restore Pack", f"Restore {len(pack_paths)} pack(s) into their original locations?") != QtWidgets.QMessageBox.Yes: return
+
+        self.progress_dialog = self._make_progress_dialog("restore"); self.progress_dialog.setWindowTitle("Restoring...")
+        self.thread = QtCore.QThread()
+        self.worker = RestoreWorker(pack_paths); self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.worker.finished.connect(lambda success: self.progress_dialog.on_finished(success, "RESTORE COMPLETED SUCCESSFULLY", "RESTORE FAILED OR ABORTED"))
+        self.worker.finished.connect(self.thread.quit); self.worker.finished.connect(self.worker.deleteLater); self.thread.finished.connect(self.thread.deleteLater)
+        self.worker.log_message.connect(self.progress_dialog.add_log)
+        self.worker.progress_updated.connect(self.progress_dialog.set_progress)
+        self.progress_dialog.abort_clicked.connect(self.worker.abort, QtCore.Qt.DirectConnection)
+        self.progress_dialog.pause_button.setVisible(False)
+        self.thread.start(); self.progress_dialog.exec()
     def _show_how_to(self): self._show_help_dialog("HowToOperate.JSON", "How To Operate")
     def _show_release_notes(self): self._show_help_dialog("ReleaseNotes.JSON", "Release Notes")
 
@@ -967,36 +5686,62 @@ class mainWindow(QtWidgets.QWidget):
 
     def _populate_project_combos(self):
         # FIX: Explicitly pass the target combo box to the function
-        self._populate_shows(self.jobComBox)
-        self._populate_shows(self.archiveShowComBox)
+        # One listing of project_root, shared by both combos
+        shows = self.prefetcher.get(("shows", self.show_root_path), self._list_shows) if self.show_root_path else []
+        self._populate_shows(self.jobComBox, shows)
+        self._populate_shows(self.archiveShowComBox, shows)
         
 
-    def _populate_shows(self, combo_box):
-        combo_box.clear(); combo_box.addItem("Select Show...")
+    def _populate_shows(self, combo_box, shows):
+        combo_box.clear(); combo_box.addItem("Select Show..."); combo_box.addItems(shows)
+    def _list_shows(self):
         try:
             if self.show_root_path and os.path.exists(self.show_root_path):
-                shows = [d for d in os.listdir(self.show_root_path) if os.path.isdir(os.path.join(self.show_root_path, d))]; combo_box.addItems(sorted(shows))
+                return sorted(d for d in os.listdir(self.show_root_path) if os.path.isdir(os.path.join(self.show_root_path, d)))
         except Exception as e: print(f"Error populating shows: {e}")
+        return []
     def _on_show_selected(self, show_name):
+        self.prefetcher.cancel()
         self.seqNameComBox.clear(); self.seqNameComBox.addItem("Select Sequence...")
         if show_name and show_name != "Select Show...":
-            seq_path = os.path.join(self.show_root_path, show_name, "Production", "Shots")
             try:
-                if os.path.exists(seq_path):
-                    sequences = [d for d in os.listdir(seq_path) if os.path.isdir(os.path.join(seq_path, d))]; self.seqNameComBox.addItems(sorted(sequences))
+                sequences = self.prefetcher.get(("seqs", show_name), lambda: self._list_sequences(show_name)); self.seqNameComBox.addItems(sequences)
+                # Warm every sequence's shot list, recently visited sequences first
+                keys = self.prefetcher.prioritize([("shots", show_name, seq) for seq in sequences])
+                self.prefetcher.schedule([(key, lambda key=key: self._list_shots(key[1], key[2])) for key in keys])
             except Exception as e: print(f"Error populating sequences for {show_name}: {e}")
         self.seqNameComBox.setCurrentIndex(0)
     def _on_seq_selected(self, seq_name):
         self.shotNameComBox.clear(); self.shotNameComBox.addItem("Select Shot...")
         show_name = self.jobComBox.currentText()
         if seq_name and seq_name != "Select Sequence..." and show_name != "Select Show...":
-            shot_path = os.path.join(self.show_root_path, show_name, "Production", "Shots", seq_name)
             try:
-                if os.path.exists(shot_path):
-                    shots = [d for d in os.listdir(shot_path) if os.path.isdir(os.path.join(shot_path, d))]; self.shotNameComBox.addItems(sorted(shots))
+                shots = self.prefetcher.get(("shots", show_name, seq_name), lambda: self._list_shots(show_name, seq_name)); self.shotNameComBox.addItems(shots)
+                self.prefetcher.note_visit(("shots", show_name, seq_name))
+                # Warm every shot's version listing, sizes and publish state, recently visited shots first
+                keys = self.prefetcher.prioritize([("versions", show_name, seq_name, shot) for shot in shots])
+                self.prefetcher.schedule([(key, lambda key=key, prefetcher=self.prefetcher: self._load_shot_versions(*key[1:], should_stop=prefetcher.is_stale)) for key in keys])
             except Exception as e: print(f"Error populating shots for {seq_name}: {e}")
+    def _list_sequences(self, show_name): return sorted(list_subdirs(get_shots_root(self.show_root_path, show_name)))
+    def _list_shots(self, show_name, seq_name): return sorted(list_subdirs(os.path.join(get_shots_root(self.show_root_path, show_name), seq_name)))
+    def _publisher_scan_paths(self, show_name, seq_name, shot_name):
+        """(WIP source root, publish root) of a shot in the active department; the source root is None when it does not exist."""
+        shot_path = os.path.join(get_shots_root(self.show_root_path, show_name), seq_name, shot_name)
+        source_template = self.config_data.get("departments", {}).get(self.config_data.get("active_department"), {}).get("source_path")
+        user_base_path = os.path.join(shot_path, source_template.replace('/', os.sep)) if source_template else None
+        return (user_base_path if user_base_path and os.path.exists(user_base_path) else None), get_publish_base(self.config_data, shot_path)
+    def _load_shot_versions(self, show_name, seq_name, shot_name, should_stop=None):
+        """Version dicts for a shot's WIP renders (see scan_publisher_versions). Runs the scan on the calling thread; used by the prefetcher and the snapshot revalidation.
+        Raises ScanCancelled once should_stop() is true."""
+        import asyncio
+        user_base_path, publish_base_path = self._publisher_scan_paths(show_name, seq_name, shot_name)
+        if not user_base_path: return []
+        async def scan():
+            with AsyncScanner.from_config(self.config_data, should_stop=should_stop) as scanner: return await scan_publisher_versions(scanner, self.config_data, user_base_path, publish_base_path)
+        return asyncio.run(scan())
     def _on_shot_selected(self, shot_name):
-        self.rendersTree.clear(); self._reset_log_browser(); self._load_shot_logs(shot_name)
+        self.rendersTree.clear(); self._thumbnail_items = {}; self._reset_log_browser(); self._load_shot_logs(shot_name)
+        if self.thumbnails: self.thumbnails.cancel()
         
         dept = self.config_data.get("active_department")
         if not dept: self.rendersTree.clear(); return
@@ -1006,52 +5751,87 @@ class mainWindow(QtWidgets.QWidget):
         show_name, seq_name = self.jobComBox.currentText(), self.seqNameComBox.currentText()
         if not all(s and "Select" not in s for s in [show_name, seq_name, shot_name]): return
         
-        user_base_path = os.path.join(self.show_root_path, show_name, "Production", "Shots", seq_name, shot_name, source_template.replace('/', os.sep))
+        key = ("versions", show_name, seq_name, shot_name); self.prefetcher.note_visit(key)
 
         try:
-            if not os.path.exists(user_base_path): return
-            
-            layers_data = {}
-            user_dirs = [d for d in os.listdir(user_base_path) if os.path.isdir(os.path.join(user_base_path, d))]
-            for user in user_dirs:
-                preview_path = os.path.join(user_base_path, user, "renders", "preview")
-                if not os.path.exists(preview_path): continue
+            versions = self.prefetcher.peek(key)
+            if versions is not None: self._populate_renders_tree(versions); return
+            self._start_publisher_scan(key)
+        except Exception as e: print(f"Error finding user directories: {e}")
+
+    def _start_publisher_scan(self, key):
+        """Scans the shown shot on a PublisherVersionsWorker (joining a warm-up of it already running) and fills the tree when it lands."""
+        if self.publisher_scan: self.publisher_scan[1].cancel(); self.publisher_scan = None # Its thread finishes on its own
+        user_base_path, publish_base_path = self._publisher_scan_paths(*key[1:])
+        if not user_base_path: self.prefetcher.put(key, []); return
+        scanning_item = QtWidgets.QTreeWidgetItem(self.rendersTree, ["Scanning..."]); scanning_item.setFlags(QtCore.Qt.NoItemFlags)
+        thread = QtCore.QThread(self); worker = PublisherVersionsWorker(key, user_base_path, publish_base_path, self.config_data, self.prefetcher.pending(key)); worker.moveToThread(thread)
+        worker.batch_ready.connect(self._on_publisher_versions_scanned)
+        thread.started.connect(worker.run)
+        worker.finished.connect(thread.quit)
+        worker.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        self.publisher_scan = (thread, worker, key); thread.start()
+
+    def _on_publisher_versions_scanned(self, batch):
+        """Caches the scanned versions and fills the publisher tree if that shot is still the one shown."""
+        for key, versions in batch:
+            if self.publisher_scan and self.publisher_scan[2] == key: self.publisher_scan = None
+            self.prefetcher.put(key, versions)
+            if key == ("versions", self.jobComBox.currentText(), self.seqNameComBox.currentText(), self.shotNameComBox.currentText()): self._populate_renders_tree(versions)
+
+    def _populate_renders_tree(self, versions):
+        """Fills the publisher tree from version dicts (see scan_publisher_versions), grouped by render layer."""
+        self.rendersTree.clear(); self._thumbnail_items = {}
+        layers_data = {}
+        for version_data in versions:
+            layers_data.setdefault(version_data['render'], []).append(version_data)
+        for layer_name in sorted(layers_data.keys()):
+            layer_item = QtWidgets.QTreeWidgetItem(self.rendersTree, [layer_name])
+            layer_item.setFlags(layer_item.flags() & ~QtCore.Qt.ItemIsSelectable)
+
+            sorted_versions = sorted(layers_data[layer_name], key=lambda x: x['mtime'], reverse=True)
+
+            for version_data in sorted_versions:
+                version_item = QtWidgets.QTreeWidgetItem(layer_item)
+                version_item.setText(0, f"    {version_data['version']} ({version_data['user']})")
                 
-                render_names = [r for r in os.listdir(preview_path) if os.path.isdir(os.path.join(preview_path, r))]
-                for render_name in render_names:
-                    if render_name not in layers_data:
-                        layers_data[render_name] = []
-                    
-                    version_path = os.path.join(preview_path, render_name)
-                    versions = [v for v in os.listdir(version_path) if os.path.isdir(os.path.join(version_path, v))]
-                    for version in versions:
-                        full_path = os.path.join(version_path, version)
-                        mtime = os.path.getmtime(full_path)
-                        layers_data[render_name].append({
-                            'user': user, 'version': version, 'path': full_path, 'mtime': mtime
-                        })
-
-            for layer_name in sorted(layers_data.keys()):
-                layer_item = QtWidgets.QTreeWidgetItem(self.rendersTree, [layer_name])
-                layer_item.setFlags(layer_item.flags() & ~QtCore.Qt.ItemIsSelectable)
-
-                sorted_versions = sorted(layers_data[layer_name], key=lambda x: x['mtime'], reverse=True)
-
-                for version_data in sorted_versions:
-                    version_item = QtWidgets.QTreeWidgetItem(layer_item)
-                    version_item.setText(0, f"    {version_data['version']} ({version_data['user']})")
-                    
-                    date_str = datetime.datetime.fromtimestamp(version_data['mtime']).strftime('%d %b %Y %H:%M')
-                    version_item.setText(1, date_str)
-                    version_item.setTextAlignment(1, QtCore.Qt.AlignCenter)
-                    
-                    version_item.setData(0, QtCore.Qt.UserRole, version_data['path'])
-
-                    self._set_publisher_item_icons(version_item, version_data, layer_name)
+                date_str = datetime.datetime.fromtimestamp(version_data['mtime']).strftime('%d %b %Y %H:%M')
+                version_item.setText(1, date_str)
+                version_item.setTextAlignment(1, QtCore.Qt.AlignCenter)
                 
-                # layer_item.setExpanded(True) # <-- THIS LINE IS NOW REMOVED
+                version_item.setData(0, QtCore.Qt.UserRole, version_data['path'])
+                version_item.setData(3, QtCore.Qt.UserRole, version_data['mtime']); self._thumbnail_items[version_data['path']] = version_item
 
-        except Exception as e: print(f"Error finding user directories: {e}")
+                self._set_publisher_item_icons(version_item, version_data, layer_name)
+            
+            # layer_item.setExpanded(True) # <-- THIS LINE IS NOW REMOVED
+        self.thumbnail_timer.start()
+
+    def _setup_thumbnails(self):
+        """(Re)creates the thumbnail loader for the loaded config; 'thumbnail_column' false hides the column."""
+        if self.thumbnails: self.thumbnails.close(); self.thumbnails.deleteLater(); self.thumbnails = None
+        enabled = self.config_data.get("thumbnail_column", True); self.rendersTree.setColumnHidden(3, not enabled)
+        if not enabled: return
+        try: self.thumbnails = ThumbnailLoader(self.config_data, self)
+        except OSError as e: print(f"Thumbnails unavailable: {e}"); self.rendersTree.setColumnHidden(3, True); return
+        self.thumbnails.thumbnail_ready.connect(self._on_thumbnail_ready)
+        self.rendersTree.setItemDelegateForColumn(3, ThumbnailDelegate(self.thumbnails.box, self.rendersTree)); self.rendersTree.setColumnWidth(3, self.thumbnails.box.width() + 8)
+
+    def _request_visible_thumbnails(self):
+        """Asks for the thumbnails of the version rows currently in view; the others are left until scrolled to."""
+        if not self.thumbnails: return
+        bottom = self.rendersTree.viewport().rect().bottom(); item = self.rendersTree.itemAt(0, 0)
+        while item is not None and self.rendersTree.visualItemRect(item).top() <= bottom:
+            path = item.data(0, QtCore.Qt.UserRole)
+            if path and item.data(3, THUMBNAIL_ROLE) is None:
+                pixmap = self.thumbnails.request(path, item.data(3, QtCore.Qt.UserRole))
+                if pixmap is not None: item.setData(3, THUMBNAIL_ROLE, pixmap)
+            item = self.rendersTree.itemBelow(item)
+
+    def _on_thumbnail_ready(self, version_path, pixmap):
+        item = self._thumbnail_items.get(version_path)
+        if item is not None: item.setData(3, THUMBNAIL_ROLE, pixmap)
 
     def _set_publisher_item_icons(self, version_item, version_data, render_name):
         """Sets the publish and frame status icons for a version item in the publisher tree."""
@@ -1065,24 +5845,26 @@ class mainWindow(QtWidgets.QWidget):
 
         # --- Publish Status Icon (column 2, added next to frame status) ---
         show_name, seq_name, shot_name = self.jobComBox.currentText(), self.seqNameComBox.currentText(), self.shotNameComBox.currentText()
-        dept = self.config_data.get("active_department")
-        dept_paths = self.config_data.get("departments", {}).get(dept, {}); publish_template = dept_paths.get("publish_path")
-        if not publish_template: return
-
-        base_shot_path = os.path.join(self.show_root_path, show_name, "Production", "Shots", seq_name, shot_name)
-        publish_check_path = os.path.join(base_shot_path, publish_template.replace('/', os.sep), render_name, version_data['version'])
+        publish_base_path = get_publish_base(self.config_data, os.path.join(get_shots_root(self.show_root_path, show_name), seq_name, shot_name))
+        if not publish_base_path: return
+        publish_check_path = storage_join(publish_base_path, render_name, version_data['version'])
         
-        source_size = self._get_directory_size(source_version_path)
+        # Sizes are normally pre-computed concurrently by scan_publisher_versions
+        source_size = version_data['source_size'] if 'source_size' in version_data else self._get_directory_size(source_version_path)
+        if version_data.get('interrupted'): # Part of the files are only in staging; publishing again resumes the move
+            version_item.setIcon(0, self.red_dot_icon); version_item.setToolTip(0, "Move interrupted - publish again to resume")
+            return
         if source_size == 0:
             version_item.setIcon(0, self.grey_icon)
             return
 
-        if os.path.exists(publish_check_path):
-            publish_size = self._get_directory_size(publish_check_path)
-            if publish_size < source_size: version_item.setIcon(0, self.red_dot_icon)
-            else: version_item.setIcon(0, self.green_dot_icon)
+        if 'published' in version_data: published, publish_size = version_data['published'], version_data.get('publish_size')
         else:
-            version_item.setIcon(0, self.blue_dot_icon)
+            published = storage_for(publish_check_path).version_committed(publish_check_path)
+            publish_size = self._get_directory_size(publish_check_path) if published and not is_object_store_path(publish_check_path) and self.config_data.get("verify_publish_sizes", False) else None
+        if not published: version_item.setIcon(0, self.blue_dot_icon)
+        elif publish_size is not None and publish_size < source_size: version_item.setIcon(0, self.red_dot_icon)
+        else: version_item.setIcon(0, self.green_dot_icon)
     
     
     def _frame_validation(self, source_path): return "NO_DATA"
@@ -1117,7 +5899,7 @@ class mainWindow(QtWidgets.QWidget):
         self.shot_logs = []
         show_name, seq_name = self.jobComBox.currentText(), self.seqNameComBox.currentText()
         if not all(s and "Select" not in s for s in [show_name, seq_name, shot_name]): self._update_log_browser_state(); return
-        log_file = os.path.join(self.show_root_path, show_name, "Production", "Shots", seq_name, shot_name, "data", "lighting", "xPubLog.JSON")
+        log_file = get_shot_log_path(self.show_root_path, show_name, seq_name, shot_name)
         try:
             if os.path.exists(log_file):
                 with open(log_file, 'r') as f: self.shot_logs = json.load(f)
@@ -1153,28 +5935,23 @@ class mainWindow(QtWidgets.QWidget):
                 display_text += f"  - {source_name}/{version_name}\n"
             self.commentTextEdit.setText(display_text)
         except IndexError: self.commentTextEdit.setText("Error: Could not retrieve log entry.")
+    def _on_publish_job_deduped(self, job_index, files_linked, bytes_saved):
+        self.published_versions[job_index].update({"dedup_files": files_linked, "dedup_bytes": int(bytes_saved)})
     def _on_publish_finished(self, success):
         self.progress_dialog.on_finished(success, "PUBLISH COMPLETED SUCCESSFULLY", "PUBLISH FAILED OR ABORTED")
-        if success: self._create_publish_log(); self._on_shot_selected(self.shotNameComBox.currentText())
-    def _create_publish_log(self):
-        show_name, seq_name, shot_name = self.jobComBox.currentText(), self.seqNameComBox.currentText(), self.shotNameComBox.currentText()
-        log_dir = os.path.join(self.show_root_path, show_name, "Production", "Shots", seq_name, shot_name, "data", "lighting")
-        log_file = os.path.join(log_dir, "xPubLog.JSON")
+        if success:
+            if not isinstance(self.worker, RemoteJobWorker): self._create_publish_log() # The service writes the log of its own jobs
+            self.prefetcher.invalidate(("versions", self.jobComBox.currentText(), self.seqNameComBox.currentText(), self.shotNameComBox.currentText()))
+            self._on_shot_selected(self.shotNameComBox.currentText())
+    def _publish_log_path(self):
+        return get_shot_log_path(self.show_root_path, self.jobComBox.currentText(), self.seqNameComBox.currentText(), self.shotNameComBox.currentText())
+    def _build_publish_log_entry(self):
         mode = "Move" if self.move_radio_btn.isChecked() else "Copy"
-        new_entry = { "User": self.artistLineEdit.text(), "Host": self.deptLineEdit.text(), "DateTime": self.dateLineEdit.text(), "Mode": mode, "Comment": self.commentTextEdit.toPlainText(), "Publishes": self.published_versions }
+        return { "User": self.artistLineEdit.text(), "Host": self.deptLineEdit.text(), "DateTime": self.dateLineEdit.text(), "Mode": mode, "Comment": self.commentTextEdit.toPlainText(), "Publishes": self.published_versions }
+    def _create_publish_log(self):
+        log_file = self._publish_log_path()
         try:
-            os.makedirs(log_dir, exist_ok=True); all_logs = []
-            if os.path.exists(log_file):
-                os.chmod(log_file, stat.S_IWRITE)
-                with open(log_file, 'r', encoding="utf-8") as f: # FIX: Specify encoding
-                    try:
-                        all_logs = json.load(f)
-                        if not isinstance(all_logs, list): all_logs = [all_logs]
-                    except json.JSONDecodeError: all_logs = []
-            all_logs.append(new_entry)
-            with open(log_file, 'w', encoding="utf-8") as f: # FIX: Specify encoding
-                json.dump(all_logs, f, indent=4)
-            os.chmod(log_file, stat.S_IREAD)
+            append_json_log(log_file, self._build_publish_log_entry())
             self.progress_dialog.add_log(f"Successfully updated log file: {log_file}")
         except Exception as e: self.progress_dialog.add_log(f"ERROR: Could not create or write to log file: {e}")
 
@@ -1211,38 +5988,45 @@ class mainWindow(QtWidgets.QWidget):
                 QtWidgets.QMessageBox.warning(self, "Invalid Input", "Max Age must be a valid number of days.")
                 return
 
-        self.progress_dialog = ProgressDialog(self); self.progress_dialog.setWindowTitle("Archiving...")
+        archive_mode = self.archiveModeComboBox.currentText(); departments = self._archive_shown_departments()
+        if archive_mode == "Pack" and not all(get_department_target(self.config_data, "archive_root", dept) for dept in departments):
+            QtWidgets.QMessageBox.warning(self, "Config Error", "Pack mode needs an 'archive_root' in the config file."); return
+
+        self.progress_dialog = self._make_progress_dialog("archive"); self.progress_dialog.setWindowTitle("Archiving...")
         self.thread = QtCore.QThread()
-        self.worker = ArchiveWorker(shot_paths, threshold, max_age_days, max_age_enabled, self.config_data)
+        if self.archiveServiceCheckBox.isChecked():
+            payload = {"shot_paths": shot_paths, "threshold": threshold, "max_age_days": max_age_days if max_age_enabled else None, "max_age_enabled": max_age_enabled, "mode": archive_mode, "departments": departments,
+                       "log_file": get_archive_log_path(self.show_root_path, show_name, seq_name), "log_entry": self._build_archive_log_entry([]), "priority": self.config_data.get("purge_priority", "Low")}
+            self.worker = RemoteJobWorker(PublishServiceClient.from_config(self.config_data), "archive", payload)
+        else:
+            self.worker = ArchiveWorker(shot_paths, threshold, max_age_days, max_age_enabled, self.config_data, archive_mode, departments=departments)
+            self.worker.archive_summary_ready.connect(self._create_archive_log)
         self.worker.moveToThread(self.thread)
 
         self.thread.started.connect(self.worker.run)
         self.worker.finished.connect(self._on_archive_finished)
-        self.worker.archive_summary_ready.connect(self._create_archive_log)
         self.worker.finished.connect(self.thread.quit); self.worker.finished.connect(self.worker.deleteLater); self.thread.finished.connect(self.thread.deleteLater)
         self.worker.log_message.connect(self.progress_dialog.add_log)
         self.worker.progress_updated.connect(self.progress_dialog.set_progress)
-        self.progress_dialog.abort_clicked.connect(self.worker.abort)
+        self.progress_dialog.abort_clicked.connect(self.worker.abort, QtCore.Qt.DirectConnection) # The worker's thread is busy in run()
         self.progress_dialog.pause_button.setVisible(False) 
+        self.progress_dialog.enable_priority(list(priority_levels(self.config_data)), self.config_data.get("purge_priority", "Low"))
+        self.progress_dialog.priority_changed.connect(self.worker.set_priority, QtCore.Qt.DirectConnection)
 
         self.thread.start()
         self.progress_dialog.exec()
         
         # Refresh the view for all selected items
+        for item in selected_items: self.archive_versions.pop(item.text(0), None) # Rescanned on the next summary/expand
         for item in selected_items:
             if item.isExpanded():
                 self._on_archive_shot_clicked(item, 0)
 
     def _on_archive_finished(self, success):
         self.progress_dialog.on_finished(success, "ARCHIVE COMPLETED SUCCESSFULLY", "ARCHIVE FAILED OR ABORTED")
+        self.prefetcher.invalidate() # Cleaned versions change sizes across many shots
 
-    def _create_archive_log(self, cleaned_versions):
-        show_name = self.archiveShowComBox.currentText()
-        seq_name = self.archiveSeqComBox.currentText()
-        seq_name_with_suffix = f"{seq_name}_Seq"
-        log_dir = os.path.join(self.show_root_path, show_name, "Production", "Shots", seq_name_with_suffix, "data", "lighting")
-        log_file = os.path.join(log_dir, "xPubArchiveLog.JSON")
-        
+    def _build_archive_log_entry(self, cleaned_versions, pack_paths=()):
         new_entry = { 
             "User": self.artistLineEdit.text(), "Host": self.deptLineEdit.text(), "DateTime": self.dateLineEdit.text(), 
             "Shot": self.archiveTree.selectedItems()[0].text(0),
@@ -1251,22 +6035,15 @@ class mainWindow(QtWidgets.QWidget):
                 "MaxAge": { "enabled": self.maxAgeRadioButton.isChecked(), "days": self.maxAgeLineEdit.text() if self.maxAgeRadioButton.isChecked() else None },
                 "Throttle": self.throttleComboBox.currentText()
             },
+            "Mode": self.archiveModeComboBox.currentText(), "Departments": self._archive_shown_departments(),
             "Comment": self.archiveCommentTextEdit.toPlainText(), "CleanedVersions": cleaned_versions
         }
-        
-        try:
-            os.makedirs(log_dir, exist_ok=True); all_logs = []
-            if os.path.exists(log_file):
-                os.chmod(log_file, stat.S_IWRITE)
-                with open(log_file, 'r', encoding="utf-8") as f: # FIX: Specify encoding
-                    try:
-                        all_logs = json.load(f)
-                        if not isinstance(all_logs, list): all_logs = [all_logs]
-                    except json.JSONDecodeError: all_logs = []
-            all_logs.append(new_entry)
-            with open(log_file, 'w', encoding="utf-8") as f: # FIX: Specify encoding
-                json.dump(all_logs, f, indent=4)
-            os.chmod(log_file, stat.S_IREAD)
+        if pack_paths: new_entry["Packs"] = list(pack_paths)
+        return new_entry
+
+    def _create_archive_log(self, cleaned_versions, pack_paths=()):
+        log_file = get_archive_log_path(self.show_root_path, self.archiveShowComBox.currentText(), self.archiveSeqComBox.currentText())
+        try: append_json_log(log_file, self._build_archive_log_entry(cleaned_versions, pack_paths))
         except Exception as e: 
             print(f"ERROR: Could not create or write to archive log file: {e}")
 
@@ -1335,7 +6112,8 @@ class mainWindow(QtWidgets.QWidget):
             # Build the new, detailed display string
             display_text = f"DateTime: {entry.get('DateTime', 'N/A')}\n"
             display_text += f"User: {entry.get('User', 'N/A')}\n"
-            display_text += f"Shot: {entry.get('Shot', 'N/A')}\n\n"
+            display_text += f"Shot: {entry.get('Shot', 'N/A')}\n"
+            display_text += f"Mode: {entry.get('Mode', 'Purge')}\n\n"
 
             # Add Filters section
             filters = entry.get('Filters', {})
@@ -1358,10 +6136,328 @@ class mainWindow(QtWidgets.QWidget):
                     display_text += f"  - {version}\n"
             else:
                 display_text += "Cleaned Versions: None\n"
+            for pack_path in entry.get('Packs', []):
+                display_text += f"  > {pack_path}\n"
 
             self.archiveCommentTextEdit.setText(display_text)
         except IndexError:
             self.archiveCommentTextEdit.setText("Error: Could not retrieve log entry.")
+
+# /////////////////////////////////////////////
+# COMMAND LINE TOOLS
+# \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
+def _parse_cli_date(text):
+    return datetime.datetime.strptime(text, "%Y-%m-%d").date()
+
+def _cli_history(args, config_data):
+    """Searches the show-wide publish history index and prints the matches."""
+    history_index = PublishHistoryIndex.from_config(config_data)
+    if not args.no_refresh:
+        seen, reindexed, removed = history_index.refresh(config_data.get("project_root", ""), args.show)
+        print(f"Indexed {seen} logs ({reindexed} updated, {removed} removed).", file=sys.stderr)
+    start = time.perf_counter()
+    results = history_index.search(show=args.show, user=args.user, host=args.host, since=args.since, until=args.until,
+                                   mode=args.mode, render=args.render, text=args.text, kind=args.kind, limit=args.limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        for r in results:
+            print(f"{r['datetime']:<21} {r['kind']:<8} {r['user']:<14} {r['host']:<14} {r['mode']:<8} {(r['seq'] + '/' + r['shot']).rstrip('/'):<24} {', '.join(r['renders'])}")
+            if r.get("comment"): print(f"    {r['comment'].strip().replace(chr(10), chr(10) + '    ')}")
+    print(f"{len(results)} entries ({elapsed_ms:.1f} ms)", file=sys.stderr)
+    return 0
+
+def _cli_report(args, config_data):
+    """Builds the show storage usage report, prints the pivot and optionally exports the raw rows."""
+    crawler = StorageCrawler.from_config(config_data); start = time.perf_counter()
+    records = build_storage_report(config_data, args.show, crawler, departments=args.department)
+    print(f"Scanned in {time.perf_counter() - start:.1f}s ({crawler.stats['listed']} folders listed, {crawler.stats['cached']} unchanged).", file=sys.stderr)
+    pivot = aggregate_storage_records(records, args.group_by)
+    columns = sorted({c for row in pivot.values() for c in row if c != "Total"}) + ["Total"]
+    print(f"{args.group_by:<28}" + "".join(f"{c:>18}" for c in columns))
+    for key, row in sorted(pivot.items(), key=lambda kv: kv[1]["Total"], reverse=True):
+        print(f"{key:<28}" + "".join(f"{format_size(row.get(c, 0)):>18}" for c in columns))
+    for path in (args.csv, args.json):
+        if path: export_storage_report(records, path); print(f"Wrote {path}", file=sys.stderr)
+    return 0
+
+def _cli_retention(args, config_data):
+    """Evaluates the retention policies over a whole show and prints what would be kept or deleted, and why. Deletes nothing."""
+    start = time.perf_counter(); shots = list_show_shots(config_data, args.show)
+    index = build_version_index(config_data, [path for seq, shot, path in shots], args.department)
+    scanned = time.perf_counter()
+    history = PublishHistoryIndex.from_config(config_data); history.refresh(config_data.get("project_root", ""), args.show)
+    plan = evaluate_retention(index, resolve_retention_policies(config_data), config_data.get("retention_pins", []), history.logged_versions(args.show))
+    print(f"{len(shots)} shots, {len(plan)} versions: scanned in {scanned - start:.1f}s, evaluated in {time.perf_counter() - scanned:.2f}s.", file=sys.stderr)
+    for (action, reason), count in sorted(plan.summary().items(), key=lambda kv: (kv[0][0], -kv[1])):
+        print(f"{action:<8} {count:>9}  {reason}")
+    if args.list:
+        for r in plan.rows("delete"): print(f"  {r['seq']}/{r['shot']} {r['department']:<10} {r['source']:<6} {r['user']:<12} {r['render']}/{r['version']}  ({r['reason']})")
+    for path in (args.csv, args.json):
+        if path: plan.export(path); print(f"Wrote {path}", file=sys.stderr)
+    return 0
+
+def _cli_snapshot(args, config_data):
+    """Scans a show and writes a scan snapshot into cache_dir/snapshots/<show>."""
+    start = time.perf_counter(); path = take_scan_snapshot(config_data, args.show)
+    with ScanSnapshot(path) as snapshot:
+        print(f"{path}: {snapshot.shot_count} shots, {len(snapshot) - snapshot.shot_count} versions, {format_size(os.path.getsize(path))} ({time.perf_counter() - start:.1f}s)")
+    return 0
+
+def _cli_snapshot_diff(args, config_data):
+    """Reports per-shot growth, new and deleted versions between two snapshots (default: latest vs. the newest one at least --hours older)."""
+    snapshots = list_scan_snapshots(config_data, args.show)
+    new_path = args.new or (snapshots[-1] if snapshots else None)
+    if not new_path: print(f"No snapshots of {args.show}; run 'xPubUi snapshot {args.show}' first.", file=sys.stderr); return 1
+    start = time.perf_counter()
+    with ScanSnapshot(new_path) as new:
+        old_path = args.old
+        if not old_path:
+            older = [p for p in snapshots if p != new_path and os.path.basename(p) < os.path.basename(new_path)]
+            cutoff = datetime.datetime.fromtimestamp(new.created - args.hours * 3600).strftime("%Y%m%d-%H%M%S") + ".xsnap"
+            old_path = next((p for p in reversed(older) if os.path.basename(p) <= cutoff), older[0] if older else None)
+        if not old_path: print("Need two snapshots to diff.", file=sys.stderr); return 1
+        with ScanSnapshot(old_path) as old:
+            changes = diff_scan_snapshots(old, new); elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"{os.path.basename(old_path)} -> {os.path.basename(new_path)}: {len(changes)} shots changed ({len(old)} / {len(new)} rows, {elapsed_ms:.1f} ms)", file=sys.stderr)
+    print(f"{'Shot':<28}{'Before':>12}{'After':>12}{'Growth':>13}{'New':>6}{'Deleted':>9}")
+    for key, c in sorted(changes.items(), key=lambda kv: abs(kv[1]["delta"]), reverse=True)[:args.top]:
+        print(f"{key:<28}{format_size(c['old']):>12}{format_size(c['new']):>12}{('+' if c['delta'] >= 0 else '-') + format_size(abs(c['delta'])):>13}{len(c['added']):>6}{len(c['removed']):>9}")
+        if args.versions:
+            for version_key, size in sorted(c["added"]): print(f"    + {version_key[len(key) + 1:]}  {format_size(size)}")
+            for version_key, size in sorted(c["removed"]): print(f"    - {version_key[len(key) + 1:]}  {format_size(size)}")
+    return 0
+
+def _cli_loadtest(args, config_data):
+    """Runs the multi-artist load test in a scratch folder and prints the report. Exits non-zero if anything was corrupted."""
+    try: mix = {op: float(weight) for op, weight in (item.split("=") for item in args.mix.split(","))}
+    except ValueError: print(f"Bad --mix '{args.mix}', expected e.g. scan=4,publish=4,log=2", file=sys.stderr); return 2
+    if set(mix) - {"scan", "publish", "log"}: print("--mix operations are scan, publish and log", file=sys.stderr); return 2
+    show_options = {"shots": args.shots, "versions": args.versions, "frames": args.frames, "frame_bytes": int(args.frame_kb * 1024)}
+    try: records, problems, wall = run_loadtest(args.root, config_data, args.artists, args.ops, args.think_ms, mix, args.latency_ms, show_options, log_callback=lambda m: print(m, file=sys.stderr))
+    except ValueError as e: print(f"Load test failed: {e}", file=sys.stderr); return 2
+    print(format_loadtest_report(records, problems, wall))
+    if not args.keep: shutil.rmtree(args.root, ignore_errors=True)
+    return 1 if any(problems.values()) else 0
+
+def _cli_throughput(args, config_data):
+    """Prints the recorded transfer throughput per route, tool and thread count."""
+    import sqlite3
+    try: rows = ThroughputHistory.from_config(config_data).report(args.route, time.time() - args.days * 86400 if args.days else None)
+    except (OSError, sqlite3.Error) as e: print(f"Could not read throughput history: {e}", file=sys.stderr); return 1
+    if args.json: print(json.dumps(rows, indent=4)); return 0
+    print(f"{'Route':<40} {'Tool':<13} {'Threads':>7} {'Jobs':>5} {'Data':>11} {'Avg MB/s':>9} {'Best MB/s':>9} {'Errors':>7} {'Retries':>8} {'Backoff':>8} {'Median File':>12}")
+    for r in rows:
+        print(f"{r['route']:<40} {r['tool']:<13} {r['threads']:>7} {r['jobs']:>5} {format_size(r['bytes'] or 0):>11} {r['avg_mbps']:>9.1f} {r['best_mbps']:>9.1f} {r['error_rate'] * 100:>6.2f}% {r['retries'] or 0:>8} {r['stall_s'] or 0:>7.0f}s {format_size(r['size_p50'] or 0):>12}")
+    return 0
+
+def _cli_bench_scan(args, config_data):
+    """Compares serial vs. async scanning of a folder with artificial per-call latency."""
+    serial_s, async_s, total = benchmark_scan(args.path, args.latency_ms, args.in_flight or config_data.get("scan_workers", 16))
+    print(f"Size: {format_size(total)}  Latency: {args.latency_ms} ms/call")
+    print(f"Serial: {serial_s:.2f}s   Async: {async_s:.2f}s   Speedup: {serial_s / max(async_s, 1e-9):.1f}x")
+    return 0
+
+def _cli_bench_priority(args, config_data):
+    """Measures how much a background copy at each priority slows an interactive reader."""
+    levels = [level.strip() for level in args.levels.split(",") if level.strip()]
+    unknown = set(levels) - set(priority_levels(config_data))
+    if unknown: print(f"Unknown priority: {', '.join(sorted(unknown))}", file=sys.stderr); return 2
+    try: rows = benchmark_priority(args.root, config_data, levels, args.data_mb, args.file_mb, args.read_kb, log_callback=lambda m: print(m, file=sys.stderr))
+    except ValueError as e: print(f"Benchmark failed: {e}", file=sys.stderr); return 2
+    scheduler = io_scheduler(args.root)
+    print(f"I/O scheduler: {scheduler or 'unknown'}" + ("" if scheduler in ("bfq", "cfq") else " (I/O classes only apply under bfq/cfq; niceness still does)"))
+    print(f"{'Priority':<11}{'Reads':>7}{'p50 ms':>9}{'p99 ms':>9}{'Copy MB/s':>11}{'Copy s':>8}")
+    for r in rows:
+        print(f"{r['priority']:<11}{r['reads']:>7}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}" + (f"{r['copy_mbps']:>11.1f}{r['copy_s']:>8.1f}" if r["copy_mbps"] else f"{'-':>11}{'-':>8}"))
+    if not args.keep: remove_bench_folder(args.root)
+    return 0
+
+def _cli_bench_small_files(args, config_data):
+    """Files/s for a version of many small files, per file vs. batched."""
+    try: rows = benchmark_small_files(args.root, config_data, args.files, args.file_kb, args.large_files, args.large_mb, args.latency_ms, log_callback=lambda m: print(m, file=sys.stderr))
+    except ValueError as e: print(f"Benchmark failed: {e}", file=sys.stderr); return 2
+    print(f"{args.files} x {args.file_kb} KB + {args.large_files} x {args.large_mb} MB, {args.latency_ms} ms per file created")
+    print(f"{'Mode':<26}{'Seconds':>9}{'Files/s':>10}  Result")
+    for r in rows: print(f"{r['mode']:<26}{r['seconds']:>9.2f}{r['files_per_s']:>10.0f}  {'ok' if r['ok'] else 'FAILED'}")
+    if not args.keep: remove_bench_folder(args.root)
+    return 0 if all(r["ok"] for r in rows) else 1
+
+def _cli_restore(args, config_data):
+    """Lists or restores the members of a cold storage pack."""
+    import lzma
+    if args.list:
+        index = read_pack_index(args.pack)
+        print(f"Source: {index.get('source')}")
+        for member in index["members"]: print(f"{member['size']:>14}  {member['name']}")
+        return 0
+    try:
+        restored = restore_pack(args.pack, args.dest, args.member)
+    except (OSError, ValueError, EOFError, RuntimeError, lzma.LZMAError, zlib.error) as e:
+        print(f"Restore failed: {e}", file=sys.stderr); return 1
+    print(f"{restored} files restored.", file=sys.stderr)
+    return 0
+
+def _cli_serve(args, config_data):
+    """Runs the publish service in the foreground until Ctrl+C."""
+    try: PublishService(config_data, args.host, args.port, args.token).serve_forever()
+    except ValueError as e: print(f"ERROR: {e}"); return 2
+    return 0
+
+def _cli_watch(args, config_data):
+    """Runs the watch folder auto-publisher in the foreground until Ctrl+C; --once makes one pass (marker completion, e.g. from cron)."""
+    if args.department: config_data = dict(config_data, active_department=args.department)
+    if args.catch_up_hours is not None: config_data = dict(config_data, watch_catch_up_hours=args.catch_up_hours)
+    dept = config_data.get("active_department"); settings = config_data.get("departments", {}).get(dept, {})
+    if not settings.get("source_path") or not settings.get("publish_path"): # Checked directly: get_publish_base needs a real shot path
+        print(f"Department '{dept}' needs a 'source_path' and a 'publish_path' in the config.", file=sys.stderr); return 2
+    shows = args.show or config_data.get("watch_shows") or sorted(list_subdirs(config_data.get("project_root", "")))
+    log = lambda text: print(f"[{datetime.datetime.now():%H:%M:%S}] {text}", flush=True)
+    publisher = AutoPublisher(config_data, args.move or config_data.get("watch_mode", "Copy") == "Move", args.dry_run, log_callback=log)
+    watcher = FolderWatcher(config_data, shows, publisher.submit, log); publisher.on_failed = watcher.rearm
+    log(f"Watching {len(shows)} shows for completed '{dept}' versions ({watcher.completion}: marker '{watcher.marker}', stable {watcher.stable_s}s)...")
+    if args.once: watcher.poll()
+    else:
+        stop = threading.Event()
+        try: watcher.run(stop)
+        except KeyboardInterrupt: stop.set(); log("Stopping; finishing queued publishes...")
+    publisher.close()
+    log(f"{publisher.published} published, {publisher.failed} failed.")
+    return 1 if publisher.failed else 0
+
+def _cli_scrub(args, config_data):
+    """Runs (or resumes) a checksum scrub pass over published versions; --problems lists the findings instead."""
+    import sqlite3
+    if args.mb_per_s is not None: config_data = dict(config_data, scrub_mb_per_s=args.mb_per_s)
+    try: index = ScrubIndex.from_config(config_data)
+    except (OSError, sqlite3.Error) as e: print(f"Could not open the scrub index: {e}", file=sys.stderr); return 1
+    if args.accept:
+        for version_path in args.accept: index.forget_version(os.path.normpath(version_path)); print(f"Forgot '{version_path}'; the next pass records it afresh.", file=sys.stderr)
+        return 0
+    if args.problems:
+        rows = index.problem_files()
+        for path, status, detail, verified_ts in rows: print(f"{status:<10} {datetime.datetime.fromtimestamp(verified_ts):%Y-%m-%d %H:%M}  {path}" + (f"  ({detail})" if detail else ""))
+        return 1 if rows else 0
+    shows = args.show or config_data.get("scrub_shows") or sorted(list_subdirs(config_data.get("project_root", "")))
+    log = lambda text: print(f"[{datetime.datetime.now():%H:%M:%S}] {text}", flush=True)
+    scrubber = PublishScrubber(config_data, index, log)
+    try: completed = scrubber.run(shows, args.department, args.max_hours * 3600 if args.max_hours else None, args.restart)
+    except KeyboardInterrupt: log("Interrupted; the next run resumes after the last finished version."); completed = False
+    return 1 if any(scrubber.stats[status] for status in SCRUB_PROBLEMS) else 0 if completed else 3
+
+def build_cli_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", help="Path to xPubConfig.JSON (defaults to the one next to the tool)")
+    parser = argparse.ArgumentParser(prog="xPubUi", description="xPub command line tools. Run without arguments to start the UI.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    history = subparsers.add_parser("history", parents=[common], help="Search publish/archive history across a show")
+    history.add_argument("show"); history.add_argument("--user"); history.add_argument("--host"); history.add_argument("--render")
+    history.add_argument("--mode", choices=["Copy", "Move", "Purge", "Pack", "Archive"]); history.add_argument("--kind", choices=["publish", "archive"])
+    history.add_argument("--since", type=_parse_cli_date, help="YYYY-MM-DD"); history.add_argument("--until", type=_parse_cli_date, help="YYYY-MM-DD")
+    history.add_argument("--text", help="Full-text search on comments"); history.add_argument("--limit", type=int, default=500)
+    history.add_argument("--no-refresh", action="store_true", help="Query the existing index without re-scanning logs")
+    history.add_argument("--json", action="store_true")
+    history.set_defaults(func=_cli_history)
+
+    report = subparsers.add_parser("report", parents=[common], help="Storage usage report for a whole show")
+    report.add_argument("show"); report.add_argument("--group-by", choices=["Shot", "Sequence", "User", "Department"], default="Sequence")
+    report.add_argument("--department", action="append", help="Limit to a configured department (repeatable)")
+    report.add_argument("--csv", help="Export raw rows to CSV"); report.add_argument("--json", help="Export raw rows to JSON")
+    report.set_defaults(func=_cli_report)
+
+    retention = subparsers.add_parser("retention", parents=[common], help="Dry run of the retention policies over a whole show")
+    retention.add_argument("show"); retention.add_argument("--department", action="append", help="Limit to a configured department (repeatable)")
+    retention.add_argument("--list", action="store_true", help="List every version that would be deleted")
+    retention.add_argument("--csv", help="Export the full plan to CSV"); retention.add_argument("--json", help="Export the full plan to JSON")
+    retention.set_defaults(func=_cli_retention)
+
+    snapshot = subparsers.add_parser("snapshot", parents=[common], help="Write a scan snapshot of a show (sizes of every version)")
+    snapshot.add_argument("show")
+    snapshot.set_defaults(func=_cli_snapshot)
+
+    snapshot_diff = subparsers.add_parser("snapshot-diff", parents=[common], help="Per-shot growth, new and deleted versions between two snapshots")
+    snapshot_diff.add_argument("show"); snapshot_diff.add_argument("--old", help="Older snapshot file"); snapshot_diff.add_argument("--new", help="Newer snapshot file (defaults to the latest)")
+    snapshot_diff.add_argument("--hours", type=float, default=24, help="Without --old, diff against the newest snapshot at least this old (default 24)")
+    snapshot_diff.add_argument("--top", type=int, default=50); snapshot_diff.add_argument("--versions", action="store_true", help="List the new and deleted versions")
+    snapshot_diff.set_defaults(func=_cli_snapshot_diff)
+
+    loadtest = subparsers.add_parser("loadtest", parents=[common], help="Simulate many artists scanning, publishing and logging at once on a synthetic show")
+    loadtest.add_argument("root", help="Scratch folder for the synthetic show (created; removed afterwards unless --keep)")
+    loadtest.add_argument("--artists", type=int, default=8); loadtest.add_argument("--ops", type=int, default=20, help="Operations per artist")
+    loadtest.add_argument("--think-ms", type=float, default=200, help="Mean pause between an artist's operations")
+    loadtest.add_argument("--mix", default="scan=4,publish=4,log=2", help="Operation weights")
+    loadtest.add_argument("--latency-ms", type=float, default=0, help="Injected latency per scan call, to mimic a slow share")
+    loadtest.add_argument("--shots", type=int, default=6); loadtest.add_argument("--versions", type=int, default=3); loadtest.add_argument("--frames", type=int, default=10)
+    loadtest.add_argument("--frame-kb", type=float, default=256); loadtest.add_argument("--keep", action="store_true", help="Keep the synthetic show for inspection")
+    loadtest.set_defaults(func=_cli_loadtest)
+
+    throughput = subparsers.add_parser("throughput", parents=[common], help="Recorded transfer throughput per source/destination route")
+    throughput.add_argument("--route", help="Only this route, e.g. 'D: -> \\\\server\\share'"); throughput.add_argument("--days", type=float, help="Only the last N days")
+    throughput.add_argument("--json", action="store_true")
+    throughput.set_defaults(func=_cli_throughput)
+
+    bench_scan = subparsers.add_parser("bench-scan", parents=[common], help="Benchmark serial vs. async scanning with injected latency")
+    bench_scan.add_argument("path"); bench_scan.add_argument("--latency-ms", type=float, default=5.0)
+    bench_scan.add_argument("--in-flight", type=int, help="Concurrent requests (defaults to scan_workers)")
+    bench_scan.set_defaults(func=_cli_bench_scan)
+
+    bench_priority = subparsers.add_parser("bench-priority", parents=[common], help="Benchmark an interactive reader against a background copy at each transfer priority")
+    bench_priority.add_argument("root", help="Empty or earlier benchmark scratch folder on the volume to test (files are created in it)")
+    bench_priority.add_argument("--levels", default="Normal,Low,Idle"); bench_priority.add_argument("--data-mb", type=int, default=512, help="Size of the background copy")
+    bench_priority.add_argument("--file-mb", type=int, default=8); bench_priority.add_argument("--read-kb", type=int, default=64, help="Foreground read size")
+    bench_priority.add_argument("--keep", action="store_true", help="Keep the scratch files for another run")
+    bench_priority.set_defaults(func=_cli_bench_priority)
+
+    bench_small = subparsers.add_parser("bench-small-files", parents=[common], help="Benchmark per-file vs. batched transfer of many small files")
+    bench_small.add_argument("root", help="Empty or earlier benchmark scratch folder (files are created in it)")
+    bench_small.add_argument("--files", type=int, default=3000); bench_small.add_argument("--file-kb", type=int, default=8)
+    bench_small.add_argument("--large-files", type=int, default=4); bench_small.add_argument("--large-mb", type=int, default=16)
+    bench_small.add_argument("--latency-ms", type=float, default=5.0, help="Added per file created at the destination, to mimic a remote share")
+    bench_small.add_argument("--keep", action="store_true", help="Keep the scratch files for another run")
+    bench_small.set_defaults(func=_cli_bench_small_files)
+
+    restore = subparsers.add_parser("restore", parents=[common], help="Restore a cold storage pack")
+    restore.add_argument("pack"); restore.add_argument("--dest", help="Restore here instead of the original version folder")
+    restore.add_argument("--member", action="append", help="Restore only this member (repeatable)")
+    restore.add_argument("--list", action="store_true", help="List members without restoring")
+    restore.set_defaults(func=_cli_restore)
+
+    watch = subparsers.add_parser("watch", parents=[common], help="Publish WIP versions automatically as renders complete")
+    watch.add_argument("--show", action="append", help="Watch this show (repeatable; defaults to watch_shows, else every show)")
+    watch.add_argument("--department", help="Department whose source_path to watch (defaults to active_department)")
+    watch.add_argument("--move", action="store_true", help="Move instead of copy (defaults to watch_mode)")
+    watch.add_argument("--catch-up-hours", type=float, help="Also publish complete versions modified this recently before the watch started (defaults to watch_catch_up_hours, 24)")
+    watch.add_argument("--once", action="store_true", help="One pass over every folder, then wait for the publishes and exit")
+    watch.add_argument("--dry-run", action="store_true", help="Only log what would be published")
+    watch.set_defaults(func=_cli_watch)
+
+    scrub = subparsers.add_parser("scrub", parents=[common], help="Verify published files against recorded checksums (resumable, throttled)")
+    scrub.add_argument("--show", action="append", help="Scrub this show (repeatable; defaults to scrub_shows, else every show)")
+    scrub.add_argument("--department", action="append", help="Limit to a configured department (repeatable)")
+    scrub.add_argument("--max-hours", type=float, help="Stop after this long; the next run resumes where it stopped")
+    scrub.add_argument("--mb-per-s", type=float, help="Read budget (defaults to scrub_mb_per_s; 0 = unlimited)")
+    scrub.add_argument("--restart", action="store_true", help="Start a new pass instead of resuming the current one")
+    scrub.add_argument("--problems", action="store_true", help="List the corrupt, truncated, modified and missing files found so far")
+    scrub.add_argument("--accept", action="append", metavar="VERSION", help="Forget a version folder (e.g. after a known rewrite) so it is recorded afresh (repeatable)")
+    scrub.set_defaults(func=_cli_scrub)
+
+    serve = subparsers.add_parser("serve", parents=[common], help="Run the publish service (run it on the file server)")
+    serve.add_argument("--host", help="Bind address (defaults to service_host, 127.0.0.1)"); serve.add_argument("--port", type=int, help="Port (defaults to service_port, 8765)")
+    serve.add_argument("--token", help="Shared secret clients must send (defaults to service_token)")
+    serve.set_defaults(func=_cli_serve)
+    return parser
+
+def run_cli(argv):
+    args = build_cli_parser().parse_args(argv)
+    try:
+        config_data = load_config_file(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Could not load config file: {e}", file=sys.stderr); return 2
+    configure_storage(config_data)
+    return args.func(args, config_data)
+
 # /////////////////////////////////////////////
 # STYLESHEET AND LAUNCHER
 # \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
@@ -1409,14 +6505,23 @@ QCheckBox::indicator:checked { background-color: #f39c12; border: 1px solid #f39
 """
 
 if __name__ == "__main__":
+    if getattr(sys, 'frozen', False): # Pack/daily process pools in the PyInstaller build
+        import multiprocessing; multiprocessing.freeze_support()
+    STARTUP_TIMER.mark("imports")
+    # Any leading sub-command (e.g. "history") runs the command line tools instead of the UI
+    if len(sys.argv) > 1 and not sys.argv[1].startswith("-"):
+        sys.exit(run_cli(sys.argv[1:]))
+
     app = QtWidgets.QApplication.instance()
     if not app:
         app = QtWidgets.QApplication(sys.argv)
     
     app.setStyle("Fusion")
     app.setStyleSheet(CSS_STYLE)
+    STARTUP_TIMER.mark("qt app")
     
     window = mainWindow()
     window.show()
+    QtCore.QTimer.singleShot(0, lambda: (STARTUP_TIMER.mark("first paint"), print(STARTUP_TIMER.report())))
     
     sys.exit(app.exec())
\ No newline at end of file